@@ -8,15 +8,28 @@ if __package__:
 else:
     __version__ = "_._._"
 
+from .backend.mem_pi import MemPi
 from .core.calibrable_servo import CalibrableServo
-from .core.multi_servo import MultiServo
+from .core.current_budget import CurrentBudget, CurrentModel
+from .core.multi_servo import MultiServo, ServoState
 from .core.piservo import PiServo
-from .helper.str_cmd_to_json import StrCmdToJson
+from .helper.async_multi_servo import AsyncMultiServo
+from .helper.async_worker import AsyncWorker
+from .helper.bin_cmd import BinCmd
+from .helper.cmd_trace import TracePi, TraceRecorder, TraceReplayer
+from .helper.process_worker import ProcessWorker
+from .helper.shm_cmd_ring import ShmCmdRing
+from .helper.shm_target_pose import ShmTargetPose, TargetPose
+from .helper.str_cmd_to_json import CmdProgram, CompileError, StrCmdToJson
 from .helper.thread_multi_servo import ThreadMultiServo
-from .helper.thread_worker import ThreadWorker
+from .helper.thread_worker import CmdFuture, ThreadWorker
+from .helper.udp_cmd import UdpCmd, UdpPacket
 from .utils.click_utils import click_common_opts
+from .utils.clock import Clock, SimClock
 from .utils.my_logger import get_logger
 from .web.api_client import ApiClient
+from .web.api_ws_client import ApiWsClient
+from .web.udp_client import UdpClient
 
 __all__ = [
     "__version__",
@@ -24,10 +37,33 @@ __all__ = [
     "click_common_opts",
 
     "ApiClient",
+    "ApiWsClient",
+    "AsyncMultiServo",
+    "AsyncWorker",
+    "BinCmd",
     "CalibrableServo",
+    "Clock",
+    "CmdFuture",
+    "CmdProgram",
+    "CompileError",
+    "CurrentBudget",
+    "CurrentModel",
+    "MemPi",
     "MultiServo",
     "PiServo",
+    "ProcessWorker",
+    "ServoState",
+    "ShmCmdRing",
+    "ShmTargetPose",
+    "SimClock",
     "StrCmdToJson",
+    "TargetPose",
     "ThreadMultiServo",
     "ThreadWorker",
+    "TracePi",
+    "TraceRecorder",
+    "TraceReplayer",
+    "UdpClient",
+    "UdpCmd",
+    "UdpPacket",
 ]
@@ -2,18 +2,42 @@
 # (c) 2025 Yoichi Tanibayashi
 #
 """__main__.py"""
+import itertools
+import json
 import os
 
 import click
 import pigpio
 import uvicorn
 
-from . import __version__, click_common_opts, get_logger
+from . import (
+    ApiClient,
+    ApiWsClient,
+    __version__,
+    click_common_opts,
+    get_logger,
+)
+from .backend.factory import (
+    BACKEND_PIGPIO,
+    BACKENDS,
+    ENV_I2C_BUS,
+    ENV_PCA9685_ADDRS,
+    open_pi,
+    parse_addrs,
+)
+from .backend.pca9685_pi import Pca9685Pi
+from .backend.sim_pi import ServoModel
+from .benchmarks.runner import BenchRunner
 from .command.cmd_apiclient import CmdApiClient
+from .command.cmd_bench import CmdBench
 from .command.cmd_calib import CalibApp
+from .command.cmd_loadtest import CmdLoadTest
 from .command.cmd_servo import CmdServo
 from .command.cmd_strclient import CmdStrClient
 from .core.calibrable_servo import CalibrableServo
+from .helper.cmd_trace import TraceCmd, TraceReplayer, read_trace
+from .helper.dynamics_report import DynamicsReport
+from .web.production import ProductionServer
 
 
 def get_pi(debug=False):
@@ -147,15 +171,70 @@ def calib(ctx, pin, conf_file, debug):
     "--port", "-p", type=int, default=8000, show_default=True,
     help="port number"
 )
+@click.option(
+    "--engine", "-e", type=click.Choice(["thread", "async", "process"]),
+    default="thread", show_default=True,
+    help="command execution engine"
+)
+@click.option(
+    "--target_pose", "-t", type=str, default="",
+    help="shared memory name of the target pose channel"
+)
+@click.option(
+    "--trace", "-T", "trace_file", type=str, default="",
+    help="record commands and pulses to the trace file"
+)
+@click.option(
+    "--backend", "-b", type=click.Choice(BACKENDS),
+    default=BACKEND_PIGPIO, show_default=True,
+    help="output backend"
+)
+@click.option(
+    "--i2c_bus", type=int, default=Pca9685Pi.DEF_BUS, show_default=True,
+    help="I2C bus number (backend: pca9685)"
+)
+@click.option(
+    "--pca9685_addrs", type=str, default=hex(Pca9685Pi.DEF_ADDR),
+    show_default=True,
+    help="PCA9685 board addresses, 16 pins each (e.g. '0x40,0x41')"
+)
+@click.option(
+    "--udp_port", "-u", type=int, default=0,
+    help="UDP control port (0: disabled)"
+)
+@click.option(
+    "--production", "-P", is_flag=True,
+    help="production mode (no reload, single hardware process)"
+)
+@click.option(
+    "--workers", "-w", type=int, default=ProductionServer.DEF_WORKERS,
+    show_default=True,
+    help="number of HTTP worker processes (production mode)"
+)
 @click_common_opts(__version__)
-def api_server(ctx, pins, server_host, port, debug):
-    """API (JSON) Server ."""
+def api_server(
+    ctx, pins, server_host, port, engine, target_pose, trace_file,
+    backend, i2c_bus, pca9685_addrs, udp_port, production, workers, debug
+):
+    """API (JSON) Server .
+
+    `--production`では、ハードウェアを所有するプロセスを一つだけ起動し、
+    `--workers`個のHTTPワーカープロセスから、コマンドを送る。
+    (`--engine`は無視する)
+    """
     cmd_name = ctx.command.name
 
     __log = get_logger(__name__, debug)
     __log.debug("cmd_name=%s", cmd_name)
     __log.debug("pins=%s", pins)
-    __log.debug("server_host=%s, port=%s", server_host, port)
+    __log.debug(
+        "server_host=%s, port=%s, engine=%s, target_pose=%s, trace=%s",
+        server_host, port, engine, target_pose, trace_file
+    )
+    __log.debug(
+        "backend=%s, udp_port=%s, production=%s, workers=%s",
+        backend, udp_port, production, workers
+    )
 
     if pins:
         os.environ["PISERVO0_PINS"] = ",".join([str(p) for p in pins])
@@ -169,7 +248,29 @@ def api_server(ctx, pins, server_host, port, debug):
         print()
         return
 
+    # "pca9685"の設定は、ハードウェアプロセスにも引き継ぐ
+    try:
+        parse_addrs(pca9685_addrs)
+    except ValueError as _e:
+        raise click.BadParameter(str(_e), param_hint="--pca9685_addrs")
+    os.environ[ENV_I2C_BUS] = str(i2c_bus)
+    os.environ[ENV_PCA9685_ADDRS] = pca9685_addrs
+
+    if production:
+        ProductionServer(
+            pins, host=server_host, port=port, workers=workers,
+            target_pose_name=target_pose or None,
+            trace_file=trace_file or None, udp_port=udp_port,
+            backend=backend, debug=debug
+        ).main()
+        return
+
     os.environ["PISERVO0_DEBUG"] = "1" if debug else "0"
+    os.environ["PISERVO0_ENGINE"] = engine
+    os.environ["PISERVO0_TARGET_POSE"] = target_pose
+    os.environ["PISERVO0_TRACE"] = trace_file
+    os.environ["PISERVO0_UDP_PORT"] = str(udp_port)
+    os.environ["PISERVO0_BACKEND"] = backend
 
     uvicorn.run(
         "piservo0.web.json_api:app",
@@ -177,6 +278,106 @@ def api_server(ctx, pins, server_host, port, debug):
     )
 
 
+@cli.command(
+    help="""
+replay trace files
+
+* trace files are recorded by `api-server --trace FILE`
+"""
+)
+@click.argument("trace_files", type=click.Path(exists=True), nargs=-1)
+@click.option(
+    "--speed", "-s", type=float, default=TraceReplayer.DEF_SPEED,
+    show_default=True, help="replay speed (N times)"
+)
+@click.option(
+    "--fast", "-F", is_flag=True, default=False,
+    help="replay as fast as possible"
+)
+@click.option(
+    "--backend", "-b", type=click.Choice(BACKENDS),
+    default=BACKEND_PIGPIO, show_default=True,
+    help="output backend"
+)
+@click.option(
+    "--i2c_bus", type=int, default=Pca9685Pi.DEF_BUS, show_default=True,
+    help="I2C bus number (backend: pca9685)"
+)
+@click.option(
+    "--pca9685_addrs", type=str, default=hex(Pca9685Pi.DEF_ADDR),
+    show_default=True,
+    help="PCA9685 board addresses, 16 pins each (e.g. '0x40,0x41')"
+)
+@click.option(
+    "--dump", is_flag=True, default=False,
+    help="print records only"
+)
+@click_common_opts(__version__)
+def replay(
+    ctx, trace_files, speed, fast, backend, i2c_bus, pca9685_addrs, dump,
+    debug
+):
+    """replay command."""
+    cmd_name = ctx.command.name
+
+    __log = get_logger(__name__, debug)
+    __log.debug(
+        "trace_files=%s, speed=%s, fast=%s, backend=%s, dump=%s",
+        trace_files, speed, fast, backend, dump
+    )
+
+    try:
+        _addrs = parse_addrs(pca9685_addrs)
+    except ValueError as _e:
+        raise click.BadParameter(str(_e), param_hint="--pca9685_addrs")
+
+    if not trace_files:
+        print()
+        print("Error: Please specify trace files.")
+        print()
+        print(f"  e.g. piservo0 {cmd_name} trace.bin.1 trace.bin")
+        print()
+        print(f"{ctx.get_help()}")
+        return
+
+    records = itertools.chain.from_iterable(
+        read_trace(f) for f in trace_files
+    )
+
+    if dump:
+        for _rec in records:
+            if isinstance(_rec, TraceCmd):
+                print(f"{_rec.t:.6f} cmd   id={_rec.cmd_id} {_rec.cmd_data}")
+            else:
+                print(f"{_rec.t:.6f} pulse pin={_rec.pin} {_rec.pulse}")
+        return
+
+    if backend == BACKEND_PIGPIO:
+        pi = get_pi(debug)
+        if not pi:
+            return
+    else:
+        try:
+            pi = open_pi(backend, debug, i2c_bus, _addrs)
+        except (RuntimeError, OSError) as _e:
+            __log.error("%s: %s", type(_e).__name__, _e)
+            return
+
+    try:
+        _replayer = TraceReplayer(pi, 0 if fast else speed, debug=debug)
+        _pulse_n = _replayer.replay(records)
+        print(f"{_pulse_n} pulses replayed")
+
+    except KeyboardInterrupt:
+        pass
+
+    except Exception as _e:
+        __log.error("%s: %s", type(_e).__name__, _e)
+
+    finally:
+        pi.stop()
+
+
 @cli.command(help="API Client (JSON)")
 @click.argument("cmdline", type=str, nargs=-1)
 @click.option(
@@ -189,21 +390,36 @@ def api_server(ctx, pins, server_host, port, debug):
     default="~/.piservo0_apiclient_history", show_default=True,
     help="History file"
 )
+@click.option(
+    "--batch_ms", "-m", type=float, default=ApiClient.DEF_BATCH_MS,
+    show_default=True, help="batching window [msec] (interactive mode)"
+)
+@click.option(
+    "--ws", "-W", is_flag=True, default=False,
+    help="stream commands over WebSocket (/ws)"
+)
+@click.option(
+    "--window", "-w", type=int, default=ApiWsClient.DEF_WINDOW,
+    show_default=True, help="max commands in flight (--ws)"
+)
 @click_common_opts(__version__)
-def api_client(ctx, cmdline, url, history_file, debug):
+def api_client(ctx, cmdline, url, history_file, batch_ms, ws, window, debug):
     """String API Server."""
     cmd_name = ctx.command.name
 
     __log = get_logger(__name__, debug)
     __log.debug(
-        "cmd_name=%s, url=%s, history_file=%s",
-        cmd_name, url, history_file
+        "cmd_name=%s, url=%s, history_file=%s, batch_ms=%s, ws=%s",
+        cmd_name, url, history_file, batch_ms, ws
     )
 
     # cmdline = " ".join(cmdline)
     __log.debug("cmdline=%a", cmdline)
 
-    _app = CmdApiClient(cmd_name, url, cmdline, history_file, debug)
+    _app = CmdApiClient(
+        cmd_name, url, cmdline, history_file, debug, batch_ms=batch_ms,
+        ws=ws, window=window
+    )
     try:
         _app.main()
 
@@ -230,8 +446,39 @@ def api_client(ctx, cmdline, url, history_file, debug):
     "--angle_factor", "-a", type=str, default="1,1,1,1", show_default=True,
     help="Angle Factor"
 )
+@click.option(
+    "--file", "-f", "script_file", type=str, default=None,
+    help="stream a script file ('-': stdin)"
+)
+@click.option(
+    "--chunk_n", "-n", type=int, default=ApiClient.DEF_CHUNK_N,
+    show_default=True, help="commands per request (--file)"
+)
+@click.option(
+    "--binary", "-B", is_flag=True, default=False,
+    help="send commands in the binary format (/cmd/bin)"
+)
+@click.option(
+    "--batch_ms", "-m", type=float, default=ApiClient.DEF_BATCH_MS,
+    show_default=True, help="batching window [msec] (interactive mode)"
+)
+@click.option(
+    "--ws", "-W", is_flag=True, default=False,
+    help="stream commands over WebSocket (/ws)"
+)
+@click.option(
+    "--window", "-w", type=int, default=ApiWsClient.DEF_WINDOW,
+    show_default=True, help="max commands in flight (--ws)"
+)
+@click.option(
+    "--count", "-c", type=int, default=1, show_default=True,
+    help="repeat the script file (--file), 0: forever"
+)
 @click_common_opts(__version__)
-def str_client(ctx, cmdline, url, history_file, angle_factor, debug):
+def str_client(
+    ctx, cmdline, url, history_file, angle_factor, script_file, chunk_n,
+    binary, batch_ms, ws, window, count, debug
+):
     """String Command API Client."""
     cmd_name = ctx.command.name
 
@@ -240,12 +487,20 @@ def str_client(ctx, cmdline, url, history_file, angle_factor, debug):
         "cmd_name=%s, url=%s, history_file=%s, angle_factor=%s",
         cmd_name, url, history_file, angle_factor
     )
-    __log.debug("cmdline=%s", cmdline)
+    __log.debug(
+        "cmdline=%s, script_file=%s, chunk_n=%s, binary=%s, batch_ms=%s",
+        cmdline, script_file, chunk_n, binary, batch_ms
+    )
+    __log.debug("ws=%s, window=%s, count=%s", ws, window, count)
 
     af_list = [int(i) for i in angle_factor.split(',')]
     __log.debug("af_list=%s", af_list)
 
-    _app = CmdStrClient(cmd_name, url, cmdline, history_file, af_list, debug)
+    _app = CmdStrClient(
+        cmd_name, url, cmdline, history_file, af_list,
+        script_file=script_file, chunk_n=chunk_n, binary=binary,
+        batch_ms=batch_ms, ws=ws, window=window, count=count, debug=debug
+    )
     try:
         _app.main()
 
@@ -254,3 +509,206 @@ def str_client(ctx, cmdline, url, history_file, angle_factor, debug):
 
     finally:
         _app.end()
+
+
+@cli.command(
+    help="""
+API load test
+
+* without `--url`, starts an API server on the in-memory backend
+"""
+)
+@click.argument("pins", type=int, nargs=-1)
+@click.option(
+    "--url", "-u", type=str, default=None,
+    help="API URL (default: start a local server)"
+)
+@click.option(
+    "--clients", "-c", "client_n", type=int,
+    default=CmdLoadTest.DEF_CLIENT_N, show_default=True,
+    help="number of concurrent clients"
+)
+@click.option(
+    "--duration", "-D", type=float, default=CmdLoadTest.DEF_DURATION,
+    show_default=True, help="duration [sec]"
+)
+@click.option(
+    "--wait", "-w", is_flag=True, default=False,
+    help="wait for completion of each request (?wait=true)"
+)
+@click.option(
+    "--engine", "-e", type=click.Choice(["thread", "async"]),
+    default="thread", show_default=True,
+    help="command execution engine (local server)"
+)
+@click.option(
+    "--sample_sec", "-s", type=float, default=CmdLoadTest.DEF_SAMPLE_SEC,
+    show_default=True, help="queue length sampling interval [sec]"
+)
+@click.option(
+    "--seed", type=int, default=None, help="random seed"
+)
+@click.option(
+    "--json", "-j", "as_json", is_flag=True, default=False,
+    help="print the result as JSON"
+)
+@click_common_opts(__version__)
+def loadtest(
+    ctx, pins, url, client_n, duration, wait, engine, sample_sec, seed,
+    as_json, debug
+):
+    """loadtest command."""
+    __log = get_logger(__name__, debug)
+    __log.debug(
+        "pins=%s, url=%s, client_n=%s, duration=%s, wait=%s, engine=%s",
+        pins, url, client_n, duration, wait, engine
+    )
+
+    _app = CmdLoadTest(
+        pins or (17, 27), url=url, client_n=client_n, duration=duration,
+        wait=wait, engine=engine, sample_sec=sample_sec, seed=seed,
+        debug=debug
+    )
+    try:
+        _app.main(as_json)
+
+    except KeyboardInterrupt:
+        pass
+
+    finally:
+        _app.end()
+
+
+@cli.command(
+    help="""
+micro benchmarks (in-memory backend)
+
+* `--output` saves the result as a baseline
+* `--baseline` compares with it, and exits 1 on regression
+"""
+)
+@click.option(
+    "--servo_n", "-n", type=str, default="1,4,16", show_default=True,
+    help="comma separated numbers of servos"
+)
+@click.option(
+    "--filter", "-k", "name_filter", type=str, default=None,
+    help="run benchmarks whose name contains this string"
+)
+@click.option(
+    "--repeat", "-r", type=int, default=BenchRunner.DEF_REPEAT,
+    show_default=True, help="repeat count (the minimum is taken)"
+)
+@click.option(
+    "--min_sec", type=float, default=BenchRunner.DEF_MIN_SEC,
+    show_default=True, help="minimum time of one measurement [sec]"
+)
+@click.option(
+    "--output", "-o", type=click.Path(dir_okay=False), default=None,
+    help="save the result as JSON"
+)
+@click.option(
+    "--baseline", "-B", type=click.Path(exists=True, dir_okay=False),
+    default=None, help="baseline JSON to compare with"
+)
+@click.option(
+    "--threshold", "-t", type=float, default=BenchRunner.DEF_THRESHOLD,
+    show_default=True, help="regression threshold (0.2 = 20% slower)"
+)
+@click.option(
+    "--json", "-j", "as_json", is_flag=True, default=False,
+    help="print the result as JSON"
+)
+@click_common_opts(__version__)
+def bench(
+    ctx, servo_n, name_filter, repeat, min_sec, output, baseline, threshold,
+    as_json, debug
+):
+    """bench command."""
+    __log = get_logger(__name__, debug)
+    __log.debug(
+        "servo_n=%s, name_filter=%s, output=%s, baseline=%s",
+        servo_n, name_filter, output, baseline
+    )
+
+    try:
+        _servo_ns = [int(_n) for _n in servo_n.split(",")]
+    except ValueError as _e:
+        raise click.BadParameter(str(_e), param_hint="--servo_n") from _e
+
+    _app = CmdBench(
+        _servo_ns, name_filter=name_filter, repeat=repeat, min_sec=min_sec,
+        output=output, baseline=baseline, threshold=threshold, debug=debug
+    )
+    ctx.exit(_app.main(as_json))
+
+
+@cli.command(
+    help="""
+simulate servo dynamics of a script, and flag physical limits
+
+* too_fast: faster than the servo can move
+* extra_steps: steps smaller than the deadband
+
+invalid commands are reported as errors (exit status 1)
+"""
+)
+@click.argument("pins", type=int, nargs=-1)
+@click.option(
+    "--cmd", "-c", "cmdline", type=str, default=None,
+    help="string commands (e.g. 'ms:0.1 mv:90,-90')"
+)
+@click.option(
+    "--file", "-f", "script_file", type=click.File("r"), default=None,
+    help="string command script file ('-': stdin)"
+)
+@click.option(
+    "--sec_per_60deg", type=float, default=ServoModel().sec_per_60deg,
+    show_default=True, help="servo speed [sec/60deg]"
+)
+@click.option(
+    "--deadband", type=float, default=ServoModel().deadband_usec,
+    show_default=True, help="deadband [usec]"
+)
+@click.option(
+    "--lag", type=float, default=ServoModel().lag_sec,
+    show_default=True, help="response lag [sec]"
+)
+@click.option(
+    "--conf_file", type=click.Path(dir_okay=False), default=None,
+    help="calibration config file (default: uncalibrated)"
+)
+@click.option(
+    "--json", "-j", "as_json", is_flag=True, default=False,
+    help="print the result as JSON"
+)
+@click_common_opts(__version__)
+def sim(
+    ctx, pins, cmdline, script_file, sec_per_60deg, deadband, lag,
+    conf_file, as_json, debug
+):
+    """sim command."""
+    __log = get_logger(__name__, debug)
+    __log.debug(
+        "pins=%s, cmdline=%s, script_file=%s, conf_file=%s",
+        pins, cmdline, script_file, conf_file
+    )
+
+    _script = cmdline or ""
+    if script_file is not None:
+        _script += " " + script_file.read()
+    if not pins or not _script.strip():
+        raise click.UsageError("Please specify PINS and --cmd or --file.")
+
+    _app = DynamicsReport(
+        pins, ServoModel(sec_per_60deg, deadband, lag),
+        conf_file=conf_file, debug=debug
+    )
+    _result = _app.run(_script)
+    if as_json:
+        print(json.dumps(_result, indent=2))
+    else:
+        print(_app.report(_result))
+
+    if _result["errors"]:
+        ctx.exit(1)
@@ -0,0 +1,82 @@
+#
+# (c) 2025 Yoichi Tanibayashi
+#
+import os
+
+import pigpio
+
+from .mem_pi import MemPi
+from .pca9685_pi import Pca9685Pi
+from .sim_pi import SimPi
+
+BACKEND_PIGPIO = "pigpio"
+BACKEND_MEM = "mem"
+BACKEND_SIM = "sim"
+BACKEND_PCA9685 = "pca9685"
+BACKENDS = (BACKEND_PIGPIO, BACKEND_MEM, BACKEND_SIM, BACKEND_PCA9685)
+
+# "pca9685"の設定 (子プロセスにも引き継がれるように、環境変数)
+ENV_I2C_BUS = "PISERVO0_I2C_BUS"
+ENV_PCA9685_ADDRS = "PISERVO0_PCA9685_ADDRS"
+
+
+def parse_addrs(addrs_str: str) -> list[int]:
+    """"0x40,0x41" --> [0x40, 0x41]
+
+    Raises:
+        ValueError: 不正なアドレス
+    """
+    _addrs = [int(_a, 0) for _a in addrs_str.split(",") if _a.strip()]
+    for _addr in _addrs:
+        if not 0x03 <= _addr <= 0x77:
+            raise ValueError(f"invalid I2C address: 0x{_addr:02X}")
+    if not _addrs:
+        raise ValueError(f"invalid I2C addresses: {addrs_str!r}")
+    return _addrs
+
+
+def open_pi(
+    backend: str = BACKEND_PIGPIO,
+    debug: bool = False,
+    i2c_bus: int | None = None,
+    pca9685_addrs: list[int] | None = None,
+):
+    """Open an output backend (`pigpio.pi` compatible).
+
+    * "pigpio": `pigpio.pi()` (pigpiodに接続)
+    * "mem": `MemPi` (メモリ上だけ。負荷試験や、ハードウェアのない環境用)
+    * "sim": `SimPi` (実時間で、サーボの動きをシミュレーションする)
+    * "pca9685": `Pca9685Pi` (ピン番号は、ボードを通したチャンネル)
+
+    "pca9685"のI2Cバス番号(`i2c_bus`)とボードのアドレス(`pca9685_addrs`)は、
+    省略すると、環境変数`PISERVO0_I2C_BUS`, `PISERVO0_PCA9685_ADDRS`
+    (e.g. "0x40,0x41")。どちらもなければ、bus 1, 0x40。
+
+    Raises:
+        ValueError: 不明なバックエンド
+        RuntimeError: "pca9685"で、`smbus2`がない
+    """
+    if backend == BACKEND_PIGPIO:
+        return pigpio.pi()
+    if backend == BACKEND_MEM:
+        return MemPi(debug=debug)
+    if backend == BACKEND_SIM:
+        return SimPi(debug=debug)
+    if backend == BACKEND_PCA9685:
+        if i2c_bus is None:
+            i2c_bus = int(os.getenv(ENV_I2C_BUS) or Pca9685Pi.DEF_BUS)
+        if pca9685_addrs is None:
+            pca9685_addrs = parse_addrs(
+                os.getenv(ENV_PCA9685_ADDRS) or str(Pca9685Pi.DEF_ADDR)
+            )
+        return Pca9685Pi.open(i2c_bus, pca9685_addrs, debug=debug)
+    raise ValueError(f"invalid backend: {backend}")
+
+
+def attach_pi(pi, mservo):
+    """Connect a frame-writing backend to `mservo`. (see `Pca9685Pi`)
+
+    フレーム単位で書き込むバックエンドでなければ、何もしない。
+    """
+    if isinstance(pi, Pca9685Pi):
+        pi.attach(mservo)
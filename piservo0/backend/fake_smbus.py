@@ -0,0 +1,72 @@
+#
+# (c) 2025 Yoichi Tanibayashi
+#
+from typing import NamedTuple
+
+
+class I2cTransaction(NamedTuple):
+    """An I2C write transaction."""
+
+    addr: int
+    reg: int
+    data: bytes
+
+    @property
+    def wire_bytes(self) -> int:
+        """Bytes on the bus. (アドレス + レジスタ番号 + データ)"""
+        return 2 + len(self.data)
+
+
+class FakeSMBus:
+    """`smbus2.SMBus`-like fake I2C bus.
+
+    ハードウェアのない環境で、`Pca9685Pi`を動かすためのバス。
+    書き込みを`transactions`(`I2cTransaction`)に記録し、
+    デバイスごとのレジスタ(`regs`)に反映する。
+    (ブロック書き込みは、オートインクリメント)
+    """
+
+    def __init__(self):
+        """Constructor."""
+        self.transactions: list[I2cTransaction] = []
+        self.regs: dict[int, bytearray] = {}
+        self.closed = False
+
+    def _write(self, addr: int, reg: int, data: bytes):
+        self.transactions.append(I2cTransaction(addr, reg, bytes(data)))
+        _regs = self.regs.setdefault(addr, bytearray(256))
+        _regs[reg:reg + len(data)] = data
+
+    def write_byte_data(self, addr: int, reg: int, value: int):
+        """Write a byte (`smbus2`互換)."""
+        self._write(addr, reg, bytes((value,)))
+
+    def read_byte_data(self, addr: int, reg: int) -> int:
+        """Read a byte (`smbus2`互換)."""
+        return self.regs.get(addr, bytearray(256))[reg]
+
+    def write_i2c_block_data(self, addr: int, reg: int, data):
+        """Write a block (`smbus2`互換)."""
+        self._write(addr, reg, bytes(data))
+
+    def i2c_rdwr(self, *msgs):
+        """Combined write transactions (`smbus2`互換. 書き込みのみ)."""
+        for _msg in msgs:
+            _buf = bytes(_msg)
+            self._write(_msg.addr, _buf[0], _buf[1:])
+
+    def close(self):
+        """Close (`smbus2`互換)."""
+        self.closed = True
+
+    def mark(self) -> int:
+        """Current position in `transactions`. (see `since()`)"""
+        return len(self.transactions)
+
+    def since(self, mark: int) -> list[I2cTransaction]:
+        """Transactions after `mark`."""
+        return self.transactions[mark:]
+
+    def bytes_since(self, mark: int) -> int:
+        """Bytes on the bus after `mark`."""
+        return sum(_t.wire_bytes for _t in self.since(mark))
@@ -0,0 +1,43 @@
+#
+# (c) 2025 Yoichi Tanibayashi
+#
+from ..utils.my_logger import get_logger
+
+
+class MemPi:
+    """In-memory output backend.
+
+    `pigpio.pi`の代わりに使える、メモリ上だけのバックエンド。
+    パルス幅を記録するだけで、ハードウェアには何も出力しない。
+
+    トレースのリプレイや、ハードウェアのない環境での動作確認に使う。
+
+    Attributes:
+        connected (bool): 常に`True` (`stop()`で`False`)
+        pulses (dict[int, int]): ピンごとの現在のパルス幅
+        write_n (int): `set_servo_pulsewidth()`の呼び出し回数
+    """
+
+    def __init__(self, debug: bool = False):
+        """Constructor."""
+        self._debug = debug
+        self.__log = get_logger(self.__class__.__name__, self._debug)
+
+        self.connected = True
+        self.pulses: dict[int, int] = {}
+        self.write_n = 0
+
+    def set_servo_pulsewidth(self, pin: int, pulse: int) -> int:
+        """Set pulse width (`pigpio.pi`互換)."""
+        self.pulses[pin] = int(pulse)
+        self.write_n += 1
+        return 0
+
+    def get_servo_pulsewidth(self, pin: int) -> int:
+        """Get pulse width (`pigpio.pi`互換). 未設定のピンは0(off)."""
+        return self.pulses.get(pin, 0)
+
+    def stop(self):
+        """Stop (`pigpio.pi`互換)."""
+        self.__log.debug("write_n=%s", self.write_n)
+        self.connected = False
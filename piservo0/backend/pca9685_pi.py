@@ -0,0 +1,260 @@
+#
+# (c) 2025 Yoichi Tanibayashi
+#
+import time
+from contextlib import contextmanager
+from typing import NamedTuple
+
+from ..utils.my_logger import get_logger
+
+try:
+    from smbus2 import SMBus, i2c_msg
+except ImportError:  # pragma: no cover
+    SMBus = i2c_msg = None  # type: ignore
+
+
+class I2cWrite(NamedTuple):
+    """I2C write message. (`smbus2.i2c_msg`がない場合の代わり)"""
+
+    addr: int
+    buf: bytes
+
+    def __bytes__(self):
+        return self.buf
+
+
+def i2c_write(addr: int, buf) -> object:
+    """Make an I2C write message for `bus.i2c_rdwr()`."""
+    if i2c_msg is not None:
+        return i2c_msg.write(addr, list(buf))
+    return I2cWrite(addr, bytes(buf))
+
+
+class Pca9685Pi:
+    """PCA9685 I2C output backend (`pigpio.pi` compatible).
+
+    16チャンネルのPCA9685ボードを、複数つないで使う。
+    ピン番号は、`addrs`の順に通したチャンネル番号。
+    (`pin = ボードの順番 * 16 + チャンネル`)
+
+    `bus`は、`smbus2.SMBus`互換のオブジェクト。
+    (`write_byte_data()`, `i2c_rdwr()`, `close()`)
+
+    **書き込み**
+
+    * `auto_flush=True`: `set_servo_pulsewidth()`ごとに書き込む。
+    * `auto_flush=False`: `flush()`まで、変更をためておく。
+      `flush()`は、ボードごとに、変更したチャンネルの範囲を、
+      一回のオートインクリメントのブロック書き込みで書く。
+
+    パルス幅が変わらないチャンネルは、書き込まない。
+
+    `attach()`で`MultiServo`につなぐと、フレーム(`move_all_angles()`や
+    `move_all_angles_sync()`の一歩)ごとに`flush()`する。
+
+    Attributes:
+        connected (bool): 常に`True` (`stop()`で`False`)
+        pulses (dict[int, int]): ピンごとの現在のパルス幅
+        frame_n (int): `flush()`で書き込んだフレーム数
+        write_n (int): ブロック書き込みの回数
+        byte_n (int): ブロック書き込みのバイト数 (レジスタ番号を含む)
+        last_frame_bytes (int): 最後のフレームのバイト数
+    """
+
+    CH_N = 16
+    OSC_HZ = 25_000_000
+    STEPS = 4096
+
+    REG_MODE1 = 0x00
+    REG_MODE2 = 0x01
+    REG_LED0 = 0x06  # LED0_ON_L, LED0_ON_H, LED0_OFF_L, LED0_OFF_H, ...
+    REG_PRESCALE = 0xFE
+
+    MODE1_AI = 0x20  # オートインクリメント
+    MODE1_SLEEP = 0x10
+    MODE2_OUTDRV = 0x04
+    FULL_OFF = 0x10  # LEDn_OFF_H
+
+    DEF_BUS = 1
+    DEF_ADDR = 0x40
+    DEF_FREQ = 50  # Hz
+
+    def __init__(
+        self,
+        bus,
+        addrs=(DEF_ADDR,),
+        freq: float = DEF_FREQ,
+        auto_flush: bool = True,
+        debug: bool = False,
+    ):
+        """Constructor.
+
+        Args:
+            bus: I2Cバス (`smbus2.SMBus`互換)
+            addrs: ボードのI2Cアドレス (この順にピン番号を割り当てる)
+            freq: PWM周波数(Hz)
+            auto_flush: `set_servo_pulsewidth()`ごとに書き込むか
+        """
+        self._debug = debug
+        self.__log = get_logger(self.__class__.__name__, self._debug)
+        self.__log.debug(
+            "addrs=%s, freq=%s, auto_flush=%s", addrs, freq, auto_flush
+        )
+
+        self.bus = bus
+        self.addrs = list(addrs)
+        self.auto_flush = auto_flush
+
+        self.prescale = min(
+            max(round(self.OSC_HZ / (self.STEPS * freq)) - 1, 3), 255
+        )
+        self.tick_usec = (self.prescale + 1) * 1_000_000 / self.OSC_HZ
+        self.__log.debug(
+            "prescale=%s, tick_usec=%s", self.prescale, self.tick_usec
+        )
+
+        self.connected = True
+        self.pulses: dict[int, int] = {}
+        self._dirty: dict[int, set[int]] = {}  # ボードの順番: チャンネル
+
+        self.frame_n = 0
+        self.write_n = 0
+        self.byte_n = 0
+        self.last_frame_bytes = 0
+
+        for _addr in self.addrs:
+            self._init_board(_addr)
+
+    @classmethod
+    def open(
+        cls,
+        bus_n: int = DEF_BUS,
+        addrs=(DEF_ADDR,),
+        freq: float = DEF_FREQ,
+        debug: bool = False,
+    ):
+        """Open `/dev/i2c-<bus_n>` with `smbus2`.
+
+        Raises:
+            RuntimeError: `smbus2`がインストールされていない
+        """
+        if SMBus is None:
+            raise RuntimeError("smbus2 is not installed")
+        return cls(SMBus(bus_n), addrs, freq, debug=debug)
+
+    def _init_board(self, addr: int):
+        """Set the PWM frequency and enable auto-increment."""
+        self.__log.debug("addr=0x%02X", addr)
+
+        self.bus.write_byte_data(
+            addr, self.REG_MODE1, self.MODE1_SLEEP | self.MODE1_AI
+        )
+        self.bus.write_byte_data(addr, self.REG_PRESCALE, self.prescale)
+        self.bus.write_byte_data(addr, self.REG_MODE2, self.MODE2_OUTDRV)
+        self.bus.write_byte_data(addr, self.REG_MODE1, self.MODE1_AI)
+        time.sleep(0.0005)  # 発振器の安定待ち
+
+    def _board(self, pin: int) -> tuple[int, int]:
+        """(board index, channel) of `pin`.
+
+        Raises:
+            ValueError: どのボードにもないピン
+        """
+        _board_i, _ch = divmod(pin, self.CH_N)
+        if pin < 0 or _board_i >= len(self.addrs):
+            raise ValueError(f"invalid pin: {pin}")
+        return _board_i, _ch
+
+    def pulse2regs(self, pulse: int) -> bytes:
+        """Pulse width (usec) to LEDn_ON_L..LEDn_OFF_H.
+
+        0は、出力なし(full off)。
+        """
+        if not pulse:
+            return bytes((0, 0, 0, self.FULL_OFF))
+
+        _off = min(round(pulse / self.tick_usec), self.STEPS - 1)
+        return bytes((0, 0, _off & 0xFF, _off >> 8))
+
+    def set_servo_pulsewidth(self, pin: int, pulse: int) -> int:
+        """Set pulse width (`pigpio.pi`互換)."""
+        _board_i, _ch = self._board(pin)
+        if self.pulses.get(pin) == int(pulse):
+            return 0
+
+        self.pulses[pin] = int(pulse)
+        self._dirty.setdefault(_board_i, set()).add(_ch)
+
+        if self.auto_flush:
+            self._write_board(_board_i)
+        return 0
+
+    def get_servo_pulsewidth(self, pin: int) -> int:
+        """Get pulse width (`pigpio.pi`互換). 未設定のピンは0(off)."""
+        self._board(pin)
+        return self.pulses.get(pin, 0)
+
+    def _write_board(self, board_i: int) -> int:
+        """Write the changed channels of a board in a block.
+
+        Returns:
+            int: 書き込んだバイト数
+        """
+        _chs = self._dirty.pop(board_i, None)
+        if not _chs:
+            return 0
+
+        _lo, _hi = min(_chs), max(_chs)
+        _buf = bytearray((self.REG_LED0 + 4 * _lo,))
+        for _ch in range(_lo, _hi + 1):
+            _buf += self.pulse2regs(
+                self.pulses.get(board_i * self.CH_N + _ch, 0)
+            )
+
+        self.bus.i2c_rdwr(i2c_write(self.addrs[board_i], _buf))
+        self.write_n += 1
+        self.byte_n += len(_buf)
+        return len(_buf)
+
+    def flush(self, _state=None) -> int:
+        """Write a frame: one block write per changed board.
+
+        `MultiServo.add_state_listener()`から呼べるように、
+        引数(`ServoState`)を受け付ける(使わない)。
+
+        Returns:
+            int: 書き込んだバイト数
+        """
+        _bytes = sum(
+            self._write_board(_board_i) for _board_i in sorted(self._dirty)
+        )
+        if _bytes:
+            self.frame_n += 1
+            self.last_frame_bytes = _bytes
+        return _bytes
+
+    @contextmanager
+    def frame(self):
+        """Defer writes in the block, and `flush()` at the end."""
+        _auto_flush, self.auto_flush = self.auto_flush, False
+        try:
+            yield self
+        finally:
+            self.auto_flush = _auto_flush
+            self.flush()
+
+    def attach(self, mservo):
+        """Write frames of `mservo` in blocks. (`auto_flush`は無効になる)"""
+        self.flush()
+        self.auto_flush = False
+        mservo.add_state_listener(self.flush)
+
+    def stop(self):
+        """Stop (`pigpio.pi`互換)."""
+        self.__log.debug(
+            "frame_n=%s, write_n=%s, byte_n=%s",
+            self.frame_n, self.write_n, self.byte_n
+        )
+        self.flush()
+        self.bus.close()
+        self.connected = False
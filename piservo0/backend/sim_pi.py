@@ -0,0 +1,177 @@
+#
+# (c) 2025 Yoichi Tanibayashi
+#
+from collections import deque
+from typing import NamedTuple
+
+from ..utils.clock import Clock
+from ..utils.my_logger import get_logger
+from .mem_pi import MemPi
+
+
+class ServoModel(NamedTuple):
+    """Physical model of a servo. (default: SG90)
+
+    * 速度の上限: `sec_per_60deg`秒で60度
+    * 不感帯: 止まっているとき、`deadband_usec`以下の変化には反応しない
+    * 遅れ: パルス幅が変わってから、`lag_sec`秒後に動き始める
+    """
+
+    sec_per_60deg: float = 0.1
+    deadband_usec: float = 10.0
+    lag_sec: float = 0.01
+
+    USEC_PER_DEG = 2000 / 180  # 500..2500 usec = 180 deg
+
+    @property
+    def max_speed(self) -> float:
+        """Max speed (usec/sec)."""
+        return 60.0 * self.USEC_PER_DEG / self.sec_per_60deg
+
+
+class SimRecord(NamedTuple):
+    """Commanded and actual position at a write."""
+
+    t: float  # clock.now()
+    pin: int
+    cmd_pulse: int  # 出力したパルス幅 (0: off)
+    act_pulse: float | None  # その時点の実際の位置 (None: 不明)
+
+
+class _Axis:
+    """Dynamic state of a servo."""
+
+    __slots__ = ("pos", "target", "t", "on", "pending")
+
+    def __init__(self, t: float):
+        self.pos: float | None = None  # 実際の位置 (usec)
+        self.target: float | None = None  # 向かっている位置
+        self.t = t  # `pos`の時刻
+        self.on = False
+        self.pending: deque = deque()  # (有効になる時刻, パルス幅)
+
+
+class SimPi(MemPi):
+    """Servo dynamics simulation backend.
+
+    `MemPi`と同じく、出力したパルス幅を記録するだけでなく、
+    `ServoModel`にしたがって、ホーンの実際の位置を計算する。
+    書き込みごとに、出力したパルス幅と、その時点の実際の位置を
+    `records`(`SimRecord`)に記録する。
+
+    `clock`は、`MultiServo`と同じものを使うこと。
+    (`SimClock`なら、待ち時間なしでシミュレーションできる)
+
+    最初のパルスでは、ホーンはすでにその位置にあるとみなす。
+    """
+
+    def __init__(
+        self,
+        clock: Clock | None = None,
+        model: ServoModel = ServoModel(),
+        models: dict[int, ServoModel] | None = None,
+        debug: bool = False,
+    ):
+        """Constructor.
+
+        Args:
+            clock: 時計 (Noneの場合は、実時間)
+            model: サーボのモデル
+            models: ピンごとのモデル (`model`より優先)
+        """
+        super().__init__(debug=debug)
+        self._debug = debug
+        self.__log = get_logger(self.__class__.__name__, self._debug)
+        self.__log.debug("model=%s, models=%s", model, models)
+
+        self.clock = Clock() if clock is None else clock
+        self.model = model
+        self.models = models or {}
+
+        self.records: list[SimRecord] = []
+        self._axes: dict[int, _Axis] = {}
+
+    def get_model(self, pin: int) -> ServoModel:
+        """Model of `pin`."""
+        return self.models.get(pin, self.model)
+
+    def set_servo_pulsewidth(self, pin: int, pulse: int) -> int:
+        """Set pulse width (`pigpio.pi`互換)."""
+        _now = self.clock.now()
+        _act = self.actual_pulse(pin, _now)
+
+        super().set_servo_pulsewidth(pin, pulse)
+        self.records.append(SimRecord(_now, pin, int(pulse), _act))
+
+        _axis = self._axes.setdefault(pin, _Axis(_now))
+        _axis.pending.append((_now + self.get_model(pin).lag_sec, pulse))
+        return 0
+
+    def _slew(self, axis: _Axis, model: ServoModel, t: float):
+        """Move `axis` toward the target until `t`."""
+        if axis.on and axis.pos is not None and axis.target is not None:
+            _max_d = model.max_speed * (t - axis.t)
+            _d = axis.target - axis.pos
+            if abs(_d) <= _max_d:
+                axis.pos = axis.target
+            else:
+                axis.pos += _max_d if _d > 0 else -_max_d
+        axis.t = max(axis.t, t)
+
+    def _advance(self, pin: int, t: float) -> _Axis | None:
+        """Advance the simulation of `pin` to `t`."""
+        _axis = self._axes.get(pin)
+        if _axis is None:
+            return None
+
+        _model = self.get_model(pin)
+        while _axis.pending and _axis.pending[0][0] <= t:
+            _t_ev, _pulse = _axis.pending.popleft()
+            self._slew(_axis, _model, _t_ev)
+
+            if _pulse == 0:  # off: その位置で止まる
+                _axis.on = False
+                continue
+
+            _axis.on = True
+            if _axis.pos is None:
+                _axis.pos = _axis.target = float(_pulse)
+            elif (
+                _axis.target is not None
+                and _axis.pos == _axis.target
+                and abs(_pulse - _axis.pos) <= _model.deadband_usec
+            ):
+                pass  # 不感帯
+            else:
+                _axis.target = float(_pulse)
+
+        self._slew(_axis, _model, t)
+        return _axis
+
+    def actual_pulse(self, pin: int, t: float | None = None) -> float | None:
+        """Actual position of the horn (usec) at `t` (default: now).
+
+        `t`は、前回の問い合わせ以降であること。
+        """
+        _axis = self._advance(pin, self.clock.now() if t is None else t)
+        if _axis is None:
+            return None
+        return _axis.pos
+
+    def settle_sec(self, pin: int) -> float:
+        """Time until the horn reaches the last commanded pulse."""
+        _now = self.clock.now()
+        _axis = self._advance(pin, _now)
+        if _axis is None or _axis.pos is None:
+            return 0.0
+
+        _model = self.get_model(pin)
+        _t_start, _target = _now, _axis.target
+        for _t_ev, _pulse in _axis.pending:
+            if _pulse:
+                _t_start, _target = _t_ev, _pulse
+        if _target is None:
+            return 0.0
+
+        _sec = _t_start - _now + abs(_target - _axis.pos) / _model.max_speed
+        return max(_sec, 0.0)
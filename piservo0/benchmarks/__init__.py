@@ -0,0 +1,11 @@
+#
+# (c) 2025 Yoichi Tanibayashi
+#
+"""Micro benchmarks. (`piservo0 bench`)
+
+ベンチマークを追加する場合は、`bench_*.py`の`BENCHMARKS`に登録し、
+ここの`BENCHMARKS`につなげる。
+"""
+from . import bench_core, bench_wire_format
+
+BENCHMARKS = bench_core.BENCHMARKS + bench_wire_format.BENCHMARKS
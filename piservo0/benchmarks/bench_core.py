@@ -0,0 +1,141 @@
+#
+# (c) 2025 Yoichi Tanibayashi
+#
+"""Benchmarks of the core motion stack (on the in-memory backend)."""
+import itertools
+import os
+
+from piservo0 import (
+    CalibrableServo,
+    MemPi,
+    MultiServo,
+    PiServo,
+    SimClock,
+    StrCmdToJson,
+    ThreadWorker,
+)
+from piservo0.utils.servo_config_manager import ServoConfigManager
+
+from .runner import Benchmark
+
+
+def make_conf(workdir: str, servo_n: int) -> str:
+    """Write a config file for `servo_n` servos, and return the path.
+
+    設定ファイルがあれば、CalibrableServoは警告も保存もしない。
+    """
+    _conf_file = os.path.join(workdir, "servo.json")
+    ServoConfigManager(_conf_file).save_all_configs([
+        {"pin": _pin, "min": 500, "center": 1500, "max": 2500}
+        for _pin in range(servo_n)
+    ])
+    return _conf_file
+
+
+def angles_cycle(servo_n: int):
+    """Iterator of alternating target angles."""
+    return itertools.cycle([[30.0] * servo_n, [-30.0] * servo_n])
+
+
+def bench_piservo_move_pulse(servo_n, workdir):
+    """PiServo.move_pulse()"""
+    _servo = PiServo(MemPi(), 0)
+    yield lambda: _servo.move_pulse(1600)
+
+
+def bench_calibrable_deg2pulse(servo_n, workdir):
+    """CalibrableServo.deg2pulse()"""
+    _servo = CalibrableServo(MemPi(), 0, conf_file=make_conf(workdir, 1))
+    yield lambda: _servo.deg2pulse(45.0)
+
+
+def bench_move_all_angles(servo_n, workdir):
+    """MultiServo.move_all_angles()"""
+    _mservo = MultiServo(
+        MemPi(), list(range(servo_n)), conf_file=make_conf(workdir, servo_n)
+    )
+    _angles = angles_cycle(servo_n)
+    yield lambda: _mservo.move_all_angles(next(_angles))
+
+
+def bench_move_all_angles_sync(servo_n, workdir):
+    """MultiServo.move_all_angles_sync() (10 steps, move_sec=0)"""
+    _mservo = MultiServo(
+        MemPi(), list(range(servo_n)), conf_file=make_conf(workdir, servo_n)
+    )
+    _angles = angles_cycle(servo_n)
+    yield lambda: _mservo.move_all_angles_sync(
+        next(_angles), move_sec=0.0, step_n=10
+    )
+
+
+def bench_move_all_angles_sync_sim(servo_n, workdir):
+    """MultiServo.move_all_angles_sync() (40 steps, 1 sec, SimClock)"""
+    _mservo = MultiServo(
+        MemPi(), list(range(servo_n)), conf_file=make_conf(workdir, servo_n),
+        clock=SimClock()
+    )
+    _angles = angles_cycle(servo_n)
+    yield lambda: _mservo.move_all_angles_sync(
+        next(_angles), move_sec=1.0, step_n=40
+    )
+
+
+def bench_str_cmd_data(servo_n, workdir):
+    """StrCmdToJson.cmd_data() (without cache)"""
+    _parser = StrCmdToJson([1] * servo_n, cache_size=0)
+    _cmd_str = "mv:" + ",".join(["30"] * servo_n)
+    yield lambda: _parser.cmd_data(_cmd_str)
+
+
+def bench_str_cmd_data_cached(servo_n, workdir):
+    """StrCmdToJson.cmd_data() (cache hit)"""
+    _parser = StrCmdToJson([1] * servo_n)
+    _cmd_str = "mv:" + ",".join(["30"] * servo_n)
+    yield lambda: _parser.cmd_data(_cmd_str)
+
+
+def bench_thread_worker_dispatch(servo_n, workdir):
+    """ThreadWorker: send() and wait for `move_all_angles`"""
+    _mservo = MultiServo(
+        MemPi(), list(range(servo_n)), conf_file=make_conf(workdir, servo_n)
+    )
+    _worker = ThreadWorker(_mservo)
+    _worker.start()
+    _cmd = {"cmd": "move_all_angles", "angles": [30.0] * servo_n}
+    try:
+        yield lambda: _worker.send(_cmd).result()
+    finally:
+        _worker.end()
+
+
+def bench_config_load(servo_n, workdir):
+    """ServoConfigManager.read_all_configs()"""
+    _manager = ServoConfigManager(make_conf(workdir, servo_n))
+    yield _manager.read_all_configs
+
+
+def bench_config_save(servo_n, workdir):
+    """ServoConfigManager.save_all_configs()"""
+    _manager = ServoConfigManager(make_conf(workdir, servo_n))
+    _data = _manager.read_all_configs()
+    yield lambda: _manager.save_all_configs(_data)
+
+
+BENCHMARKS = [
+    Benchmark("piservo.move_pulse", bench_piservo_move_pulse, False),
+    Benchmark("calibrable.deg2pulse", bench_calibrable_deg2pulse, False),
+    Benchmark("multi_servo.move_all_angles", bench_move_all_angles),
+    Benchmark(
+        "multi_servo.move_all_angles_sync", bench_move_all_angles_sync
+    ),
+    Benchmark(
+        "multi_servo.move_all_angles_sync_sim",
+        bench_move_all_angles_sync_sim
+    ),
+    Benchmark("str_cmd.cmd_data", bench_str_cmd_data),
+    Benchmark("str_cmd.cmd_data_cached", bench_str_cmd_data_cached),
+    Benchmark("thread_worker.dispatch", bench_thread_worker_dispatch),
+    Benchmark("config.load", bench_config_load),
+    Benchmark("config.save", bench_config_save),
+]
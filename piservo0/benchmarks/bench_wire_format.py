@@ -0,0 +1,77 @@
+#
+# (c) 2025 Yoichi Tanibayashi
+#
+"""Benchmarks of the command wire formats: JSON vs binary (`BinCmd`).
+
+クライアントでのエンコードと、サーバーでのデコードを、
+`CMD_N`個のコマンド(ほとんどが移動)をまとめて計測する。
+(一回の呼び出しの時間 / `CMD_N` が、コマンドあたりの時間)
+"""
+import json
+
+from piservo0 import BinCmd
+
+from .runner import Benchmark
+
+CMD_N = 100  # 一回の呼び出しで扱うコマンドの数
+
+
+def make_cmds(cmd_n: int, servo_n: int) -> list[dict]:
+    """Make a realistic command mix (mostly moves)."""
+    _cmds: list[dict] = []
+    for _i in range(cmd_n):
+        if _i % 4 == 3:
+            _cmds.append({"cmd": "sleep", "sec": 0.1})
+        else:
+            _cmds.append({
+                "cmd": "move_all_angles_sync",
+                "angles": [
+                    float((_i * 7 + _j * 13) % 181 - 90)
+                    for _j in range(servo_n)
+                ],
+                "move_sec": 0.2,
+                "step_n": 40,
+            })
+    return _cmds
+
+
+def encode_json(cmds: list[dict]) -> bytes:
+    """Encode commands to JSON."""
+    return json.dumps(cmds).encode("utf-8")
+
+
+def decode_json(buf: bytes) -> list[dict]:
+    """Decode JSON commands."""
+    return json.loads(buf.decode("utf-8"))
+
+
+def bench_json_encode(servo_n, workdir):
+    """JSON: encode `CMD_N` commands"""
+    _cmds = make_cmds(CMD_N, servo_n)
+    yield lambda: encode_json(_cmds)
+
+
+def bench_json_decode(servo_n, workdir):
+    """JSON: decode `CMD_N` commands"""
+    _buf = encode_json(make_cmds(CMD_N, servo_n))
+    yield lambda: decode_json(_buf)
+
+
+def bench_bin_encode(servo_n, workdir):
+    """BinCmd.encode_list(): `CMD_N` commands"""
+    _cmds = make_cmds(CMD_N, servo_n)
+    yield lambda: BinCmd.encode_list(_cmds)
+
+
+def bench_bin_decode(servo_n, workdir):
+    """BinCmd.decode_all(): `CMD_N` commands"""
+    _buf = BinCmd.encode_list(make_cmds(CMD_N, servo_n))
+    yield lambda: BinCmd.decode_all(_buf)
+
+
+BENCHMARKS = [
+    Benchmark("wire_format.json_encode", bench_json_encode),
+    Benchmark("wire_format.json_decode", bench_json_decode),
+    Benchmark("wire_format.bin_encode", bench_bin_encode),
+    Benchmark("wire_format.bin_decode", bench_bin_decode),
+]
@@ -0,0 +1,180 @@
+#
+# (c) 2025 Yoichi Tanibayashi
+#
+"""Benchmark runner."""
+import platform
+import tempfile
+import timeit
+from contextlib import contextmanager
+from typing import Callable, NamedTuple
+
+from piservo0 import __version__, get_logger
+
+
+class Benchmark(NamedTuple):
+    """A benchmark case.
+
+    `func(servo_n, workdir)`は、計測する関数(引数なし)を一つyieldする
+    ジェネレーター。yieldの前が準備、後が後始末。
+    """
+
+    name: str
+    func: Callable
+    scaled: bool = True  # サーボの数ごとに計測する
+
+
+class BenchResult(NamedTuple):
+    """Result of a benchmark case."""
+
+    name: str
+    servo_n: int
+    number: int  # 一回の計測での呼び出し回数
+    usec: float  # 一回の呼び出しの時間 (`repeat`回の最小値)
+
+
+class BenchRunner:
+    """Benchmark runner.
+
+    `timeit`と同じく、GCを止めて計測する。
+    一回の計測が`min_sec`以上になるように呼び出し回数を決め、
+    `repeat`回計測した最小値を、結果とする。
+
+    結果はJSON(dict)で、保存しておいたベースラインと比較できる。
+    """
+
+    DEF_SERVO_NS = (1, 4, 16)
+    DEF_REPEAT = 5
+    DEF_MIN_SEC = 0.05
+    DEF_THRESHOLD = 0.2  # 20%以上遅くなったら、regression
+
+    def __init__(
+        self,
+        benchmarks,
+        servo_ns=DEF_SERVO_NS,
+        repeat: int = DEF_REPEAT,
+        min_sec: float = DEF_MIN_SEC,
+        name_filter: str | None = None,
+        debug=False,
+    ):
+        """Constructor.
+
+        Args:
+            benchmarks (list[Benchmark]): 計測するベンチマーク
+            servo_ns: サーボの数のリスト
+            repeat: 計測の回数
+            min_sec: 一回の計測の最小時間(秒)
+            name_filter: 名前にこの文字列を含むものだけを計測する
+        """
+        self._debug = debug
+        self.__log = get_logger(self.__class__.__name__, self._debug)
+        self.__log.debug(
+            "servo_ns=%s, repeat=%s, min_sec=%s, name_filter=%s",
+            servo_ns, repeat, min_sec, name_filter
+        )
+
+        self.benchmarks = [
+            _b for _b in benchmarks
+            if not name_filter or name_filter in _b.name
+        ]
+        self.servo_ns = list(servo_ns)
+        self.repeat = repeat
+        self.min_sec = min_sec
+
+    def measure(self, func) -> tuple[int, float]:
+        """Measure `func`.
+
+        Returns:
+            tuple[int, float]: 呼び出し回数と、一回の時間(usec)
+        """
+        _timer = timeit.Timer(func)
+
+        _number = 1
+        while True:
+            _sec = _timer.timeit(_number)
+            if _sec >= self.min_sec:
+                break
+            _number *= 2 if _sec * 10 > self.min_sec else 10
+
+        _best = min([_sec] + _timer.repeat(self.repeat - 1, _number))
+        return _number, _best / _number * 1_000_000
+
+    def run_one(self, bench: Benchmark, servo_n: int) -> BenchResult:
+        """Run a benchmark case."""
+        with tempfile.TemporaryDirectory() as _workdir:
+            with contextmanager(bench.func)(servo_n, _workdir) as _func:
+                _number, _usec = self.measure(_func)
+
+        _res = BenchResult(bench.name, servo_n, _number, _usec)
+        self.__log.debug("%s", _res)
+        return _res
+
+    def run(self, on_result=None) -> dict:
+        """Run all benchmarks.
+
+        Args:
+            on_result: 一つ計測するごとに`BenchResult`を渡して呼ぶ関数
+
+        Returns:
+            dict: JSONで保存できる結果
+        """
+        _results = []
+        for _bench in self.benchmarks:
+            _servo_ns = self.servo_ns if _bench.scaled else [1]
+            for _servo_n in _servo_ns:
+                _res = self.run_one(_bench, _servo_n)
+                _results.append(_res)
+                if on_result:
+                    on_result(_res)
+
+        return {
+            "version": __version__,
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "repeat": self.repeat,
+            "min_sec": self.min_sec,
+            "results": [
+                {
+                    "name": _r.name,
+                    "servo_n": _r.servo_n,
+                    "number": _r.number,
+                    "usec": round(_r.usec, 3),
+                }
+                for _r in _results
+            ],
+        }
+
+    @staticmethod
+    def compare(
+        report: dict, baseline: dict, threshold: float = DEF_THRESHOLD
+    ) -> list[dict]:
+        """Compare with a baseline.
+
+        Returns:
+            list[dict]: ベンチマークごとの比較結果。
+                "status"は、"ok", "regression", "improved", "new"。
+                ("ratio" = usec / ベースラインのusec)
+        """
+        _base = {
+            (_r["name"], _r["servo_n"]): _r["usec"]
+            for _r in baseline.get("results", [])
+        }
+
+        _cmp = []
+        for _r in report["results"]:
+            _base_usec = _base.get((_r["name"], _r["servo_n"]))
+            if not _base_usec:
+                _cmp.append(dict(_r, status="new"))
+                continue
+
+            _ratio = _r["usec"] / _base_usec
+            if _ratio > 1 + threshold:
+                _status = "regression"
+            elif _ratio < 1 / (1 + threshold):
+                _status = "improved"
+            else:
+                _status = "ok"
+            _cmp.append(dict(
+                _r, base_usec=_base_usec, ratio=round(_ratio, 3),
+                status=_status
+            ))
+        return _cmp
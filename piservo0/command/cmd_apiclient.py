@@ -3,19 +3,30 @@
 # (c) 2025 Yoichi Tanibayashi
 #
 """cmd_apiclient.py"""
+import json
 import os
 import readline  # input()でヒストリー機能が使える
 
-from piservo0 import ApiClient, get_logger
+from piservo0 import ApiClient, ApiWsClient, get_logger
 
 
 class CmdApiClient:
-    """CmdApiClient."""
+    """CmdApiClient.
+
+    対話モードでは、`ApiClient.submit()`でコマンドを送るので、
+    プロンプトは、ネットワークの往復を待たずに、すぐに戻る。
+    レスポンスは、届いた時点で表示される。
+
+    `ws=True`の場合は、WebSocket(`/ws`)でコマンドを送り、
+    完了イベントを表示する。(`window`: 未完了のコマンドの最大数)
+    """
 
     PROMPT_STR = "> "
 
     def __init__(
-            self, cmd_name, url, cmdline: tuple, history_file, debug=False
+            self, cmd_name, url, cmdline: tuple, history_file,
+            debug=False, binary=False, batch_ms=ApiClient.DEF_BATCH_MS,
+            ws=False, window=ApiWsClient.DEF_WINDOW
     ) -> None:
         """constractor."""
         self._debug = debug
@@ -31,22 +42,97 @@ class CmdApiClient:
         self.__log.debug("cmdline=%s", self.cmdline)
         self.__log.debug("history_file=%s", self.history_file)
 
-        self.api_client = ApiClient(self.url, self._debug)
+        self.api_client = ApiClient(
+            self.url, binary=binary, batch_ms=batch_ms, debug=self._debug
+        )
+
+        self.ws = ws
+        self.window = window
+        self.ws_client: ApiWsClient | None = None
+        self.print_done = True  # `False`: 完了イベントは表示しない
+
+    def open_ws(self):
+        """Open the WebSocket session (`ws=True` only)."""
+        if self.ws and self.ws_client is None:
+            self.ws_client = self.api_client.open_ws(
+                window=self.window, on_event=self.print_event
+            )
 
     def print_response(self, _res):
         """print response in json format"""
+        if _res is None:
+            return
         print(f"* {self.url}> {_res.json()}")
 
-    def parse_cmdline(self, cmdline):
-        """parse command line string to json
+    def print_result(self, fut):
+        """print the result of `ApiClient.submit()`"""
+        try:
+            print(f"* {self.url}> {fut.result()}")
+        except Exception as _e:
+            print(f"* {self.url}> {type(_e).__name__}: {_e}")
+
+    def print_event(self, event):
+        """print an event from the WebSocket"""
+        _name = event.get("event")
+        if _name in ("queued", "telemetry"):
+            return
+        if _name == "done" and not self.print_done:
+            return
+        print(f"* {self.ws_client.url if self.ws_client else ''}> {event}")
+
+    def parse_cmdline(self, cmdline) -> list[dict] | None:
+        """parse command line string to command list
 
         *** To Be Override ***
 
+        不正な場合は、メッセージを表示してNoneを返す。
+        """
+        try:
+            _data = json.loads(cmdline)
+        except json.JSONDecodeError as _e:
+            print(f"* invalid JSON: {_e}")
+            return None
+
+        return _data if isinstance(_data, list) else [_data]
+
+    def send_line(self, line):
+        """parse and send a line (blocking)
+
+        Returns:
+            requests.Response | None: 送信しなかった場合はNone
         """
-        return cmdline
+        _cmd_list = self.parse_cmdline(line)
+        if not _cmd_list:
+            return None
+
+        if self.ws_client is not None:
+            self.ws_client.send(_cmd_list)
+            self.ws_client.wait_done()
+            return None
+
+        return self.api_client.post_cmds(_cmd_list)
+
+    def submit_line(self, line):
+        """parse and submit a line (non-blocking)
+
+        Returns:
+            Future | None: 送信しなかった場合(WebSocketの場合も)はNone
+        """
+        _cmd_list = self.parse_cmdline(line)
+        if not _cmd_list:
+            return None
+
+        if self.ws_client is not None:
+            self.ws_client.send(_cmd_list)  # 完了は`print_event()`
+            return None
+
+        _fut = self.api_client.submit(_cmd_list)
+        _fut.add_done_callback(self.print_result)
+        return _fut
 
     def main(self):
         """main loop"""
+        self.open_ws()
 
         if self.cmdline:
             #
@@ -55,8 +141,7 @@ class CmdApiClient:
             for _l in self.cmdline:
                 self.__log.debug("_l=%s", _l)
 
-                _parsed_line = self.parse_cmdline(_l)
-                _res = self.api_client.post(_parsed_line)
+                _res = self.send_line(_l)
                 self.print_response(_res)
             return
 
@@ -87,10 +172,11 @@ class CmdApiClient:
             except (KeyboardInterrupt, EOFError):
                 break
 
-            _parsed_line = self.parse_cmdline(_line)
-            _res = self.api_client.post(_parsed_line)
-            self.print_response(_res)
+            self.submit_line(_line)
 
     def end(self):
         """end"""
+        if self.ws_client is not None:
+            self.ws_client.close()
+        self.api_client.close()
         print("\n* Bye\n")
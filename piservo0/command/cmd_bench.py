@@ -0,0 +1,120 @@
+#
+# (c) 2025 Yoichi Tanibayashi
+#
+"""cmd_bench.py."""
+import json
+
+from piservo0 import get_logger
+from piservo0.benchmarks import BENCHMARKS
+from piservo0.benchmarks.runner import BenchRunner
+
+
+class CmdBench:
+    """Micro benchmarks of the hot paths.
+
+    `piservo0.benchmarks`のベンチマークを、サーボの数を変えながら実行し、
+    一回の呼び出しの時間(usec)を表示する。
+
+    * `output`: 結果をJSONで保存する (次回のベースライン)
+    * `baseline`: 保存した結果と比べて、`threshold`以上遅くなったものを
+      regressionとする (`main()`は 1 を返す)
+
+    ハードウェアは使わない(`MemPi`)。
+    """
+
+    def __init__(
+        self,
+        servo_ns=BenchRunner.DEF_SERVO_NS,
+        name_filter: str | None = None,
+        repeat: int = BenchRunner.DEF_REPEAT,
+        min_sec: float = BenchRunner.DEF_MIN_SEC,
+        output: str | None = None,
+        baseline: str | None = None,
+        threshold: float = BenchRunner.DEF_THRESHOLD,
+        debug=False,
+    ):
+        """Constructor.
+
+        Args:
+            servo_ns: サーボの数のリスト
+            name_filter: 名前にこの文字列を含むベンチマークだけを実行する
+            repeat: 計測の繰り返し回数 (最小値を採る)
+            min_sec: 一回の計測の最小時間(秒)
+            output: 結果を保存するファイル
+            baseline: 比較するベースラインのファイル
+            threshold: regressionとする遅くなった割合
+        """
+        self._debug = debug
+        self.__log = get_logger(self.__class__.__name__, self._debug)
+        self.__log.debug(
+            "servo_ns=%s, name_filter=%s, repeat=%s, min_sec=%s, "
+            "output=%s, baseline=%s, threshold=%s",
+            servo_ns, name_filter, repeat, min_sec,
+            output, baseline, threshold
+        )
+
+        self.output = output
+        self.baseline = baseline
+        self.threshold = threshold
+
+        self.runner = BenchRunner(
+            BENCHMARKS, servo_ns=servo_ns, repeat=repeat, min_sec=min_sec,
+            name_filter=name_filter, debug=self._debug
+        )
+
+    @staticmethod
+    def format_result(res: dict) -> str:
+        """One line of the table."""
+        _line = (
+            f"{res['name']:36} {res['servo_n']:3} "
+            f"{res['usec']:12.3f} {res['number']:8}"
+        )
+        if "status" in res:
+            _ratio = res.get("ratio")
+            _line += (
+                f" {'-' if _ratio is None else f'{_ratio:.3f}':>7}"
+                f"  {res['status']}"
+            )
+        return _line
+
+    @classmethod
+    def report(cls, result: dict, cmp: list[dict] | None = None) -> str:
+        """Human readable report."""
+        _lines = [
+            f"piservo0 {result['version']}, python {result['python']}, "
+            f"{result['machine']}",
+            f"{'name':36} {'n':>3} {'usec':>12} {'number':>8}"
+            + (f" {'ratio':>7}  status" if cmp is not None else ""),
+        ]
+        for _r in cmp if cmp is not None else result["results"]:
+            _lines.append(cls.format_result(_r))
+        return "\n".join(_lines)
+
+    def main(self, as_json: bool = False) -> int:
+        """main
+
+        Returns:
+            int: exit code (regressionがあれば 1)
+        """
+        _result = self.runner.run()
+
+        if self.output:
+            with open(self.output, "w", encoding="utf-8") as _f:
+                json.dump(_result, _f, indent=2)
+
+        _cmp = None
+        if self.baseline:
+            with open(self.baseline, encoding="utf-8") as _f:
+                _cmp = self.runner.compare(
+                    _result, json.load(_f), self.threshold
+                )
+            _result["compare"] = _cmp
+
+        if as_json:
+            print(json.dumps(_result, indent=2))
+        else:
+            print(self.report(_result, _cmp))
+
+        if _cmp and any(_c["status"] == "regression" for _c in _cmp):
+            return 1
+        return 0
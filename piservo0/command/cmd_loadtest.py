@@ -0,0 +1,298 @@
+#
+# (c) 2025 Yoichi Tanibayashi
+#
+"""cmd_loadtest.py."""
+import json
+import random
+import threading
+import time
+
+import requests
+
+from piservo0 import StrCmdToJson, get_logger
+from piservo0.utils.metrics import Histogram
+from piservo0.web.local_server import LocalServer
+
+
+class CmdLoadTest:
+    """API load generator.
+
+    `client_n`個のクライアント(スレッド)が、それぞれのコネクションで、
+    `MIX`の割合でコマンド(文字列コマンド)を、`duration`秒間POSTし続ける。
+
+    * `mv`: 移動 (1コマンド)
+    * `sl`: スリープ (1コマンド)
+    * `batch`: 移動とスリープの組み合わせ (5コマンド)
+    * `cancel`: キャンセル
+
+    `url`を指定しない場合は、メモリ上のバックエンドで動く
+    APIサーバー(`LocalServer`)を、このプロセスの中で起動する。
+
+    **計測**
+
+    * latency: POSTの応答時間 (`wait=True`の場合は、実行完了まで)
+    * throughput: 送ったリクエスト数・コマンド数と、
+      サーバーが実行したコマンド数(`/status`の`cmd_n`)の、毎秒の値
+    * qsize: `sample_sec`ごとの、サーバーのキューの長さ
+    """
+
+    # (種類, 重み)
+    MIX = (("mv", 50), ("sl", 15), ("batch", 30), ("cancel", 5))
+
+    DEF_CLIENT_N = 4
+    DEF_DURATION = 5.0  # sec
+    DEF_SAMPLE_SEC = 0.2
+    DEF_MOVE_SEC = 0.02
+    DEF_SLEEP_SEC = 0.002
+
+    PERCENTILES = (50.0, 95.0, 99.0)
+
+    def __init__(
+        self,
+        pins=(17, 27),
+        url: str | None = None,
+        client_n: int = DEF_CLIENT_N,
+        duration: float = DEF_DURATION,
+        wait: bool = False,
+        engine: str = "thread",
+        sample_sec: float = DEF_SAMPLE_SEC,
+        move_sec: float = DEF_MOVE_SEC,
+        seed: int | None = None,
+        debug=False,
+    ):
+        """Constructor.
+
+        Args:
+            pins: サーバーを起動する場合のGPIOピン
+                (クライアントは、その数の角度を送る)
+            url: APIサーバーのURL。Noneの場合は、サーバーを起動する
+            client_n: クライアントの数
+            duration: 送り続ける時間(秒)
+            wait: 実行完了を待つ (`?wait=true`)
+            engine: サーバーを起動する場合のエンジン
+            sample_sec: キューの長さを取得する間隔(秒)
+            move_sec: 移動コマンドの`move_sec`
+            seed: 乱数のシード
+        """
+        self._debug = debug
+        self.__log = get_logger(self.__class__.__name__, self._debug)
+        self.__log.debug(
+            "pins=%s, url=%s, client_n=%s, duration=%s, wait=%s, "
+            "engine=%s, sample_sec=%s, move_sec=%s, seed=%s",
+            pins, url, client_n, duration, wait,
+            engine, sample_sec, move_sec, seed
+        )
+
+        if client_n < 1:
+            raise ValueError(f"invalid client_n: {client_n}")
+
+        self.pins = list(pins)
+        self.url = url
+        self.client_n = client_n
+        self.duration = duration
+        self.wait = wait
+        self.engine = engine
+        self.sample_sec = sample_sec
+        self.move_sec = move_sec
+        self.seed = seed
+
+        self.server: LocalServer | None = None
+        self.parser = StrCmdToJson([1] * len(self.pins))
+
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+
+        self.latency = Histogram("latency")
+        self.req_n = 0
+        self.cmd_n = 0
+        self.err_n = 0
+        self.kind_n = {_k: 0 for _k, _ in self.MIX}
+        self.samples: list[dict] = []
+
+    @property
+    def status_url(self) -> str:
+        """`/status` URL."""
+        assert self.url is not None
+        return self.url.rsplit("/", 1)[0] + "/status"
+
+    def make_cmdline(self, kind: str, rng: random.Random) -> str:
+        """Make a string command line of `kind`."""
+        _n = len(self.pins)
+
+        def _angles():
+            return ",".join(str(rng.randint(-90, 90)) for _ in range(_n))
+
+        if kind == "mv":
+            return f"mv:{_angles()}"
+        if kind == "sl":
+            return f"sl:{self.DEF_SLEEP_SEC}"
+        if kind == "batch":
+            return (
+                f"ms:{self.move_sec} mv:{_angles()} sl:{self.DEF_SLEEP_SEC} "
+                f"mv:{_angles()} mv:{_angles()}"
+            )
+        return "ca"
+
+    def _client(self, client_i: int):
+        """Client thread."""
+        _rng = random.Random(
+            None if self.seed is None else self.seed + client_i
+        )
+        _kinds = [_k for _k, _ in self.MIX]
+        _weights = [_w for _, _w in self.MIX]
+        _params = {"wait": "true"} if self.wait else {}
+
+        with requests.Session() as _session:
+            while not self._stop.is_set():
+                _kind = _rng.choices(_kinds, _weights)[0]
+                _cmds = self.parser.cmd_data_list(
+                    self.make_cmdline(_kind, _rng)
+                )
+
+                _t0 = time.perf_counter()
+                try:
+                    _res = _session.post(
+                        self.url, json=_cmds, params=_params  # type: ignore
+                    )
+                    _ok = _res.status_code == 200
+                except requests.RequestException as _e:
+                    self.__log.debug("%s: %s", type(_e).__name__, _e)
+                    _ok = False
+                _sec = time.perf_counter() - _t0
+
+                with self._lock:
+                    self.req_n += 1
+                    self.kind_n[_kind] += 1
+                    if _ok:
+                        self.cmd_n += len(_cmds)
+                        self.latency.record_sec(_sec)
+                    else:
+                        self.err_n += 1
+
+    def _get_status(self, session) -> dict | None:
+        """Get `/status`."""
+        try:
+            return session.get(self.status_url).json()
+        except (requests.RequestException, ValueError) as _e:
+            self.__log.debug("%s: %s", type(_e).__name__, _e)
+            return None
+
+    def _sampler(self, t0: float):
+        """Sample the queue length of the server."""
+        with requests.Session() as _session:
+            while not self._stop.wait(self.sample_sec):
+                _status = self._get_status(_session)
+                if _status is None:
+                    continue
+                with self._lock:
+                    self.samples.append({
+                        "t": round(time.monotonic() - t0, 3),
+                        "qsize": _status.get("qsize"),
+                        "req_n": self.req_n,
+                        "exec_n": _status.get("cmd_n"),
+                    })
+
+    def run(self) -> dict:
+        """Run the load test.
+
+        Returns:
+            dict: 結果 (see `report()`)
+        """
+        if self.url is None:
+            self.server = LocalServer(
+                self.pins, engine=self.engine, debug=self._debug
+            )
+            self.server.start()
+            self.url = self.server.url
+
+        with requests.Session() as _session:
+            # 移動時間を短くしておく
+            _session.post(self.url, json=self.parser.cmd_data_list(
+                f"ms:{self.move_sec}"
+            ))
+            _status0 = self._get_status(_session) or {}
+
+            _t0 = time.monotonic()
+            _threads = [
+                threading.Thread(target=self._client, args=(_i,))
+                for _i in range(self.client_n)
+            ]
+            _threads.append(
+                threading.Thread(target=self._sampler, args=(_t0,))
+            )
+            for _thr in _threads:
+                _thr.start()
+
+            self._stop.wait(self.duration)
+            self._stop.set()
+            for _thr in _threads:
+                _thr.join()
+            _sec = time.monotonic() - _t0
+
+            _status1 = self._get_status(_session) or {}
+
+        _exec_n = (_status1.get("cmd_n") or 0) - (_status0.get("cmd_n") or 0)
+
+        return {
+            "url": self.url,
+            "client_n": self.client_n,
+            "wait": self.wait,
+            "sec": round(_sec, 3),
+            "req_n": self.req_n,
+            "cmd_n": self.cmd_n,
+            "err_n": self.err_n,
+            "exec_n": _exec_n,
+            "req_per_sec": round(self.req_n / _sec, 1),
+            "cmd_per_sec": round(self.cmd_n / _sec, 1),
+            "exec_per_sec": round(_exec_n / _sec, 1),
+            "kind_n": dict(self.kind_n),
+            "latency": self.latency.to_dict(self.PERCENTILES),
+            "qsize_max": max(
+                [_s["qsize"] or 0 for _s in self.samples], default=0
+            ),
+            "samples": list(self.samples),
+        }
+
+    @staticmethod
+    def report(result: dict) -> str:
+        """Human readable report."""
+        _lat = result["latency"]
+        _lines = [
+            f"url: {result['url']}",
+            f"clients: {result['client_n']}, wait: {result['wait']}, "
+            f"sec: {result['sec']}",
+            f"requests: {result['req_n']} ({result['req_per_sec']}/s), "
+            f"errors: {result['err_n']}",
+            f"commands: sent {result['cmd_n']} "
+            f"({result['cmd_per_sec']}/s), "
+            f"executed {result['exec_n']} ({result['exec_per_sec']}/s)",
+            f"mix: {result['kind_n']}",
+            f"latency(usec): p50={_lat['p50']}, p95={_lat['p95']}, "
+            f"p99={_lat['p99']}, max={_lat['max']}",
+            f"qsize: max={result['qsize_max']}",
+            "",
+            "     t  qsize  req_n  exec_n",
+        ]
+        for _s in result["samples"]:
+            # `exec_n`は、サーバーがまだ知らなければNone
+            _exec_n = "-" if _s["exec_n"] is None else _s["exec_n"]
+            _lines.append(
+                f"{_s['t']:6.2f} {_s['qsize']:6} {_s['req_n']:6} "
+                f"{_exec_n:>7}"
+            )
+        return "\n".join(_lines)
+
+    def main(self, as_json: bool = False):
+        """main"""
+        _result = self.run()
+        if as_json:
+            print(json.dumps(_result, indent=2))
+        else:
+            print(self.report(_result))
+
+    def end(self):
+        """end"""
+        self._stop.set()
+        if self.server is not None:
+            self.server.end()
+            self.server = None
@@ -2,7 +2,16 @@
 # (c) 2025 Yoichi Tanibayashi
 #
 """cmd_strclient.py."""
-from piservo0 import StrCmdToJson, get_logger
+import itertools
+import sys
+
+from piservo0 import (
+    ApiClient,
+    ApiWsClient,
+    CompileError,
+    StrCmdToJson,
+    get_logger,
+)
 
 from .cmd_apiclient import CmdApiClient
 
@@ -11,25 +20,110 @@ class CmdStrClient(CmdApiClient):
     """CmdStrClient."""
 
     def __init__(
-        self, cmd_name, url, cmdline, history_file, angle_factor, debug=False
+        self, cmd_name, url, cmdline, history_file, angle_factor,
+        script_file=None, chunk_n=ApiClient.DEF_CHUNK_N, binary=False,
+        batch_ms=ApiClient.DEF_BATCH_MS, ws=False,
+        window=ApiWsClient.DEF_WINDOW, count=1, debug=False
     ):
-        super().__init__(cmd_name, url, cmdline, history_file, debug)
+        super().__init__(
+            cmd_name, url, cmdline, history_file, debug,
+            binary=binary, batch_ms=batch_ms, ws=ws, window=window
+        )
 
         self._debug = debug
         self.__log = get_logger(self.__class__.__name__, self._debug)
         self.__log.debug(
-            "cmd_name=%s, angle_factor=%s", cmd_name, angle_factor
+            "cmd_name=%s, angle_factor=%s, script_file=%s, chunk_n=%s, "
+            "count=%s",
+            cmd_name, angle_factor, script_file, chunk_n, count
         )
 
         self._angle_factor = angle_factor
+        self.script_file = script_file
+        self.chunk_n = chunk_n
+        self.count = count
 
         self.parser = StrCmdToJson(self._angle_factor, debug=self._debug)
 
-    def parse_cmdline(self, cmdline):
-        """parse string command to json."""
+    def parse_cmdline(self, cmdline) -> list[dict] | None:
+        """parse string commands to command list."""
         self.__log.debug("cmdline=%s", cmdline)
 
-        parsed_str = self.parser.jsonstr(cmdline)
-        self.__log.debug("parsed_str=%s", parsed_str)
+        _cmd_list = self.parser.cmd_data_list(cmdline)
+        self.__log.debug("cmd_list=%s", _cmd_list)
+
+        if _cmd_list and _cmd_list[-1].get("err"):
+            print(f"* invalid command: {_cmd_list[-1]['err']!r}")
+            return None
+
+        return _cmd_list
+
+    def main(self):
+        """main"""
+        if self.script_file:
+            self.open_ws()
+            self.stream_file(self.script_file)
+            return
+
+        super().main()
+
+    def stream_file(self, script_file):
+        """Stream a script file to the server in chunks.
+
+        スクリプトを一行ずつパースしながら、`chunk_n`個ずつ送信する。
+        ロボットが動いている間に、続きを読んで送るので、
+        大きなスクリプトでも、全体を読み込むのを待たない。
+        (`-`の場合は、標準入力から読む)
+
+        WebSocketの場合は、コマンドを一つずつ送り、
+        未完了のコマンドが`window`個以内になるように待つ。
+        (エラーとキャンセルだけを表示する)
+
+        `count`が1以外の場合は、スクリプト全体を一度だけコンパイルし
+        (`StrCmdToJson.compile_file()`)、`count`回(0: 無限に)繰り返す。
+        不正なコマンドがあれば、何も送らない。
+        """
+        self.__log.debug("script_file=%s, count=%s", script_file, self.count)
+
+        if self.count != 1:
+            try:
+                _program = self.compile_script(script_file)
+            except CompileError as _e:
+                print(f"* invalid command: {_e}")
+                return
+
+            _repeat = itertools.count() if self.count <= 0 else range(
+                self.count
+            )
+            self._stream(
+                _cmd for _ in _repeat for _cmd in _program.cmd_data_list()
+            )
+            return
+
+        if script_file == "-":
+            self._stream(self.parser.iter_cmd_data(sys.stdin))
+        else:
+            with open(script_file, encoding="utf-8") as _f:
+                self._stream(self.parser.iter_cmd_data(_f))
+
+    def compile_script(self, script_file):
+        """Compile a script file. (`-`: stdin)
+
+        Raises:
+            CompileError: 不正なコマンドがあった。
+        """
+        if script_file == "-":
+            return self.parser.compile(sys.stdin, source="<stdin>")
+        return self.parser.compile_file(script_file)
+
+    def _stream(self, cmd_iter):
+        """Stream commands."""
+        if self.ws_client is not None:
+            self.print_done = False
+            _n = self.ws_client.send_stream(cmd_iter)
+            self.ws_client.wait_done()
+            print(f"* {self.ws_client.url}> {_n} commands")
+            return
 
-        return parsed_str
+        for _res in self.api_client.post_stream(cmd_iter, self.chunk_n):
+            self.print_response(_res)
@@ -16,6 +16,9 @@ class CalibrableServo(PiServo):
         pulse_center (int): キャリブレーション後の中央位置のパルス幅。
         pulse_min (int): キャリブレーション後の最小位置のパルス幅。
         pulse_max (int): キャリブレーション後の最大位置のパルス幅。
+        max_speed (float | None): 最大角速度(deg/sec)。Noneは未設定。
+        max_accel (float | None): 最大角加速度(deg/sec^2)。Noneは未設定。
+        stall_current (float | None): ストール電流(A)。Noneは未設定。
     """
 
     DEF_CONF_FILE = "servo.json"  # デフォルトの設定ファイル名
@@ -55,6 +58,13 @@ class CalibrableServo(PiServo):
         self._pulse_center = super().CENTER
         self._pulse_max = super().MAX
 
+        # 速度の上限 (`MultiServo.plan_move()`で使う)
+        self.max_speed: float | None = None
+        self.max_accel: float | None = None
+
+        # ストール電流 (`CurrentBudget`で使う)
+        self.stall_current: float | None = None
+
         # 設定を読み込んで適用
         self.load_conf()
 
@@ -251,11 +261,20 @@ class CalibrableServo(PiServo):
             self._pulse_min = config.get("min", self.pulse_min)
             self._pulse_center = config.get("center", self.pulse_center)
             self._pulse_max = config.get("max", self.pulse_max)
+            self.max_speed = config.get("max_speed", self.max_speed)
+            self.max_accel = config.get("max_accel", self.max_accel)
+            self.stall_current = config.get(
+                "stall_current", self.stall_current
+            )
 
         self.__log.debug(
             "Loaded: pin=%s, min=%s, center=%s, max=%s",
             self.pin, self.pulse_min, self.pulse_center, self.pulse_max
         )
+        self.__log.debug(
+            "max_speed=%s, max_accel=%s, stall_current=%s",
+            self.max_speed, self.max_accel, self.stall_current
+        )
 
     def save_conf(self):
         """現在のキャリブレーション値を設定ファイルに保存する。"""
@@ -265,6 +284,13 @@ class CalibrableServo(PiServo):
             "center": self.pulse_center,
             "max": self.pulse_max,
         }
+        # 速度の上限とストール電流は、設定されている場合だけ保存する
+        if self.max_speed is not None:
+            new_config["max_speed"] = self.max_speed
+        if self.max_accel is not None:
+            new_config["max_accel"] = self.max_accel
+        if self.stall_current is not None:
+            new_config["stall_current"] = self.stall_current
         self._config_manager.save_config(new_config)
         self.__log.debug("Saved: %s", new_config)
 
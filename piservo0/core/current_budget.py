@@ -0,0 +1,167 @@
+#
+# (c) 2025 Yoichi Tanibayashi
+#
+"""current_budget.py"""
+import math
+from typing import NamedTuple
+
+from ..utils.my_logger import get_logger
+
+
+class CurrentModel(NamedTuple):
+    """Supply current model of a servo. (default: SG90, 5 V)
+
+    動き始めの`surge_sec`秒間は、ストール電流(`surge_a`)が流れ、
+    その後、止まるまでは`move_a`、止まっている間は`idle_a`。
+    """
+
+    surge_a: float = 0.65  # 動き始め (ストール電流)
+    move_a: float = 0.2  # 動いている間
+    idle_a: float = 0.01  # 止まっている間
+    surge_sec: float = 0.03
+
+    def current(self, t: float, duration: float) -> float:
+        """Current (A) at `t` sec after the start of a `duration` move."""
+        if t < 0 or t >= duration:
+            return self.idle_a
+        if t < self.surge_sec:
+            return self.surge_a
+        return self.move_a
+
+
+class CurrentBudget:
+    """Staggering scheduler under a supply current budget.
+
+    同じ電源につながった多数のサーボを同時に動かし始めると、
+    ストール電流の合計で電圧が下がる(ブラウンアウト)。
+
+    `schedule()`は、各サーボの動き始めをずらして(フレーム単位)、
+    推定した電流の合計が`budget_a`を超えないようにする。
+
+    * 長く動くサーボから順に、電流の合計が予算内に収まる、
+      最も早い開始時刻を割り当てる(貪欲法)。
+    * 開始時刻は、`frame_sec`の倍数 (`move_all_angles_sync()`では、ステップ)
+
+    一台だけでも予算を超える場合は、他のすべてが止まってから動かす。
+    """
+
+    DEF_FRAME_SEC = 0.005  # sec
+
+    def __init__(
+        self,
+        budget_a: float,
+        model: CurrentModel = CurrentModel(),
+        frame_sec: float = DEF_FRAME_SEC,
+        debug=False,
+    ):
+        """Constructor.
+
+        Args:
+            budget_a: 電流の予算(A)
+            model: サーボの電流のモデル
+                (`CalibrableServo.stall_current`があれば、`surge_a`を置き換える)
+            frame_sec: 開始時刻の単位(秒)
+        """
+        self._debug = debug
+        self.__log = get_logger(self.__class__.__name__, self._debug)
+        self.__log.debug(
+            "budget_a=%s, model=%s, frame_sec=%s", budget_a, model, frame_sec
+        )
+
+        if budget_a <= 0:
+            raise ValueError(f"invalid budget_a: {budget_a}")
+
+        self.budget_a = budget_a
+        self.model = model
+        self.frame_sec = frame_sec
+
+    @staticmethod
+    def total(models, durations, offsets, t: float) -> float:
+        """Estimated total current (A) at `t`."""
+        return sum(
+            _m.current(t - _o, _d)
+            for _m, _d, _o in zip(models, durations, offsets)
+        )
+
+    @staticmethod
+    def breakpoints(models, durations, offsets) -> list[float]:
+        """Times where the total current may change."""
+        _ts = {0.0}
+        for _m, _d, _o in zip(models, durations, offsets):
+            if _d > 0:
+                _ts.update((_o, _o + min(_m.surge_sec, _d), _o + _d))
+        return sorted(_ts)
+
+    @classmethod
+    def peak(cls, models, durations, offsets) -> float:
+        """Estimated peak current (A)."""
+        return max(
+            cls.total(models, durations, offsets, _t)
+            for _t in cls.breakpoints(models, durations, offsets)
+        )
+
+    @staticmethod
+    def _quantize(t: float, frame_sec: float) -> float:
+        """Round `t` up to a frame."""
+        if frame_sec <= 0:
+            return t
+        return math.ceil(t / frame_sec - 1e-9) * frame_sec
+
+    def schedule(
+        self, durations, models=None, frame_sec: float | None = None
+    ) -> list[float]:
+        """Start offsets (sec) of the moves.
+
+        Args:
+            durations (list[float]): 各サーボが動く時間(秒)。0は動かない
+            models (list[CurrentModel] | None): 各サーボのモデル
+                (Noneの場合は、すべて`model`)
+            frame_sec: 開始時刻の単位 (Noneの場合は、`frame_sec`)
+
+        Returns:
+            list[float]: 各サーボの動き始めの、最初からの遅れ(秒)
+        """
+        _n = len(durations)
+        if frame_sec is None:
+            frame_sec = self.frame_sec
+        if models is None:
+            models = [self.model] * _n
+
+        _offsets = [0.0] * _n
+        if self.peak(models, durations, _offsets) <= self.budget_a:
+            return _offsets
+
+        _order = sorted(
+            [_i for _i in range(_n) if durations[_i] > 0],
+            key=lambda _i: -durations[_i]
+        )
+        # まだ開始時刻を決めていないサーボは、止まっているとみなす
+        _durs = [0.0] * _n
+        _over = []
+        for _i in _order:
+            _cands = sorted({
+                self._quantize(_t, frame_sec)
+                for _t in self.breakpoints(models, _durs, _offsets)
+            })
+            for _t in _cands:
+                _durs[_i], _offsets[_i] = durations[_i], _t
+                _ts = [
+                    _b for _b in self.breakpoints(models, _durs, _offsets)
+                    if _t <= _b < _t + durations[_i]
+                ]
+                if all(
+                    self.total(models, _durs, _offsets, _b) <= self.budget_a
+                    for _b in _ts
+                ):
+                    break
+            else:
+                _over.append(_i)
+                _durs[_i], _offsets[_i] = durations[_i], _cands[-1]
+
+        if _over:
+            # 一台だけで予算を超える場合も、計画ごとに一回だけ警告する
+            self.__log.warning(
+                "servo%s: over budget (%s A)", sorted(_over), self.budget_a
+            )
+        self.__log.debug("offsets=%s", _offsets)
+        return _offsets
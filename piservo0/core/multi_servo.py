@@ -2,19 +2,74 @@
 # (c) 2025 Yoichi Tanibayashi
 #
 """multi_servo.py"""
+import math
 import time
+from typing import NamedTuple
 
+from ..utils.clock import Clock
+from ..utils.metrics import Histogram
 from ..utils.my_logger import get_logger
 from .calibrable_servo import CalibrableServo
+from .current_budget import CurrentBudget
+
+
+class ServoState(NamedTuple):
+    """Snapshot of servo state published by `MultiServo`.
+
+    pigpioから読み出した値ではなく、最後に出力した値。
+    """
+
+    seq: int  # 更新ごとに増える
+    t: float  # `MultiServo.clock.now()`
+    pulses: tuple[int | None, ...]  # None: まだ出力していない
+    angles: tuple[float | None, ...]  # None: 未出力 または オフ
+
+
+class MovePlan(NamedTuple):
+    """Synchronized move planned by `MultiServo.plan_move()`."""
+
+    move_sec: float  # すべてのサーボが同時に着く、最短の時間
+    accel_frac: float  # 加速(減速)の時間の割合 (0: 等速, 0.5: 三角形)
 
 
 class MultiServo:
     """
     複数のサーボモーターを制御する。
+
+    動かすたびに、状態のスナップショット(`ServoState`)を`state`に公開する。
+    (参照の置き換えだけなので、他のスレッドからロックなしで読める)
+    `add_state_listener()`した関数は、公開のたびに呼ばれる。
+
+    時刻の取得と待ちは、`clock`(`Clock`)で行う。
+    `SimClock`を指定すると、待ち時間なしで動かせる。
+
+    `current_budget`(`CurrentBudget`)を設定すると、電流の合計が
+    予算を超えないように、各サーボの動き始めをずらす。
+    (`move_all_angles()`, `move_all_angles_sync()`)
+
+    **計画と書き込み**
+
+    `move_all_angles()`と`move_all_angles_sync()`は、待ち以外の部分を、
+    次の公開メソッドで行う。待ち方の違う呼び出し側(`AsyncMultiServo`)は、
+    これらを組み合わせて、同じ動きを実現する。
+
+    * `validate_angle_list()`: 角度のリストの検証
+    * `stagger_offsets()`, `write_stagger_group()`:
+      `move_all_angles()`の動き始めのずらし(秒)と、その書き込み
+    * `plan_step_offsets()`, `step_angles()`:
+      `move_all_angles_sync()`の動き始めのずらし(ステップ)と、各ステップの角度
+    * `write_all_angles()`: 検証・ずらしなしの書き込み
     """
 
     DEF_MOVE_SEC = 0.2  # sec
     DEF_STEP_N = 40
+    DEF_TICK_SEC = 0.005  # sec: follow_target_pose()の周期
+
+    # 設定ファイルに速度の上限がないサーボの値 (SG90: 0.1 sec/60 deg)
+    DEF_MAX_SPEED = 600.0  # deg/sec
+    DEF_MAX_ACCEL = 6000.0  # deg/sec^2
+
+    MOVE_SEC_AUTO = "auto"  # `move_sec`: `plan_move()`で決める
 
     def __init__(
         self,
@@ -22,6 +77,7 @@ class MultiServo:
         pins: list[int],
         first_move=True,
         conf_file=CalibrableServo.DEF_CONF_FILE,
+        clock: Clock | None = None,
         debug=False,
     ):
         """
@@ -37,6 +93,8 @@ class MultiServo:
             Trueの場合、初期化時にサーボを0度の位置に移動させる。
         conf_file: str
             キャリブレーション設定ファイルのパス。
+        clock: Clock | None
+            時刻の取得と待ちに使う時計。Noneの場合は、実時間(`Clock`)。
         debug: bool
             デバッグモードを有効にするかどうかのフラグ。
         """
@@ -53,6 +111,8 @@ class MultiServo:
 
         self.servo_n = len(pins)
 
+        self.clock = Clock() if clock is None else clock
+
         self.servo = [
             CalibrableServo(self._pi, _pin, conf_file=conf_file, debug=False)
             for _pin in self.pins
@@ -61,6 +121,23 @@ class MultiServo:
         self.conf_file = self.servo[0].conf_file
         self.__log.debug("conf_file=%s", self.conf_file)
 
+        # `move_all_angles_sync()`の各ステップの開始時刻の、
+        # 予定時刻からのずれ(usec)
+        self.hist_step_jitter = Histogram("step_jitter")
+
+        # 外部プロセスからの目標角度 (ShmTargetPose)
+        self.target_pose = None
+
+        # 電流の予算 (Noneの場合は、ずらさない)
+        self.current_budget: CurrentBudget | None = None
+
+        # 最後に出力した状態 (`_publish_state()`で置き換える)
+        self.state = ServoState(
+            0, self.clock.now(),
+            (None,) * self.servo_n, (None,) * self.servo_n
+        )
+        self._state_listeners: list = []
+
         if self.first_move:
             self.move_all_angles([0] * self.servo_n)
 
@@ -209,7 +286,7 @@ class MultiServo:
 
         return True
 
-    def _validate_angle_list(self, angles):
+    def validate_angle_list(self, angles):
         """
         角度のリストを検証する。
         有効な場合はTrue、そうでない場合はFalseを返す。
@@ -245,6 +322,28 @@ class MultiServo:
         self.__log.debug("")
         for s in self.servo:
             s.off()
+        self._publish_state()
+
+    def _publish_state(self):
+        """Publish a new snapshot of the state. (no pigpio I/O)"""
+        _pulses = tuple(_s.last_pulse for _s in self.servo)
+        _angles = tuple(
+            _s.pulse2deg(_p) if _p else None
+            for _s, _p in zip(self.servo, _pulses)
+        )
+        self.state = ServoState(
+            self.state.seq + 1, self.clock.now(), _pulses, _angles
+        )
+        for _func in self._state_listeners:
+            _func(self.state)
+
+    def add_state_listener(self, func):
+        """Add a function called with `ServoState` on every publish.
+
+        モーションループ(ステップごと)から呼ばれるので、すぐに返ること。
+        """
+        self.__log.debug("func=%s", func)
+        self._state_listeners.append(func)
 
     def get_pulse(self, idx: int) -> int:
         """Get pulse of servo[idx].
@@ -269,6 +368,7 @@ class MultiServo:
         """Move one servo[idx].
         """
         self.servo[idx].move_pulse(pulse, forced)
+        self._publish_state()
 
     def move_all_pulses(self, pulses, forced=False):
         """Move all servos to `pulse`.
@@ -282,7 +382,8 @@ class MultiServo:
             `True`の場合、可動範囲外のパルス幅も強制的に設定する。
         """
         for i in range(len(self.servo)):
-            self.move_pulse(i, pulses[i], forced)
+            self.servo[i].move_pulse(pulses[i], forced)
+        self._publish_state()
 
     def move_pulse_relative(self, idx: int, pulse_diff: int, forced=False):
         """Relative move one servo[idx].
@@ -326,7 +427,7 @@ class MultiServo:
         self.__log.debug("angles=%s", angles)
         return angles
 
-    def move_all_angles(self, target_angles):
+    def move_all_angles(self, target_angles, stop_event=None):
         """
         各サーボを指定された角度に動かす。
 
@@ -334,15 +435,170 @@ class MultiServo:
         ----------
         target_angles: list[float]
             各サーボに設定する角度のリスト。
+        stop_event: threading.Event | None
+            `current_budget`で動き始めをずらしている間に、
+            セットされたら、残りのサーボを動かさずに戻る。
         """
         self.__log.debug("target_angles=%s", target_angles)
 
-        if not self._validate_angle_list(target_angles):
+        if not self.validate_angle_list(target_angles):
+            return
+
+        if self.current_budget is not None:
+            self._move_all_angles_staggered(target_angles, stop_event)
             return
 
+        self.write_all_angles(target_angles)
+
+    def write_all_angles(self, target_angles):
+        """Move all servos at once. (no validation, no staggering)
+
+        `validate_angle_list()`で検証済みの角度を、すぐに書き込み、
+        状態を公開する。
+        """
         for _i, _s in enumerate(self.servo):
             # self.__log.debug("pin=%s, angle=%s", _s.pin, target_angles[_i])
             _s.move_angle(target_angles[_i])
+        self._publish_state()
+
+    def _move_all_angles_staggered(self, target_angles, stop_event=None):
+        """Move all servos, staggering the starts. (see `plan_stagger()`)
+
+        ずらした分だけ、呼び出しはブロックする。
+        `stop_event`がセットされたら、まだ動かしていないサーボは動かさない。
+        """
+        _offsets = self.stagger_offsets(target_angles)
+
+        _t0 = self.clock.now()
+        for _offset in sorted(set(_offsets)):
+            if self.clock.sleep_until(_t0 + _offset, stop_event):
+                self.__log.debug("canceled: offset=%s", _offset)
+                break
+            self.write_stagger_group(target_angles, _offsets, _offset)
+
+    def stagger_offsets(self, target_angles) -> list[float]:
+        """Start offsets of `move_all_angles()` with `current_budget`.
+
+        各サーボが全速で動く時間を、`max_speed`から見積もり、
+        `plan_stagger()`で、動き始めの遅れを計算する。
+
+        Returns
+        -------
+        list[float]
+            各サーボの遅れ(秒)。`write_stagger_group()`に渡す。
+        """
+        _cur_angles = self.get_all_angles()
+        _target = self.calc_num_angles(target_angles, _cur_angles)
+        return self.plan_stagger([
+            abs(_t - _c) / (_s.max_speed or self.DEF_MAX_SPEED)
+            for _s, _t, _c in zip(self.servo, _target, _cur_angles)
+        ])
+
+    def write_stagger_group(self, target_angles, offsets, offset: float):
+        """Move the servos that start at `offset`.
+
+        Parameters
+        ----------
+        target_angles: list[float]
+            各サーボの目標角度。(検証済み)
+        offsets: list[float]
+            `stagger_offsets()`の結果。
+        offset: float
+            `offsets`の値の一つ。この遅れのサーボだけを動かす。
+        """
+        for _s, _angle, _o in zip(self.servo, target_angles, offsets):
+            if _o == offset:
+                _s.move_angle(_angle)
+        self._publish_state()
+
+    def plan_stagger(self, durations, frame_sec: float | None = None):
+        """
+        `current_budget`のもとで、各サーボの動き始めの遅れを計算する。
+
+        ストール電流は、各サーボの`stall_current`(設定ファイル)。
+        未設定の場合は、`current_budget.model`の値。
+
+        Parameters
+        ----------
+        durations: list[float]
+            各サーボが動く時間(秒)。0は、動かない。
+        frame_sec: float | None
+            遅れの単位(秒)。Noneの場合は、`current_budget.frame_sec`。
+
+        Returns
+        -------
+        list[float]
+            各サーボの遅れ(秒)。`current_budget`がなければ、すべて0。
+        """
+        if self.current_budget is None:
+            return [0.0] * len(durations)
+
+        _model = self.current_budget.model
+        _models = [
+            _model._replace(surge_a=_s.stall_current)
+            if _s.stall_current else _model
+            for _s in self.servo
+        ]
+        return self.current_budget.schedule(durations, _models, frame_sec)
+
+    def plan_step_offsets(
+        self, angle_diffs, move_sec: float, step_n: int
+    ) -> list[int]:
+        """Staggering of `move_all_angles_sync()` (in steps).
+
+        Parameters
+        ----------
+        angle_diffs: list[float]
+            各サーボの移動量。0は、動かない。
+        move_sec: float
+            動作時間(秒)
+        step_n: int
+            ステップ数
+
+        Returns
+        -------
+        list[int]
+            各サーボの遅れ(ステップ数)。`current_budget`がなければ、すべて0。
+            動作全体のステップ数は、`step_n + max(遅れ)`。
+        """
+        _step_sec = move_sec / step_n
+        if self.current_budget is None or _step_sec <= 0:
+            return [0] * self.servo_n
+
+        _offsets = self.plan_stagger(
+            [move_sec if _d else 0.0 for _d in angle_diffs], _step_sec
+        )
+        return [round(_o / _step_sec) for _o in _offsets]
+
+    def step_angles(
+        self, start_angles, angle_diffs, step_offsets,
+        step_i: int, step_n: int, accel_frac: float
+    ) -> list[float]:
+        """Angles at `step_i` of `move_all_angles_sync()`.
+
+        Parameters
+        ----------
+        start_angles: list[float]
+            動き始めの角度
+        angle_diffs: list[float]
+            各サーボの移動量
+        step_offsets: list[int]
+            `plan_step_offsets()`の結果
+        step_i: int
+            ステップ番号 (1から)
+        step_n: int
+            ステップ数
+        accel_frac: float
+            加速(減速)の時間の割合 (see `profile()`)
+        """
+        return [
+            _start + _diff * self.profile(
+                min(max((step_i - _offset) / step_n, 0.0), 1.0), accel_frac
+            )
+            for _start, _diff, _offset in zip(
+                start_angles, angle_diffs, step_offsets
+            )
+        ]
 
     def move_all_angles_relative(self, angle_diffs):
         """Relative Move.
@@ -362,12 +618,122 @@ class MultiServo:
 
         self.move_angle(_new_angles)
 
+    def calc_num_angles(self, target_angles, cur_angles) -> list[float]:
+        """
+        目標角度のリストを、数値(角度)のリストに変換する。
+
+        Parameters
+        ----------
+        target_angles: list[float | str | None]
+            各サーボの目標角度のリスト。
+            None: 現在の角度(つまり、動かさない)
+            文字列: "center", "min", "max"
+        cur_angles: list[float]
+            各サーボの現在の角度のリスト。
+
+        Returns
+        -------
+        list[float]
+            目標角度(数値)のリスト。
+            範囲外の角度は、ANGLE_MIN〜ANGLE_MAXにクリップされる。
+        """
+        _num_target_angles = []
+        for i, _angle in enumerate(target_angles):
+            _servo = self.servo[i]
+
+            if isinstance(_angle, str):
+                if _angle == _servo.POS_CENTER:
+                    _num_target_angles.append(_servo.ANGLE_CENTER)
+                elif _angle == _servo.POS_MIN:
+                    _num_target_angles.append(_servo.ANGLE_MIN)
+                elif _angle == _servo.POS_MAX:
+                    _num_target_angles.append(_servo.ANGLE_MAX)
+                else:  # 不明な文字: 動かさない
+                    self.__log.warning("invalid word %a: ignored", _angle)
+                    _num_target_angles.append(cur_angles[i])
+
+            elif _angle is None:  # None は、「動かさない」の意味
+                _num_target_angles.append(cur_angles[i])
+
+            else:  # num
+                # clip: ANGLE_MIN <= _angle <= ANGLE_MAX
+                _angle = max(min(_angle, _servo.ANGLE_MAX), _servo.ANGLE_MIN)
+                _num_target_angles.append(_angle)
+
+        return _num_target_angles
+
+    @staticmethod
+    def profile(x: float, accel_frac: float) -> float:
+        """Normalized trapezoidal position profile.
+
+        Args:
+            x: 経過時間の割合 (0..1)
+            accel_frac: 加速(減速)の時間の割合 (0..0.5)
+
+        Returns:
+            float: 移動距離の割合 (0..1)
+        """
+        if accel_frac <= 0:
+            return x
+
+        _v = 1 / (1 - accel_frac)  # 等速部分の速度
+        if x < accel_frac:
+            return 0.5 * _v / accel_frac * x * x
+        if x > 1 - accel_frac:
+            return 1 - 0.5 * _v / accel_frac * (1 - x) ** 2
+        return _v * (x - 0.5 * accel_frac)
+
+    def plan_move(self, target_angles, start_angles=None) -> MovePlan:
+        """
+        速度と加速度の上限のもとで、すべてのサーボが同時に着く、
+        最短の同期移動を計算する。
+
+        すべてのサーボが、同じ形の台形速度(`profile()`)で動くとして、
+        距離 d, 速度の上限 v, 加速度の上限 a のサーボの中で、
+        V = max(d / v), A = max(d / a) とすると、
+
+        * A / (V^2 + A) < 0.5: 台形 (move_sec = V + A / V)
+        * それ以外: 三角形 (move_sec = 2 * sqrt(A))
+
+        速度の上限は、各サーボの`max_speed`, `max_accel`
+        (設定ファイル)。未設定の場合は、`DEF_MAX_SPEED`, `DEF_MAX_ACCEL`。
+
+        Parameters
+        ----------
+        target_angles: list
+            目標角度 (`move_all_angles_sync()`と同じ)
+        start_angles: list[float] | None
+            開始角度。Noneの場合は、現在の角度。
+
+        Returns
+        -------
+        MovePlan
+        """
+        if start_angles is None:
+            start_angles = self.get_all_angles()
+        _target = self.calc_num_angles(target_angles, start_angles)
+
+        _v = _a = 0.0  # V, A
+        for _servo, _start, _end in zip(self.servo, start_angles, _target):
+            _d = abs(_end - _start)
+            _v = max(_v, _d / (_servo.max_speed or self.DEF_MAX_SPEED))
+            _a = max(_a, _d / (_servo.max_accel or self.DEF_MAX_ACCEL))
+
+        if _v <= 0:
+            return MovePlan(0.0, 0.0)
+
+        _frac = _a / (_v * _v + _a)
+        if _frac >= 0.5:
+            return MovePlan(2 * math.sqrt(_a), 0.5)
+        return MovePlan(_v + _a / _v, _frac)
+
     def move_all_angles_sync(
         self,
         target_angles,
-        move_sec: float = DEF_MOVE_SEC,
-        step_n: int = DEF_STEP_N
-    ):
+        move_sec: float | str = DEF_MOVE_SEC,
+        step_n: int = DEF_STEP_N,
+        accel_frac: float = 0.0,
+    ) -> float | None:
         """
         すべてのサーボを目標角度まで同期的かつ滑らかに動かす。
         角度は、数値だけでなく、文字列、Noneでも指定できる。
@@ -378,55 +744,56 @@ class MultiServo:
             各サーボの目標角度のリスト。
             None: 現在の角度(つまり、動かさない)
             文字列: "center", "min", "max"
-        move_sec: float
+        move_sec: float | str
             動作にかかるおおよその時間（秒）。
+            "auto"(`MOVE_SEC_AUTO`)の場合は、`plan_move()`で決める。
         step_n: int
             動作を分割するステップ数。
             1以下の場合は、move_angle() を呼び出して、ダイレクトに動かす
+        accel_frac: float
+            加速(減速)の時間の割合 (see `profile()`)。
+            0の場合は、等速。("auto"の場合は、`plan_move()`の値)
+
+        `current_budget`がある場合は、ステップ単位で動き始めをずらす。
+        (その分、ステップ数と動作時間が増える)
+
+        Returns
+        -------
+        float | None
+            動作時間(秒)。角度が不正な場合は、None。
         """
         self.__log.debug(
-            "target_angles=%s, move_sec=%s, step_n=%s",
-            target_angles, move_sec, step_n
+            "target_angles=%s, move_sec=%s, step_n=%s, accel_frac=%s",
+            target_angles, move_sec, step_n, accel_frac
         )
 
-        if not self._validate_angle_list(target_angles):
-            return
+        if not self.validate_angle_list(target_angles):
+            return None
 
         # step_n が１以下の場合は、ダイレクトに動かす
         if step_n <= 1:
             self.move_all_angles(target_angles)
-            return
-
-        _step_sec = move_sec / step_n
-        self.__log.debug("_step_sec=%.3f", _step_sec)
+            return 0.0
 
         _start_angles = self.get_all_angles()
         self.__log.debug("_start_angles=%s", _start_angles)
 
-        # target_anglesを数値(角度)に変換
-        _num_target_angles = []
-        for i, _angle in enumerate(target_angles):
-            _servo = self.servo[i]
-
-            if isinstance(_angle, str):
-                if _angle == _servo.POS_CENTER:
-                    _num_target_angles.append(_servo.ANGLE_CENTER)
-                elif _angle == _servo.POS_MIN:
-                    _num_target_angles.append(_servo.ANGLE_MIN)
-                elif _angle == _servo.POS_MAX:
-                    _num_target_angles.append(_servo.ANGLE_MAX)
-                else:  # 不明な文字: 動かさない
-                    self.__log.warning("invalid word %a: ignored", _angle)
-                    _num_target_angles.append(_start_angles[i])
-
-            elif _angle is None:  # None は、「動かさない」の意味
-                _num_target_angles.append(_start_angles[i])
+        if move_sec == self.MOVE_SEC_AUTO:
+            move_sec, accel_frac = self.plan_move(
+                target_angles, _start_angles
+            )
+            self.__log.debug(
+                "planned: move_sec=%.3f, accel_frac=%.3f",
+                move_sec, accel_frac
+            )
+        move_sec = float(move_sec)
 
-            else:  # num
-                # clip: ANGLE_MIN <= _angle <= ANGLE_MAX
-                _angle = max(min(_angle, _servo.ANGLE_MAX), _servo.ANGLE_MIN)
-                _num_target_angles.append(_angle)
+        _step_sec = move_sec / step_n
+        self.__log.debug("_step_sec=%.3f", _step_sec)
 
+        _num_target_angles = self.calc_num_angles(
+            target_angles, _start_angles
+        )
         self.__log.debug("_num_target_angles=%s", _num_target_angles)
 
         _angle_diffs = [
@@ -435,18 +802,109 @@ class MultiServo:
         ]
         self.__log.debug("_angle_diffs=%s", _angle_diffs)
 
-        for _step_i in range(1, step_n + 1):
-            next_angles = [
-                _start_angles[i] + _angle_diffs[i] * _step_i / step_n
-                for i in range(self.servo_n)
-            ]
+        _step_offsets = self.plan_step_offsets(
+            _angle_diffs, move_sec, step_n
+        )
+        _total_n = step_n + max(_step_offsets)
+
+        _t0 = self.clock.now()
+        for _step_i in range(1, _total_n + 1):
+            self.hist_step_jitter.record_sec(
+                self.clock.now() - (_t0 + (_step_i - 1) * _step_sec)
+            )
+
+            next_angles = self.step_angles(
+                _start_angles, _angle_diffs, _step_offsets,
+                _step_i, step_n, accel_frac
+            )
 
-            self.move_all_angles(next_angles)
+            self.write_all_angles(next_angles)
             # self.__log.debug(
             #     "step %s/%s: next_angles=%s, _step_sec=%s",
-            #     _step_i, step_n, next_angles, _step_sec
+            #     _step_i, _total_n, next_angles, _step_sec
             # )
-            time.sleep(_step_sec)
+            # 予定時刻まで待つ (書き込みや寝過ごしの遅れを、積み重ねない)
+            self.clock.sleep_until(_t0 + _step_i * _step_sec)
+
+        return _total_n * _step_sec
+
+    def attach_target_pose(self, target_pose):
+        """Attach a target pose channel (`ShmTargetPose`).
+
+        `follow_target_pose()`で、ティックごとに読み出される。
+        """
+        self.__log.debug("target_pose=%s", target_pose)
+        self.target_pose = target_pose
+
+    def follow_target_pose(
+        self,
+        tick_sec: float = DEF_TICK_SEC,
+        duration_sec: float | None = None,
+        stop_event=None,
+        max_age_sec: float | None = None,
+    ) -> int:
+        """
+        `attach_target_pose()`した目標角度に、ティックごとに追従する。
+
+        ティックごとに目標角度を読み出し、更新されていれば、
+        `move_all_angles()`でダイレクトに動かす。
+        NaNの角度のサーボは、動かさない。
+
+        Parameters
+        ----------
+        tick_sec: float
+            ティックの周期(秒)。
+        duration_sec: float | None
+            追従する時間(秒)。Noneの場合は、`stop_event`まで続ける。
+        stop_event: threading.Event | None
+            セットされたら、追従を終了する。
+        max_age_sec: float | None
+            これより古い目標角度は無視する。
+
+        Returns
+        -------
+        int
+            実際に動かした回数。
+        """
+        self.__log.debug(
+            "tick_sec=%s, duration_sec=%s, max_age_sec=%s",
+            tick_sec, duration_sec, max_age_sec
+        )
+
+        if self.target_pose is None:
+            self.__log.error("no target pose attached")
+            return 0
+
+        _move_n = 0
+        _last_seq = 0
+        _t0 = self.clock.now()
+        _tick_i = 0
+        while stop_event is None or not stop_event.is_set():
+            if (
+                duration_sec is not None
+                and self.clock.now() - _t0 >= duration_sec
+            ):
+                break
+
+            _pose = self.target_pose.read()
+            if (
+                _pose is not None
+                and _pose.seq != _last_seq
+                # `timestamp`は、書き込んだプロセスの実時間
+                and (max_age_sec is None
+                     or time.monotonic() - _pose.timestamp <= max_age_sec)
+            ):
+                self.move_all_angles([
+                    None if math.isnan(_a) else _a for _a in _pose.angles
+                ], stop_event)
+                _last_seq = _pose.seq
+                _move_n += 1
+
+            _tick_i += 1
+            self.clock.sleep_until(_t0 + _tick_i * tick_sec, stop_event)
+
+        self.__log.debug("move_n=%s", _move_n)
+        return _move_n
 
     def move_angle_sync_relative(
         self,
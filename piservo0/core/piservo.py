@@ -16,6 +16,10 @@ class PiServo:
     MAX = 2500
     CENTER = 1500
 
+    # 最後に出力したパルス幅 (None: まだ出力していない)
+    # pigpioに問い合わせずに、状態を知るために使う
+    last_pulse: int | None = None
+
     def __init__(self, pi, pin, debug=False):
         """PiServoクラスのコンストラクタ。
 
@@ -71,6 +75,7 @@ class PiServo:
             self.__log.debug("pulse=%s", pulse)
 
         self.pi.set_servo_pulsewidth(self.pin, pulse)
+        self.last_pulse = pulse
 
     def move_pulse_relative(self, pulse_diff):
         """Move relative.
@@ -121,3 +126,4 @@ class PiServo:
         """
         self.__log.debug("pin=%s", self.pin)
         self.pi.set_servo_pulsewidth(self.pin, self.OFF)
+        self.last_pulse = self.OFF
@@ -0,0 +1,314 @@
+#
+# (c) 2025 Yoichi Tanibayashi
+#
+import asyncio
+import functools
+import math
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+from ..core.multi_servo import MultiServo
+from ..utils.my_logger import get_logger
+
+
+class AsyncMultiServo:
+    """
+    MultiServoを、asyncioのイベントループから使うためのラッパークラス。
+
+    pigpioの呼び出し(ソケット通信)は、専用のシングルスレッドの
+    executorで実行されるので、イベントループをブロックしない。
+    pigpioの呼び出しは、このexecutor上で直列化される。
+
+    `move_all_angles_sync()`のステップ間の待ちは、`loop.call_at()`による
+    絶対時刻(デッドライン)で行うので、ステップごとの誤差が累積しない。
+    """
+
+    DEF_MOVE_SEC = MultiServo.DEF_MOVE_SEC
+    DEF_STEP_N = MultiServo.DEF_STEP_N
+
+    def __init__(
+        self,
+        mservo: MultiServo,
+        executor: ThreadPoolExecutor | None = None,
+        debug: bool = False,
+    ):
+        """
+        AsyncMultiServoのインスタンスを初期化する。
+
+        Parameters
+        ----------
+        mservo: MultiServo
+            実際にサーボを制御するMultiServoのインスタンス。
+        executor: ThreadPoolExecutor | None
+            pigpio呼び出し用のexecutor。
+            Noneの場合は、シングルスレッドのexecutorを作成する。
+        debug: bool
+            デバッグモードを有効にするかどうかのフラグ。
+        """
+        self._debug = debug
+        self.__log = get_logger(self.__class__.__name__, self._debug)
+
+        self.mservo = mservo
+        self.servo_n = mservo.servo_n
+
+        self._own_executor = executor is None
+        if executor is None:
+            executor = ThreadPoolExecutor(
+                max_workers=1, thread_name_prefix="pigpio"
+            )
+        self._executor = executor
+
+    def end(self):
+        """End.
+
+        自分で作成したexecutorを停止する。
+        """
+        self.__log.debug("")
+        if self._own_executor:
+            self._executor.shutdown(wait=True)
+
+    async def _call(self, func, *args, **kwargs):
+        """Call `func` in the executor."""
+        _loop = asyncio.get_running_loop()
+        return await _loop.run_in_executor(
+            self._executor, functools.partial(func, *args, **kwargs)
+        )
+
+    async def _sleep_until(
+        self, deadline: float, stop_event: asyncio.Event | None = None
+    ) -> bool:
+        """Sleep until `deadline` (loop.time() base).
+
+        Returns:
+            bool: `stop_event`がセットされて、中断した場合は`True`
+        """
+        _loop = asyncio.get_running_loop()
+        _fut = _loop.create_future()
+        _handle = _loop.call_at(deadline, _fut.set_result, None)
+        _stop = None
+        if stop_event is not None:
+            _stop = asyncio.ensure_future(stop_event.wait())
+        try:
+            if _stop is None:
+                await _fut
+                return False
+            await asyncio.wait(
+                [_fut, _stop], return_when=asyncio.FIRST_COMPLETED
+            )
+            return stop_event.is_set()
+        finally:
+            _handle.cancel()
+            if _stop is not None:
+                _stop.cancel()
+
+    # --- 状態取得メソッド ---
+
+    async def get_all_pulses(self) -> list[int]:
+        """Get all pulses."""
+        return await self._call(self.mservo.get_all_pulses)
+
+    async def get_all_angles(self) -> list[float]:
+        """Get all angles."""
+        return await self._call(self.mservo.get_all_angles)
+
+    # --- 制御メソッド ---
+
+    async def off(self):
+        """すべてのサーボをオフにする。"""
+        await self._call(self.mservo.off)
+
+    async def move_all_angles(
+        self,
+        target_angles: list,
+        stop_event: asyncio.Event | None = None,
+    ):
+        """各サーボを指定された角度に動かす。
+
+        `current_budget`で動き始めをずらす間の待ちは、イベントループで行う。
+        `stop_event`がセットされたら、残りのサーボを動かさずに戻る。
+        """
+        _mservo = self.mservo
+        if (
+            _mservo.current_budget is None
+            or not _mservo.validate_angle_list(target_angles)
+        ):
+            await self._call(_mservo.move_all_angles, target_angles)
+            return
+
+        _offsets = await self._call(_mservo.stagger_offsets, target_angles)
+
+        _t0 = asyncio.get_running_loop().time()
+        for _offset in sorted(set(_offsets)):
+            if await self._sleep_until(_t0 + _offset, stop_event):
+                self.__log.debug("canceled: offset=%s", _offset)
+                break
+            await self._call(
+                _mservo.write_stagger_group, target_angles, _offsets, _offset
+            )
+
+    async def move_all_pulses_relative(self, pulse_diffs, forced=False):
+        """Relative move all servos (pulse)."""
+        await self._call(
+            self.mservo.move_all_pulses_relative, pulse_diffs, forced
+        )
+
+    async def move_all_angles_sync(
+        self,
+        target_angles: list,
+        move_sec: float | str = MultiServo.DEF_MOVE_SEC,
+        step_n: int = MultiServo.DEF_STEP_N,
+        accel_frac: float = 0.0,
+    ) -> float | None:
+        """
+        すべてのサーボを目標角度まで同期的かつ滑らかに動かす。
+
+        `MultiServo.move_all_angles_sync()`と同じだが、
+        ステップ間の待ちで、イベントループをブロックしない。
+
+        Parameters
+        ----------
+        target_angles: list[float | str | None]
+            各サーボの目標角度のリスト。
+        move_sec: float | str
+            動作にかかるおおよその時間（秒）。"auto"は、`plan_move()`。
+        step_n: int
+            動作を分割するステップ数。
+        accel_frac: float
+            加速(減速)の時間の割合 (see `MultiServo.profile()`)。
+
+        Returns
+        -------
+        float | None
+            動作時間(秒)。角度が不正な場合は、None。
+        """
+        self.__log.debug(
+            "target_angles=%s, move_sec=%s, step_n=%s, accel_frac=%s",
+            target_angles, move_sec, step_n, accel_frac
+        )
+
+        if not self.mservo.validate_angle_list(target_angles):
+            return None
+
+        if step_n <= 1:
+            await self.move_all_angles(target_angles)
+            return 0.0
+
+        _start_angles = await self.get_all_angles()
+        if move_sec == MultiServo.MOVE_SEC_AUTO:
+            move_sec, accel_frac = self.mservo.plan_move(
+                target_angles, _start_angles
+            )
+        move_sec = float(move_sec)
+
+        _step_sec = move_sec / step_n
+
+        _num_target_angles = self.mservo.calc_num_angles(
+            target_angles, _start_angles
+        )
+        _angle_diffs = [
+            _num_target_angles[i] - _start_angles[i]
+            for i in range(self.servo_n)
+        ]
+
+        _step_offsets = self.mservo.plan_step_offsets(
+            _angle_diffs, move_sec, step_n
+        )
+        _total_n = step_n + max(_step_offsets)
+
+        _loop = asyncio.get_running_loop()
+        _t0 = _loop.time()
+        for _step_i in range(1, _total_n + 1):
+            self.mservo.hist_step_jitter.record_sec(
+                _loop.time() - (_t0 + (_step_i - 1) * _step_sec)
+            )
+
+            next_angles = self.mservo.step_angles(
+                _start_angles, _angle_diffs, _step_offsets,
+                _step_i, step_n, accel_frac
+            )
+            await self._call(self.mservo.write_all_angles, next_angles)
+            await self._sleep_until(_t0 + _step_i * _step_sec)
+
+        return _total_n * _step_sec
+
+    async def move_all_angles_sync_relative(
+        self,
+        angle_diffs: list[Optional[float]],
+        move_sec: float | str = MultiServo.DEF_MOVE_SEC,
+        step_n: int = MultiServo.DEF_STEP_N,
+    ) -> float | None:
+        """現在の角度からの相対角度で、滑らかに動かす。"""
+        _cur_angles = await self.get_all_angles()
+        _new_angles = [
+            _cur_angles[i] + (angle_diffs[i] or 0)
+            for i in range(self.servo_n)
+        ]
+        return await self.move_all_angles_sync(
+            _new_angles, move_sec, step_n
+        )
+
+    async def follow_target_pose(
+        self,
+        tick_sec: float = MultiServo.DEF_TICK_SEC,
+        duration_sec: float | None = None,
+        stop_event: asyncio.Event | None = None,
+        max_age_sec: float | None = None,
+    ) -> int:
+        """
+        目標角度(`ShmTargetPose`)に、ティックごとに追従する。
+
+        `MultiServo.follow_target_pose()`と同じだが、
+        ティック間の待ちで、イベントループをブロックしない。
+        """
+        _target_pose = self.mservo.target_pose
+        if _target_pose is None:
+            self.__log.error("no target pose attached")
+            return 0
+
+        _loop = asyncio.get_running_loop()
+        _move_n = 0
+        _last_seq = 0
+        _t0 = _loop.time()
+        _tick_i = 0
+        while stop_event is None or not stop_event.is_set():
+            _elapsed = _loop.time() - _t0
+            if duration_sec is not None and _elapsed >= duration_sec:
+                break
+
+            _pose = _target_pose.read()
+            if (
+                _pose is not None
+                and _pose.seq != _last_seq
+                and (max_age_sec is None
+                     or time.monotonic() - _pose.timestamp <= max_age_sec)
+            ):
+                await self.move_all_angles([
+                    None if math.isnan(_a) else _a for _a in _pose.angles
+                ], stop_event)
+                _last_seq = _pose.seq
+                _move_n += 1
+
+            _tick_i += 1
+            await self._sleep_until(_t0 + _tick_i * tick_sec)
+
+        return _move_n
+
+    # --- calibration ---
+
+    async def set_pulse(self, index: int, target: str) -> bool:
+        """Set center/min/max pulse to the current pulse.
+
+        Returns:
+            bool: `False`の場合、`target`が不正
+        """
+        _func = {
+            "center": self.mservo.set_pulse_center,
+            "min": self.mservo.set_pulse_min,
+            "max": self.mservo.set_pulse_max,
+        }.get(target)
+        if _func is None:
+            return False
+
+        await self._call(_func, index)
+        return True
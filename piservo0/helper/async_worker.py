@@ -0,0 +1,345 @@
+#
+# (c) 2025 Yoichi Tanibayashi
+#
+import asyncio
+import inspect
+import itertools
+import json
+import time
+
+from ..utils.metrics import Histogram, WorkerMetrics
+from ..utils.my_logger import get_logger
+from .async_multi_servo import AsyncMultiServo
+from .thread_worker import CmdFuture, WorkerStatus
+from .worker_cmd import WorkerCmdMixin
+
+
+class AsyncWorker(WorkerCmdMixin):
+    """asyncio worker.
+
+    `ThreadWorker`と同じコマンドを、asyncioのイベントループ上で実行する。
+    コマンドは`asyncio.Queue`を介して受け渡され、一つずつ順に実行される。
+
+    スレッドの受け渡しがないので、FastAPIなどのasyncioアプリケーションから、
+    同じイベントループ上で、ハードウェアを駆動できる。
+    (pigpioの呼び出しだけは、`AsyncMultiServo`のexecutorで実行される)
+
+    `send()`は、`ThreadWorker.send()`と同様に、`CmdFuture`を返す。
+    状態も、`ThreadWorker`と同様に、`status`(`WorkerStatus`)で公開する。
+    `start()`と`send()`は、イベントループのスレッドから呼び出すこと。
+
+    コマンドの解釈は、`ThreadWorker`と共通(`WorkerCmdMixin`)。
+    executorのスレッドから届く`MultiServo`の状態の通知は、
+    `loop.call_soon_threadsafe()`で、イベントループに渡して反映する。
+    """
+
+    _SENTINEL = None  # `end()`でワーカーを起こすための番兵
+
+    def __init__(
+        self,
+        amservo: AsyncMultiServo,
+        move_sec: float | None = None,
+        step_n: int | None = None,
+        interval_sec: float = WorkerCmdMixin.DEF_INTERVAL_SEC,
+        trace=None,
+        debug=False,
+    ):
+        """Constructor. (`trace`: see `ThreadWorker`)"""
+        self._debug = debug
+        self.__log = get_logger(self.__class__.__name__, self._debug)
+
+        self.amservo = amservo
+        self._init_cmd(amservo, move_sec, step_n, interval_sec, debug)
+        self.trace = trace
+
+        self.__log.debug(
+            "move_sec=%s, step_n=%s, interval_sec=%s",
+            move_sec, step_n, interval_sec
+        )
+
+        self._cmdq: asyncio.Queue = asyncio.Queue()
+        self._cancel_ev = asyncio.Event()
+        self._task: asyncio.Task | None = None
+        self._loop: asyncio.AbstractEventLoop | None = None
+
+        self._cmd_id = itertools.count(1)
+
+        self.metrics = WorkerMetrics()
+
+        self.cur_cmd_id: int | None = None  # 実行中のコマンドID
+        self.cur_cmd: str | None = None  # 実行中のコマンド名
+        self._sent_n = 0
+
+        # 状態のスナップショット (`_publish_status()`で置き換える)
+        _mservo = amservo.mservo
+        self._status_seq = itertools.count(1)
+        self.status = WorkerStatus(
+            0, time.monotonic(), _mservo.state.pulses, _mservo.state.angles,
+            0, None, None, 0, 0, 0
+        )
+        _mservo.add_state_listener(self._on_state)
+
+    def start(self):
+        """Start worker task on the running loop."""
+        self.__log.debug("")
+        self._loop = asyncio.get_running_loop()
+        self._task = self._loop.create_task(self._run())
+
+    async def end(self):
+        """end worker"""
+        self.__log.debug("")
+        self.clear_cmdq()
+        self._cmdq.put_nowait(self._SENTINEL)
+        if self._task:
+            await self._task
+        self.__log.debug("done")
+
+    def clear_cmdq(self):
+        """clear command queue
+
+        実行中の待ち時間(`sleep`, インターバル)も中断する。
+        """
+        self._cancel_ev.set()
+
+        _count = 0
+        _sentinel = False
+        while not self._cmdq.empty():
+            _cmd = self._cmdq.get_nowait()
+            if _cmd is self._SENTINEL:
+                _sentinel = True
+                continue
+
+            _count += 1
+            _cmd.cancel()
+            self.__log.debug("%2d:%s", _count, _cmd.cmd_data)
+
+        if _sentinel:
+            self._cmdq.put_nowait(self._SENTINEL)
+
+        self.__log.debug("count=%s", _count)
+        self._publish_status()
+        return _count
+
+    def cancel_cmds(self):
+        """Alias of clear_cmdq()."""
+        self.__log.debug("")
+        return self.clear_cmdq()
+
+    def send(self, cmd_data) -> CmdFuture:
+        """send
+
+        Args:
+            cmd_data (dict | str): コマンド(dict または JSON文字列)
+
+        Returns:
+            CmdFuture: コマンドの完了を待つためのFuture
+        """
+        _fut = CmdFuture(next(self._cmd_id), cmd_data)
+        self._sent_n += 1
+        try:
+            if isinstance(cmd_data, str):
+                cmd_data = json.loads(cmd_data)
+                _fut.cmd_data = cmd_data
+
+            if cmd_data.get("cmd") == self.CMD_CANCEL:
+                cmd_data["count"] = self.clear_cmdq()
+                _fut.set_running_or_notify_cancel()
+                _fut.set_result(_fut.make_result())
+            else:
+                self._cmdq.put_nowait(_fut)
+                self._publish_status()
+
+            self.__log.debug(
+                "id=%s, cmd_data=%s, qsize=%s",
+                _fut.cmd_id, cmd_data, self._cmdq.qsize()
+            )
+
+        except Exception as _e:
+            self.__log.error("%s: %s", type(_e).__name__, _e)
+            if not _fut.done():
+                _fut.set_running_or_notify_cancel()
+                _fut.set_exception(_e)
+
+        return _fut
+
+    async def send_async(self, cmd_data) -> dict:
+        """Send a command and wait its completion."""
+        return await asyncio.wrap_future(self.send(cmd_data))
+
+    def qsize(self) -> int:
+        """Number of queued commands."""
+        return self._cmdq.qsize()
+
+    def _on_state(self, state):
+        """State listener of `MultiServo`. (executorのスレッドから呼ばれる)
+
+        `status`は、イベントループのスレッドだけで置き換える。
+        """
+        _loop = self._loop
+        if _loop is None or _loop.is_closed():
+            self._publish_status(state)
+            return
+        _loop.call_soon_threadsafe(self._publish_status, state)
+
+    def _publish_status(self, state=None):
+        """Publish a new status snapshot. (see `ThreadWorker`)"""
+        if state is None:
+            state = self.amservo.mservo.state
+
+        self.status = WorkerStatus(
+            next(self._status_seq), time.monotonic(),
+            state.pulses, state.angles, self._cmdq.qsize(),
+            self.cur_cmd_id, self.cur_cmd,
+            self._sent_n, self.metrics.cmd_n, self.metrics.err_n,
+        )
+
+    def _set_cur_cmd(self, fut: CmdFuture | None):
+        """Set the running command and publish the status."""
+        self.cur_cmd_id = None if fut is None else fut.cmd_id
+        self.cur_cmd = None if fut is None else fut.make_result()["cmd"]
+        self._publish_status()
+
+    def get_metrics(self) -> dict:
+        """Get metrics (histograms of timing). See `ThreadWorker`."""
+        _metrics = self.metrics.to_dict()
+        _metrics["qsize"] = self._cmdq.qsize()
+
+        _hist = getattr(self.amservo.mservo, "hist_step_jitter", None)
+        if isinstance(_hist, Histogram):
+            _metrics["step_jitter"] = _hist.to_dict()
+
+        return _metrics
+
+    def reset_metrics(self):
+        """Reset metrics."""
+        self.metrics.reset()
+
+        _hist = getattr(self.amservo.mservo, "hist_step_jitter", None)
+        if isinstance(_hist, Histogram):
+            _hist.reset()
+
+    async def _wait(self, sec: float) -> bool:
+        """Wait `sec` seconds, unless canceled.
+
+        Returns:
+            bool: `True`の場合、キャンセルにより中断された
+        """
+        try:
+            await asyncio.wait_for(self._cancel_ev.wait(), sec)
+        except asyncio.TimeoutError:
+            return False
+        return True
+
+    async def _handle_move_all_angles_sync(self, cmd: dict):
+        """Handle move_all_angles_sync()."""
+        _move_sec, _step_n = self._get_move_params(cmd)
+        _t0 = time.monotonic()
+        _sec = await self.amservo.move_all_angles_sync(
+            cmd["angles"], _move_sec, _step_n
+        )
+        self._record_move(time.monotonic() - _t0, _move_sec, _sec)
+        await self._sleep_interval()
+
+    async def _handle_move_all_angles_sync_relative(self, cmd: dict):
+        """Handle move_all_angles_sync_relative()."""
+        _move_sec, _step_n = self._get_move_params(cmd)
+        _t0 = time.monotonic()
+        _sec = await self.amservo.move_all_angles_sync_relative(
+            cmd["angle_diffs"], _move_sec, _step_n
+        )
+        self._record_move(time.monotonic() - _t0, _move_sec, _sec)
+        await self._sleep_interval()
+
+    async def _handle_move_all_angles(self, cmd: dict):
+        """Handle move_all_angles()."""
+        await self.amservo.move_all_angles(
+            cmd["angles"], stop_event=self._cancel_ev
+        )
+        await self._sleep_interval()
+
+    async def _handle_move_all_pulses_relative(self, cmd: dict):
+        """Handle move_all_pulses_relative()."""
+        await self.amservo.move_all_pulses_relative(
+            cmd["pulse_diffs"], forced=True
+        )
+        await self._sleep_interval()
+
+    async def _handle_sleep(self, cmd: dict):
+        """Handle sleep."""
+        _sec = self._get_sleep_sec(cmd)
+        self.__log.debug("sleep: %s sec", _sec)
+        if _sec > 0.0:
+            if await self._wait(_sec):
+                self.__log.debug("sleep: canceled")
+
+    async def _handle_follow(self, cmd: dict):
+        """Handle follow. (see `ThreadWorker`)"""
+        await self.amservo.follow_target_pose(
+            stop_event=self._cancel_ev,
+            **self._get_follow_params(cmd, self.amservo.mservo.DEF_TICK_SEC),
+        )
+
+    async def _sleep_interval(self):
+        """sleep interval"""
+        if self.interval_sec > 0:
+            await self._wait(self.interval_sec)
+
+    async def _handle_set(self, cmd: dict):
+        """Handle set cmd. (save calibration)"""
+        _params = self._get_set_params(cmd)
+        if _params is None:
+            return
+
+        await self.amservo.set_pulse(*_params)
+
+    async def _dispatch_cmd(self, cmd_data: dict):
+        """Dispatch command."""
+        self.__log.debug("cmd_data=%a", cmd_data)
+
+        # 設定だけのコマンド(`WorkerCmdMixin`)は、awaitしない
+        _ret = self._get_handler(cmd_data)(cmd_data)
+        if inspect.isawaitable(_ret):
+            await _ret
+
+    async def _exec_cmd(self, fut: CmdFuture):
+        """Execute a command and set the result to `fut`."""
+        if not fut.set_running_or_notify_cancel():
+            return  # canceled
+
+        fut.t_start = time.monotonic()
+        if self.trace is not None:
+            self.trace.record_cmd(fut.cmd_id, fut.cmd_data)
+
+        self._set_cur_cmd(fut)
+        try:
+            await self._dispatch_cmd(fut.cmd_data)
+
+        except Exception as _e:
+            fut.t_end = time.monotonic()
+            self.__log.error("%s: %s", type(_e).__name__, _e)
+            self.metrics.record_cmd(fut, err=True)
+            self._set_cur_cmd(None)
+            fut.set_exception(_e)
+            return
+
+        fut.t_end = time.monotonic()
+        self.metrics.record_cmd(fut)
+        self._set_cur_cmd(None)
+        fut.set_result(fut.make_result())
+
+    async def _run(self):
+        """run"""
+        self.__log.debug("start")
+
+        while True:
+            _fut = await self._cmdq.get()
+            if _fut is self._SENTINEL:
+                break
+
+            # 取り出した後のコマンドは、直前のキャンセルの影響を受けない
+            self._cancel_ev.clear()
+
+            self.__log.debug("qsize=%s", self._cmdq.qsize())
+            await self._exec_cmd(_fut)
+
+        self.__log.debug("done")
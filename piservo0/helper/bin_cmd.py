@@ -0,0 +1,312 @@
+#
+# (c) 2025 Yoichi Tanibayashi
+#
+import math
+import struct
+
+
+class BinCmd:
+    """Compact binary encoding of commands.
+
+    JSONコマンド(dict)を、固定長フィールドのバイナリに変換する。
+    (JSONの代わりに、`/cmd/bin`や`ApiClient(binary=True)`で使う)
+
+    **フレーム**
+
+    header: version(B), opcode(B), payload length(H)
+    payload: opcodeごとの固定フィールド + float32/int16の配列
+    (時間(秒)は、誤差が出ないようにfloat64)
+
+    複数のコマンドは、フレームを連結するだけ。
+
+    **角度(float32)**
+
+    * NaN: None (動かさない)
+    * +inf: "max", -inf: "min"
+    * "center": 0.0
+
+    **時間(float64)**
+
+    * `move_sec`の"auto"は、-1.0 (`SEC_AUTO`)
+
+    e.g. 4サーボの`move`は、30 bytes (JSONでは約60〜80 bytes)
+    """
+
+    VERSION = 1
+
+    HDR = struct.Struct("<BBH")
+
+    OP_MOVE = 1  # move_all_angles_sync
+    OP_MOVE_RELATIVE = 2  # move_all_angles_sync_relative
+    OP_MOVE_ANGLES = 3  # move_all_angles
+    OP_MOVE_PULSES_RELATIVE = 4  # move_all_pulses_relative
+    OP_MOVE_SEC = 5
+    OP_STEP_N = 6
+    OP_INTERVAL = 7
+    OP_SLEEP = 8
+    OP_SET = 9
+    OP_CANCEL = 10
+    OP_FOLLOW = 11
+
+    # opcode --> JSONのコマンド名
+    CMD_NAME = {
+        OP_MOVE: "move_all_angles_sync",
+        OP_MOVE_RELATIVE: "move_all_angles_sync_relative",
+        OP_MOVE_ANGLES: "move_all_angles",
+        OP_MOVE_PULSES_RELATIVE: "move_all_pulses_relative",
+        OP_MOVE_SEC: "move_sec",
+        OP_STEP_N: "step_n",
+        OP_INTERVAL: "interval",
+        OP_SLEEP: "sleep",
+        OP_SET: "set",
+        OP_CANCEL: "cancel",
+        OP_FOLLOW: "follow",
+    }
+
+    # JSONのコマンド名 --> opcode
+    OPCODE = {_name: _op for _op, _name in CMD_NAME.items()}
+    OPCODE["move"] = OP_MOVE
+
+    # move_sec(d: NaN=省略), step_n(H: 0=省略)
+    MOVE_PARAMS = struct.Struct("<dH")
+    SEC = struct.Struct("<d")
+    STEP_N = struct.Struct("<H")
+    SET = struct.Struct("<BB")  # servo, target
+    FOLLOW = struct.Struct("<ddd")  # sec, tick, max_age (NaN=省略)
+
+    # opcode --> (固定部分のサイズ, 配列の要素のサイズ(0: 配列なし))
+    PAYLOAD_SIZE = {
+        OP_MOVE: (MOVE_PARAMS.size, 4),
+        OP_MOVE_RELATIVE: (MOVE_PARAMS.size, 4),
+        OP_MOVE_ANGLES: (0, 4),
+        OP_MOVE_PULSES_RELATIVE: (0, 2),
+        OP_MOVE_SEC: (SEC.size, 0),
+        OP_STEP_N: (STEP_N.size, 0),
+        OP_INTERVAL: (SEC.size, 0),
+        OP_SLEEP: (SEC.size, 0),
+        OP_SET: (SET.size, 0),
+        OP_CANCEL: (0, 0),
+        OP_FOLLOW: (FOLLOW.size, 0),
+    }
+
+    SET_TARGETS = ("center", "min", "max")
+
+    SEC_AUTO = -1.0  # move_sec: "auto"
+
+    @staticmethod
+    def _opt_float(val) -> float:
+        """None --> NaN"""
+        return math.nan if val is None else float(val)
+
+    @classmethod
+    def _sec_to_float(cls, sec) -> float:
+        """move_sec (float | "auto" | None) to float64 value."""
+        if sec == "auto":
+            return cls.SEC_AUTO
+        return cls._opt_float(sec)
+
+    @classmethod
+    def _float_to_sec(cls, val: float):
+        """float64 value to move_sec (float | "auto")."""
+        if val == cls.SEC_AUTO:
+            return "auto"
+        return val
+
+    @staticmethod
+    def _angle_to_float(angle) -> float:
+        """Angle (float | str | None) to float32 value."""
+        if angle is None:
+            return math.nan
+        if angle == "max":
+            return math.inf
+        if angle == "min":
+            return -math.inf
+        if angle == "center":
+            return 0.0
+        return float(angle)
+
+    @staticmethod
+    def _float_to_angle(val: float):
+        """float32 value to angle (float | str | None)."""
+        if math.isnan(val):
+            return None
+        if val == math.inf:
+            return "max"
+        if val == -math.inf:
+            return "min"
+        return val
+
+    @classmethod
+    def encode(cls, cmd_data: dict) -> bytes:
+        """Encode a command.
+
+        Raises:
+            ValueError: バイナリに変換できないコマンド
+        """
+        _op = cls.OPCODE.get(cmd_data.get("cmd", ""))
+        if _op is None:
+            raise ValueError(f"unsupported command: {cmd_data}")
+
+        try:
+            if _op in (cls.OP_MOVE, cls.OP_MOVE_RELATIVE):
+                _key = "angles" if _op == cls.OP_MOVE else "angle_diffs"
+                _vals = cmd_data[_key]
+                _payload = cls.MOVE_PARAMS.pack(
+                    cls._sec_to_float(cmd_data.get("move_sec")),
+                    cmd_data.get("step_n") or 0,
+                ) + struct.pack(
+                    f"<{len(_vals)}f",
+                    *[cls._angle_to_float(_a) for _a in _vals]
+                )
+
+            elif _op == cls.OP_MOVE_ANGLES:
+                _vals = cmd_data["angles"]
+                _payload = struct.pack(
+                    f"<{len(_vals)}f",
+                    *[cls._angle_to_float(_a) for _a in _vals]
+                )
+
+            elif _op == cls.OP_MOVE_PULSES_RELATIVE:
+                _vals = cmd_data["pulse_diffs"]
+                _payload = struct.pack(
+                    f"<{len(_vals)}h", *[int(_p or 0) for _p in _vals]
+                )
+
+            elif _op == cls.OP_MOVE_SEC:
+                _payload = cls.SEC.pack(cls._sec_to_float(cmd_data["sec"]))
+
+            elif _op in (cls.OP_INTERVAL, cls.OP_SLEEP):
+                _payload = cls.SEC.pack(float(cmd_data["sec"]))
+
+            elif _op == cls.OP_STEP_N:
+                _payload = cls.STEP_N.pack(int(cmd_data["n"]))
+
+            elif _op == cls.OP_SET:
+                _payload = cls.SET.pack(
+                    int(cmd_data["servo"]),
+                    cls.SET_TARGETS.index(cmd_data["target"])
+                )
+
+            elif _op == cls.OP_FOLLOW:
+                _payload = cls.FOLLOW.pack(
+                    cls._opt_float(cmd_data.get("sec")),
+                    cls._opt_float(cmd_data.get("tick")),
+                    cls._opt_float(cmd_data.get("max_age")),
+                )
+
+            else:  # OP_CANCEL
+                _payload = b""
+
+        except (KeyError, TypeError, struct.error) as _e:
+            raise ValueError(
+                f"{type(_e).__name__}: {_e}: {cmd_data}"
+            ) from _e
+
+        return cls.HDR.pack(cls.VERSION, _op, len(_payload)) + _payload
+
+    @classmethod
+    def encode_list(cls, cmd_list) -> bytes:
+        """Encode commands."""
+        return b"".join(cls.encode(_c) for _c in cmd_list)
+
+    @classmethod
+    def decode(cls, buf, offset: int = 0) -> tuple[dict, int]:
+        """Decode a command at `offset`.
+
+        Returns:
+            tuple[dict, int]: コマンドと、次のフレームのオフセット
+
+        Raises:
+            ValueError: 不正なフレーム
+        """
+        if len(buf) - offset < cls.HDR.size:
+            raise ValueError(f"truncated header: offset={offset}")
+
+        _version, _op, _len = cls.HDR.unpack_from(buf, offset)
+        if _version != cls.VERSION:
+            raise ValueError(f"unsupported version: {_version}")
+
+        offset += cls.HDR.size
+        _end = offset + _len
+        if _end > len(buf):
+            raise ValueError(f"truncated payload: offset={offset}")
+
+        _name = cls.CMD_NAME.get(_op)
+        if _name is None:
+            raise ValueError(f"unknown opcode: {_op}")
+
+        # ペイロード長は、opcodeで決まる
+        _fixed, _item = cls.PAYLOAD_SIZE[_op]
+        if (
+            _len < _fixed
+            or (_item == 0 and _len != _fixed)
+            or (_item and (_len - _fixed) % _item)
+        ):
+            raise ValueError(
+                f"invalid payload length: opcode={_op}, len={_len}"
+            )
+        _n = (_len - _fixed) // _item if _item else 0
+
+        _cmd: dict = {"cmd": _name}
+        try:
+            if _op in (cls.OP_MOVE, cls.OP_MOVE_RELATIVE):
+                _move_sec, _step_n = cls.MOVE_PARAMS.unpack_from(buf, offset)
+                _vals = struct.unpack_from(
+                    f"<{_n}f", buf, offset + cls.MOVE_PARAMS.size
+                )
+                if _op == cls.OP_MOVE:
+                    _cmd["angles"] = [cls._float_to_angle(_v) for _v in _vals]
+                else:
+                    _cmd["angle_diffs"] = list(_vals)
+                if not math.isnan(_move_sec):
+                    _cmd["move_sec"] = cls._float_to_sec(_move_sec)
+                if _step_n:
+                    _cmd["step_n"] = _step_n
+
+            elif _op == cls.OP_MOVE_ANGLES:
+                _vals = struct.unpack_from(f"<{_n}f", buf, offset)
+                _cmd["angles"] = [cls._float_to_angle(_v) for _v in _vals]
+
+            elif _op == cls.OP_MOVE_PULSES_RELATIVE:
+                _vals = struct.unpack_from(f"<{_n}h", buf, offset)
+                _cmd["pulse_diffs"] = list(_vals)
+
+            elif _op == cls.OP_MOVE_SEC:
+                (_sec,) = cls.SEC.unpack_from(buf, offset)
+                _cmd["sec"] = cls._float_to_sec(_sec)
+
+            elif _op in (cls.OP_INTERVAL, cls.OP_SLEEP):
+                (_cmd["sec"],) = cls.SEC.unpack_from(buf, offset)
+
+            elif _op == cls.OP_STEP_N:
+                (_cmd["n"],) = cls.STEP_N.unpack_from(buf, offset)
+
+            elif _op == cls.OP_SET:
+                _servo, _target = cls.SET.unpack_from(buf, offset)
+                _cmd["servo"] = _servo
+                _cmd["target"] = cls.SET_TARGETS[_target]
+
+            elif _op == cls.OP_FOLLOW:
+                for _key, _val in zip(
+                    ("sec", "tick", "max_age"),
+                    cls.FOLLOW.unpack_from(buf, offset)
+                ):
+                    if not math.isnan(_val):
+                        _cmd[_key] = _val
+
+        except (IndexError, struct.error) as _e:
+            raise ValueError(f"invalid payload: opcode={_op}: {_e}") from _e
+
+        if offset + _fixed + _n * _item != _end:
+            raise ValueError(f"invalid payload: opcode={_op}")
+        return _cmd, _end
+
+    @classmethod
+    def decode_all(cls, buf) -> list[dict]:
+        """Decode all commands in `buf`."""
+        _cmds = []
+        _offset = 0
+        while _offset < len(buf):
+            _cmd, _offset = cls.decode(buf, _offset)
+            _cmds.append(_cmd)
+        return _cmds
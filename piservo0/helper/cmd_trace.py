@@ -0,0 +1,340 @@
+#
+# (c) 2025 Yoichi Tanibayashi
+#
+import json
+import os
+import struct
+import threading
+import time
+from typing import Iterable, Iterator, NamedTuple
+
+from ..utils.clock import Clock
+from ..utils.my_logger import get_logger
+
+MAGIC = b"PST0"
+VERSION = 1
+
+# file header: magic(4s), version(H), pad(H), 作成時刻(d: time.time())
+FILE_HDR = struct.Struct("<4sHHd")
+
+# record: kind(B), timestamp(d: `TraceRecorder.clock`) + 種類ごとのデータ
+REC_HDR = struct.Struct("<Bd")
+REC_CMD = struct.Struct("<II")  # cmd_id, payload length (JSON)
+REC_PULSE = struct.Struct("<BH")  # pin, pulse
+
+KIND_CMD = ord("C")
+KIND_PULSE = ord("P")
+
+
+class TraceCmd(NamedTuple):
+    """Command record: ワーカーが実行を開始したコマンド"""
+
+    t: float
+    cmd_id: int
+    cmd_data: dict | str
+
+
+class TracePulse(NamedTuple):
+    """Pulse record: バックエンドに出力したパルス幅"""
+
+    t: float
+    pin: int
+    pulse: int
+
+
+class TraceRecorder:
+    """Binary trace recorder (append-only, rotating).
+
+    ワーカーが実行したコマンドと、出力したパルス幅を、
+    タイムスタンプ付きで、バイナリファイルに追記する。
+
+    * コマンド: `ThreadWorker`(`trace=`)から`record_cmd()`
+    * パルス: `TracePi`でラップしたバックエンドから`record_pulse()`
+
+    タイムスタンプは、どちらも`clock`(`Clock`)の時刻。
+    (省略時は、`time.monotonic()`)
+    `SimClock`で動かす場合は、`MultiServo`と同じものを渡すこと。
+
+    ファイルサイズが`max_bytes`を超えたら、`logging.RotatingFileHandler`
+    と同様に、`FILE.1`, `FILE.2`, .. にローテートする。
+    (`max_bytes=0`の場合は、ローテートしない)
+
+    記録中のファイルも`read_trace()`で読めるように、`flush_n`レコードごとと、
+    `flush_sec`秒ごと(バックグラウンドのスレッド)に、ファイルに書き出す。
+    (それぞれ、0の場合は、行わない)
+
+    複数のスレッドから呼び出してもよい。
+    """
+
+    DEF_MAX_BYTES = 16 * 1024 * 1024
+    DEF_BACKUP_N = 3
+    DEF_FLUSH_N = 100  # records
+    DEF_FLUSH_SEC = 0.2  # sec
+
+    def __init__(
+        self,
+        path: str,
+        max_bytes: int = DEF_MAX_BYTES,
+        backup_n: int = DEF_BACKUP_N,
+        flush_n: int = DEF_FLUSH_N,
+        flush_sec: float = DEF_FLUSH_SEC,
+        clock: Clock | None = None,
+        debug: bool = False,
+    ):
+        """Constructor."""
+        self._debug = debug
+        self.__log = get_logger(self.__class__.__name__, self._debug)
+        self.__log.debug(
+            "path=%s, max_bytes=%s, backup_n=%s, flush_n=%s, flush_sec=%s",
+            path, max_bytes, backup_n, flush_n, flush_sec
+        )
+
+        self.path = os.path.expanduser(path)
+        self.max_bytes = max_bytes
+        self.backup_n = backup_n
+        self.flush_n = flush_n
+        self.flush_sec = flush_sec
+        self.clock = Clock() if clock is None else clock
+
+        self.rec_n = 0
+
+        self._lock = threading.Lock()
+        self._open()
+
+        self._closed = threading.Event()
+        self._flusher: threading.Thread | None = None
+        if flush_sec > 0:
+            self._flusher = threading.Thread(
+                target=self._flush_loop, daemon=True
+            )
+            self._flusher.start()
+
+    def _open(self):
+        """Open the trace file (append)."""
+        self._file = open(self.path, "ab")
+        self._size = self._file.tell()
+        if self._size == 0:
+            self._file.write(FILE_HDR.pack(MAGIC, VERSION, 0, time.time()))
+            self._file.flush()
+            self._size = FILE_HDR.size
+        self._unflushed_n = 0
+
+    def _rotate(self):
+        """Rotate trace files."""
+        self.__log.debug("size=%s", self._size)
+        self._file.close()
+
+        for _i in range(self.backup_n - 1, 0, -1):
+            _src = f"{self.path}.{_i}"
+            if os.path.exists(_src):
+                os.replace(_src, f"{self.path}.{_i + 1}")
+        if self.backup_n > 0:
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.unlink(self.path)
+
+        self._open()
+
+    def _write(self, data: bytes):
+        """Write a record (with lock)."""
+        with self._lock:
+            if (
+                self.max_bytes > 0
+                and self._size + len(data) > self.max_bytes
+                and self._size > FILE_HDR.size
+            ):
+                self._rotate()
+
+            self._file.write(data)
+            self._size += len(data)
+            self.rec_n += 1
+
+            self._unflushed_n += 1
+            if self.flush_n > 0 and self._unflushed_n >= self.flush_n:
+                self._flush()
+
+    def _flush(self):
+        """Flush. (without lock)"""
+        if self._unflushed_n > 0:
+            self._file.flush()
+            self._unflushed_n = 0
+
+    def _flush_loop(self):
+        """Flush every `flush_sec` until `close()`."""
+        while not self._closed.wait(self.flush_sec):
+            self.flush()
+
+    def record_cmd(self, cmd_id: int, cmd_data, t: float | None = None):
+        """Record a command."""
+        if t is None:
+            t = self.clock.now()
+
+        if isinstance(cmd_data, str):
+            _payload = cmd_data.encode("utf-8")
+        else:
+            _payload = json.dumps(cmd_data, separators=(",", ":")).encode(
+                "utf-8"
+            )
+
+        self._write(
+            REC_HDR.pack(KIND_CMD, t)
+            + REC_CMD.pack(cmd_id, len(_payload))
+            + _payload
+        )
+
+    def record_pulse(self, pin: int, pulse: int, t: float | None = None):
+        """Record a pulse."""
+        if t is None:
+            t = self.clock.now()
+
+        self._write(
+            REC_HDR.pack(KIND_PULSE, t) + REC_PULSE.pack(pin, int(pulse))
+        )
+
+    def flush(self):
+        """Flush."""
+        with self._lock:
+            self._flush()
+
+    def close(self):
+        """Close."""
+        self.__log.debug("rec_n=%s", self.rec_n)
+        self._closed.set()
+        if self._flusher is not None:
+            self._flusher.join()
+        with self._lock:
+            self._file.close()
+
+
+class TracePi:
+    """Backend proxy that records pulses to `TraceRecorder`.
+
+    `pigpio.pi`などのバックエンドをラップし、
+    `set_servo_pulsewidth()`を記録してから、バックエンドに渡す。
+    それ以外の属性は、そのままバックエンドに委譲する。
+    """
+
+    def __init__(self, pi, recorder: TraceRecorder):
+        """Constructor."""
+        self._pi = pi
+        self._recorder = recorder
+
+    def set_servo_pulsewidth(self, pin, pulse):
+        """Record and set pulse width."""
+        self._recorder.record_pulse(pin, pulse)
+        return self._pi.set_servo_pulsewidth(pin, pulse)
+
+    def __getattr__(self, name):
+        """Delegate to the backend."""
+        return getattr(self._pi, name)
+
+
+def read_trace(path: str) -> Iterator[TraceCmd | TracePulse]:
+    """Read records from a trace file.
+
+    書き込み途中で途切れた最後のレコードは、無視する。
+
+    Raises:
+        ValueError: トレースファイルではない。
+    """
+    with open(os.path.expanduser(path), "rb") as _f:
+        _hdr = _f.read(FILE_HDR.size)
+        if len(_hdr) < FILE_HDR.size:
+            raise ValueError(f"not a trace file: {path}")
+        _magic, _version, _, _ = FILE_HDR.unpack(_hdr)
+        if _magic != MAGIC or _version != VERSION:
+            raise ValueError(f"not a trace file: {path}")
+
+        while True:
+            _rec = _f.read(REC_HDR.size)
+            if len(_rec) < REC_HDR.size:
+                return
+            _kind, _t = REC_HDR.unpack(_rec)
+
+            if _kind == KIND_PULSE:
+                _data = _f.read(REC_PULSE.size)
+                if len(_data) < REC_PULSE.size:
+                    return
+                yield TracePulse(_t, *REC_PULSE.unpack(_data))
+
+            elif _kind == KIND_CMD:
+                _data = _f.read(REC_CMD.size)
+                if len(_data) < REC_CMD.size:
+                    return
+                _cmd_id, _len = REC_CMD.unpack(_data)
+                _payload = _f.read(_len)
+                if len(_payload) < _len:
+                    return
+
+                _text = _payload.decode("utf-8")
+                try:
+                    _cmd_data = json.loads(_text)
+                except json.JSONDecodeError:
+                    _cmd_data = _text
+                yield TraceCmd(_t, _cmd_id, _cmd_data)
+
+            else:
+                raise ValueError(f"{path}: invalid record kind: {_kind}")
+
+
+class TraceReplayer:
+    """Replay pulses in trace records.
+
+    記録されたパルス幅を、記録されたタイミングで、バックエンドに出力する。
+    同じトレースからは、常に同じパルス列が出力される。
+
+    `speed`: 再生速度(倍)。0以下の場合は、待たずに最速で出力する。
+    """
+
+    DEF_SPEED = 1.0
+
+    def __init__(self, pi, speed: float = DEF_SPEED, debug: bool = False):
+        """Constructor."""
+        self._debug = debug
+        self.__log = get_logger(self.__class__.__name__, self._debug)
+        self.__log.debug("speed=%s", speed)
+
+        self.pi = pi
+        self.speed = speed
+
+    def replay(
+        self, records: Iterable[TraceCmd | TracePulse], stop_event=None
+    ) -> int:
+        """Replay records.
+
+        Args:
+            records: トレースのレコード (`read_trace()`)
+            stop_event (threading.Event | None): セットされたら中断する。
+
+        Returns:
+            int: 出力したパルスの数
+        """
+        _pulse_n = 0
+        _t0_rec: float | None = None
+        _t0 = time.monotonic()
+
+        for _rec in records:
+            if stop_event is not None and stop_event.is_set():
+                break
+
+            if _t0_rec is None:
+                _t0_rec = _rec.t
+
+            if self.speed > 0:
+                _sleep_sec = (
+                    _t0 + (_rec.t - _t0_rec) / self.speed - time.monotonic()
+                )
+                if _sleep_sec > 0:
+                    if stop_event is None:
+                        time.sleep(_sleep_sec)
+                    elif stop_event.wait(_sleep_sec):
+                        break
+
+            if isinstance(_rec, TracePulse):
+                self.pi.set_servo_pulsewidth(_rec.pin, _rec.pulse)
+                _pulse_n += 1
+            else:
+                self.__log.debug("id=%s, cmd=%s", _rec.cmd_id, _rec.cmd_data)
+
+        self.__log.debug("pulse_n=%s", _pulse_n)
+        return _pulse_n
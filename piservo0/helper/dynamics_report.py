@@ -0,0 +1,230 @@
+#
+# (c) 2025 Yoichi Tanibayashi
+#
+"""dynamics_report.py"""
+import math
+import os
+import tempfile
+
+from ..backend.sim_pi import ServoModel, SimPi
+from ..core.multi_servo import MultiServo
+from ..core.piservo import PiServo
+from ..utils.clock import SimClock
+from ..utils.my_logger import get_logger
+from ..utils.servo_config_manager import ServoConfigManager
+from .str_cmd_to_json import StrCmdToJson
+from .thread_worker import ThreadWorker
+
+
+class DynamicsReport:
+    """Run a script on the dynamics simulator and flag physical limits.
+
+    `SimClock`と`SimPi`の上で、`ThreadWorker`にスクリプトを実行させ、
+    移動コマンドごとに、指令した動きと、ホーンの実際の動きを比べる。
+    (待ち時間なしで実行するので、長いスクリプトもすぐに終わる)
+
+    **移動コマンドごとの値**
+
+    * `delta_usec`: パルス幅の最大の変化量
+    * `sec`: コマンドの実行時間 (インターバルを含む)
+    * `min_sec`: 速度の上限で動いた場合に必要な時間
+    * `error_usec`: コマンドの終了時点の、指令と実際の位置の最大の差
+    * `settle_sec`: 終了後、実際に目標に届くまでの時間
+    * `useful_step_n`: 一歩が不感帯を超える、最大のステップ数
+
+    **フラグ**
+
+    * `too_fast`: 速度の上限を超えている (`sec` < `min_sec`)。
+      ホーンは追いつけず、動きが途中で切られる。
+    * `extra_steps`: `step_n`が`useful_step_n`より多い。
+      不感帯より小さい一歩は、動きにならない。
+
+    解釈できないコマンドや、ワーカーが受け付けないコマンドは、
+    実行せずに`errors`に記録する。
+    """
+
+    MOVE_CMDS = ("move", "move_all_angles_sync", "move_all_angles")
+
+    def __init__(
+        self,
+        pins,
+        model: ServoModel = ServoModel(),
+        conf_file: str | None = None,
+        debug=False,
+    ):
+        """Constructor.
+
+        Args:
+            pins: GPIOピン
+            model: サーボのモデル
+            conf_file: キャリブレーション設定ファイル
+                (Noneの場合は、キャリブレーションしていない値)
+        """
+        self._debug = debug
+        self.__log = get_logger(self.__class__.__name__, self._debug)
+        self.__log.debug(
+            "pins=%s, model=%s, conf_file=%s", pins, model, conf_file
+        )
+
+        self.pins = list(pins)
+        self.model = model
+        self.conf_file = conf_file
+
+    def make_cmds(self, script) -> list[dict]:
+        """Script (str or list of dict) to commands."""
+        if isinstance(script, str):
+            return StrCmdToJson(
+                [1] * len(self.pins), cache_size=0
+            ).cmd_data_list(script)
+        return list(script)
+
+    def run(self, script) -> dict:
+        """Run the script.
+
+        Args:
+            script (str | list[dict]): 文字列コマンド または JSONコマンド
+
+        Returns:
+            dict: {"moves": [...], "errors": [...], "summary": {...}}
+        """
+        with tempfile.TemporaryDirectory() as _tmpdir:
+            _conf_file = self.conf_file
+            if _conf_file is None:
+                _conf_file = os.path.join(_tmpdir, "servo.json")
+                ServoConfigManager(_conf_file).save_all_configs([
+                    {
+                        "pin": _pin, "min": PiServo.MIN,
+                        "center": PiServo.CENTER, "max": PiServo.MAX,
+                    }
+                    for _pin in self.pins
+                ])
+
+            _clock = SimClock()
+            _pi = SimPi(_clock, self.model, debug=self._debug)
+            _mservo = MultiServo(
+                _pi, self.pins, conf_file=_conf_file, clock=_clock,
+                debug=self._debug
+            )
+            _worker = ThreadWorker(_mservo, debug=self._debug)
+            _moves: list[dict] = []
+            _errors: list[dict] = []
+            _worker.start()
+            try:
+                for _i, _cmd in enumerate(self.make_cmds(script)):
+                    if "err" in _cmd:  # 文字列コマンドの解釈エラー
+                        _errors.append(
+                            {"index": _i, "cmd": _cmd, "err": _cmd["err"]}
+                        )
+                        continue
+                    try:
+                        _m = self._run_cmd(_worker, _pi, _i, _cmd)
+                    except ValueError as _e:
+                        _errors.append(
+                            {"index": _i, "cmd": _cmd, "err": str(_e)}
+                        )
+                        continue
+                    if _m is not None:
+                        _moves.append(_m)
+            finally:
+                _worker.end()
+
+        return {
+            "moves": _moves,
+            "errors": _errors,
+            "summary": {
+                "sec": round(_clock.now(), 6),
+                "move_n": len(_moves),
+                "error_n": len(_errors),
+                "too_fast_n": sum(_m["too_fast"] for _m in _moves),
+                "extra_step_n": sum(
+                    max(_m["step_n"] - _m["useful_step_n"], 0)
+                    for _m in _moves
+                ),
+                "max_settle_sec": max(
+                    [_m["settle_sec"] for _m in _moves], default=0.0
+                ),
+            },
+        }
+
+    def _run_cmd(self, worker, pi: SimPi, index: int, cmd: dict):
+        """Run a command, and check it if it is a move command."""
+        _name = cmd.get("cmd")
+        if _name not in self.MOVE_CMDS:
+            worker.send(cmd).result()
+            return None
+
+        _step_n = 1
+        if _name != "move_all_angles":
+            _step_n = cmd.get("step_n") or worker.step_n
+
+        _before = [pi.get_servo_pulsewidth(_p) for _p in self.pins]
+        _t0 = pi.clock.now()
+        worker.send(cmd).result()
+        _sec = pi.clock.now() - _t0
+        _after = [pi.get_servo_pulsewidth(_p) for _p in self.pins]
+
+        _delta = max(
+            [abs(_a - _b) for _a, _b in zip(_after, _before) if _a and _b],
+            default=0,
+        )
+        _error = max(
+            [
+                abs(_a - (pi.actual_pulse(_p) or _a))
+                for _p, _a in zip(self.pins, _after)
+                if _a
+            ],
+            default=0.0,
+        )
+        _min_sec = _delta / self.model.max_speed
+        _useful_step_n = max(
+            math.ceil(_delta / max(self.model.deadband_usec, 1.0)), 1
+        )
+
+        return {
+            "index": index,
+            "cmd": cmd,
+            "step_n": _step_n,
+            "delta_usec": _delta,
+            "sec": round(_sec, 6),
+            "min_sec": round(_min_sec, 6),
+            "error_usec": round(_error, 1),
+            "settle_sec": round(
+                max(pi.settle_sec(_p) for _p in self.pins), 6
+            ),
+            "useful_step_n": _useful_step_n,
+            "too_fast": _sec < _min_sec,
+            "extra_steps": _step_n > _useful_step_n,
+        }
+
+    @staticmethod
+    def report(result: dict) -> str:
+        """Human readable report."""
+        _lines = [
+            "  #  delta[us]  sec      min_sec  error[us] settle   "
+            "step_n(useful)  flags"
+        ]
+        for _m in result["moves"]:
+            _flags = [
+                _f for _f in ("too_fast", "extra_steps") if _m[_f]
+            ]
+            _lines.append(
+                f"{_m['index']:3}  {_m['delta_usec']:8}  "
+                f"{_m['sec']:7.3f}  {_m['min_sec']:7.3f}  "
+                f"{_m['error_usec']:8.1f}  {_m['settle_sec']:7.3f}  "
+                f"{_m['step_n']:4}({_m['useful_step_n']:4})     "
+                f"{' '.join(_flags)}"
+            )
+
+        for _e in result.get("errors", []):
+            _lines.append(f"{_e['index']:3}  error: {_e['err']}")
+
+        _sum = result["summary"]
+        _lines += [
+            "",
+            f"sec: {_sum['sec']}, moves: {_sum['move_n']}, "
+            f"errors: {_sum.get('error_n', 0)}, "
+            f"too_fast: {_sum['too_fast_n']}, "
+            f"extra steps: {_sum['extra_step_n']}, "
+            f"max settle: {_sum['max_settle_sec']} sec",
+        ]
+        return "\n".join(_lines)
@@ -0,0 +1,403 @@
+#
+# (c) 2025 Yoichi Tanibayashi
+#
+import itertools
+import json
+import multiprocessing
+import time
+
+from ..backend.factory import BACKEND_PIGPIO, attach_pi, open_pi
+from ..core.calibrable_servo import CalibrableServo
+from ..core.multi_servo import MultiServo
+from ..utils.my_logger import get_logger
+from .cmd_trace import TracePi, TraceRecorder
+from .shm_cmd_ring import ShmCmdRing
+from .shm_target_pose import ShmTargetPose
+from .thread_worker import CmdFuture, ThreadWorker, WorkerStatus
+
+POLL_SEC = 0.005  # ワーカーのキューが空くのを確認する間隔
+PUBLISH_SEC = 0.05  # ワーカーの状態・メトリクスを共有メモリに書く間隔
+
+
+def publish_stats(ring: ShmCmdRing, worker: ThreadWorker) -> bool:
+    """Write the status and metrics of `worker` to the stats area.
+
+    (see `ProcessWorker.status`, `ProcessWorker.get_metrics()`)
+    """
+    _stats = {
+        "status": worker.status._asdict(),
+        "metrics": worker.get_metrics(),
+    }
+    return ring.put_stats(
+        json.dumps(_stats, separators=(",", ":")).encode("utf-8")
+    )
+
+
+def hw_process_main(
+    ring_name: str,
+    pins: list[int],
+    conf_file: str = CalibrableServo.DEF_CONF_FILE,
+    target_pose_name: str | None = None,
+    trace_file: str | None = None,
+    debug: bool = False,
+    backend: str = BACKEND_PIGPIO,
+    qsize_max: int = 2,
+):
+    """Main function of the hardware process.
+
+    `MultiServo`と`ThreadWorker`を、このプロセスの中で動かし、
+    リングバッファから受け取ったコマンドを、`ThreadWorker`に渡す。
+    リングバッファが`shutdown()`されたら、残りのコマンドを渡して終了する。
+
+    `ThreadWorker`のキューが`qsize_max`未満の間だけ、リングバッファから
+    取り出す。(ロボットが遅れると、リングバッファが満杯になり、
+    `ProcessWorker.send()`が失敗する: APIへの背圧)
+    キャンセル要求(`ShmCmdRing.cancel()`)は、順番を待たずに処理する。
+
+    `ThreadWorker`の状態とメトリクスは、変化があれば`PUBLISH_SEC`ごとに
+    リングバッファのstats領域に書き込む。(see `publish_stats()`)
+
+    `target_pose_name`を指定した場合は、その`ShmTargetPose`に接続する。
+    `trace_file`を指定した場合は、コマンドとパルスを記録する。
+    `backend`は、出力先。(see `open_pi()`)
+    """
+    __log = get_logger(__name__, debug)
+    __log.debug("ring_name=%s, pins=%s", ring_name, pins)
+
+    ring = ShmCmdRing(ring_name, untrack=False, debug=debug)
+    ring.open_reader()
+
+    pi = open_pi(backend, debug=debug)
+    if not pi.connected:
+        __log.error("pigpio daemon not connected.")
+        ring.close()
+        return
+
+    trace = None
+    _pi = pi
+    if trace_file:
+        trace = TraceRecorder(trace_file, debug=debug)
+        pi = TracePi(pi, trace)
+
+    mservo = MultiServo(pi, pins, conf_file=conf_file)
+    attach_pi(_pi, mservo)
+
+    target_pose = None
+    if target_pose_name:
+        target_pose = ShmTargetPose(name=target_pose_name, untrack=False)
+        mservo.attach_target_pose(target_pose)
+
+    worker = ThreadWorker(mservo, trace=trace, debug=debug)
+    worker.start()
+    publish_stats(ring, worker)
+    _pub_seq = worker.status.seq
+    _pub_t = time.monotonic()
+
+    try:
+        while True:
+            _canceled = ring.take_cancel()
+            if _canceled is not None:
+                _count = worker.clear_cmdq()
+                __log.debug("cancel: ring=%s, worker=%s", _canceled, _count)
+
+            if ring.take_reset():
+                worker.reset_metrics()
+                _pub_seq = None  # すぐに書き込む
+
+            _now = time.monotonic()
+            if worker.status.seq != _pub_seq and (
+                _pub_seq is None or _now - _pub_t >= PUBLISH_SEC
+            ):
+                _pub_seq = worker.status.seq
+                _pub_t = _now
+                publish_stats(ring, worker)
+
+            if ring.closed:
+                for _rec in ring.get(timeout=0.0):
+                    worker.send(_rec.decode("utf-8"))
+                break
+
+            _room = qsize_max - worker.qsize()
+            if _room <= 0:
+                # ワーカーのキューが空くか、キャンセル要求を待つ
+                ring.wait(POLL_SEC)
+                continue
+
+            for _rec in ring.get(_room, timeout=PUBLISH_SEC):
+                worker.send(_rec.decode("utf-8"))
+
+    except KeyboardInterrupt:
+        pass
+
+    finally:
+        worker.end()
+        mservo.off()
+        pi.stop()
+        ring.close()
+        if target_pose:
+            target_pose.close()
+        if trace:
+            trace.close()
+        __log.debug("done")
+
+
+class ProcessWorker:
+    """Hardware worker in a dedicated process.
+
+    `MultiServo`と`ThreadWorker`を専用のプロセスで動かし、
+    共有メモリ上のリングバッファ(`ShmCmdRing`)でコマンドを渡す。
+
+    APIサーバーなどのプロセスとGILを共有しないので、
+    JSONのパースなどの負荷が、サーボのステップ動作を遅らせない。
+
+    `send()`は、`ThreadWorker`と同様に`CmdFuture`を返すが、
+    コマンドがリングバッファに書き込まれた時点で完了する。
+    (プロセスをまたいだ、実行完了の追跡は行わない)
+
+    ハードウェアプロセスは、`ThreadWorker`のキューが`hw_qsize_max`未満の
+    間だけ、リングバッファから取り出す。ロボットが遅れると、
+    リングバッファが満杯になり、`send()`は`BufferError`になる。
+    `cancel`コマンドは、リングバッファに入れずに、`ShmCmdRing.cancel()`で
+    すぐに伝える。
+
+    `status`(`WorkerStatus`)と`get_metrics()`は、ハードウェアプロセスが
+    `PUBLISH_SEC`ごとに共有メモリに書き込んだ、`ThreadWorker`のもの。
+    (`qsize`は、リングバッファと`ThreadWorker`のキューの合計)
+    まだ書き込まれていない場合、分からない値はNone。
+
+    `ring_name`を指定した場合は、起動済みのハードウェアプロセスの
+    リングバッファに接続するだけで、プロセスは起動しない。
+    (複数のHTTPワーカープロセスから、一つのハードウェアプロセスに送る)
+    接続したリングバッファは、`end()`で閉じるだけで、削除しない。
+    """
+
+    CMD_CANCEL = "cancel"
+
+    DEF_JOIN_TIMEOUT = 5.0  # sec
+    DEF_HW_QSIZE_MAX = 2  # ハードウェアプロセスの`ThreadWorker`のキュー
+
+    def __init__(
+        self,
+        pins: list[int],
+        conf_file: str = CalibrableServo.DEF_CONF_FILE,
+        slot_n: int = ShmCmdRing.DEF_SLOT_N,
+        slot_size: int = ShmCmdRing.DEF_SLOT_SIZE,
+        target_pose_name: str | None = None,
+        trace_file: str | None = None,
+        ring_name: str | None = None,
+        backend: str = BACKEND_PIGPIO,
+        ring_untrack: bool = True,
+        hw_qsize_max: int = DEF_HW_QSIZE_MAX,
+        debug: bool = False,
+    ):
+        """Constructor.
+
+        `target_pose_name`: ハードウェアプロセスが接続する`ShmTargetPose`
+        `trace_file`: ハードウェアプロセスが記録するトレースファイル
+        `ring_name`: 接続する既存のリングバッファ (プロセスを起動しない)
+        `backend`: ハードウェアプロセスの出力先 (see `open_pi()`)
+        `ring_untrack`: `ring_name`のリングバッファに接続するときの
+        `ShmCmdRing`の`untrack`
+        `hw_qsize_max`: ハードウェアプロセスの`ThreadWorker`のキューの上限
+        """
+        self._debug = debug
+        self.__log = get_logger(self.__class__.__name__, self._debug)
+        self.__log.debug(
+            "pins=%s, conf_file=%s, slot_n=%s, slot_size=%s",
+            pins, conf_file, slot_n, slot_size
+        )
+
+        self.pins = pins
+
+        if ring_name:
+            self.ring = ShmCmdRing(
+                ring_name, untrack=ring_untrack, debug=debug
+            )
+        else:
+            self.ring = ShmCmdRing(
+                create=True, slot_n=slot_n, slot_size=slot_size, debug=debug
+            )
+
+        self._cmd_id = itertools.count(1)
+
+        # `ShmCmdRing.get_stats()`のキャッシュ: (seq, stats)
+        self._stats: tuple[int, dict | None] = (0, None)
+
+        self._proc = None
+        if ring_name:
+            return
+
+        _ctx = multiprocessing.get_context("spawn")
+        self._proc = _ctx.Process(
+            target=hw_process_main,
+            args=(
+                self.ring.name, pins, conf_file,
+                target_pose_name, trace_file, debug, backend, hw_qsize_max
+            ),
+            name="piservo0-hw",
+            daemon=True,
+        )
+
+    @property
+    def ring_name(self) -> str:
+        """Name of the command ring buffer."""
+        return self.ring.name
+
+    @property
+    def attached(self) -> bool:
+        """`True` if attached to an existing ring (no process)."""
+        return self._proc is None
+
+    def start(self):
+        """Start the hardware process."""
+        self.__log.debug("")
+        if self._proc is not None:
+            self._proc.start()
+
+    def is_alive(self) -> bool:
+        """`True` if the hardware process is alive."""
+        if self._proc is None:
+            return not self.ring.closed
+        return self._proc.is_alive()
+
+    def end(self):
+        """Stop the hardware process.
+
+        接続しただけの場合は、リングバッファを閉じるだけ。
+        """
+        self.__log.debug("")
+        if self._proc is None:
+            self.ring.close()
+            return
+
+        self.ring.shutdown()
+        if self._proc.is_alive():
+            self._proc.join(self.DEF_JOIN_TIMEOUT)
+        if self._proc.is_alive():
+            self.__log.warning("hardware process does not stop: terminate")
+            self._proc.terminate()
+            self._proc.join()
+        self.ring.close()
+        self.__log.debug("done")
+
+    def send(self, cmd_data) -> CmdFuture:
+        """send
+
+        Args:
+            cmd_data (dict | str): コマンド(dict または JSON文字列)
+
+        Returns:
+            CmdFuture: リングバッファへの書き込みが完了したFuture。
+                満杯の場合は、`BufferError`が設定される。
+                `cancel`コマンドの`count`は、リングバッファで捨てられる
+                コマンドの数。(ハードウェアプロセスのキューの分は含まない)
+        """
+        _fut = CmdFuture(next(self._cmd_id), cmd_data)
+        _fut.set_running_or_notify_cancel()
+        try:
+            if isinstance(cmd_data, str):
+                cmd_data = json.loads(cmd_data)
+                _fut.cmd_data = cmd_data
+
+            if cmd_data.get("cmd") == self.CMD_CANCEL:
+                cmd_data["count"] = self.ring.cancel()
+                _fut.set_result(_fut.make_result())
+                return _fut
+
+            _payload = json.dumps(cmd_data, separators=(",", ":"))
+            if not self.ring.put(_payload.encode("utf-8")):
+                raise BufferError("command ring is full")
+
+            self.__log.debug(
+                "id=%s, cmd_data=%s, qsize=%s",
+                _fut.cmd_id, cmd_data, self.ring.qsize()
+            )
+
+        except Exception as _e:
+            self.__log.error("%s: %s", type(_e).__name__, _e)
+            _fut.set_exception(_e)
+            return _fut
+
+        _fut.set_result(_fut.make_result())
+        return _fut
+
+    def clear_cmdq(self) -> int:
+        """Cancel commands. (see `ShmCmdRing.cancel()`)
+
+        Returns:
+            int: リングバッファで捨てられるコマンドの数
+        """
+        self.__log.debug("")
+        return self.ring.cancel()
+
+    def cancel_cmds(self) -> int:
+        """Alias of clear_cmdq()."""
+        return self.clear_cmdq()
+
+    def _get_stats(self) -> dict | None:
+        """Get the stats of the hardware process. (see `publish_stats()`)
+
+        Returns:
+            dict | None: {"status": ..., "metrics": ...}。
+                まだ書き込まれていない場合は、None。
+        """
+        _seq, _stats = self._stats
+        if self.ring.stats_seq == _seq:
+            return _stats
+
+        _res = self.ring.get_stats()
+        if _res is None:
+            return _stats
+
+        _seq, _payload = _res
+        _stats = json.loads(_payload.decode("utf-8"))
+        self._stats = (_seq, _stats)
+        return _stats
+
+    def qsize(self) -> int:
+        """Number of queued commands.
+
+        リングバッファと、ハードウェアプロセスの`ThreadWorker`のキューの合計。
+        """
+        _stats = self._get_stats()
+        _hw_qsize = _stats["status"]["qsize"] if _stats else 0
+        return self.ring.qsize() + _hw_qsize
+
+    @property
+    def status(self) -> WorkerStatus:
+        """Latest status snapshot of the hardware process.
+
+        まだ書き込まれていない場合、`pulses`, `angles`と、
+        カウンタ(`sent_n`, `cmd_n`, `err_n`)はNone。
+        """
+        _stats = self._get_stats()
+        _ring_qsize = self.ring.qsize()
+        if _stats is None:
+            return WorkerStatus(
+                0, time.monotonic(), None, None, _ring_qsize,
+                None, None, None, None, None
+            )
+
+        _status = dict(_stats["status"])
+        for _key in ("pulses", "angles"):
+            if _status[_key] is not None:
+                _status[_key] = tuple(_status[_key])
+        _status["qsize"] += _ring_qsize
+        return WorkerStatus(**_status)
+
+    def get_metrics(self) -> dict:
+        """Get metrics of the hardware process. (see `ThreadWorker`)
+
+        `qsize`は、リングバッファとハードウェアプロセスのキューの合計、
+        `dropped`は、リングバッファが満杯で失敗した`send()`の数。
+        """
+        _stats = self._get_stats()
+        _metrics = dict(_stats["metrics"]) if _stats else {}
+        _metrics["qsize"] = self.qsize()
+        _metrics["dropped"] = self.ring.dropped
+        return _metrics
+
+    def reset_metrics(self):
+        """Reset metrics. (ハードウェアプロセスのものも)"""
+        self.ring.dropped = 0
+        self.ring.request_reset()
@@ -0,0 +1,514 @@
+#
+# (c) 2025 Yoichi Tanibayashi
+#
+import errno
+import fcntl
+import os
+import select
+import struct
+import tempfile
+import threading
+from multiprocessing import resource_tracker, shared_memory
+
+from ..utils.my_logger import get_logger
+
+
+class ShmCmdRing:
+    """Command ring buffer on shared memory.
+
+    プロセス間で、固定長のコマンドレコードを受け渡すリングバッファ。
+
+    * データ: `multiprocessing.shared_memory`上の固定長スロット
+    * 起床通知: 名前付きパイプ(FIFO)に1バイト書き込む
+    * 書き込み側の排他: ロックファイル(`fcntl.flock`)とスレッドロック
+
+    書き込み側(producer)は複数プロセスでもよいが、
+    読み出し側(consumer)は一つのプロセス・スレッドに限る。
+
+    共有メモリと、FIFO・ロックファイルは、`name`で識別されるので、
+    子プロセスなどから、名前だけで接続できる。
+    (共有メモリの生成・削除は、`create=True`で作成したプロセスが行う)
+
+    **メモリレイアウト**
+
+    header: magic(4s), version(H), pad(H), slot_n(I), slot_size(I),
+            head(Q: 書き込み数), tail(Q: 読み出し数), closed(I),
+            cancel_n(I: キャンセル要求の数), cancel_head(Q),
+            reset_n(I: メトリクスのリセット要求の数), stats_size(I)
+    stats:  seq(Q), length(I), pad(I), payload(stats_size - 16 bytes)
+    slot:   length(I), payload(slot_size - 4 bytes)
+
+    headの更新は、スロットへの書き込みの後、tailの更新は、読み出しの後に行う。
+    ロック解放とFIFOへの書き込み・読み出しはシステムコールなので、
+    これらがメモリバリアとして働く。
+
+    **キャンセル**
+
+    `cancel()`は、その時点のheadを`cancel_head`に記録する。
+    読み出し側は、`take_cancel()`で、`cancel_head`より前のレコードを
+    読まずに捨てる。(キャンセルは、リングバッファの順番を待たない)
+
+    **統計情報**
+
+    読み出し側は、`put_stats()`で、自分の状態(JSONなど)を
+    stats領域に書き込み、書き込み側は、`get_stats()`で読む。
+    stats領域は、`ShmTargetPose`と同じ、シーケンスロックで保護する。
+    (書き込むのは、読み出し側だけ)
+    """
+
+    MAGIC = b"PSR0"
+    VERSION = 2
+
+    HEADER_FMT = "<4sHHIIQQIIQII"
+    HEADER_SIZE = struct.calcsize(HEADER_FMT)
+    OFS_HEAD = struct.calcsize("<4sHHII")
+    OFS_TAIL = OFS_HEAD + 8
+    OFS_CLOSED = OFS_TAIL + 8
+    OFS_CANCEL_N = OFS_CLOSED + 4
+    OFS_CANCEL_HEAD = OFS_CANCEL_N + 4
+    OFS_RESET_N = OFS_CANCEL_HEAD + 8
+    OFS_STATS_SIZE = OFS_RESET_N + 4
+
+    STATS_HDR_FMT = "<QII"
+    STATS_HDR_SIZE = struct.calcsize(STATS_HDR_FMT)
+    OFS_STATS = HEADER_SIZE
+    OFS_STATS_LEN = OFS_STATS + 8
+
+    SLOT_HDR_FMT = "<I"
+    SLOT_HDR_SIZE = struct.calcsize(SLOT_HDR_FMT)
+
+    DEF_SLOT_N = 1024
+    DEF_SLOT_SIZE = 256  # bytes
+    DEF_STATS_SIZE = 4096  # bytes
+
+    DEF_RETRY_N = 100
+
+    def __init__(
+        self,
+        name: str | None = None,
+        create: bool = False,
+        slot_n: int = DEF_SLOT_N,
+        slot_size: int = DEF_SLOT_SIZE,
+        stats_size: int = DEF_STATS_SIZE,
+        untrack: bool = True,
+        debug: bool = False,
+    ):
+        """Constructor.
+
+        Args:
+            name (str | None): 共有メモリの名前。
+                `create=True`で`None`の場合は、自動的に付けられる。
+            create (bool): `True`の場合、共有メモリなどを新規に作成する。
+            slot_n (int): スロット数 (`create=True`の場合のみ)
+            slot_size (int): スロットのバイト数 (`create=True`の場合のみ)
+            stats_size (int): stats領域のバイト数 (`create=True`の場合のみ)
+            untrack (bool): 既存の共有メモリに接続する場合、
+                このプロセスの終了時に、共有メモリが削除されないようにする。
+                作成したプロセスの子プロセス(`multiprocessing`)から
+                接続する場合は、`False`にすること。
+            debug (bool): debug flag
+        """
+        self._debug = debug
+        self.__log = get_logger(self.__class__.__name__, self._debug)
+        self.__log.debug(
+            "name=%s, create=%s, slot_n=%s, slot_size=%s",
+            name, create, slot_n, slot_size
+        )
+
+        self._create = create
+
+        if create:
+            _size = self.HEADER_SIZE + stats_size + slot_n * slot_size
+            self._shm = shared_memory.SharedMemory(
+                name=name, create=True, size=_size
+            )
+            struct.pack_into(
+                self.HEADER_FMT, self._shm.buf, 0,
+                self.MAGIC, self.VERSION, 0, slot_n, slot_size,
+                0, 0, 0, 0, 0, 0, stats_size
+            )
+        else:
+            self._shm = shared_memory.SharedMemory(name=name)
+            if untrack:
+                # 接続しただけのプロセスの終了時に、削除されないようにする
+                resource_tracker.unregister(
+                    self._shm._name, "shared_memory"  # type: ignore
+                )
+
+        (
+            _magic, _version, _, self.slot_n, self.slot_size,
+            _, _, _, _, _, _, self.stats_size
+        ) = struct.unpack_from(self.HEADER_FMT, self._shm.buf, 0)
+        if _magic != self.MAGIC or _version != self.VERSION:
+            self._shm.close()
+            raise ValueError(f"invalid ring buffer: {name}")
+
+        self.name = self._shm.name
+        self.payload_max = self.slot_size - self.SLOT_HDR_SIZE
+        self.stats_max = self.stats_size - self.STATS_HDR_SIZE
+        self._slots_ofs = self.HEADER_SIZE + self.stats_size
+
+        _base = os.path.join(
+            tempfile.gettempdir(), self.name.lstrip("/")
+        )
+        self.fifo_path = _base + ".fifo"
+        self.lock_path = _base + ".lock"
+
+        if create:
+            for _path in (self.fifo_path, self.lock_path):
+                if os.path.exists(_path):
+                    os.unlink(_path)
+            os.mkfifo(self.fifo_path, 0o600)
+            with open(self.lock_path, "w"):
+                pass
+
+        self._lock = threading.Lock()
+        self._wake_lock = threading.Lock()
+        self._lock_fd: int | None = None
+        self._wake_wfd: int | None = None
+        self._wake_rfd: int | None = None
+
+        self.dropped = 0
+
+        # 読み出し側が受け取ったキャンセル要求の数 (see `take_cancel()`)
+        self._cancel_seen = 0
+
+        # 読み出し側が受け取ったリセット要求の数 (see `take_reset()`)
+        self._reset_seen = 0
+
+        # `put_stats()`で書き込んだ回数 x 2 (奇数: 書き込み中)
+        self._stats_seq = 0
+
+    def close(self):
+        """Close (and unlink, if created by this instance)."""
+        self.__log.debug("name=%s", self.name)
+
+        for _fd in (self._lock_fd, self._wake_wfd, self._wake_rfd):
+            if _fd is not None:
+                os.close(_fd)
+        self._lock_fd = self._wake_wfd = self._wake_rfd = None
+
+        self._shm.close()
+
+        if self._create:
+            self._shm.unlink()
+            for _path in (self.fifo_path, self.lock_path):
+                if os.path.exists(_path):
+                    os.unlink(_path)
+
+    def _get(self, ofs: int) -> int:
+        """Get an unsigned int64 in the header."""
+        return struct.unpack_from("<Q", self._shm.buf, ofs)[0]
+
+    def _set(self, ofs: int, val: int):
+        """Set an unsigned int64 in the header."""
+        struct.pack_into("<Q", self._shm.buf, ofs, val)
+
+    def qsize(self) -> int:
+        """Number of records in the ring."""
+        return self._get(self.OFS_HEAD) - self._get(self.OFS_TAIL)
+
+    @property
+    def closed(self) -> bool:
+        """`True` if the consumer should stop."""
+        return self._get_u32(self.OFS_CLOSED) != 0
+
+    def _get_u32(self, ofs: int) -> int:
+        """Get an unsigned int32 in the header."""
+        return struct.unpack_from("<I", self._shm.buf, ofs)[0]
+
+    def _slot_ofs(self, count: int) -> int:
+        """Offset of the slot for `count`."""
+        return self._slots_ofs + (count % self.slot_n) * self.slot_size
+
+    def _incr_u32(self, ofs: int):
+        """Increment an unsigned int32 in the header."""
+        struct.pack_into(
+            "<I", self._shm.buf, ofs, (self._get_u32(ofs) + 1) & 0xFFFFFFFF
+        )
+
+    # --- producer ---
+
+    def put(self, payload: bytes) -> bool:
+        """Put a record.
+
+        Returns:
+            bool: `False`の場合、リングバッファが満杯で、書き込めなかった。
+
+        Raises:
+            ValueError: `payload`がスロットに収まらない。
+        """
+        if len(payload) > self.payload_max:
+            raise ValueError(
+                f"payload too large: {len(payload)} > {self.payload_max}"
+            )
+
+        with self._lock:
+            if self._lock_fd is None:
+                self._lock_fd = os.open(self.lock_path, os.O_RDWR)
+
+            fcntl.flock(self._lock_fd, fcntl.LOCK_EX)
+            try:
+                _head = self._get(self.OFS_HEAD)
+                if _head - self._get(self.OFS_TAIL) >= self.slot_n:
+                    self.dropped += 1
+                    return False
+
+                _ofs = self._slot_ofs(_head)
+                struct.pack_into(
+                    self.SLOT_HDR_FMT, self._shm.buf, _ofs, len(payload)
+                )
+                _ofs += self.SLOT_HDR_SIZE
+                self._shm.buf[_ofs:_ofs + len(payload)] = payload
+
+                self._set(self.OFS_HEAD, _head + 1)
+            finally:
+                fcntl.flock(self._lock_fd, fcntl.LOCK_UN)
+
+        self.wakeup()
+        return True
+
+    def wakeup(self):
+        """Wake up the consumer.
+
+        読み出し側がまだFIFOを開いていない場合は、何もしない。
+        (読み出し側は、待つ前に必ずリングバッファを確認する)
+        """
+        with self._wake_lock:
+            self._wakeup()
+
+    def _wakeup(self):
+        """Wake up the consumer. (without lock)"""
+        try:
+            if self._wake_wfd is None:
+                self._wake_wfd = os.open(
+                    self.fifo_path, os.O_WRONLY | os.O_NONBLOCK
+                )
+            os.write(self._wake_wfd, b"\0")
+
+        except BlockingIOError:
+            pass  # FIFOが満杯なら、読み出し側はすでに起きている
+
+        except OSError as _e:
+            # ENXIO: 読み出し側がいない, EPIPE: 読み出し側が終了した
+            self.__log.debug("%s: %s", type(_e).__name__, _e)
+            if self._wake_wfd is not None:
+                os.close(self._wake_wfd)
+                self._wake_wfd = None
+
+    def cancel(self) -> int:
+        """Request the consumer to discard the records put so far.
+
+        Returns:
+            int: 捨てられるレコードの数 (まだ読まれていないもの)
+        """
+        with self._lock:
+            if self._lock_fd is None:
+                self._lock_fd = os.open(self.lock_path, os.O_RDWR)
+
+            fcntl.flock(self._lock_fd, fcntl.LOCK_EX)
+            try:
+                _head = self._get(self.OFS_HEAD)
+                self._set(self.OFS_CANCEL_HEAD, _head)
+                self._incr_u32(self.OFS_CANCEL_N)
+                _count = _head - self._get(self.OFS_TAIL)
+            finally:
+                fcntl.flock(self._lock_fd, fcntl.LOCK_UN)
+
+        self.wakeup()
+        return _count
+
+    def request_reset(self):
+        """Request the consumer to reset its statistics.
+
+        読み出し側は、`take_reset()`で受け取る。
+        """
+        with self._lock:
+            if self._lock_fd is None:
+                self._lock_fd = os.open(self.lock_path, os.O_RDWR)
+
+            fcntl.flock(self._lock_fd, fcntl.LOCK_EX)
+            try:
+                self._incr_u32(self.OFS_RESET_N)
+            finally:
+                fcntl.flock(self._lock_fd, fcntl.LOCK_UN)
+
+        self.wakeup()
+
+    @property
+    def stats_seq(self) -> int:
+        """Sequence counter of the stats area. (0: not written yet)
+
+        `get_stats()`の結果をキャッシュする場合に、更新の有無を調べる。
+        """
+        return self._get(self.OFS_STATS)
+
+    def get_stats(
+        self, retry_n: int = DEF_RETRY_N
+    ) -> tuple[int, bytes] | None:
+        """Get the statistics written by the consumer.
+
+        Returns:
+            tuple[int, bytes] | None: (seq, payload)。
+                一度も書き込まれていない場合や、`retry_n`回試しても
+                一貫したデータが読めない場合は`None`。
+        """
+        _buf = self._shm.buf
+        for _ in range(retry_n):
+            _seq1 = self._get(self.OFS_STATS)
+            if _seq1 & 1:
+                continue  # 書き込み中
+
+            _len = min(self._get_u32(self.OFS_STATS_LEN), self.stats_max)
+            _ofs = self.OFS_STATS + self.STATS_HDR_SIZE
+            _payload = bytes(_buf[_ofs:_ofs + _len])
+
+            _seq2 = self._get(self.OFS_STATS)
+            if _seq1 == _seq2:
+                if _seq1 == 0:
+                    return None
+                return _seq1, _payload
+
+        return None
+
+    def shutdown(self):
+        """Request the consumer to stop."""
+        struct.pack_into("<I", self._shm.buf, self.OFS_CLOSED, 1)
+        self.wakeup()
+
+    # --- consumer ---
+
+    def open_reader(self):
+        """Open the wakeup FIFO for reading."""
+        if self._wake_rfd is None:
+            # O_RDWR: 書き込み側がいなくても、EOFにならない
+            self._wake_rfd = os.open(self.fifo_path, os.O_RDWR)
+
+    def get_all(self, block: bool = True) -> list[bytes]:
+        """Get all records.
+
+        `block=True`の場合、レコードが来るか、`shutdown()`されるまで待つ。
+        """
+        return self.get(timeout=None if block else 0.0)
+
+    def get(
+        self, max_n: int | None = None, timeout: float | None = None
+    ) -> list[bytes]:
+        """Get at most `max_n` records. (None: all)
+
+        レコードがなければ、レコードが来るか、`shutdown()`・`cancel()`
+        されるまで、`timeout`秒(None: 無期限)待つ。
+
+        まだ`take_cancel()`していないキャンセル要求があれば、
+        読まずに空のリストを返す。
+        """
+        self.open_reader()
+
+        while True:
+            if self._cancel_requested():
+                return []
+
+            _records = self._pop(max_n)
+            if _records or self.closed or timeout == 0.0:
+                return _records
+
+            if not self.wait(timeout):
+                return self._pop(max_n)
+
+    def wait(self, timeout: float | None = None) -> bool:
+        """Wait for a wakeup (`put()`, `cancel()`, `shutdown()`).
+
+        Returns:
+            bool: `False`の場合、タイムアウト
+        """
+        self.open_reader()
+        assert self._wake_rfd is not None
+
+        try:
+            _ready, _, _ = select.select([self._wake_rfd], [], [], timeout)
+            if not _ready:
+                return False
+            os.read(self._wake_rfd, 4096)
+        except OSError as _e:
+            if _e.errno != errno.EINTR:
+                raise
+        return True
+
+    def _cancel_requested(self) -> bool:
+        """`True` if `cancel()` is not taken yet."""
+        return self._get_u32(self.OFS_CANCEL_N) != self._cancel_seen
+
+    def take_cancel(self) -> int | None:
+        """Take a `cancel()` request, and discard the canceled records.
+
+        Returns:
+            int | None: 捨てたレコードの数。キャンセル要求がなければ、None。
+        """
+        _cancel_n = self._get_u32(self.OFS_CANCEL_N)
+        if _cancel_n == self._cancel_seen:
+            return None
+        self._cancel_seen = _cancel_n
+
+        _tail = self._get(self.OFS_TAIL)
+        _cancel_head = self._get(self.OFS_CANCEL_HEAD)
+        if _cancel_head <= _tail:
+            return 0
+
+        self._set(self.OFS_TAIL, _cancel_head)
+        return _cancel_head - _tail
+
+    def take_reset(self) -> bool:
+        """Take a `request_reset()` request.
+
+        Returns:
+            bool: リセット要求があれば、`True`
+        """
+        _reset_n = self._get_u32(self.OFS_RESET_N)
+        if _reset_n == self._reset_seen:
+            return False
+        self._reset_seen = _reset_n
+        return True
+
+    def put_stats(self, payload: bytes) -> bool:
+        """Write the statistics of the consumer.
+
+        Returns:
+            bool: `False`の場合、`payload`がstats領域に収まらず、
+                書き込めなかった。
+        """
+        if len(payload) > self.stats_max:
+            self.__log.warning(
+                "stats too large: %s > %s", len(payload), self.stats_max
+            )
+            return False
+
+        _buf = self._shm.buf
+        _seq = self._stats_seq + 1  # 奇数: 書き込み中
+        self._set(self.OFS_STATS, _seq)
+        struct.pack_into("<I", _buf, self.OFS_STATS_LEN, len(payload))
+        _ofs = self.OFS_STATS + self.STATS_HDR_SIZE
+        _buf[_ofs:_ofs + len(payload)] = payload
+        self._stats_seq = _seq + 1  # 偶数: 書き込み完了
+        self._set(self.OFS_STATS, self._stats_seq)
+        return True
+
+    def _pop(self, max_n: int | None = None) -> list[bytes]:
+        """Pop at most `max_n` records without blocking. (None: all)"""
+        _tail = self._get(self.OFS_TAIL)
+        _head = self._get(self.OFS_HEAD)
+        if max_n is not None:
+            _head = min(_head, _tail + max(max_n, 0))
+
+        _records = []
+        for _count in range(_tail, _head):
+            _ofs = self._slot_ofs(_count)
+            (_len,) = struct.unpack_from(
+                self.SLOT_HDR_FMT, self._shm.buf, _ofs
+            )
+            _ofs += self.SLOT_HDR_SIZE
+            _records.append(bytes(self._shm.buf[_ofs:_ofs + _len]))
+
+        if _head != _tail:
+            self._set(self.OFS_TAIL, _head)
+
+        return _records
@@ -0,0 +1,175 @@
+#
+# (c) 2025 Yoichi Tanibayashi
+#
+import math
+import struct
+import time
+from multiprocessing import resource_tracker, shared_memory
+from typing import NamedTuple
+
+from ..utils.my_logger import get_logger
+
+
+class TargetPose(NamedTuple):
+    """Target pose read from `ShmTargetPose`."""
+
+    seq: int
+    timestamp: float  # time.monotonic()
+    angles: tuple[float, ...]  # NaN: 動かさない
+
+
+class ShmTargetPose:
+    """Shared-memory target pose channel (seqlock).
+
+    外部プロセス(制御ループなど)が、目標角度を高頻度で書き込み、
+    モーションループが、ティックごとに読み出すための共有メモリ。
+    JSONなどのシリアライズは行わず、float64の配列をそのまま読み書きする。
+
+    書き込み側は一つに限る。読み出し側は、いくつでもよい。
+
+    **seqlock**
+
+    書き込み側は、seqを奇数にしてから、タイムスタンプと角度を書き込み、
+    最後にseqを偶数にする。
+    読み出し側は、読み出しの前後でseqが同じ偶数であれば、一貫したデータとする。
+    (Pythonには明示的なメモリバリアがないので、厳密な保証ではない)
+
+    **メモリレイアウト**
+
+    magic(4s), version(H), servo_n(H), seq(Q), timestamp(d), angles(d * n)
+
+    `time.monotonic()`は、同じホスト上のプロセス間で共通なので、
+    タイムスタンプで、データの古さを判断できる。
+    """
+
+    MAGIC = b"PSP0"
+    VERSION = 1
+
+    HEADER_FMT = "<4sHH"
+    HEADER_SIZE = struct.calcsize(HEADER_FMT)
+    OFS_SEQ = HEADER_SIZE
+    OFS_TIMESTAMP = OFS_SEQ + 8
+    OFS_ANGLES = OFS_TIMESTAMP + 8
+
+    DEF_RETRY_N = 100
+
+    def __init__(
+        self,
+        servo_n: int = 0,
+        name: str | None = None,
+        create: bool = False,
+        untrack: bool = True,
+        debug: bool = False,
+    ):
+        """Constructor.
+
+        Args:
+            servo_n (int): サーボの数 (`create=True`の場合のみ)
+            name (str | None): 共有メモリの名前。
+            create (bool): `True`の場合、共有メモリを新規に作成する。
+            untrack (bool): 既存の共有メモリに接続する場合、
+                このプロセスの終了時に、共有メモリが削除されないようにする。
+                作成したプロセスの子プロセス(`multiprocessing`)から
+                接続する場合は、`False`にすること。
+            debug (bool): debug flag
+        """
+        self._debug = debug
+        self.__log = get_logger(self.__class__.__name__, self._debug)
+        self.__log.debug(
+            "servo_n=%s, name=%s, create=%s", servo_n, name, create
+        )
+
+        self._create = create
+
+        if create:
+            self._shm = shared_memory.SharedMemory(
+                name=name, create=True, size=self.OFS_ANGLES + 8 * servo_n
+            )
+            struct.pack_into(
+                self.HEADER_FMT, self._shm.buf, 0,
+                self.MAGIC, self.VERSION, servo_n
+            )
+            struct.pack_into("<Qd", self._shm.buf, self.OFS_SEQ, 0, 0.0)
+        else:
+            self._shm = shared_memory.SharedMemory(name=name)
+            if untrack:
+                # 接続しただけのプロセスの終了時に、削除されないようにする
+                resource_tracker.unregister(
+                    self._shm._name, "shared_memory"  # type: ignore
+                )
+
+        _magic, _version, self.servo_n = struct.unpack_from(
+            self.HEADER_FMT, self._shm.buf, 0
+        )
+        if _magic != self.MAGIC or _version != self.VERSION:
+            self._shm.close()
+            raise ValueError(f"invalid target pose: {name}")
+
+        self.name = self._shm.name
+
+        self._angles_fmt = f"<{self.servo_n}d"
+        self._seq = self._get_seq()
+
+    def close(self):
+        """Close (and unlink, if created by this instance)."""
+        self.__log.debug("name=%s", self.name)
+        self._shm.close()
+        if self._create:
+            self._shm.unlink()
+
+    def _get_seq(self) -> int:
+        """Get sequence counter."""
+        return struct.unpack_from("<Q", self._shm.buf, self.OFS_SEQ)[0]
+
+    def write(self, angles, timestamp: float | None = None):
+        """Write target angles.
+
+        Args:
+            angles (list[float | None]): 目標角度。None(NaN)は「動かさない」
+            timestamp (float | None): `time.monotonic()`の値。
+                Noneの場合は、現在時刻。
+        """
+        if len(angles) != self.servo_n:
+            raise ValueError(
+                f"len(angles)={len(angles)} != servo_n={self.servo_n}"
+            )
+
+        if timestamp is None:
+            timestamp = time.monotonic()
+
+        _buf = self._shm.buf
+        _seq = self._seq + 1  # 奇数: 書き込み中
+        struct.pack_into("<Q", _buf, self.OFS_SEQ, _seq)
+        struct.pack_into("<d", _buf, self.OFS_TIMESTAMP, timestamp)
+        struct.pack_into(
+            self._angles_fmt, _buf, self.OFS_ANGLES,
+            *[math.nan if _a is None else _a for _a in angles]
+        )
+        self._seq = _seq + 1  # 偶数: 書き込み完了
+        struct.pack_into("<Q", _buf, self.OFS_SEQ, self._seq)
+
+    def read(self, retry_n: int = DEF_RETRY_N) -> TargetPose | None:
+        """Read the target pose.
+
+        Returns:
+            TargetPose | None: 一度も書き込まれていない場合や、
+                `retry_n`回試しても一貫したデータが読めない場合は`None`。
+        """
+        _buf = self._shm.buf
+        for _ in range(retry_n):
+            _seq1 = struct.unpack_from("<Q", _buf, self.OFS_SEQ)[0]
+            if _seq1 & 1:
+                continue  # 書き込み中
+
+            (_ts,) = struct.unpack_from("<d", _buf, self.OFS_TIMESTAMP)
+            _angles = struct.unpack_from(
+                self._angles_fmt, _buf, self.OFS_ANGLES
+            )
+
+            _seq2 = struct.unpack_from("<Q", _buf, self.OFS_SEQ)[0]
+            if _seq1 == _seq2:
+                if _seq1 == 0:
+                    return None
+                return TargetPose(_seq1, _ts, _angles)
+
+        return None
@@ -2,15 +2,103 @@
 # (c) 2025 Yoichi Tanibayashi
 #
 """cmd_to_json.py."""
+import hashlib
 import json
-from typing import Any, Dict, List, Optional, Union
+import os
+import threading
+from collections import OrderedDict
+from types import MappingProxyType
+from typing import (
+    Any,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Mapping,
+    NamedTuple,
+    Optional,
+    Union,
+)
 
 from piservo0.utils.my_logger import get_logger
 
 
+class CacheInfo(NamedTuple):
+    """Statistics of the parse cache. (`functools.lru_cache`と同じ形式)"""
+
+    hits: int
+    misses: int
+    maxsize: int
+    currsize: int
+
+
+class CmdRecord(NamedTuple):
+    """A command record of a compiled program."""
+
+    lineno: int  # スクリプトの行番号 (1から)
+    token: str  # コマンド文字列 e.g. "mv:10,20,30,40"
+    cmd: Mapping[str, Any]  # 変更不可のコマンドオブジェクト
+
+
+class CompileError(ValueError):
+    """Errors found by `StrCmdToJson.compile()`.
+
+    Attributes:
+        errors (list[tuple[int, str]]): (行番号, コマンド文字列)のリスト
+    """
+
+    def __init__(self, source: str, errors: list[tuple[int, str]]):
+        """Constructor."""
+        self.source = source
+        self.errors = errors
+
+        _msg = "; ".join(f"line {_n}: {_t!r}" for _n, _t in errors)
+        super().__init__(f"{source}: {len(errors)} error(s): {_msg}")
+
+
+class CmdProgram:
+    """Compiled string command script. (see `StrCmdToJson.compile()`)
+
+    検証済みの`CmdRecord`の平坦なタプル。
+    何度実行しても、パースはやり直さない。
+    """
+
+    def __init__(self, records: Iterable[CmdRecord], source: str = ""):
+        """Constructor."""
+        self.records: tuple[CmdRecord, ...] = tuple(records)
+        self.source = source
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    def __iter__(self) -> Iterator[CmdRecord]:
+        return iter(self.records)
+
+    def cmd_data_list(self) -> list[dict]:
+        """Command data(dict) list. (変更してもよいコピー)"""
+        return [StrCmdToJson.thaw(_r.cmd) for _r in self.records]
+
+
 class StrCmdToJson:
-    """String Command to JSON."""
-    
+    """String Command to JSON.
+
+    パース結果は、(コマンド文字列, angle_factor)をキーとして、
+    LRUキャッシュに保存される。
+    同じコマンド文字列を繰り返し送る場合(歩行パターンなど)は、
+    2回目以降のパースは、キャッシュから返される。
+
+    キャッシュされるのは、変更不可のコマンドオブジェクト(`parse()`)。
+    `cmd_data()`は、そのコピー(dict)を返すので、変更してもよい。
+    `angle_factor`を変更すると、キャッシュはクリアされる。
+    """
+
+    DEF_CACHE_SIZE = 256
+
+    # コンパイル済みプログラムのディスクキャッシュ
+    # (形式を変えたら、COMPILE_VERSIONを上げること)
+    COMPILE_VERSION = 1
+    DEF_COMPILE_CACHE_DIR = "~/.cache/piservo0/compiled"
+
     # コマンド文字列とJSONコマンド名のマッピング
     COMMAND_MAP: Dict[str, str] = {
         # main move command
@@ -44,14 +132,30 @@ class StrCmdToJson:
         "sx": "max",
     }
 
-    def __init__(self, angle_factor: List =[], debug=False):
-        """constractor."""
+    def __init__(
+        self,
+        angle_factor: List =[],
+        cache_size: int = DEF_CACHE_SIZE,
+        debug=False
+    ):
+        """constractor.
+
+        `cache_size=0`の場合は、キャッシュしない。
+        """
         self._debug = debug
         self.__log = get_logger(self.__class__.__name__, self._debug)
-        self.__log.debug("angle_factor=%s", angle_factor)
+        self.__log.debug(
+            "angle_factor=%s, cache_size=%s", angle_factor, cache_size
+        )
 
         self._angle_factor = angle_factor #  property
 
+        self._cache_size = cache_size
+        self._cache: OrderedDict = OrderedDict()
+        self._cache_lock = threading.Lock()
+        self._cache_hits = 0
+        self._cache_misses = 0
+
     @property
     def angle_factor(self):
         """Get angle_factor."""
@@ -59,8 +163,24 @@ class StrCmdToJson:
 
     @angle_factor.setter
     def angle_factor(self, af: List = []):
-        """Set angle_factor."""
+        """Set angle_factor. (キャッシュはクリアされる)"""
         self._angle_factor = af
+        self.cache_clear()
+
+    def cache_info(self) -> CacheInfo:
+        """Get statistics of the parse cache."""
+        with self._cache_lock:
+            return CacheInfo(
+                self._cache_hits, self._cache_misses,
+                self._cache_size, len(self._cache)
+            )
+
+    def cache_clear(self):
+        """Clear the parse cache and its statistics."""
+        with self._cache_lock:
+            self._cache.clear()
+            self._cache_hits = 0
+            self._cache_misses = 0
 
     def _create_error_data(self, strcmd: str) -> dict:
         """Create error data."""
@@ -126,6 +246,38 @@ class StrCmdToJson:
         self.__log.debug("angles=%s", angles)
         return angles
 
+    def parse(self, cmd_str: str) -> Mapping[str, Any]:
+        """Command string to immutable command object (cached).
+
+        Args:
+            cmd_str: "mv:40,30", "sl:0.5" のようなコマンド文字列。
+
+        Returns: (Mapping)
+            変更不可のコマンドオブジェクト。(リストはタプルになる)
+            変換できない場合はエラー情報を返す。
+        """
+        if not isinstance(cmd_str, str):
+            return MappingProxyType(self._create_error_data(cmd_str))
+
+        _key = (cmd_str, tuple(self._angle_factor))
+        with self._cache_lock:
+            _cmd = self._cache.get(_key)
+            if _cmd is not None:
+                self._cache.move_to_end(_key)
+                self._cache_hits += 1
+                return _cmd
+            self._cache_misses += 1
+
+        _cmd = self.freeze(self._parse(cmd_str))
+
+        if self._cache_size > 0:
+            with self._cache_lock:
+                self._cache[_key] = _cmd
+                if len(self._cache) > self._cache_size:
+                    self._cache.popitem(last=False)
+
+        return _cmd
+
     def cmd_data(self, cmd_str: str) -> dict:
         """Command string to command data(dict).
 
@@ -136,6 +288,167 @@ class StrCmdToJson:
             変換されたコマンドデータ(dict)。
             変換できない場合はエラー情報を返す。
         """
+        return self.thaw(self.parse(cmd_str))
+
+    @staticmethod
+    def freeze(cmd_data: dict) -> Mapping[str, Any]:
+        """Command data(dict) to immutable command object."""
+        return MappingProxyType({
+            _k: tuple(_v) if isinstance(_v, list) else _v
+            for _k, _v in cmd_data.items()
+        })
+
+    @staticmethod
+    def thaw(cmd: Mapping[str, Any]) -> dict:
+        """Immutable command object to command data(dict)."""
+        return {
+            _k: list(_v) if isinstance(_v, tuple) else _v
+            for _k, _v in cmd.items()
+        }
+
+    def compile(
+        self, script: str | Iterable[str], source: str = "<string>"
+    ) -> CmdProgram:
+        """Compile a whole script into a command program.
+
+        空行と`#`で始まる行は無視する。
+        一行に複数のコマンドを、スペース区切りで書いてもよい。
+
+        Args:
+            script: スクリプト(文字列、または行のイテラブル)
+            source: エラーメッセージ用のスクリプト名
+
+        Returns: (CmdProgram)
+            検証済みのコマンドプログラム
+
+        Raises:
+            CompileError: 不正なコマンドがあった。
+                (最初のエラーで止めずに、すべてのエラーを報告する)
+        """
+        self.__log.debug("source=%s", source)
+
+        if isinstance(script, str):
+            script = script.splitlines()
+
+        _records = []
+        _errors = []
+        for _rec in self.iter_records(script):
+            if "err" in _rec.cmd:
+                _errors.append((_rec.lineno, _rec.token))
+            else:
+                _records.append(_rec)
+
+        if _errors:
+            raise CompileError(source, _errors)
+
+        self.__log.debug("records=%s", len(_records))
+        return CmdProgram(_records, source)
+
+    def iter_records(
+        self, lines: Iterable[str | bytes]
+    ) -> Iterator[CmdRecord]:
+        """Parse lines incrementally. (streaming)
+
+        ファイルやソケット(`socket.makefile()`)などの行のイテラブルから、
+        一行ずつ読みながら、`CmdRecord`をyieldする。
+        全体をメモリに読み込まないので、どんなに大きなスクリプトでも、
+        メモリ使用量は一定。
+
+        空行と`#`で始まる行は無視する。
+        エラーのコマンドも、そのままyieldする。(`"err"`キーを持つ)
+        """
+        for _lineno, _line in enumerate(lines, 1):
+            if isinstance(_line, bytes):
+                _line = _line.decode("utf-8")
+
+            _line = _line.strip()
+            if not _line or _line.startswith("#"):
+                continue
+
+            for _token in _line.split():
+                yield CmdRecord(_lineno, _token, self.parse(_token))
+
+    def iter_cmd_data(self, lines: Iterable[str | bytes]) -> Iterator[dict]:
+        """Parse lines incrementally into command data(dict).
+
+        `cmd_data_list()`と同様に、エラーのコマンドをyieldしたら終了する。
+        """
+        for _rec in self.iter_records(lines):
+            _cmd_data = self.thaw(_rec.cmd)
+            yield _cmd_data
+
+            if _cmd_data.get("err"):
+                self.__log.error("line %s: %a", _rec.lineno, _rec.token)
+                return
+
+    def compile_file(
+        self, path: str, cache_dir: str | None = DEF_COMPILE_CACHE_DIR
+    ) -> CmdProgram:
+        """Compile a script file (with disk cache).
+
+        コンパイル結果は、ファイルの内容と`angle_factor`のハッシュを
+        キーとして、`cache_dir`にキャッシュされる。
+        同じ内容のファイルは、2回目以降、パースせずに読み込まれる。
+
+        Args:
+            path: スクリプトファイル
+            cache_dir: キャッシュディレクトリ (None: キャッシュしない)
+
+        Raises:
+            CompileError: 不正なコマンドがあった。
+        """
+        with open(os.path.expanduser(path), "rb") as _f:
+            _content = _f.read()
+
+        if cache_dir is None:
+            return self.compile(_content.decode("utf-8"), source=path)
+
+        _hash = hashlib.sha256(_content)
+        _hash.update(
+            json.dumps([self.COMPILE_VERSION, list(self._angle_factor)])
+            .encode("utf-8")
+        )
+        _cache_file = os.path.join(
+            os.path.expanduser(cache_dir), _hash.hexdigest() + ".json"
+        )
+
+        try:
+            with open(_cache_file, encoding="utf-8") as _f:
+                _program = CmdProgram(
+                    (
+                        CmdRecord(_lineno, _token, self.freeze(_cmd))
+                        for _lineno, _token, _cmd in json.load(_f)
+                    ),
+                    source=path,
+                )
+            self.__log.debug("cache hit: %s", _cache_file)
+            return _program
+
+        except (OSError, ValueError, TypeError) as _e:
+            self.__log.debug("cache miss: %s: %s", type(_e).__name__, _e)
+
+        _program = self.compile(_content.decode("utf-8"), source=path)
+
+        try:
+            os.makedirs(os.path.dirname(_cache_file), exist_ok=True)
+            _tmp_file = f"{_cache_file}.{os.getpid()}.tmp"
+            with open(_tmp_file, "w", encoding="utf-8") as _f:
+                json.dump(
+                    [
+                        [_r.lineno, _r.token, self.thaw(_r.cmd)]
+                        for _r in _program
+                    ],
+                    _f, separators=(",", ":")
+                )
+            os.replace(_tmp_file, _cache_file)
+
+        except OSError as _e:
+            self.__log.warning("%s: %s", type(_e).__name__, _e)
+
+        return _program
+
+    def _parse(self, cmd_str: str) -> dict:
+        """Parse command string (without cache)."""
         self.__log.debug("cmd_str=%s", cmd_str)
 
         # 不正な文字列はエラー
@@ -179,6 +492,9 @@ class StrCmdToJson:
 
                 _cmd_data["angles"] = angles
 
+            elif cmd_key == "ms" and cmd_param_str.lower() == "auto":
+                _cmd_data["sec"] = "auto"
+
             elif cmd_key in ["sl", "ms", "is"]:
                 sec = float(cmd_param_str)
                 if sec < 0:
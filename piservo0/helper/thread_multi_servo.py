@@ -18,6 +18,7 @@ class ThreadMultiServo:
 
     このクラスのメソッドはすべて非同期であり、呼び出し元をブロックしません。
     すべてのコマンドはキューを通じてワーカースレッドで順次実行されます。
+    コマンドを送信するメソッドは、完了を待つための`CmdFuture`を返します。
     """
 
     def __init__(
@@ -85,13 +86,18 @@ class ThreadMultiServo:
         self.__log.debug("Worker ended.")
 
     def send_cmd(self, cmd: dict):
-        """コマンドをキューに送る"""
+        """コマンドをキューに送る
+
+        Returns:
+            CmdFuture: コマンドの完了を待つためのFuture
+        """
         self.__log.debug("cmd=%s", cmd)
-        self._worker.send(cmd)
+        return self._worker.send(cmd)
 
     def cancel_cmds(self):
         """Cancel all commands.
-        現在実行中のコマンドは、キャンセルできない。
+        現在実行中の移動コマンドは、キャンセルできない。
+        実行中の`sleep`とインターバル待ちは、その場で中断される。
         """
         self.__log.debug("")
         self._worker.clear_cmdq()
@@ -107,7 +113,7 @@ class ThreadMultiServo:
             各サーボの目標角度のリスト。
         """
         cmd = {"cmd": "move_all_angles", "target_angles": target_angles}
-        self.send_cmd(cmd)
+        return self.send_cmd(cmd)
 
     def move_all_angles_sync(
         self,
@@ -137,7 +143,7 @@ class ThreadMultiServo:
             "move_sec": move_sec,
             "step_n": step_n,
         }
-        self.send_cmd(cmd)
+        return self.send_cmd(cmd)
 
     def move_all_angles_sync_relative(
         self,
@@ -167,7 +173,7 @@ class ThreadMultiServo:
             "move_sec": move_sec,
             "step_n": step_n,
         }
-        self.send_cmd(cmd)
+        return self.send_cmd(cmd)
 
     def set_move_sec(self, sec: float):
         """
@@ -177,7 +183,7 @@ class ThreadMultiServo:
             sec (float): 移動時間(秒)。
         """
         cmd = {"cmd": "move_sec", "sec": sec}
-        self.send_cmd(cmd)
+        return self.send_cmd(cmd)
 
     def set_step_n(self, n: int):
         """
@@ -187,7 +193,7 @@ class ThreadMultiServo:
             n (int): ステップ数。
         """
         cmd = {"cmd": "step_n", "n": n}
-        self.send_cmd(cmd)
+        return self.send_cmd(cmd)
 
     def set_interval(self, sec: float):
         """
@@ -197,7 +203,7 @@ class ThreadMultiServo:
             sec (float): インターバル時間(秒)。
         """
         cmd = {"cmd": "interval", "sec": sec}
-        self.send_cmd(cmd)
+        return self.send_cmd(cmd)
 
     def sleep(self, sec: float):
         """
@@ -207,7 +213,7 @@ class ThreadMultiServo:
             sec (float): スリープ時間(秒)。
         """
         cmd = {"cmd": "sleep", "sec": sec}
-        self.send_cmd(cmd)
+        return self.send_cmd(cmd)
 
     def off(self):
         """
@@ -1,16 +1,89 @@
 #
 # (c) 2025 Yoichi Tanibayashi
 #
+import asyncio
+import itertools
 import json
 import queue
 import threading
 import time
+from concurrent.futures import Future
+from typing import NamedTuple
 
 from ..core.multi_servo import MultiServo
+from ..utils.clock import Clock
+from ..utils.metrics import Histogram, WorkerMetrics
 from ..utils.my_logger import get_logger
+from .worker_cmd import WorkerCmdMixin
 
 
-class ThreadWorker(threading.Thread):
+class CmdFuture(Future):
+    """Future of a command sent to `ThreadWorker`.
+
+    コマンドの実行が完了すると、結果(dict)が設定される。
+
+    e.g. {"id": 12, "cmd": "move",
+          "queue_sec": 0.412, "exec_sec": 0.203}
+
+    キャンセルされた場合は、`cancelled()`が`True`になる。
+
+    Attributes:
+        cmd_id (int): コマンドID (ワーカーごとに連番)
+        cmd_data (dict | str): 送信されたコマンド
+        t_queued (float): キューに入れた時刻 (ワーカーの時計)
+        t_start (float | None): 実行開始時刻
+        t_end (float | None): 実行終了時刻
+    """
+
+    def __init__(self, cmd_id: int, cmd_data, t_queued: float | None = None):
+        """Constructor."""
+        super().__init__()
+
+        self.cmd_id = cmd_id
+        self.cmd_data = cmd_data
+
+        self.t_queued = time.monotonic() if t_queued is None else t_queued
+        self.t_start: float | None = None
+        self.t_end: float | None = None
+
+    def make_result(self) -> dict:
+        """Make result data from timing."""
+        _t_start = self.t_queued if self.t_start is None else self.t_start
+        _t_end = _t_start if self.t_end is None else self.t_end
+
+        _cmd = None
+        if isinstance(self.cmd_data, dict):
+            _cmd = self.cmd_data.get("cmd")
+
+        return {
+            "id": self.cmd_id,
+            "cmd": _cmd,
+            "queue_sec": _t_start - self.t_queued,
+            "exec_sec": _t_end - _t_start,
+        }
+
+
+class WorkerStatus(NamedTuple):
+    """Immutable status snapshot published by workers.
+
+    ワーカーが、コマンドの受付・開始・終了と、
+    モーションループのステップごとに、新しいものに置き換える。
+    (`ThreadWorker.status`: ロックなし、pigpioの読み出しなしで読める)
+    """
+
+    seq: int  # 更新ごとに増える
+    t: float  # time.monotonic() (ThreadWorkerは、`clock.now()`)
+    pulses: tuple | None  # 最後に出力したパルス幅 (`ServoState`)
+    angles: tuple | None  # 最後に出力した角度 (`ServoState`)
+    qsize: int  # キューの長さ
+    cmd_id: int | None  # 実行中のコマンドID
+    cmd: str | None  # 実行中のコマンド名
+    sent_n: int  # 受け付けたコマンドの数
+    cmd_n: int  # 実行したコマンドの数
+    err_n: int  # 失敗したコマンドの数
+
+
+class ThreadWorker(WorkerCmdMixin, threading.Thread):
     """Thred worker.
 
     すべてのコマンドは、JSON形式で、キューを介して受け渡される。
@@ -18,11 +91,25 @@ class ThreadWorker(threading.Thread):
     利用者は、コマンドを`send()`したら、ブロックせずに、
     非同期に他の処理を行える。
 
+    `send()`は、`CmdFuture`(`concurrent.futures.Future`)を返す。
+    特定のコマンドの完了を待ちたい場合は、`result()`で待つ。
+    asyncioからは、`send_async()`か`asyncio.wrap_future()`で待てる。
+
     `Worker`は、コマンドキューから一つずつコマンドを取り出し、
     順に実行する。
 
     コマンドをキャンセルしたい場合は、`clear_cmdq()`で、
     キューに溜まっているコマンドをすべてキャンセルできる。
+    実行中の`sleep`とインターバル待ちも、その場で中断される。
+
+    ワーカーの状態は、`status`(`WorkerStatus`)として公開される。
+    参照の置き換えで更新されるので、他のスレッドからロックなしで読める。
+
+    時刻の取得と、`sleep`・インターバルの待ちは、`clock`(`Clock`)で行う。
+    (省略時は、`mservo.clock`) `SimClock`なら、待ち時間なしで実行する。
+
+    アイドル時、ワーカーはタイムアウトなしでキューを待つ(ポーリングしない)。
+    `end()`は、キューに終了用の番兵(sentinel)を入れて、即座に起こす。
 
     **コマンド一覧(例)**
     
@@ -34,6 +121,9 @@ class ThreadWorker(threading.Thread):
      "angles": [30, None, "center"],   # mandatory
      "move_sec": 0.2, "step_n": 40}    # optional
 
+    # "auto": 速度・加速度の上限で、最短の時間 (`MultiServo.plan_move()`)
+    {"cmd": "move", "angles": [30, None, "center"], "move_sec": "auto"}
+
     {"cmd": "move_all_angles", "angles": [30, None, "center"]}
     {"cmd": "move_all_pulses", "pulses": [1000, 2000, None, 0]}
 
@@ -42,43 +132,49 @@ class ThreadWorker(threading.Thread):
     {"cmd": "interval", "sec": 0.5}
     {"cmd": "sleep", "sec": 1.0}
 
+    # 共有メモリの目標角度(ShmTargetPose)に追従する (cancelまで)
+    {"cmd": "follow",
+     "sec": 10.0, "tick": 0.005, "max_age": 0.1}  # optional
+
     # for calibration
     {"cmd": "move_pulse_relative", "servo": 2, "pulse_diff": -20}
     {"cmd": "set", "servo": 1, "target": "center"}
-    """
 
-    DEF_RECV_TIMEOUT = 0.2  # sec
-    DEF_INTERVAL_SEC = 0.0  # sec
+    コマンドの解釈は、`AsyncWorker`と共通(`WorkerCmdMixin`)。
+    """
 
-    CMD_CANCEL = "cancel"
+    _SENTINEL = None  # `end()`でワーカーを起こすための番兵
 
     def __init__(
         self,
         mservo: MultiServo,
         move_sec: float | None = None,
         step_n: int | None = None,
-        interval_sec: float = DEF_INTERVAL_SEC,
+        interval_sec: float = WorkerCmdMixin.DEF_INTERVAL_SEC,
+        trace=None,
+        clock: Clock | None = None,
         debug=False,
     ):
-        """Constructor."""
+        """Constructor.
+
+        `trace`(`TraceRecorder`)を指定した場合は、
+        実行を開始したコマンドを記録する。
+        (時刻は、パルスと同じ`trace.clock`)
+        """
         super().__init__(daemon=True)
 
         self._debug = debug
         self.__log = get_logger(self.__class__.__name__, self._debug)
 
         self.mservo = mservo
+        self._init_cmd(mservo, move_sec, step_n, interval_sec, debug)
+        self.trace = trace
 
-        if move_sec is None:
-            self.move_sec = mservo.DEF_MOVE_SEC
-        else:
-            self.move_sec = move_sec
-
-        if step_n is None:
-            self.step_n = mservo.DEF_STEP_N
-        else:
-            self.step_n = step_n
-
-        self.interval_sec = interval_sec
+        if clock is None:
+            clock = getattr(mservo, "clock", None)
+            if not isinstance(clock, Clock):
+                clock = Clock()
+        self.clock = clock
 
         self.__log.debug(
             "move_sec=%s, step_n=%s, interval_sec=%s",
@@ -88,28 +184,24 @@ class ThreadWorker(threading.Thread):
         self._cmdq: queue.Queue = queue.Queue()
         self._active = False
 
-        self._command_handlers = {
-            "move":
-            self._handle_move_all_angles_sync,
-
-            "move_all_angles_sync":
-            self._handle_move_all_angles_sync,
+        self._cmd_id = itertools.count(1)
 
-            "move_all_angles_sync_relative":
-            self._handle_move_all_angles_sync_relative,
+        self.metrics = WorkerMetrics()
 
-            "move_all_angles":
-            self._handle_move_all_angles,
+        self.cur_cmd_id: int | None = None  # 実行中のコマンドID
+        self.cur_cmd: str | None = None  # 実行中のコマンド名
+        self._sent_n = 0
 
-            "move_all_pulses_relative":
-            self._handle_move_all_pulses_relative,
+        # 状態のスナップショット (`_publish_status()`で置き換える)
+        self._status_seq = itertools.count(1)
+        self.status = WorkerStatus(
+            0, self.clock.now(), mservo.state.pulses, mservo.state.angles,
+            0, None, None, 0, 0, 0
+        )
+        mservo.add_state_listener(self._publish_status)
 
-            "move_sec": self._handle_move_sec,
-            "step_n": self._handle_step_n,
-            "interval": self._handle_interval,
-            "sleep": self._handle_sleep,
-            "set": self._handle_set,
-        }
+        # `sleep`などの待ち時間を中断するためのイベント
+        self._cancel_ev = threading.Event()
 
     def __del__(self):
         """del"""
@@ -121,18 +213,36 @@ class ThreadWorker(threading.Thread):
         self.__log.debug("")
         self._active = False
         self.clear_cmdq()
-        self.join()
+        self._cmdq.put(self._SENTINEL)
+        if self.is_alive():
+            self.join()
         self.__log.debug("done")
 
     def clear_cmdq(self):
-        """clear command queue"""
+        """clear command queue
+
+        実行中の待ち時間(`sleep`, インターバル)も中断する。
+        """
+        self._cancel_ev.set()
+
         _count = 0
-        while not self._cmdq.empty():
+        while True:
+            try:
+                _cmd = self._cmdq.get_nowait()
+            except queue.Empty:
+                break
+
+            if _cmd is self._SENTINEL:
+                # 終了要求は、キャンセルせずに戻しておく
+                self._cmdq.put(_cmd)
+                break
+
             _count += 1
-            _cmd = self._cmdq.get()
-            self.__log.debug("%2d:%s", _count, _cmd)
+            _cmd.cancel()
+            self.__log.debug("%2d:%s", _count, _cmd.cmd_data)
 
         self.__log.debug("count=%s", _count)
+        self._publish_status()
         return _count
 
     def cancel_cmds(self):
@@ -140,28 +250,104 @@ class ThreadWorker(threading.Thread):
         self.__log.debug("")
         return self.clear_cmdq()
 
-    def send(self, cmd_data):
-        """send"""
+    def send(self, cmd_data) -> CmdFuture:
+        """send
+
+        Args:
+            cmd_data (dict | str): コマンド(dict または JSON文字列)
+
+        Returns:
+            CmdFuture: コマンドの完了を待つためのFuture。
+                `cancel`コマンドは、キューに入れずに即座に完了する。
+        """
+        _fut = CmdFuture(next(self._cmd_id), cmd_data, self.clock.now())
+        self._sent_n += 1
         try:
             if isinstance(cmd_data, str):
                 cmd_data = json.loads(cmd_data)
+                _fut.cmd_data = cmd_data
 
             if cmd_data.get("cmd") == self.CMD_CANCEL:
                 cmd_data["count"] = self.clear_cmdq()
+                _fut.set_running_or_notify_cancel()
+                _fut.set_result(_fut.make_result())
             else:
-                self._cmdq.put(cmd_data)
+                self._cmdq.put(_fut)
+                self._publish_status()
 
             self.__log.debug(
-                "cmd_data=%s, qsize=%s", cmd_data, self._cmdq.qsize()
+                "id=%s, cmd_data=%s, qsize=%s",
+                _fut.cmd_id, cmd_data, self._cmdq.qsize()
             )
 
         except Exception as _e:
             self.__log.error("%s: %s", type(_e).__name__, _e)
+            if not _fut.done():
+                _fut.set_running_or_notify_cancel()
+                _fut.set_exception(_e)
+
+        return _fut
 
-        return cmd_data
+    async def send_async(self, cmd_data) -> dict:
+        """Send a command and wait its completion asynchronously.
+
+        e.g. (FastAPI)
+            _res = await thr_worker.send_async({"cmd": "move", ...})
+
+        Returns:
+            dict: `CmdFuture`の結果
+        """
+        return await asyncio.wrap_future(self.send(cmd_data))
 
-    def recv(self, timeout=DEF_RECV_TIMEOUT):
-        """recv"""
+    def qsize(self) -> int:
+        """Number of queued commands."""
+        return self._cmdq.qsize()
+
+    def _publish_status(self, state=None):
+        """Publish a new status snapshot (atomic reference swap).
+
+        Args:
+            state (ServoState | None): Noneの場合は、`mservo.state`
+        """
+        if state is None:
+            state = self.mservo.state
+
+        self.status = WorkerStatus(
+            next(self._status_seq), self.clock.now(),
+            state.pulses, state.angles, self._cmdq.qsize(),
+            self.cur_cmd_id, self.cur_cmd,
+            self._sent_n, self.metrics.cmd_n, self.metrics.err_n,
+        )
+
+    def get_metrics(self) -> dict:
+        """Get metrics (histograms of timing).
+
+        Returns:
+            dict: キュー待ち時間、実行時間、`move_sec`超過時間、
+                ステップのジッタ(`MultiServo`)のサマリー。単位はusec。
+        """
+        _metrics = self.metrics.to_dict()
+        _metrics["qsize"] = self._cmdq.qsize()
+
+        _hist = getattr(self.mservo, "hist_step_jitter", None)
+        if isinstance(_hist, Histogram):
+            _metrics["step_jitter"] = _hist.to_dict()
+
+        return _metrics
+
+    def reset_metrics(self):
+        """Reset metrics."""
+        self.metrics.reset()
+
+        _hist = getattr(self.mservo, "hist_step_jitter", None)
+        if isinstance(_hist, Histogram):
+            _hist.reset()
+
+    def recv(self, timeout=None):
+        """recv
+
+        `timeout`が`None`の場合は、コマンドが届くまでブロックする。
+        """
         try:
             _cmd_data = self._cmdq.get(timeout=timeout)
         except queue.Empty:
@@ -169,25 +355,29 @@ class ThreadWorker(threading.Thread):
 
         return _cmd_data
 
+    def _wait(self, sec: float) -> bool:
+        """Wait `sec` seconds, unless canceled.
+
+        Returns:
+            bool: `True`の場合、キャンセルにより中断された
+        """
+        return self.clock.sleep(sec, self._cancel_ev)
+
     def _handle_move_all_angles_sync(self, cmd: dict):
         """Handle move_all_angles_sync().
 
         e.g. {"cmd": "move_all_angles_sync", "angles": [30, None, -30, 0],
-          "move_sec": 0.2,  # optional
+          "move_sec": 0.2,  # optional ("auto": `MultiServo.plan_move()`)
           "step_n": 40  # optional
         }
         """
-        _angles = cmd["angles"]
+        _move_sec, _step_n = self._get_move_params(cmd)
 
-        _move_sec = cmd.get("move_sec")
-        if _move_sec is None:
-            _move_sec = self.move_sec
-
-        _step_n = cmd.get("step_n")
-        if _step_n is None:
-            _step_n = self.step_n
-
-        self.mservo.move_all_angles_sync(_angles, _move_sec, _step_n)
+        _t0 = self.clock.now()
+        _sec = self.mservo.move_all_angles_sync(
+            cmd["angles"], _move_sec, _step_n
+        )
+        self._record_move(self.clock.now() - _t0, _move_sec, _sec)
         self._sleep_interval()
 
     def _handle_move_all_angles_sync_relative(self, cmd: dict):
@@ -200,19 +390,13 @@ class ThreadWorker(threading.Thread):
           "step_n": 40  # optional
         }
         """
-        _angle_diffs = cmd["angle_diffs"]
+        _move_sec, _step_n = self._get_move_params(cmd)
 
-        _move_sec = cmd.get("move_sec")
-        if _move_sec is None:
-            _move_sec = self.move_sec
-
-        _step_n = cmd.get("step_n")
-        if _step_n is None:
-            _step_n = self.step_n
-
-        self.mservo.move_all_angles_sync_relative(
-            _angle_diffs, _move_sec, _step_n
+        _t0 = self.clock.now()
+        _sec = self.mservo.move_all_angles_sync_relative(
+            cmd["angle_diffs"], _move_sec, _step_n
         )
+        self._record_move(self.clock.now() - _t0, _move_sec, _sec)
         self._sleep_interval()
 
     def _handle_move_all_angles(self, cmd: dict):
@@ -220,8 +404,7 @@ class ThreadWorker(threading.Thread):
 
         e.g. {"cmd": "move_all_angles", "angles": [30, None, -30, 0]}
         """
-        _angles = cmd["angles"]
-        self.mservo.move_all_angles(_angles)
+        self.mservo.move_all_angles(cmd["angles"], stop_event=self._cancel_ev)
         self._sleep_interval()
 
     def _handle_move_all_pulses_relative(self, cmd: dict):
@@ -236,45 +419,35 @@ class ThreadWorker(threading.Thread):
         self.mservo.move_all_pulses_relative(_pulse_diffs, forced=True)
         self._sleep_interval()
 
-    def _handle_move_sec(self, cmd: dict):
-        """Handle move_sec.
-
-        e.g. {"cmd": "move_sec", "sec": 1.5}
-        """
-        self.move_sec = float(cmd["sec"])
-        self.__log.debug("move_sec=%s", self.move_sec)
-
-    def _handle_step_n(self, cmd: dict):
-        """Handle step_n.
-
-        e.g. {"cmd": "step_n", "n": 40}
-        """
-        self.step_n = int(cmd["n"])
-        self.__log.debug("step_n=%s", self.step_n)
-
-    def _handle_interval(self, cmd: dict):
-        """Handle interval.
-
-        e.g. {"cmd": "interval", "sec": 0.5}
-        """
-        self.interval_sec = float(cmd["sec"])
-        self.__log.debug("set interval_sec=%s", self.interval_sec)
-
     def _handle_sleep(self, cmd: dict):
         """Handle sleep.
 
         e.g. {"cmd": "sleep", "sec": 1.0}
         """
-        _sec = float(cmd["sec"])
+        _sec = self._get_sleep_sec(cmd)
         self.__log.debug("sleep: %s sec", _sec)
         if _sec > 0.0:
-            time.sleep(_sec)
+            if self._wait(_sec):
+                self.__log.debug("sleep: canceled")
+
+    def _handle_follow(self, cmd: dict):
+        """Handle follow. (follow the shared-memory target pose)
+
+        e.g. {"cmd": "follow",
+              "sec": 10.0,  # optional: 省略時はキャンセルされるまで
+              "tick": 0.005,  # optional
+              "max_age": 0.1}  # optional
+        """
+        self.mservo.follow_target_pose(
+            stop_event=self._cancel_ev,
+            **self._get_follow_params(cmd, self.mservo.DEF_TICK_SEC),
+        )
 
     def _sleep_interval(self):
         """sleep interval"""
         if self.interval_sec > 0:
             self.__log.debug("sleep interval_sec: %s sec", self.interval_sec)
-            time.sleep(self.interval_sec)
+            self._wait(self.interval_sec)
 
     def _handle_move_pulse_relative(self, cmd: dict):
         """Handle move pulse relative.
@@ -294,34 +467,49 @@ class ThreadWorker(threading.Thread):
 
         * pulse is current value.
         """
-        _servo = int(cmd["servo"])
-        _target = cmd["target"]
-        
-        self.__log.debug("set: servo:%s", _servo)
- 
-        if _target == "center":
-            self.mservo.set_pulse_center(_servo)
-        elif _target == "min":
-            self.mservo.set_pulse_min(_servo)
-        elif _target == "max":
-            self.mservo.set_pulse_max(_servo)
-        else:
-            self.__log.warning("Invalid target: %s", _target)
+        _params = self._get_set_params(cmd)
+        if _params is None:
+            return
+
+        _servo, _target = _params
+        getattr(self.mservo, f"set_pulse_{_target}")(_servo)
 
     def _dispatch_cmd(self, cmd_data: dict):
         """Dispatch command."""
         self.__log.debug("cmd_data=%a", cmd_data)
+        self._get_handler(cmd_data)(cmd_data)
+
+    def _set_cur_cmd(self, fut: CmdFuture | None):
+        """Set the running command and publish the status."""
+        self.cur_cmd_id = None if fut is None else fut.cmd_id
+        self.cur_cmd = None if fut is None else fut.make_result()["cmd"]
+        self._publish_status()
+
+    def _exec_cmd(self, fut: CmdFuture):
+        """Execute a command and set the result to `fut`."""
+        if not fut.set_running_or_notify_cancel():
+            return  # canceled
+
+        fut.t_start = self.clock.now()
+        if self.trace is not None:
+            self.trace.record_cmd(fut.cmd_id, fut.cmd_data)
+
+        self._set_cur_cmd(fut)
+        try:
+            self._dispatch_cmd(fut.cmd_data)
 
-        _cmd_str = cmd_data.get("cmd")
-        if not _cmd_str:
-            self.__log.error("invalid command (no 'cmd' key): %s", cmd_data)
+        except Exception as _e:
+            fut.t_end = self.clock.now()
+            self.__log.error("%s: %s", type(_e).__name__, _e)
+            self.metrics.record_cmd(fut, err=True)
+            self._set_cur_cmd(None)
+            fut.set_exception(_e)
             return
 
-        handler = self._command_handlers.get(_cmd_str)
-        if handler:
-            handler(cmd_data)
-        else:
-            self.__log.error("unknown command: %s", cmd_data)
+        fut.t_end = self.clock.now()
+        self.metrics.record_cmd(fut)
+        self._set_cur_cmd(None)
+        fut.set_result(fut.make_result())
 
     def run(self):
         """run"""
@@ -330,15 +518,16 @@ class ThreadWorker(threading.Thread):
         self._active = True
 
         while self._active:
-            _cmd_data = self.recv()
-            if not _cmd_data:
+            _fut = self.recv()
+            if _fut is self._SENTINEL:
+                break
+            if not _fut:
                 continue
 
-            self.__log.debug("qsize=%s", self._cmdq.qsize())
-            try:
-                self._dispatch_cmd(_cmd_data)
+            # 取り出した後のコマンドは、直前のキャンセルの影響を受けない
+            self._cancel_ev.clear()
 
-            except Exception as _e:
-                self.__log.error("%s: %s", type(_e).__name__, _e)
+            self.__log.debug("qsize=%s", self._cmdq.qsize())
+            self._exec_cmd(_fut)
 
         self.__log.debug("done")
@@ -0,0 +1,132 @@
+#
+# (c) 2025 Yoichi Tanibayashi
+#
+import math
+import struct
+import time
+from typing import NamedTuple
+
+from .bin_cmd import BinCmd
+
+
+class UdpPacket(NamedTuple):
+    """Decoded UDP datagram. (see `UdpCmd`)"""
+
+    kind: int  # UdpCmd.KIND_POSE | UdpCmd.KIND_CMD
+    session: int
+    seq: int
+    timestamp: float  # 送信側の`time.monotonic()`
+    angles: list | None  # KIND_POSE: None=動かさない
+    cmds: list[dict] | None  # KIND_CMD
+
+
+class UdpCmd:
+    """Compact, sequence-numbered UDP datagram format.
+
+    一つのデータグラムに、一つのパケット。
+
+    **ヘッダー** (24 bytes)
+
+    version(B), kind(B), n(H), session(I), seq(Q), timestamp(d)
+
+    * session: 送信側が起動時に決める乱数。変わったら、seqをリセットする。
+    * seq: 送信側の連番(1から)。古いものや重複は、受信側で捨てる。
+    * timestamp: 送信側の`time.monotonic()`
+
+    **ペイロード**
+
+    * KIND_POSE: 目標角度 float32 * n (NaN: 動かさない)
+    * KIND_CMD: `BinCmd`のフレームを連結したもの (nはバイト数)
+
+    e.g. 4サーボのポーズは、40 bytes
+    """
+
+    VERSION = 1
+
+    HDR = struct.Struct("<BBHIQd")
+
+    KIND_POSE = 1
+    KIND_CMD = 2
+
+    DEF_PORT = 8001
+    MAX_SIZE = 1400  # 断片化しないサイズ
+
+    @classmethod
+    def _pack(
+        cls, kind: int, n: int, session: int, seq: int,
+        timestamp: float | None, payload: bytes,
+    ) -> bytes:
+        """Pack a header and a payload."""
+        if timestamp is None:
+            timestamp = time.monotonic()
+
+        _data = cls.HDR.pack(
+            cls.VERSION, kind, n, session, seq, timestamp
+        ) + payload
+        if len(_data) > cls.MAX_SIZE:
+            raise ValueError(f"too large: {len(_data)} > {cls.MAX_SIZE}")
+        return _data
+
+    @classmethod
+    def encode_pose(
+        cls, session: int, seq: int, angles, timestamp: float | None = None
+    ) -> bytes:
+        """Encode a target pose.
+
+        Args:
+            angles (list[float | None]): 目標角度。Noneは「動かさない」
+        """
+        _payload = struct.pack(
+            f"<{len(angles)}f",
+            *[math.nan if _a is None else float(_a) for _a in angles]
+        )
+        return cls._pack(
+            cls.KIND_POSE, len(angles), session, seq, timestamp, _payload
+        )
+
+    @classmethod
+    def encode_cmds(
+        cls, session: int, seq: int, cmd_list, timestamp: float | None = None
+    ) -> bytes:
+        """Encode commands. (see `BinCmd`)
+
+        Raises:
+            ValueError: バイナリに変換できないコマンド、大きすぎる
+        """
+        _payload = BinCmd.encode_list(cmd_list)
+        return cls._pack(
+            cls.KIND_CMD, len(_payload), session, seq, timestamp, _payload
+        )
+
+    @classmethod
+    def decode(cls, data: bytes) -> UdpPacket:
+        """Decode a datagram.
+
+        Raises:
+            ValueError: 不正なデータグラム
+        """
+        if len(data) < cls.HDR.size:
+            raise ValueError(f"truncated header: {len(data)} bytes")
+
+        _version, _kind, _n, _session, _seq, _ts = cls.HDR.unpack_from(data)
+        if _version != cls.VERSION:
+            raise ValueError(f"unsupported version: {_version}")
+
+        _payload = memoryview(data)[cls.HDR.size:]
+
+        if _kind == cls.KIND_POSE:
+            if len(_payload) != _n * 4:
+                raise ValueError(f"invalid pose: n={_n}")
+            _angles = [
+                None if math.isnan(_v) else _v
+                for _v in struct.unpack(f"<{_n}f", _payload)
+            ]
+            return UdpPacket(_kind, _session, _seq, _ts, _angles, None)
+
+        if _kind == cls.KIND_CMD:
+            if len(_payload) != _n:
+                raise ValueError(f"invalid payload length: n={_n}")
+            _cmds = BinCmd.decode_all(_payload)
+            return UdpPacket(_kind, _session, _seq, _ts, None, _cmds)
+
+        raise ValueError(f"unknown kind: {_kind}")
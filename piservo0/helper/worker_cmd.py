@@ -0,0 +1,180 @@
+#
+# (c) 2025 Yoichi Tanibayashi
+#
+from ..core.multi_servo import MultiServo
+from ..utils.my_logger import get_logger
+
+
+class WorkerCmdMixin:
+    """Command parsing shared by `ThreadWorker` and `AsyncWorker`.
+
+    コマンドの解釈(引数の取り出しと省略時の値)と、設定だけのコマンド
+    (`move_sec`, `step_n`, `interval`)は、ここで共通に実装する。
+    ワーカーには、実際に動かす部分(スレッドで待つか、awaitするか)だけを
+    `_handle_*()`として実装する。
+
+    コマンドの一覧は、`ThreadWorker`を参照。
+    """
+
+    DEF_INTERVAL_SEC = 0.0  # sec
+
+    CMD_CANCEL = "cancel"
+
+    SET_TARGETS = ("center", "min", "max")
+
+    def _init_cmd(
+        self,
+        mservo,
+        move_sec: float | str | None,
+        step_n: int | None,
+        interval_sec: float,
+        debug=False,
+    ):
+        """Initialize the command parameters. (ワーカーの`__init__()`から)
+
+        Args:
+            mservo: `DEF_MOVE_SEC`, `DEF_STEP_N`を持つもの
+                (`MultiServo`, `AsyncMultiServo`)
+        """
+        self.__log = get_logger(self.__class__.__name__, debug)
+
+        if move_sec is None:
+            self.move_sec = mservo.DEF_MOVE_SEC
+        else:
+            self.move_sec = move_sec
+
+        if step_n is None:
+            self.step_n = mservo.DEF_STEP_N
+        else:
+            self.step_n = step_n
+
+        self.interval_sec = interval_sec
+
+        self._command_handlers = {
+            "move":
+            self._handle_move_all_angles_sync,
+
+            "move_all_angles_sync":
+            self._handle_move_all_angles_sync,
+
+            "move_all_angles_sync_relative":
+            self._handle_move_all_angles_sync_relative,
+
+            "move_all_angles":
+            self._handle_move_all_angles,
+
+            "move_all_pulses_relative":
+            self._handle_move_all_pulses_relative,
+
+            "move_sec": self._handle_move_sec,
+            "step_n": self._handle_step_n,
+            "interval": self._handle_interval,
+            "sleep": self._handle_sleep,
+            "set": self._handle_set,
+            "follow": self._handle_follow,
+        }
+
+    def _get_handler(self, cmd_data: dict):
+        """Get the handler of `cmd_data`.
+
+        Raises:
+            ValueError: `cmd`がない、または、未知のコマンド
+        """
+        _cmd_str = cmd_data.get("cmd")
+        if not _cmd_str:
+            raise ValueError(f"invalid command (no 'cmd' key): {cmd_data}")
+
+        handler = self._command_handlers.get(_cmd_str)
+        if not handler:
+            raise ValueError(f"unknown command: {cmd_data}")
+
+        return handler
+
+    def _get_move_params(self, cmd: dict):
+        """Get `move_sec` and `step_n` from `cmd`. (省略時は、現在の設定)"""
+        _move_sec = cmd.get("move_sec")
+        if _move_sec is None:
+            _move_sec = self.move_sec
+
+        _step_n = cmd.get("step_n")
+        if _step_n is None:
+            _step_n = self.step_n
+
+        return _move_sec, _step_n
+
+    def _record_move(self, exec_sec: float, move_sec, sec: float | None):
+        """Record a move to `metrics`.
+
+        Args:
+            move_sec: 指定した動作時間 ("auto"の場合は、`sec`)
+            sec: 動作時間 (`move_all_angles_sync()`の戻り値)
+        """
+        if move_sec == MultiServo.MOVE_SEC_AUTO:
+            move_sec = sec or 0.0
+        self.metrics.record_move(exec_sec, move_sec)
+
+    @staticmethod
+    def _get_sleep_sec(cmd: dict) -> float:
+        """Get `sec` of the sleep command."""
+        return float(cmd["sec"])
+
+    @staticmethod
+    def _get_follow_params(cmd: dict, def_tick_sec: float) -> dict:
+        """Get the keyword arguments of `follow_target_pose()`.
+
+        e.g. {"cmd": "follow", "sec": 10.0, "tick": 0.005, "max_age": 0.1}
+        (`stop_event`は、ワーカーが加える)
+        """
+        _sec = cmd.get("sec")
+        _tick = cmd.get("tick")
+        if _tick is None:
+            _tick = def_tick_sec
+
+        return {
+            "tick_sec": float(_tick),
+            "duration_sec": None if _sec is None else float(_sec),
+            "max_age_sec": cmd.get("max_age"),
+        }
+
+    def _get_set_params(self, cmd: dict):
+        """Get (servo, target) of the set command.
+
+        Returns:
+            tuple[int, str] | None: `target`が不正な場合は、None
+        """
+        _servo = int(cmd["servo"])
+        _target = cmd["target"]
+        self.__log.debug("set: servo:%s", _servo)
+
+        if _target not in self.SET_TARGETS:
+            self.__log.warning("Invalid target: %s", _target)
+            return None
+        return _servo, _target
+
+    def _handle_move_sec(self, cmd: dict):
+        """Handle move_sec.
+
+        e.g. {"cmd": "move_sec", "sec": 1.5}
+             {"cmd": "move_sec", "sec": "auto"}  # `MultiServo.plan_move()`
+        """
+        _sec = cmd["sec"]
+        if _sec != MultiServo.MOVE_SEC_AUTO:
+            _sec = float(_sec)
+        self.move_sec = _sec
+        self.__log.debug("move_sec=%s", self.move_sec)
+
+    def _handle_step_n(self, cmd: dict):
+        """Handle step_n.
+
+        e.g. {"cmd": "step_n", "n": 40}
+        """
+        self.step_n = int(cmd["n"])
+        self.__log.debug("step_n=%s", self.step_n)
+
+    def _handle_interval(self, cmd: dict):
+        """Handle interval.
+
+        e.g. {"cmd": "interval", "sec": 0.5}
+        """
+        self.interval_sec = float(cmd["sec"])
+        self.__log.debug("set interval_sec=%s", self.interval_sec)
@@ -0,0 +1,90 @@
+#
+# (c) 2025 Yoichi Tanibayashi
+#
+"""clock.py"""
+import threading
+import time
+
+
+class Clock:
+    """Real-time clock. (`time.monotonic()`)
+
+    `MultiServo`, `ThreadWorker`は、時刻の取得と待ちを、
+    すべてこのインターフェースで行う。
+    `SimClock`に差し替えると、待ち時間なしで同じ手順を実行できる。
+
+    `event`(`threading.Event`)を渡すと、セットされた時点で待ちを中断する。
+    """
+
+    def now(self) -> float:
+        """Current time (sec)."""
+        return time.monotonic()
+
+    def sleep(self, sec: float, event=None) -> bool:
+        """Sleep `sec` seconds, unless `event` is set.
+
+        Returns:
+            bool: `True`の場合、`event`により中断された
+        """
+        if event is not None:
+            if sec <= 0:
+                return event.is_set()
+            return event.wait(sec)
+
+        if sec > 0:
+            time.sleep(sec)
+        return False
+
+    def sleep_until(self, t: float, event=None) -> bool:
+        """Sleep until `t`. (see `sleep()`)"""
+        return self.sleep(t - self.now(), event)
+
+
+class SimClock(Clock):
+    """Simulated clock: sleeping advances the time instantly.
+
+    `sleep_until()`は、待たずに時刻を`t`まで進めて返る。
+    パルス幅を出力する時刻の並び(タイムライン)は、実時間と同じになるので、
+    長い振り付けも、数ミリ秒で検証・計時できる。
+
+    e.g.
+        _clock = SimClock()
+        _mservo = MultiServo(MemPi(), [17, 27], clock=_clock)
+        _mservo.move_all_angles_sync([90, -90], move_sec=600.0)
+        _clock.now()  # 600.0
+
+    時刻は一つだけなので、複数のスレッドが同時に待つと、
+    遅い方の時刻まで進む。
+    """
+
+    def __init__(self, t0: float = 0.0):
+        """Constructor.
+
+        Args:
+            t0: 開始時刻(秒)
+        """
+        self._t = t0
+        self._lock = threading.Lock()
+
+    def now(self) -> float:
+        """Current simulated time (sec)."""
+        return self._t
+
+    def sleep_until(self, t: float, event=None) -> bool:
+        """Advance the time to `t`, unless `event` is set."""
+        if event is not None and event.is_set():
+            return True
+
+        with self._lock:
+            if t > self._t:
+                self._t = t
+        return False
+
+    def sleep(self, sec: float, event=None) -> bool:
+        """Advance the time by `sec`, unless `event` is set."""
+        return self.sleep_until(self._t + sec, event)
+
+    def advance(self, sec: float):
+        """Advance the time by `sec` seconds."""
+        with self._lock:
+            self._t += sec
@@ -0,0 +1,195 @@
+#
+# (c) 2025 Yoichi Tanibayashi
+#
+"""metrics.py"""
+import threading
+from array import array
+
+
+class Histogram:
+    """Fixed-size, low-overhead histogram (HDR-style buckets).
+
+    値(整数, 単位はマイクロ秒を想定)を、対数・線形の組み合わせの
+    バケットに記録する。
+
+    * `SUB_BUCKET_N`未満の値は、1刻みで正確に記録する。
+    * それ以上の値は、2のべき乗ごとに`SUB_BUCKET_N`個のバケットに分ける。
+      (相対誤差は、おおよそ 1/`SUB_BUCKET_N` 以下)
+
+    バケットは、初期化時に確保した`array`だけを使うので、
+    記録時にメモリ確保は発生しない。
+    `MAX_VALUE`以上の値は、最後のバケットに記録される。
+    """
+
+    SUB_BUCKET_BITS = 4
+    SUB_BUCKET_N = 1 << SUB_BUCKET_BITS
+    MAX_BITS = 32  # 2**32 usec = 約71分
+    MAX_VALUE = (1 << MAX_BITS) - 1
+
+    BUCKET_N = SUB_BUCKET_N * (MAX_BITS - SUB_BUCKET_BITS + 1)
+
+    DEF_PERCENTILES = (50.0, 90.0, 99.0, 99.9)
+
+    def __init__(self, name: str = "", unit: str = "usec"):
+        """Constructor."""
+        self.name = name
+        self.unit = unit
+
+        self._counts = array("Q", bytes(8 * self.BUCKET_N))
+        self.reset()
+
+    def reset(self):
+        """Reset all counts."""
+        for _i in range(self.BUCKET_N):
+            self._counts[_i] = 0
+
+        self.count = 0
+        self.total = 0
+        self.min = 0
+        self.max = 0
+
+    @classmethod
+    def bucket_index(cls, value: int) -> int:
+        """Value to bucket index."""
+        if value < cls.SUB_BUCKET_N:
+            return value
+
+        _shift = value.bit_length() - cls.SUB_BUCKET_BITS - 1
+        return (
+            cls.SUB_BUCKET_N * (_shift + 1)
+            + (value >> _shift) - cls.SUB_BUCKET_N
+        )
+
+    @classmethod
+    def bucket_range(cls, index: int) -> tuple[int, int]:
+        """Bucket index to value range (low, high). (両端を含む)"""
+        if index < cls.SUB_BUCKET_N:
+            return index, index
+
+        _shift = index // cls.SUB_BUCKET_N - 1
+        _m = index % cls.SUB_BUCKET_N + cls.SUB_BUCKET_N
+        return _m << _shift, ((_m + 1) << _shift) - 1
+
+    def record(self, value: int | float):
+        """Record a value.
+
+        負の値は0として記録する。
+        """
+        _v = int(value)
+        if _v < 0:
+            _v = 0
+        elif _v > self.MAX_VALUE:
+            _v = self.MAX_VALUE
+
+        self._counts[self.bucket_index(_v)] += 1
+
+        if self.count == 0 or _v < self.min:
+            self.min = _v
+        if _v > self.max:
+            self.max = _v
+        self.count += 1
+        self.total += _v
+
+    def record_sec(self, sec: float):
+        """Record a value in seconds (as micro seconds)."""
+        self.record(sec * 1_000_000)
+
+    @property
+    def mean(self) -> float:
+        """Mean value."""
+        if self.count == 0:
+            return 0.0
+        return self.total / self.count
+
+    def percentile(self, pct: float) -> int:
+        """Value at the given percentile (0.0 .. 100.0).
+
+        バケットの上限値を返す。(ただし、最大値を超えない)
+        """
+        if self.count == 0:
+            return 0
+
+        _target = max(1, int(self.count * pct / 100.0 + 0.5))
+        _n = 0
+        for _i in range(self.BUCKET_N):
+            _n += self._counts[_i]
+            if _n >= _target:
+                return min(self.bucket_range(_i)[1], self.max)
+
+        return self.max
+
+    def to_dict(self, percentiles=DEF_PERCENTILES) -> dict:
+        """Summary of the histogram."""
+        _d = {
+            "unit": self.unit,
+            "count": self.count,
+            "min": self.min,
+            "max": self.max,
+            "mean": round(self.mean, 1),
+        }
+        for _pct in percentiles:
+            _d[f"p{_pct:g}"] = self.percentile(_pct)
+        return _d
+
+    def buckets(self) -> list[tuple[int, int, int]]:
+        """Non-empty buckets: [(low, high, count), ..]"""
+        return [
+            (*self.bucket_range(_i), self._counts[_i])
+            for _i in range(self.BUCKET_N)
+            if self._counts[_i]
+        ]
+
+
+class WorkerMetrics:
+    """Metrics of a command worker.
+
+    * queue_wait: キューに入ってから、実行開始までの時間
+    * exec: コマンドの実行時間
+    * overrun: 移動コマンドの実行時間の`move_sec`からの超過分
+    """
+
+    def __init__(self):
+        """Constructor."""
+        self._lock = threading.Lock()
+
+        self.queue_wait = Histogram("queue_wait")
+        self.exec = Histogram("exec")
+        self.overrun = Histogram("overrun")
+
+        self.cmd_n = 0
+        self.err_n = 0
+
+    def record_cmd(self, fut, err: bool = False):
+        """Record timing of a finished command (`CmdFuture`)."""
+        with self._lock:
+            self.cmd_n += 1
+            if err:
+                self.err_n += 1
+            if fut.t_start is None or fut.t_end is None:
+                return
+            self.queue_wait.record_sec(fut.t_start - fut.t_queued)
+            self.exec.record_sec(fut.t_end - fut.t_start)
+
+    def record_move(self, elapsed_sec: float, move_sec: float):
+        """Record overrun of a move command."""
+        with self._lock:
+            self.overrun.record_sec(elapsed_sec - move_sec)
+
+    def reset(self):
+        """Reset all metrics."""
+        with self._lock:
+            for _h in (self.queue_wait, self.exec, self.overrun):
+                _h.reset()
+            self.cmd_n = 0
+            self.err_n = 0
+
+    def to_dict(self) -> dict:
+        """Summary of the metrics."""
+        with self._lock:
+            return {
+                "cmd_n": self.cmd_n,
+                "err_n": self.err_n,
+                "queue_wait": self.queue_wait.to_dict(),
+                "exec": self.exec.to_dict(),
+                "overrun": self.overrun.to_dict(),
+            }
@@ -2,32 +2,295 @@
 # (c) 2025 Yoichi Tanibayashi
 #
 """API Client."""
+import itertools
+import json
+import threading
+import time
+from concurrent.futures import Future
+
 import requests
+from requests.adapters import HTTPAdapter
+
+from piservo0 import BinCmd, get_logger
 
-from piservo0 import get_logger
+from .api_ws_client import ApiWsClient
 
 
 class ApiClient:
     """API Client.
 
     POST method    
+
+    `binary=True`の場合、`post_cmds()`と`post_stream()`は、
+    `BinCmd`でエンコードして、`/cmd/bin`に送る。
+
+    **コネクションの再利用**
+
+    `requests.Session`のコネクションプールを使い、keep-aliveで
+    同じTCPコネクションを使い回す。(リクエストごとに接続しない)
+
+    **バッチ送信 (non-blocking)**
+
+    `submit()`は、コマンドを送信待ちのバッチに追加して、すぐに返る。
+    送信用のスレッドが、最初のコマンドから`batch_ms`ミリ秒の間に
+    `submit()`されたコマンドを、一つのJSON配列にまとめてPOSTする。
+    結果は、`submit()`が返す`Future`で受け取る。
+    (POSTは一つずつ順に行うので、コマンドの順序は変わらない)
+
+    使い終わったら、`close()`すること。(送信待ちのコマンドも送る)
+
+    **WebSocketストリーミング**
+
+    `open_ws()`で、`/ws`に接続した`ApiWsClient`を得る。
+    一つの接続でコマンドを送り続け、完了イベントを受け取る。
     """
 
     DEF_URL = "http://localhost:8000/cmd"
     HEADERS = {'content-type': 'application/json'}
+    HEADERS_BIN = {'content-type': 'application/octet-stream'}
+
+    DEF_CHUNK_N = 20  # post_stream(): 一度にPOSTするコマンド数
+    DEF_POLL_SEC = 0.05  # post_stream(): キューの長さを確認する間隔
 
-    def __init__(self, url=DEF_URL, debug=False) -> None:
-        """Constractor."""
+    DEF_BATCH_MS = 10.0  # submit(): まとめて送る時間窓
+    DEF_BATCH_MAX = 100  # submit(): 一度に送る最大コマンド数
+    DEF_POOL_N = 4  # コネクションプールのサイズ
+
+    def __init__(
+        self,
+        url=DEF_URL,
+        debug=False,
+        *,
+        binary=False,
+        batch_ms: float = DEF_BATCH_MS,
+        batch_max: int = DEF_BATCH_MAX,
+    ) -> None:
+        """Constractor.
+
+        `binary`, `batch_ms`, `batch_max`は、キーワード引数のみ。
+        (`ApiClient(url, debug)`の呼び出しと互換)
+        """
         self._debug = debug
         self.__log = get_logger(self.__class__.__name__, self._debug)
-        self.__log.debug("url=%s", url)
+        self.__log.debug(
+            "url=%s, binary=%s, batch_ms=%s, batch_max=%s",
+            url, binary, batch_ms, batch_max
+        )
 
         self.url = url
+        self.binary = binary
+        self.bin_url = self.url + "/bin"
+
+        # e.g. "http://localhost:8000/cmd" --> "http://localhost:8000/metrics"
+        self.metrics_url = self.url.rsplit("/", 1)[0] + "/metrics"
+        self.status_url = self.url.rsplit("/", 1)[0] + "/status"
+
+        self.session = requests.Session()
+        _adapter = HTTPAdapter(
+            pool_connections=1, pool_maxsize=self.DEF_POOL_N
+        )
+        self.session.mount("http://", _adapter)
+        self.session.mount("https://", _adapter)
+
+        self.batch_sec = batch_ms / 1000.0
+        self.batch_max = batch_max
+
+        self._pending: list[tuple[Future, list[dict]]] = []
+        self._pending_n = 0
+        self._cond = threading.Condition()
+        self._sender: threading.Thread | None = None
+        self._closed = False
+
+    def close(self):
+        """Send pending commands, and close the session."""
+        self.__log.debug("")
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        if self._sender is not None:
+            self._sender.join()
+        self.session.close()
+
+    def open_ws(
+        self,
+        window: int = ApiWsClient.DEF_WINDOW,
+        on_event=None,
+        telemetry_ms: float = 0.0,
+    ) -> ApiWsClient:
+        """Open a WebSocket streaming session. (see `ApiWsClient`)
+
+        URLは、`url`から作る。(e.g. "http://HOST:8000/cmd" -->
+        "ws://HOST:8000/ws") `binary`も、そのまま引き継ぐ。
+        """
+        _ws = ApiWsClient(
+            ApiWsClient.ws_url(self.url), binary=self.binary, window=window,
+            on_event=on_event, telemetry_ms=telemetry_ms, debug=self._debug
+        )
+        _ws.connect()
+        return _ws
 
     def post(self, data_str: str):
         """Send command line string."""
 
-        res = requests.post(self.url, data=data_str, headers=self.HEADERS)
+        res = self.session.post(
+            self.url, data=data_str, headers=self.HEADERS
+        )
         self.__log.debug("res=%s", res)
 
         return res
+
+    def post_bin(self, cmd_list: list[dict]):
+        """Send commands in the binary format. (see `BinCmd`)
+
+        Raises:
+            ValueError: バイナリに変換できないコマンド
+        """
+        res = self.session.post(
+            self.bin_url, data=BinCmd.encode_list(cmd_list),
+            headers=self.HEADERS_BIN
+        )
+        self.__log.debug("res=%s", res)
+
+        return res
+
+    def post_cmds(self, cmd_list: list[dict]):
+        """Send commands (JSON or binary)."""
+        if self.binary:
+            return self.post_bin(cmd_list)
+        return self.post(json.dumps(cmd_list))
+
+    def get_qsize(self) -> int | None:
+        """Get the command queue length of the server.
+
+        `/status`の`qsize`(サーバーのワーカーのキューの長さ)。
+        `engine="process"`の場合は、リングバッファと
+        ハードウェアプロセスのキューの合計。
+        (`/metrics`は、ヒストグラムを計算するので、ポーリングには使わない)
+        取得できない場合は、None。
+        """
+        try:
+            _res = self.session.get(self.status_url)
+            return int(_res.json()["qsize"])
+
+        except (requests.RequestException, ValueError, KeyError) as _e:
+            self.__log.debug("%s: %s", type(_e).__name__, _e)
+            return None
+
+    def wait_qsize(self, max_qsize: int, poll_sec: float = DEF_POLL_SEC):
+        """Wait until the queue length of the server <= `max_qsize`."""
+        while True:
+            _qsize = self.get_qsize()
+            if _qsize is None or _qsize <= max_qsize:
+                return
+            time.sleep(poll_sec)
+
+    def post_stream(
+        self,
+        cmd_data_iter,
+        chunk_n: int = DEF_CHUNK_N,
+        max_qsize: int | None = None,
+    ):
+        """Send commands in chunks, while the robot is moving.
+
+        `cmd_data_iter`(`StrCmdToJson.iter_cmd_data()`など)から、
+        `chunk_n`個ずつ取り出して、JSON配列としてPOSTする。
+
+        サーバーのキューが`max_qsize`(省略時は`chunk_n`)より長い間は、
+        次のPOSTを待つ。(フロー制御)
+        クライアントもサーバーも、溜め込むコマンドは一定数以内になる。
+        `max_qsize=0`の場合は、待たずにすべて送る。
+
+        Yields:
+            requests.Response: チャンクごとのレスポンス
+        """
+        if max_qsize is None:
+            max_qsize = chunk_n
+
+        _iter = iter(cmd_data_iter)
+        while True:
+            _chunk = list(itertools.islice(_iter, chunk_n))
+            if not _chunk:
+                return
+
+            if max_qsize > 0:
+                self.wait_qsize(max_qsize)
+
+            self.__log.debug("chunk=%s", _chunk)
+            yield self.post_cmds(_chunk)
+
+    def submit(self, cmd_data) -> Future:
+        """Submit commands without blocking.
+
+        Args:
+            cmd_data (dict | list[dict]): コマンド、またはそのリスト
+
+        Returns:
+            Future: 結果は、これらのコマンドに対するレスポンス(list)。
+                送信に失敗した場合は、例外が設定される。
+        """
+        _cmd_list = cmd_data if isinstance(cmd_data, list) else [cmd_data]
+        _fut: Future = Future()
+
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("ApiClient is closed")
+
+            if self._sender is None:
+                self._sender = threading.Thread(
+                    target=self._send_loop, name="ApiClient", daemon=True
+                )
+                self._sender.start()
+
+            self._pending.append((_fut, _cmd_list))
+            self._pending_n += len(_cmd_list)
+            self._cond.notify()
+
+        return _fut
+
+    def _send_loop(self):
+        """Sender thread: send pending commands in batches."""
+        self.__log.debug("start")
+
+        while True:
+            with self._cond:
+                while not self._pending and not self._closed:
+                    self._cond.wait()
+                if not self._pending:
+                    break  # closed
+
+                # 時間窓の間に来たコマンドを、まとめる
+                _deadline = time.monotonic() + self.batch_sec
+                while not self._closed and self._pending_n < self.batch_max:
+                    _remain = _deadline - time.monotonic()
+                    if _remain <= 0:
+                        break
+                    self._cond.wait(_remain)
+
+                _batch = self._pending
+                self._pending = []
+                self._pending_n = 0
+
+            self._send_batch(_batch)
+
+        self.__log.debug("done")
+
+    def _send_batch(self, batch: list[tuple[Future, list[dict]]]):
+        """Send a batch with one POST and distribute the response."""
+        _cmd_list = [_c for _, _cmds in batch for _c in _cmds]
+        self.__log.debug("cmd_n=%s, submit_n=%s", len(_cmd_list), len(batch))
+
+        try:
+            _res = self.post_cmds(_cmd_list)
+            _res.raise_for_status()
+            _items = _res.json()
+
+        except Exception as _e:
+            self.__log.error("%s: %s", type(_e).__name__, _e)
+            for _fut, _ in batch:
+                _fut.set_exception(_e)
+            return
+
+        _i = 0
+        for _fut, _cmds in batch:
+            _fut.set_result(_items[_i:_i + len(_cmds)])
+            _i += len(_cmds)
@@ -0,0 +1,231 @@
+#
+# (c) 2025 Yoichi Tanibayashi
+#
+"""WebSocket API Client."""
+import collections
+import contextlib
+import itertools
+import json
+import threading
+
+from websockets.exceptions import ConnectionClosed
+from websockets.sync.client import connect
+
+from piservo0 import BinCmd, get_logger
+
+
+class ApiWsClient:
+    """WebSocket streaming client. (see `/ws` of the API server)
+
+    一つのWebSocketで、コマンドを連続して送り、
+    サーバーからのイベント(完了、テレメトリーなど)を、受信スレッドで受け取る。
+    コマンドごとのHTTPリクエストがないので、毎秒100コマンド以上送れる。
+
+    `binary=True`の場合は、`BinCmd`でエンコードして送る。
+
+    受信したイベント(dict)は、`on_event`に渡す。
+    (`on_event`は、受信スレッドから呼ばれる)
+
+    **フロー制御**
+
+    未完了のコマンドが`window`個以上ある間は、`send()`がブロックする。
+    サーバーのキューに溜まるコマンドは、`window`個以内になる。
+    `window=0`の場合は、ブロックしない。
+    """
+
+    DEF_URL = "ws://localhost:8000/ws"
+    DEF_WINDOW = 20  # 未完了のコマンドの最大数
+
+    # コマンドが終わったことを示すイベント
+    END_EVENTS = ("done", "error", "canceled")
+
+    def __init__(
+        self,
+        url=DEF_URL,
+        binary=False,
+        window: int = DEF_WINDOW,
+        on_event=None,
+        telemetry_ms: float = 0.0,
+        debug=False,
+    ) -> None:
+        """Constractor."""
+        self._debug = debug
+        self.__log = get_logger(self.__class__.__name__, self._debug)
+        self.__log.debug(
+            "url=%s, binary=%s, window=%s, telemetry_ms=%s",
+            url, binary, window, telemetry_ms
+        )
+
+        self.url = url
+        if telemetry_ms > 0:
+            self.url += f"?telemetry_ms={telemetry_ms}"
+
+        self.binary = binary
+        self.window = window
+        self.on_event = on_event
+
+        self.conn = None
+        self._stack = contextlib.ExitStack()
+        self._receiver: threading.Thread | None = None
+
+        self._cond = threading.Condition()
+        self._send_lock = threading.Lock()  # 送信の順序 (`_msg_n`の順序)
+        self._inflight = 0  # 未完了のコマンド数
+        self._msg_n: collections.deque = collections.deque()  # 応答待ち
+        self._closed = False
+
+        self.sent_n = 0
+        self.done_n = 0
+
+    @staticmethod
+    def ws_url(http_url: str) -> str:
+        """Make the WebSocket URL from the HTTP API URL.
+
+        e.g. "http://localhost:8000/cmd" --> "ws://localhost:8000/ws"
+        """
+        _base = http_url.rsplit("/", 1)[0]
+        if _base.startswith("https://"):
+            return "wss://" + _base[len("https://"):] + "/ws"
+        if _base.startswith("http://"):
+            return "ws://" + _base[len("http://"):] + "/ws"
+        return _base + "/ws"
+
+    def connect(self):
+        """Connect and start the receiver thread."""
+        self.__log.debug("url=%s", self.url)
+        self.conn = self._stack.enter_context(connect(self.url))
+        self._receiver = threading.Thread(
+            target=self._recv_loop, name="ApiWsClient", daemon=True
+        )
+        self._receiver.start()
+
+    def close(self):
+        """Close the connection."""
+        self.__log.debug("sent_n=%s, done_n=%s", self.sent_n, self.done_n)
+        self._stack.close()
+        if self._receiver is not None:
+            self._receiver.join()
+
+    @property
+    def inflight(self) -> int:
+        """Number of commands not completed yet."""
+        return self._inflight
+
+    def send(self, cmd_data):
+        """Send commands (one message).
+
+        未完了のコマンドが`window`個以上ある間は、ブロックする。
+
+        Args:
+            cmd_data (dict | list[dict]): コマンド、またはそのリスト
+
+        Raises:
+            ValueError: バイナリに変換できないコマンド
+            ConnectionError: 接続が切れた
+        """
+        _cmd_list = cmd_data if isinstance(cmd_data, list) else [cmd_data]
+        if not _cmd_list:
+            return
+
+        if self.binary:
+            _msg: str | bytes = BinCmd.encode_list(_cmd_list)
+        else:
+            _msg = json.dumps(_cmd_list, separators=(",", ":"))
+
+        # 複数のスレッドから送っても、`_msg_n`と送信の順序が合うように
+        with self._send_lock:
+            # ウィンドウの枠の予約だけ、`_cond`の中で行う
+            # (送信中も、受信スレッドが`_cond`を取れるように)
+            with self._cond:
+                while (
+                    self.window > 0
+                    and self._inflight >= self.window
+                    and not self._closed
+                ):
+                    self._cond.wait()
+                if self._closed:
+                    raise ConnectionError("WebSocket is closed")
+
+                self._inflight += len(_cmd_list)
+                self._msg_n.append(len(_cmd_list))
+
+            assert self.conn is not None
+            try:
+                self.conn.send(_msg)
+
+            except ConnectionClosed as _e:
+                # 予約を取り消す (`_send_lock`の中なので、最後のもの)
+                with self._cond:
+                    self._inflight -= self._msg_n.pop()
+                    self._cond.notify_all()
+                raise ConnectionError("WebSocket is closed") from _e
+
+            self.sent_n += len(_cmd_list)
+
+    def send_stream(self, cmd_data_iter, chunk_n: int = 1) -> int:
+        """Send commands from an iterator.
+
+        `chunk_n`個ずつ、一つのメッセージにまとめて送る。
+
+        Returns:
+            int: 送ったコマンドの数
+        """
+        _n = 0
+        _iter = iter(cmd_data_iter)
+        while True:
+            _chunk = list(itertools.islice(_iter, chunk_n))
+            if not _chunk:
+                return _n
+            self.send(_chunk)
+            _n += len(_chunk)
+
+    def wait_done(self, timeout: float | None = None) -> bool:
+        """Wait until all sent commands are completed.
+
+        Returns:
+            bool: `False`の場合、タイムアウトまたは接続が切れた
+        """
+        with self._cond:
+            self._cond.wait_for(
+                lambda: self._inflight == 0 or self._closed, timeout
+            )
+            return self._inflight == 0
+
+    def _recv_loop(self):
+        """Receiver thread."""
+        self.__log.debug("start")
+        assert self.conn is not None
+
+        try:
+            for _msg in self.conn:
+                _event = json.loads(_msg)
+                self._handle_event(_event)
+                if self.on_event is not None:
+                    self.on_event(_event)
+
+        except ConnectionClosed as _e:
+            self.__log.debug("%s: %s", type(_e).__name__, _e)
+
+        finally:
+            with self._cond:
+                self._closed = True
+                self._cond.notify_all()
+
+        self.__log.debug("done")
+
+    def _handle_event(self, event: dict):
+        """Update the number of inflight commands."""
+        _name = event.get("event")
+        with self._cond:
+            if _name == "queued":
+                self._msg_n.popleft()
+
+            elif _name == "error" and "id" not in event:
+                # メッセージ全体が、拒否された
+                self._inflight -= self._msg_n.popleft()
+                self._cond.notify_all()
+
+            elif _name in self.END_EVENTS:
+                self._inflight -= 1
+                self.done_n += 1
+                self._cond.notify_all()
@@ -0,0 +1,110 @@
+#
+# (c) 2025 Yoichi Tanibayashi
+#
+"""Fast JSON / msgpack codec for the API server.
+
+`orjson`と`msgpack`は、オプション。
+インストールされていなければ、標準の`json`を使う。
+(msgpackのリクエストは、415エラーになる)
+"""
+import json
+from typing import Any
+
+from fastapi.responses import JSONResponse, Response
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None  # type: ignore
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover
+    msgpack = None  # type: ignore
+
+JSON_TYPE = "application/json"
+MSGPACK_TYPES = ("application/msgpack", "application/x-msgpack")
+
+
+class CodecUnavailableError(RuntimeError):
+    """The codec of the request is not installed. (e.g. msgpack)"""
+
+
+def dumps_json(obj: Any) -> bytes:
+    """Serialize to JSON (orjson, if available)."""
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, separators=(",", ":")).encode("utf-8")
+
+
+def loads_json(data: bytes | str) -> Any:
+    """Deserialize JSON (orjson, if available).
+
+    Raises:
+        ValueError: 不正なJSON
+    """
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def is_msgpack(content_type: str | None) -> bool:
+    """`True` if `content_type` is msgpack."""
+    if not content_type:
+        return False
+    return content_type.split(";")[0].strip().lower() in MSGPACK_TYPES
+
+
+def accepts_msgpack(accept: str | None) -> bool:
+    """`True` if the `Accept` header prefers msgpack (and available)."""
+    if msgpack is None or not accept:
+        return False
+    return any(is_msgpack(_t) for _t in accept.split(","))
+
+
+def decode_body(body: bytes, content_type: str | None) -> Any:
+    """Decode a request body (JSON or msgpack).
+
+    Raises:
+        ValueError: 不正なボディ
+        CodecUnavailableError: msgpackがインストールされていない
+    """
+    if is_msgpack(content_type):
+        if msgpack is None:
+            raise CodecUnavailableError("msgpack is not installed")
+        try:
+            return msgpack.unpackb(body)
+        except Exception as _e:
+            raise ValueError(f"invalid msgpack: {_e}") from _e
+
+    return loads_json(body)
+
+
+class FastJSONResponse(JSONResponse):
+    """JSON response serialized by `dumps_json()`."""
+
+    def render(self, content: Any) -> bytes:
+        """render"""
+        return dumps_json(content)
+
+
+class MsgpackResponse(Response):
+    """msgpack response."""
+
+    media_type = MSGPACK_TYPES[0]
+
+    def render(self, content: Any) -> bytes:
+        """render"""
+        assert msgpack is not None
+        return msgpack.packb(content)
+
+
+def make_response(content: Any, accept: str | None = None) -> Response:
+    """Make a response for the `Accept` header.
+
+    FastAPIの`jsonable_encoder`を通さずに、直接シリアライズする。
+    (dict, list, str, 数値, None, タプルだけを含むこと)
+    """
+    if accepts_msgpack(accept):
+        return MsgpackResponse(content)
+    return FastJSONResponse(content)
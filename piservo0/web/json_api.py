@@ -4,46 +4,249 @@
 """
 piservo0 JSON API Server
 """
+import asyncio
 import os
 from contextlib import asynccontextmanager
-from typing import Any, Dict, List, Union
+from typing import Any, Dict, List
+
+from fastapi import (
+    FastAPI,
+    HTTPException,
+    Request,
+    WebSocket,
+    WebSocketDisconnect,
+)
+from fastapi.responses import StreamingResponse
+
+from piservo0 import (
+    AsyncMultiServo,
+    AsyncWorker,
+    BinCmd,
+    MultiServo,
+    ProcessWorker,
+    ShmTargetPose,
+    ThreadWorker,
+    TracePi,
+    TraceRecorder,
+    get_logger,
+)
+from piservo0.backend.factory import (
+    BACKEND_PIGPIO,
+    BACKENDS,
+    attach_pi,
+    open_pi,
+)
+from piservo0.web.codec import (
+    CodecUnavailableError,
+    FastJSONResponse,
+    decode_body,
+    dumps_json,
+    loads_json,
+    make_response,
+)
+from piservo0.web.telemetry import EventQueue, TelemetryHub
+from piservo0.web.udp_server import UdpServer
 
-import pigpio
-from fastapi import Body, FastAPI, Request
 
-from piservo0 import MultiServo, ThreadWorker, get_logger
+class JsonApi:
+    """Main class for Web Application
 
+    `engine`で、コマンドを実行するワーカーを選択する。
 
-class JsonApi:
-    """Main class for Web Application"""
+    * "thread": `ThreadWorker` (別スレッドで実行)
+    * "async": `AsyncWorker` (サーバーと同じイベントループで実行)
+    * "process": `ProcessWorker` (専用のプロセスで実行)
+    """
 
-    def __init__(self, pins, debug=False):
-        """constractor"""
+    ENGINE_THREAD = "thread"
+    ENGINE_ASYNC = "async"
+    ENGINE_PROCESS = "process"
+    ENGINES = (ENGINE_THREAD, ENGINE_ASYNC, ENGINE_PROCESS)
+
+    def __init__(
+        self,
+        pins,
+        engine=ENGINE_THREAD,
+        target_pose_name=None,
+        trace_file=None,
+        ring_name=None,
+        backend=BACKEND_PIGPIO,
+        debug=False,
+    ):
+        """constractor
+
+        `engine="async"`の場合は、イベントループ上で呼び出すこと。
+
+        `target_pose_name`を指定した場合は、その名前で`ShmTargetPose`を
+        作成する。外部プロセスは、この名前で接続して目標角度を書き込み、
+        `{"cmd": "follow"}`コマンドで追従させる。
+
+        `trace_file`を指定した場合は、実行したコマンドと出力したパルスを
+        記録する。(`piservo0 replay`で再生できる)
+
+        `engine="process"`で`ring_name`を指定した場合は、起動済みの
+        ハードウェアプロセスのリングバッファに接続するだけで、
+        ハードウェア、`ShmTargetPose`、トレースは、そのプロセスに任せる。
+        (`piservo0 api-server --production`のHTTPワーカープロセス)
+
+        `backend`は、出力先。"mem"の場合は、ハードウェアを使わない。
+        (負荷試験用。see `open_pi()`)
+        """
         self._debug = debug
         self.__log = get_logger(self.__class__.__name__, self._debug)
 
         self.pins = pins
+        self.engine = engine
 
-        self.__log.debug("pins=%s", self.pins)
+        self.__log.debug(
+            "pins=%s, engine=%s, target_pose_name=%s, trace_file=%s, "
+            "ring_name=%s, backend=%s",
+            self.pins, self.engine, target_pose_name, trace_file, ring_name,
+            backend
+        )
 
-        print("Initializing ...")
-        self.pi = pigpio.pi()
+        if self.engine not in self.ENGINES:
+            raise ValueError(f"invalid engine: {self.engine}")
+        if backend not in BACKENDS:
+            raise ValueError(f"invalid backend: {backend}")
 
-        self.mservo = MultiServo(self.pi, self.pins) #  debug=self._debug)
-        self.thr_worker = ThreadWorker(self.mservo, debug=self._debug)
-        self.thr_worker.start()
+        print("Initializing ...")
 
-    def end(self):
+        if ring_name and self.engine != self.ENGINE_PROCESS:
+            raise ValueError(
+                f"ring_name requires engine={self.ENGINE_PROCESS}"
+            )
+
+        self.target_pose: ShmTargetPose | None = None
+        if target_pose_name and not ring_name:
+            self.target_pose = ShmTargetPose(
+                len(self.pins), name=target_pose_name, create=True
+            )
+
+        self.trace: TraceRecorder | None = None
+
+        self.pi = None
+        self.mservo: MultiServo | None = None
+        self.amservo: AsyncMultiServo | None = None
+        self.worker: ThreadWorker | AsyncWorker | ProcessWorker
+
+        if self.engine == self.ENGINE_PROCESS:
+            # ハードウェアは、専用のプロセスが所有する
+            self.worker = ProcessWorker(
+                self.pins, target_pose_name=target_pose_name,
+                trace_file=trace_file, ring_name=ring_name,
+                backend=backend,
+                # `ring_name`は、productionのHTTPワーカー
+                # (リングバッファを作ったプロセスの子プロセス)
+                ring_untrack=False,
+                debug=self._debug
+            )
+        else:
+            self.pi = open_pi(backend, debug=self._debug)
+            _pi = self.pi
+            if trace_file:
+                self.trace = TraceRecorder(trace_file, debug=self._debug)
+                self.pi = TracePi(self.pi, self.trace)
+
+            self.mservo = MultiServo(self.pi, self.pins)
+            attach_pi(_pi, self.mservo)
+            if self.target_pose:
+                self.mservo.attach_target_pose(self.target_pose)
+
+            if self.engine == self.ENGINE_ASYNC:
+                self.amservo = AsyncMultiServo(
+                    self.mservo, debug=self._debug
+                )
+                self.worker = AsyncWorker(
+                    self.amservo, trace=self.trace, debug=self._debug
+                )
+            else:
+                self.worker = ThreadWorker(
+                    self.mservo, trace=self.trace, debug=self._debug
+                )
+
+        self.worker.start()
+
+        self.telemetry = TelemetryHub(self.snapshot, debug=self._debug)
+
+        self.udp: UdpServer | None = None
+
+    async def start_udp(self, port: int, host: str = "0.0.0.0"):
+        """Start the UDP control server. (see `UdpServer`)
+
+        `target_pose`があれば、ポーズはそこに書き込む。
+        """
+        self.udp = UdpServer(
+            self.worker, target_pose=self.target_pose,
+            servo_n=len(self.pins), debug=self._debug
+        )
+        return await self.udp.start(host, port)
+
+    async def end(self):
         """end"""
-        self.thr_worker.end()
+        if self.udp:
+            self.udp.end()
+
+        await self.telemetry.end()
+
+        if isinstance(self.worker, AsyncWorker):
+            await self.worker.end()
+        else:
+            self.worker.end()
+
+        if self.amservo:
+            self.amservo.end()
+
+        if self.target_pose:
+            self.target_pose.close()
+
+        if self.trace:
+            self.trace.close()
+
+    def snapshot(self) -> dict:
+        """Snapshot of the state. (see `/status`, `/telemetry`)
+
+        ワーカーが公開した`status`(`WorkerStatus`)を、dictにして返す。
+        参照を一つ読むだけなので、ロックもpigpioの読み出しもしない。
+
+        `engine="process"`の場合は、ハードウェアプロセスが共有メモリに
+        書き込んだもの。(see `ProcessWorker.status`)
+        """
+        return self.worker.status._asdict()
 
     def send_cmdjson(self, cmdjson):
-        """send JSON command to thread worker"""
+        """send JSON command to the worker
+
+        Returns:
+            CmdFuture: コマンドの完了を待つためのFuture
+        """
         self.__log.debug("cmdjson=%s", cmdjson)
 
-        _res = self.thr_worker.send(cmdjson)
+        _fut = self.worker.send(cmdjson)
+
+        return _fut
 
-        return _res
+    @staticmethod
+    def echo_data(fut) -> Any:
+        """Make response data (echo back with command id)."""
+        if isinstance(fut.cmd_data, dict):
+            return dict(fut.cmd_data, id=fut.cmd_id)
+        return fut.cmd_data
+
+    @staticmethod
+    def result_event(fut) -> dict:
+        """Make an event of the command completion. (see `/ws`)"""
+        if fut.cancelled():
+            return {"event": "canceled", "id": fut.cmd_id}
+
+        _e = fut.exception()
+        if _e is not None:
+            return {
+                "event": "error", "id": fut.cmd_id,
+                "err": f"{type(_e).__name__}: {_e}",
+            }
+
+        return dict(fut.result(), event="done")
 
 
 # --- FastAPI Lifespan Management ---
@@ -58,19 +261,38 @@ async def lifespan(app: FastAPI):
     debug_str = os.getenv("PISERVO0_DEBUG", "0")
     debug = debug_str == "1"
 
-    log = get_logger(__name__, debug)
-    log.debug("pins=%s, debug=%s", pins, debug)
+    engine = os.getenv("PISERVO0_ENGINE", JsonApi.ENGINE_THREAD)
+    target_pose_name = os.getenv("PISERVO0_TARGET_POSE") or None
+    trace_file = os.getenv("PISERVO0_TRACE") or None
+    ring_name = os.getenv("PISERVO0_RING") or None
+    udp_port = int(os.getenv("PISERVO0_UDP_PORT") or 0)
+    backend = os.getenv("PISERVO0_BACKEND") or BACKEND_PIGPIO
 
-    app.state.json_app = JsonApi(pins, debug=debug)
+    log = get_logger(__name__, debug)
+    log.debug(
+        "pins=%s, engine=%s, target_pose_name=%s, trace_file=%s, "
+        "ring_name=%s, udp_port=%s, backend=%s, debug=%s",
+        pins, engine, target_pose_name, trace_file, ring_name, udp_port,
+        backend, debug
+    )
+
+    app.state.json_app = JsonApi(
+        pins, engine=engine, target_pose_name=target_pose_name,
+        trace_file=trace_file, ring_name=ring_name, backend=backend,
+        debug=debug
+    )
     app.state.debug = debug
 
+    if udp_port:
+        await app.state.json_app.start_udp(udp_port)
+
     yield
 
-    app.state.json_app.end()
+    await app.state.json_app.end()
 
 
 # --- make 'app' ---
-app = FastAPI(lifespan=lifespan)
+app = FastAPI(lifespan=lifespan, default_response_class=FastJSONResponse)
 
 
 # --- API Endpoints ---
@@ -80,17 +302,92 @@ async def read_root():
     return {"Hello": "World"}
 
 
+ACK_FULL = "full"
+ACK_MINIMAL = "minimal"
+
+
+async def submit_cmds(
+    request: Request, cmd_list: List[Dict[str, Any]], wait: bool,
+    ack: str = ACK_FULL,
+) -> Any:
+    """Send commands to the worker and make the response.
+
+    `wait=True`の場合は、すべてのコマンドの完了を待ち、
+    各コマンドの結果(ID, 待ち時間, 実行時間)を返す。
+    それ以外は、コマンドIDを付けたエコーバックを返す。
+
+    `ack="minimal"`の場合は、エコーバックや結果の代わりに、
+    コマンドIDのリストと数だけを返す。
+    (`wait=True`の場合は、失敗したコマンドの"err"も)
+    """
+    _json_app = request.app.state.json_app
+    _futs = [_json_app.send_cmdjson(c) for c in cmd_list]
+
+    _res: List[Any]
+    if wait:
+        _res = await asyncio.gather(
+            *[asyncio.wrap_future(f) for f in _futs],
+            return_exceptions=True
+        )
+        _res = [
+            {"id": f.cmd_id, "err": f"{type(r).__name__}: {r}"}
+            if isinstance(r, BaseException)
+            else r
+            for f, r in zip(_futs, _res)
+        ]
+    elif ack != ACK_MINIMAL:
+        _res = [_json_app.echo_data(f) for f in _futs]
+
+    if ack == ACK_MINIMAL:
+        _ack: Dict[str, Any] = {
+            "n": len(_futs), "ids": [f.cmd_id for f in _futs]
+        }
+        if wait:
+            _ack["err"] = [r for r in _res if "err" in r]
+        return _ack
+
+    return _res
+
+
+def check_ack(ack: str):
+    """Check `?ack=`."""
+    if ack not in (ACK_FULL, ACK_MINIMAL):
+        raise HTTPException(status_code=400, detail=f"invalid ack: {ack}")
+
+
 @app.post("/cmd")
 async def exec_cmd(
     request: Request,
-    cmd: Union[List[Dict[str, Any]], Dict[str, Any]] = Body()
+    wait: bool = False,
+    ack: str = ACK_FULL,
 ):
     """execute commands.
 
-       JSON配列を受け取り、コマンドを実行する。
+       JSON配列(または一つのコマンド)を受け取り、コマンドを実行する。
+       レスポンスは、コマンドIDを付けたエコーバック。
+
+       `?wait=true`の場合は、すべてのコマンドの完了を待ち、
+       各コマンドの結果(ID, 待ち時間, 実行時間)を返す。
+
+       `?ack=minimal`の場合は、コマンドIDのリストと数だけを返す。
+       (大きなバッチで、エコーバックのシリアライズを省く)
+
+       `Content-Type: application/msgpack`のボディも受け付ける。
+       `Accept: application/msgpack`の場合は、msgpackで返す。
+       (msgpackがインストールされている場合)
     """
     debug = request.app.state.debug
     _log = get_logger(__name__, debug)
+    check_ack(ack)
+
+    _body = await request.body()
+    try:
+        cmd = decode_body(_body, request.headers.get("content-type"))
+    except CodecUnavailableError as _e:
+        raise HTTPException(status_code=415, detail=str(_e)) from _e
+    except ValueError as _e:
+        raise HTTPException(status_code=400, detail=str(_e)) from _e
+
     _log.debug("cmd=%s, type=%s", cmd, type(cmd))
 
     cmd_list: List[Dict[str, Any]]
@@ -99,14 +396,194 @@ async def exec_cmd(
     else:
         cmd_list = cmd
 
+    if not isinstance(cmd_list, list) or not all(
+        isinstance(c, dict) for c in cmd_list
+    ):
+        raise HTTPException(status_code=400, detail=f"invalid command: {cmd}")
+
     _log.debug("cmd_list=%s", cmd_list)
 
-    _json_app = request.app.state.json_app
-    _res = []
-    for c in cmd_list:
-        _res1 = _json_app.send_cmdjson(c)
-        _log.debug("c=%s, _res1=%s", c, _res1)
-        _res.append(_res1)
+    _res = await submit_cmds(request, cmd_list, wait, ack)
 
     _log.debug("_res=%s", _res)
-    return _res
+    return make_response(_res, request.headers.get("accept"))
+
+
+@app.post("/cmd/bin")
+async def exec_cmd_bin(
+    request: Request, wait: bool = False, ack: str = ACK_FULL
+):
+    """execute binary commands. (see `BinCmd`)
+
+       リクエストボディは、`BinCmd`でエンコードしたフレームの列。
+       レスポンスは、`/cmd`と同じ。
+    """
+    debug = request.app.state.debug
+    _log = get_logger(__name__, debug)
+    check_ack(ack)
+
+    _body = await request.body()
+    try:
+        cmd_list = BinCmd.decode_all(_body)
+    except ValueError as _e:
+        raise HTTPException(status_code=400, detail=str(_e)) from _e
+
+    _log.debug("cmd_list=%s", cmd_list)
+
+    _res = await submit_cmds(request, cmd_list, wait, ack)
+
+    _log.debug("_res=%s", _res)
+    return make_response(_res, request.headers.get("accept"))
+
+
+@app.get("/metrics")
+async def get_metrics(request: Request, reset: bool = False):
+    """worker metrics.
+
+       コマンドのキュー待ち時間、実行時間、`move_sec`の超過時間、
+       ステップのジッタのヒストグラムのサマリー(単位: usec)を返す。
+       `?reset=true`の場合は、返した後にリセットする。
+       UDPサーバーが動いていれば、"udp"に、そのメトリクスを含める。
+    """
+    _json_app = request.app.state.json_app
+    _worker = _json_app.worker
+    _metrics = _worker.get_metrics()
+    if _json_app.udp:
+        _metrics = dict(_metrics, udp=_json_app.udp.get_metrics())
+    if reset:
+        _worker.reset_metrics()
+        if _json_app.udp:
+            _json_app.udp.reset_metrics()
+    return _metrics
+
+
+@app.get("/status")
+async def get_status(request: Request):
+    """status.
+
+       ワーカーが公開した、最新の状態のスナップショットを返す。
+       (pulses, angles, qsize, 実行中のコマンド, カウンター)
+       ロックも、pigpioの読み出しもしないので、頻繁に呼んでもよい。
+    """
+    return request.app.state.json_app.snapshot()
+
+
+@app.get("/telemetry")
+async def telemetry(request: Request, n: int = 0):
+    """telemetry stream. (Server-Sent Events)
+
+       ティックごとに、サーボの状態のスナップショットを配信する。
+       (`JsonApi.snapshot()`: pulses, angles, qsize, cmd_id, ..)
+
+       スナップショットは、モーションループが公開したものなので、
+       購読者が何人いても、ハードウェアの読み出しは増えない。
+       `?n=`を指定した場合は、n個送って終了する。
+    """
+    return StreamingResponse(
+        request.app.state.json_app.telemetry.sse(n),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache"},
+    )
+
+
+@app.websocket("/ws")
+async def ws_cmd(websocket: WebSocket, telemetry_ms: float = 0.0):
+    """WebSocket streaming.
+
+       一つのWebSocketで、コマンドを連続して受け取り、
+       コマンドの完了などのイベントを、同じWebSocketで送り返す。
+       (コマンドごとの、HTTPのヘッダや接続のオーバーヘッドがない)
+
+       受信: JSONテキスト(コマンド または その配列)、
+       または`BinCmd`のバイナリ
+
+       送信(JSONテキスト):
+
+       * `{"event": "queued", "ids": [..]}`: 受信したメッセージごと
+       * `{"event": "done", "id": .., ..}`: 完了 (`/cmd?wait=true`と同じ)
+       * `{"event": "error", "id": .., "err": ..}`: 失敗
+         (不正なメッセージの場合は、"id"なし)
+       * `{"event": "canceled", "id": ..}`: キャンセルされた
+       * `{"event": "telemetry", "t": .., "qsize": .., ..}`:
+         `?telemetry_ms=`ミリ秒ごと (0の場合は送らない)
+         (内容は、`/telemetry`と同じ)
+
+       送信待ちのテレメトリは、最新の一つだけを残す。それ以外のイベントは
+       捨てず、たまりすぎたら、コマンドの受信を止める。(see `EventQueue`)
+    """
+    _json_app = websocket.app.state.json_app
+    _log = get_logger(__name__, websocket.app.state.debug)
+    _log.debug("telemetry_ms=%s", telemetry_ms)
+
+    await websocket.accept()
+
+    _loop = asyncio.get_running_loop()
+    _outq = EventQueue()
+
+    def _on_done(fut):
+        """Called in the worker thread (or the loop)."""
+        try:
+            _loop.call_soon_threadsafe(
+                _outq.put, _json_app.result_event(fut)
+            )
+        except RuntimeError:
+            pass  # loop closed
+
+    async def _send_events():
+        """Send events in order (only this task sends)."""
+        while True:
+            await websocket.send_text(
+                dumps_json(await _outq.get()).decode("utf-8")
+            )
+
+    async def _send_telemetry():
+        """Put telemetry events periodically."""
+        _sec = telemetry_ms / 1000.0
+        while True:
+            await asyncio.sleep(_sec)
+            _outq.put_telemetry(
+                dict(_json_app.snapshot(), event="telemetry")
+            )
+
+    _tasks = [asyncio.create_task(_send_events())]
+    if telemetry_ms > 0:
+        _tasks.append(asyncio.create_task(_send_telemetry()))
+
+    try:
+        while True:
+            await _outq.wait_room()
+            _msg = await websocket.receive()
+            if _msg["type"] == "websocket.disconnect":
+                break
+
+            try:
+                if _msg.get("bytes") is not None:
+                    cmd_list = BinCmd.decode_all(_msg["bytes"])
+                else:
+                    _data = loads_json(_msg.get("text") or "")
+                    cmd_list = _data if isinstance(_data, list) else [_data]
+                    if not all(isinstance(_c, dict) for _c in cmd_list):
+                        raise ValueError(f"invalid command: {_data}")
+
+            except ValueError as _e:
+                _log.warning("%s: %s", type(_e).__name__, _e)
+                _outq.put({
+                    "event": "error", "err": f"{type(_e).__name__}: {_e}"
+                })
+                continue
+
+            _futs = [_json_app.send_cmdjson(_c) for _c in cmd_list]
+            _outq.put(
+                {"event": "queued", "ids": [_f.cmd_id for _f in _futs]}
+            )
+            for _f in _futs:
+                _f.add_done_callback(_on_done)
+
+    except WebSocketDisconnect:
+        pass
+
+    finally:
+        _log.debug("disconnected")
+        for _t in _tasks:
+            _t.cancel()
+        await asyncio.gather(*_tasks, return_exceptions=True)
@@ -0,0 +1,101 @@
+#
+# (c) 2025 Yoichi Tanibayashi
+#
+"""API server in a background thread."""
+import os
+import socket
+import threading
+import time
+
+import uvicorn
+
+from piservo0 import get_logger
+
+
+class LocalServer:
+    """API server in a background thread of this process.
+
+    `piservo0.web.json_api:app`を、このプロセスのスレッドで動かす。
+    負荷試験(`piservo0 loadtest`)やテスト用。
+
+    設定は、`api-server`と同じ環境変数で渡す。
+    `backend`のデフォルトは"mem"。(ハードウェアを使わない)
+    """
+
+    DEF_HOST = "127.0.0.1"
+    DEF_START_TIMEOUT = 10.0  # sec
+
+    def __init__(
+        self,
+        pins,
+        host: str = DEF_HOST,
+        port: int = 0,
+        engine: str = "thread",
+        backend: str = "mem",
+        debug=False,
+    ):
+        """Constructor.
+
+        `port=0`の場合は、空いているポートを使う。
+        """
+        self._debug = debug
+        self.__log = get_logger(self.__class__.__name__, self._debug)
+        self.__log.debug(
+            "pins=%s, host=%s, port=%s, engine=%s, backend=%s",
+            pins, host, port, engine, backend
+        )
+
+        self.pins = list(pins)
+        self.host = host
+        self.port = port or self.free_port(host)
+        self.engine = engine
+        self.backend = backend
+
+        self._server: uvicorn.Server | None = None
+        self._thr: threading.Thread | None = None
+
+    @staticmethod
+    def free_port(host: str = DEF_HOST) -> int:
+        """Find a free TCP port."""
+        with socket.socket() as _s:
+            _s.bind((host, 0))
+            return _s.getsockname()[1]
+
+    @property
+    def url(self) -> str:
+        """Command URL. (e.g. "http://127.0.0.1:PORT/cmd")"""
+        return f"http://{self.host}:{self.port}/cmd"
+
+    def start(self, timeout: float = DEF_START_TIMEOUT):
+        """Start the server and wait until it is ready.
+
+        Raises:
+            TimeoutError: 起動しない
+        """
+        os.environ["PISERVO0_PINS"] = ",".join([str(p) for p in self.pins])
+        os.environ["PISERVO0_DEBUG"] = "1" if self._debug else "0"
+        os.environ["PISERVO0_ENGINE"] = self.engine
+        os.environ["PISERVO0_BACKEND"] = self.backend
+
+        from piservo0.web.json_api import app
+
+        self._server = uvicorn.Server(uvicorn.Config(
+            app, host=self.host, port=self.port, log_level="warning"
+        ))
+        self._thr = threading.Thread(target=self._server.run, daemon=True)
+        self._thr.start()
+
+        _t_end = time.monotonic() + timeout
+        while not self._server.started:
+            if time.monotonic() > _t_end or not self._thr.is_alive():
+                raise TimeoutError(f"server does not start: {self.url}")
+            time.sleep(0.01)
+        self.__log.debug("url=%s", self.url)
+
+    def end(self, timeout: float = DEF_START_TIMEOUT):
+        """Stop the server."""
+        self.__log.debug("")
+        if self._server is not None:
+            self._server.should_exit = True
+        if self._thr is not None:
+            self._thr.join(timeout)
@@ -0,0 +1,156 @@
+#
+# (c) 2025 Yoichi Tanibayashi
+#
+"""Production serving mode of the API server.
+
+`piservo0 api-server --production`
+"""
+import importlib.util
+import os
+
+import uvicorn
+
+from piservo0 import ProcessWorker, ShmTargetPose, get_logger
+
+
+class ProductionServer:
+    """Production serving mode of the API server.
+
+    ハードウェア(pigpio)を所有するのは、`ProcessWorker`のプロセス一つだけ。
+    HTTPワーカープロセスを`workers`個起動し、各ワーカーは、
+    そのリングバッファ(`ShmCmdRing`)に接続してコマンドを送る。
+
+    ```
+    HTTP worker 1 --+
+    HTTP worker 2 --+--> ShmCmdRing --> hardware process (pigpio)
+    ...           --+
+    ```
+
+    * リロードしない
+    * `uvloop`, `httptools`があれば使う (なければ`asyncio`, `h11`)
+
+    コマンドIDは、HTTPワーカープロセスごとの連番。
+    """
+
+    APP = "piservo0.web.json_api:app"
+    DEF_WORKERS = 2
+
+    def __init__(
+        self,
+        pins,
+        host: str = "0.0.0.0",
+        port: int = 8000,
+        workers: int = DEF_WORKERS,
+        target_pose_name: str | None = None,
+        trace_file: str | None = None,
+        udp_port: int = 0,
+        backend: str = "pigpio",
+        debug: bool = False,
+    ):
+        """Constructor.
+
+        Args:
+            pins: GPIO pins
+            host: server hostname or IP address
+            port: port number
+            workers: HTTPワーカープロセスの数
+            target_pose_name: 作成する`ShmTargetPose`の名前
+            trace_file: ハードウェアプロセスが記録するトレースファイル
+            udp_port: UDPのポート番号 (0: 使わない)
+                (`SO_REUSEPORT`で、各HTTPワーカーが同じポートで受け取る)
+            backend: ハードウェアプロセスの出力先 (see `open_pi()`)
+        """
+        self._debug = debug
+        self.__log = get_logger(self.__class__.__name__, self._debug)
+        self.__log.debug(
+            "pins=%s, host=%s, port=%s, workers=%s, "
+            "target_pose_name=%s, trace_file=%s, udp_port=%s",
+            pins, host, port, workers, target_pose_name, trace_file, udp_port
+        )
+
+        if workers < 1:
+            raise ValueError(f"invalid workers: {workers}")
+
+        self.pins = list(pins)
+        self.host = host
+        self.port = port
+        self.workers = workers
+        self.target_pose_name = target_pose_name
+        self.trace_file = trace_file
+        self.udp_port = udp_port
+        self.backend = backend
+
+        self.target_pose: ShmTargetPose | None = None
+        self.worker: ProcessWorker | None = None
+
+    @staticmethod
+    def select_loop() -> str:
+        """Event loop implementation for uvicorn."""
+        if importlib.util.find_spec("uvloop") is not None:
+            return "uvloop"
+        return "asyncio"
+
+    @staticmethod
+    def select_http() -> str:
+        """HTTP protocol implementation for uvicorn."""
+        if importlib.util.find_spec("httptools") is not None:
+            return "httptools"
+        return "h11"
+
+    def start_hw(self):
+        """Start the hardware-owning process."""
+        if self.target_pose_name:
+            self.target_pose = ShmTargetPose(
+                len(self.pins), name=self.target_pose_name, create=True
+            )
+
+        self.worker = ProcessWorker(
+            self.pins, target_pose_name=self.target_pose_name,
+            trace_file=self.trace_file, backend=self.backend,
+            debug=self._debug
+        )
+        self.worker.start()
+        self.__log.debug("ring_name=%s", self.worker.ring_name)
+
+    def end_hw(self):
+        """Stop the hardware-owning process."""
+        if self.worker:
+            self.worker.end()
+            self.worker = None
+
+        if self.target_pose:
+            self.target_pose.close()
+            self.target_pose = None
+
+    def worker_env(self) -> dict:
+        """Environment variables for the HTTP worker processes."""
+        assert self.worker is not None
+        return {
+            "PISERVO0_PINS": ",".join([str(p) for p in self.pins]),
+            "PISERVO0_DEBUG": "1" if self._debug else "0",
+            "PISERVO0_ENGINE": "process",
+            "PISERVO0_RING": self.worker.ring_name,
+            "PISERVO0_UDP_PORT": str(self.udp_port),
+            # ハードウェアプロセスが担当する
+            "PISERVO0_TARGET_POSE": "",
+            "PISERVO0_TRACE": "",
+        }
+
+    def main(self):
+        """main"""
+        self.start_hw()
+        try:
+            os.environ.update(self.worker_env())
+
+            _loop = self.select_loop()
+            _http = self.select_http()
+            self.__log.debug("loop=%s, http=%s", _loop, _http)
+
+            uvicorn.run(
+                self.APP, host=self.host, port=self.port,
+                workers=self.workers, reload=False,
+                loop=_loop, http=_http,
+            )
+
+        finally:
+            self.end_hw()
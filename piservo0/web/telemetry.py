@@ -0,0 +1,198 @@
+#
+# (c) 2025 Yoichi Tanibayashi
+#
+"""Telemetry broadcaster."""
+import asyncio
+import collections
+
+from piservo0 import get_logger
+
+from .codec import dumps_json
+
+
+class TelemetryHub:
+    """Broadcast snapshots to subscribers at a fixed rate.
+
+    ティックごとに`snapshot_func()`を一度だけ呼び、JSONに変換して、
+    すべての購読者のキューに配る。
+    購読者が何人いても、スナップショットの取得とシリアライズは一回。
+
+    購読者がいない間は、ティックのタスクを止める。
+    遅い購読者のキューが溢れた場合は、古いものから捨てる。
+    (他の購読者とティックを遅らせない)
+
+    イベントループのスレッドから使うこと。
+    """
+
+    DEF_TICK_SEC = 0.05  # 20 Hz
+    DEF_QUEUE_N = 8  # 購読者ごとのキューの長さ
+
+    def __init__(
+        self,
+        snapshot_func,
+        tick_sec: float = DEF_TICK_SEC,
+        queue_n: int = DEF_QUEUE_N,
+        debug=False,
+    ):
+        """Constructor.
+
+        Args:
+            snapshot_func: スナップショット(dict)を返す関数。
+                ハードウェアを読まずに、すぐに返ること。
+            tick_sec: 配信の周期(秒)
+            queue_n: 購読者ごとのキューの長さ
+        """
+        self._debug = debug
+        self.__log = get_logger(self.__class__.__name__, self._debug)
+        self.__log.debug("tick_sec=%s, queue_n=%s", tick_sec, queue_n)
+
+        self.snapshot_func = snapshot_func
+        self.tick_sec = tick_sec
+        self.queue_n = queue_n
+
+        self._subscribers: set[asyncio.Queue] = set()
+        self._task: asyncio.Task | None = None
+
+        self.tick_n = 0
+
+    @property
+    def subscriber_n(self) -> int:
+        """Number of subscribers."""
+        return len(self._subscribers)
+
+    def subscribe(self) -> asyncio.Queue:
+        """Subscribe.
+
+        Returns:
+            asyncio.Queue: JSON文字列のスナップショットが届くキュー
+        """
+        _q: asyncio.Queue = asyncio.Queue(self.queue_n)
+        self._subscribers.add(_q)
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+        self.__log.debug("subscriber_n=%s", self.subscriber_n)
+        return _q
+
+    def unsubscribe(self, q: asyncio.Queue):
+        """Unsubscribe."""
+        self._subscribers.discard(q)
+        self.__log.debug("subscriber_n=%s", self.subscriber_n)
+
+    async def end(self):
+        """Stop the tick task."""
+        self._subscribers.clear()
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+
+    def publish(self, data: str):
+        """Put `data` to all subscribers (drop the oldest if full)."""
+        for _q in self._subscribers:
+            if _q.full():
+                _q.get_nowait()
+            _q.put_nowait(data)
+
+    async def _run(self):
+        """Tick task."""
+        self.__log.debug("start")
+        _loop = asyncio.get_running_loop()
+        _t0 = _loop.time()
+        _tick_i = 0
+
+        while self._subscribers:
+            self.publish(dumps_json(self.snapshot_func()).decode("utf-8"))
+            self.tick_n += 1
+
+            _tick_i += 1
+            _sleep_sec = _t0 + _tick_i * self.tick_sec - _loop.time()
+            if _sleep_sec < 0:  # 遅れた分は、取り戻さない
+                _t0 = _loop.time()
+                _tick_i = 0
+                _sleep_sec = 0
+            await asyncio.sleep(_sleep_sec)
+
+        self.__log.debug("done")
+
+    async def sse(self, max_n: int = 0):
+        """Server-Sent Events stream.
+
+        Args:
+            max_n: 送るイベントの数 (0: 無制限)
+
+        Yields:
+            str: `data: {...}`形式のイベント
+        """
+        _q = self.subscribe()
+        try:
+            _n = 0
+            while max_n <= 0 or _n < max_n:
+                yield f"data: {await _q.get()}\n\n"
+                _n += 1
+        finally:
+            self.unsubscribe(_q)
+
+
+class EventQueue:
+    """Outgoing event queue of a connection. (see `/ws`)
+
+    イベント(コマンドの完了など)は、捨てずに順番に送る。
+    テレメトリは、最新の一つだけを残し、古いものは捨てる。(coalesce)
+    テレメトリは、他のイベントがない時に送る。
+
+    イベントが`max_n`個たまったら、`wait_room()`で待たせる。
+    (受信側は、コマンドの受け取りを止める: 遅いクライアントへの背圧)
+
+    イベントループのスレッドから使うこと。
+    """
+
+    DEF_MAX_N = 256
+
+    def __init__(self, max_n: int = DEF_MAX_N):
+        """Constructor."""
+        self.max_n = max_n
+
+        self._events: collections.deque = collections.deque()
+        self._telemetry: dict | None = None
+        self._wake = asyncio.Event()
+        self._room = asyncio.Event()
+        self._room.set()
+
+        self.coalesced_n = 0  # 送らずに捨てたテレメトリの数
+
+    def qsize(self) -> int:
+        """Number of events to send (including telemetry)."""
+        return len(self._events) + (self._telemetry is not None)
+
+    def put(self, event: dict):
+        """Put an event. (never dropped)"""
+        self._events.append(event)
+        if len(self._events) >= self.max_n:
+            self._room.clear()
+        self._wake.set()
+
+    def put_telemetry(self, event: dict):
+        """Put a telemetry event. (replace the unsent one)"""
+        if self._telemetry is not None:
+            self.coalesced_n += 1
+        self._telemetry = event
+        self._wake.set()
+
+    async def get(self) -> dict:
+        """Get the next event to send."""
+        while True:
+            if self._events:
+                _event = self._events.popleft()
+                if len(self._events) < self.max_n:
+                    self._room.set()
+                return _event
+
+            if self._telemetry is not None:
+                _event, self._telemetry = self._telemetry, None
+                return _event
+
+            self._wake.clear()
+            await self._wake.wait()
+
+    async def wait_room(self):
+        """Wait until less than `max_n` events are queued."""
+        await self._room.wait()
@@ -0,0 +1,68 @@
+#
+# (c) 2025 Yoichi Tanibayashi
+#
+"""UDP control client."""
+import itertools
+import random
+import socket
+
+from piservo0 import get_logger
+from piservo0.helper.udp_cmd import UdpCmd
+
+
+class UdpClient:
+    """UDP control client. (see `UdpCmd`, `UdpServer`)
+
+    送りっぱなしで、応答は待たない。
+    (失われたパケットは再送せず、次のパケットで上書きする)
+    """
+
+    DEF_HOST = "localhost"
+
+    def __init__(
+        self, host: str = DEF_HOST, port: int = UdpCmd.DEF_PORT, debug=False
+    ):
+        """Constructor."""
+        self._debug = debug
+        self.__log = get_logger(self.__class__.__name__, self._debug)
+        self.__log.debug("host=%s, port=%s", host, port)
+
+        self.host = host
+        self.port = port
+
+        self.session = random.getrandbits(32)
+        self._seq = itertools.count(1)
+
+        self._sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self._sock.connect((host, port))
+
+    def close(self):
+        """Close."""
+        self._sock.close()
+
+    def send_pose(self, angles, timestamp: float | None = None) -> int:
+        """Send a target pose.
+
+        Returns:
+            int: seq
+        """
+        _seq = next(self._seq)
+        self._sock.send(
+            UdpCmd.encode_pose(self.session, _seq, angles, timestamp)
+        )
+        return _seq
+
+    def send_cmds(self, cmd, timestamp: float | None = None) -> int:
+        """Send commands. (dict or list of dict)
+
+        Returns:
+            int: seq
+        """
+        if isinstance(cmd, dict):
+            cmd = [cmd]
+
+        _seq = next(self._seq)
+        self._sock.send(
+            UdpCmd.encode_cmds(self.session, _seq, cmd, timestamp)
+        )
+        return _seq
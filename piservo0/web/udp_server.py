@@ -0,0 +1,278 @@
+#
+# (c) 2025 Yoichi Tanibayashi
+#
+"""Low-latency UDP control server."""
+import asyncio
+import math
+import socket
+import threading
+import time
+from collections import OrderedDict
+
+from piservo0 import get_logger
+from piservo0.helper.udp_cmd import UdpCmd, UdpPacket
+from piservo0.utils.metrics import Histogram
+
+
+class _Sender:
+    """Receive state of a sender (address)."""
+
+    __slots__ = ("session", "last_seq", "min_delay")
+
+    def __init__(self, session: int):
+        self.session = session
+        self.last_seq = 0
+        self.min_delay = math.inf
+
+
+class UdpServer(asyncio.DatagramProtocol):
+    """Low-latency UDP control server. (see `UdpCmd`)
+
+    HTTPと並行して、`UdpCmd`のデータグラムを受け取る。
+    TCPの再送待ち(head-of-line blocking)がないので、
+    Wi-Fi越しの遠隔操作でも、遅れたパケットを待たずに最新の目標に追従できる。
+
+    **捨てるパケット**
+
+    * 送信元ごとに、受け取った最大のseq以下のもの (順序の逆転、重複)
+    * `max_age`秒以上遅れて届いたもの
+    * 角度の数が`servo_n`と違うポーズ (`bad_n`)
+
+    送信元の状態は、最近の`SENDER_N_MAX`個だけを覚えておく。
+
+    遅れは、送信元ごとの「最小の(受信時刻 - timestamp)」からの差。
+    送信側と時計が違っても(別ホストでも)、判断できる。
+
+    **渡し先**
+
+    * ポーズ: `target_pose`(`ShmTargetPose`)があれば書き込むだけ。
+      (`{"cmd": "follow"}`で追従させる)
+      なければ、`move_all_angles`としてワーカーに送る。
+      前のポーズが終わっていなければ、最新のものだけを残す。
+      (次のポーズは、イベントループのスレッドから送る)
+    * コマンド: ワーカーに送る。
+
+    `latency`には、送信から反映(ShmTargetPoseへの書き込み、
+    コマンドの完了)までの時間を記録する。
+    (送信側と`time.monotonic()`を共有する、同じホストの場合のみ有効)
+
+    イベントループのスレッドで使うこと。
+    """
+
+    DEF_MAX_AGE = 0.1  # sec (0: 捨てない)
+    SENDER_N_MAX = 256
+
+    def __init__(
+        self,
+        worker,
+        target_pose=None,
+        max_age: float = DEF_MAX_AGE,
+        servo_n: int | None = None,
+        debug=False,
+    ):
+        """Constructor.
+
+        Args:
+            worker: コマンドを送るワーカー (ThreadWorker, AsyncWorker, ..)
+            target_pose (ShmTargetPose | None): ポーズを書き込むチャンネル
+            max_age: これ以上遅れたパケットは捨てる(秒)
+            servo_n: ポーズの角度の数
+                (Noneの場合は、`target_pose`の`servo_n`。
+                `target_pose`もなければ、ワーカーに任せる)
+        """
+        self._debug = debug
+        self.__log = get_logger(self.__class__.__name__, self._debug)
+        self.__log.debug(
+            "target_pose=%s, max_age=%s, servo_n=%s",
+            target_pose, max_age, servo_n
+        )
+
+        self.worker = worker
+        self.target_pose = target_pose
+        self.max_age = max_age
+        if servo_n is None and target_pose is not None:
+            servo_n = target_pose.servo_n
+        self.servo_n = servo_n
+
+        self.transport: asyncio.DatagramTransport | None = None
+        self.addr: tuple | None = None
+        self._loop: asyncio.AbstractEventLoop | None = None
+
+        self._senders: OrderedDict[tuple, _Sender] = OrderedDict()
+
+        self._lock = threading.Lock()
+        self._pose_busy = False  # ワーカーがポーズを実行中
+        self._next_pose: UdpPacket | None = None
+
+        self.latency = Histogram("latency")
+        self.reset_metrics()
+
+    def reset_metrics(self):
+        """Reset metrics."""
+        with self._lock:
+            self.latency.reset()
+            self.recv_n = 0
+            self.pose_n = 0
+            self.cmd_n = 0
+            self.bad_n = 0
+            self.drop_old_n = 0
+            self.drop_stale_n = 0
+            self.coalesced_n = 0
+
+    def get_metrics(self) -> dict:
+        """Get metrics."""
+        with self._lock:
+            return {
+                "recv_n": self.recv_n,
+                "pose_n": self.pose_n,
+                "cmd_n": self.cmd_n,
+                "bad_n": self.bad_n,
+                "drop_old_n": self.drop_old_n,
+                "drop_stale_n": self.drop_stale_n,
+                "coalesced_n": self.coalesced_n,
+                "latency": self.latency.to_dict(),
+            }
+
+    async def start(self, host: str = "0.0.0.0", port: int = UdpCmd.DEF_PORT):
+        """Start listening.
+
+        `SO_REUSEPORT`が使える場合は、複数のプロセスで同じポートを使える。
+        (`api-server --production`のHTTPワーカープロセス)
+
+        Returns:
+            tuple: 実際のアドレス (`port=0`の場合に、ポート番号がわかる)
+        """
+        await asyncio.get_running_loop().create_datagram_endpoint(
+            lambda: self, local_addr=(host, port),
+            reuse_port=hasattr(socket, "SO_REUSEPORT"),
+        )
+        assert self.addr is not None
+        self.__log.debug("addr=%s", self.addr)
+        return self.addr
+
+    def end(self):
+        """Stop listening."""
+        self.__log.debug("")
+        if self.transport is not None:
+            self.transport.close()
+            self.transport = None
+
+    def connection_made(self, transport):
+        """asyncio.DatagramProtocol"""
+        self.transport = transport
+        self.addr = transport.get_extra_info("sockname")
+        self._loop = asyncio.get_running_loop()
+
+    def datagram_received(self, data, addr):
+        """asyncio.DatagramProtocol"""
+        _now = time.monotonic()
+        self.recv_n += 1
+
+        try:
+            _pkt = UdpCmd.decode(data)
+        except ValueError as _e:
+            self.__log.debug("%s: %s", addr, _e)
+            self.bad_n += 1
+            return
+
+        if not self._accept(_pkt, addr, _now):
+            return
+
+        if (
+            _pkt.kind == UdpCmd.KIND_POSE
+            and self.servo_n is not None
+            and len(_pkt.angles or []) != self.servo_n
+        ):
+            self.__log.debug(
+                "%s: len(angles)=%s != servo_n=%s",
+                addr, len(_pkt.angles or []), self.servo_n
+            )
+            self.bad_n += 1
+            return
+
+        if _pkt.kind == UdpCmd.KIND_POSE:
+            self.pose_n += 1
+            self._feed_pose(_pkt)
+        else:
+            self.cmd_n += 1
+            self._feed_cmds(_pkt)
+
+    def _accept(self, pkt: UdpPacket, addr, now: float) -> bool:
+        """`True` if the packet is new and fresh."""
+        _sender = self._senders.get(addr)
+        if _sender is None or _sender.session != pkt.session:
+            _sender = self._senders[addr] = _Sender(pkt.session)
+            while len(self._senders) > self.SENDER_N_MAX:
+                self._senders.popitem(last=False)  # 最も古い送信元
+        self._senders.move_to_end(addr)
+
+        if pkt.seq <= _sender.last_seq:
+            self.drop_old_n += 1
+            return False
+        _sender.last_seq = pkt.seq
+
+        _delay = now - pkt.timestamp
+        if _delay < _sender.min_delay:
+            _sender.min_delay = _delay
+
+        if self.max_age > 0 and _delay - _sender.min_delay > self.max_age:
+            self.drop_stale_n += 1
+            return False
+
+        return True
+
+    def _record_latency(self, timestamp: float):
+        """Record the latency from sending."""
+        with self._lock:
+            self.latency.record_sec(time.monotonic() - timestamp)
+
+    def _feed_pose(self, pkt: UdpPacket):
+        """Write the pose to the target pose channel, or send to worker."""
+        if self.target_pose is not None:
+            self.target_pose.write(pkt.angles)
+            self._record_latency(pkt.timestamp)
+            return
+
+        with self._lock:
+            if self._pose_busy:
+                if self._next_pose is not None:
+                    self.coalesced_n += 1
+                self._next_pose = pkt
+                return
+            self._pose_busy = True
+
+        self._send_pose(pkt)
+
+    def _send_pose(self, pkt: UdpPacket):
+        """Send the pose to the worker. (`_pose_busy`であること)"""
+        self.worker.send(
+            {"cmd": "move_all_angles", "angles": pkt.angles}
+        ).add_done_callback(lambda _f: self._pose_done(pkt))
+
+    def _pose_done(self, pkt: UdpPacket):
+        """Done callback of a pose: send the next pose, if any.
+
+        ワーカーのスレッドから呼ばれる。
+        次のポーズがある間は`_pose_busy`のままにして、
+        新しいポーズが追い越さないようにする。
+        """
+        self._record_latency(pkt.timestamp)
+
+        with self._lock:
+            _next = self._next_pose
+            self._next_pose = None
+            if _next is None:
+                self._pose_busy = False
+                return
+
+        if self._loop is not None and not self._loop.is_closed():
+            self._loop.call_soon_threadsafe(self._send_pose, _next)
+        else:  # `start()`していない
+            self._send_pose(_next)
+
+    def _feed_cmds(self, pkt: UdpPacket):
+        """Send the commands to the worker."""
+        for _cmd in pkt.cmds or []:
+            self.worker.send(_cmd).add_done_callback(
+                lambda _f: self._record_latency(pkt.timestamp)
+            )
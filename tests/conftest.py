@@ -7,6 +7,7 @@ pytest conftest
 from unittest.mock import MagicMock, patch
 
 import pytest
+from fastapi.testclient import TestClient
 
 
 @pytest.fixture
@@ -48,3 +49,16 @@ def mocker_pigpio():
         # このフィクスチャを使用するテストに、
         # pi()コンストラクタのモックを渡す
         yield mock_pi_constructor
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    """メモリ上のバックエンドで動かすAPIサーバーのテストクライアント"""
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv("PISERVO0_PINS", "17,27")
+    monkeypatch.setenv("PISERVO0_BACKEND", "mem")
+
+    from piservo0.web.json_api import app
+
+    with TestClient(app) as _client:
+        yield _client
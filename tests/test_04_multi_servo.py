@@ -130,8 +130,13 @@ class TestMultiServo:
         mock_instances[0].move_angle.assert_called_with(target_angles[0])
         mock_instances[1].move_angle.assert_called_with(target_angles[1])
 
+        # 各ステップの予定時刻まで待つ (`time.sleep`はモックなので、
+        # 時間は進まず、待ち時間は予定時刻までの残り)
         assert mock_sleep.call_count == steps
-        mock_sleep.assert_called_with(move_sec / steps)
+        for _i, _call in enumerate(mock_sleep.call_args_list):
+            assert _call.args[0] == pytest.approx(
+                (_i + 1) * move_sec / steps, abs=0.01
+            )
 
     @patch("time.sleep")
     def test_move_all_angles_sync_str_none(self, mock_sleep, multi_servo):
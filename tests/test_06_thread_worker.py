@@ -0,0 +1,178 @@
+# (c) 2025 Yoichi Tanibayashi
+#
+"""
+tests/test_06_thread_worker.py
+"""
+import asyncio
+import time
+from concurrent.futures import CancelledError
+from unittest.mock import MagicMock
+
+import pytest
+
+from piservo0.helper.thread_worker import ThreadWorker
+
+# アイドル状態からの終了・キャンセルにかかる時間の上限(秒)
+LATENCY_LIMIT = 0.05
+
+
+@pytest.fixture
+def mservo():
+    """MultiServoのモックを返すフィクスチャ"""
+    _mservo = MagicMock()
+    _mservo.DEF_MOVE_SEC = 0.2
+    _mservo.DEF_STEP_N = 40
+    return _mservo
+
+
+@pytest.fixture
+def worker(mservo):
+    """起動済みのThreadWorkerを返すフィクスチャ"""
+    _worker = ThreadWorker(mservo, debug=True)
+    _worker.start()
+    yield _worker
+    if _worker.is_alive():
+        _worker.end()
+
+
+def wait_until(cond, timeout=1.0):
+    """`cond()`が真になるまで待つ"""
+    _t_end = time.monotonic() + timeout
+    while not cond():
+        if time.monotonic() > _t_end:
+            return False
+        time.sleep(0.001)
+    return True
+
+
+class TestThreadWorker:
+    """ThreadWorkerクラスのテスト"""
+
+    def test_dispatch(self, worker, mservo):
+        """コマンドが順に実行されるかのテスト"""
+        worker.send({"cmd": "move_all_angles", "angles": [10, 20]})
+
+        assert wait_until(lambda: mservo.move_all_angles.called)
+        mservo.move_all_angles.assert_called_with(
+            [10, 20], stop_event=worker._cancel_ev
+        )
+
+    def test_send_json_str(self, worker, mservo):
+        """JSON文字列のコマンド"""
+        worker.send('{"cmd": "step_n", "n": 10}')
+
+        assert wait_until(lambda: worker.step_n == 10)
+
+    def test_send_future(self, worker, mservo):
+        """`send()`が返すFutureで、完了を待てるかのテスト"""
+        _fut1 = worker.send({"cmd": "sleep", "sec": 0.05})
+        _fut2 = worker.send({"cmd": "move_all_angles", "angles": [1, 2]})
+
+        assert _fut2.cmd_id == _fut1.cmd_id + 1
+
+        _res = _fut2.result(timeout=1.0)
+        assert _fut1.done()
+        assert _res["id"] == _fut2.cmd_id
+        assert _res["cmd"] == "move_all_angles"
+        assert _res["queue_sec"] >= 0.04
+        assert _res["exec_sec"] >= 0.0
+        mservo.move_all_angles.assert_called_once_with(
+            [1, 2], stop_event=worker._cancel_ev
+        )
+
+    def test_send_future_error(self, worker):
+        """不正なコマンドは、Futureに例外が設定される"""
+        _fut = worker.send({"cmd": "no_such_cmd"})
+        with pytest.raises(ValueError):
+            _fut.result(timeout=1.0)
+
+        _fut = worker.send("{invalid json")
+        with pytest.raises(ValueError):
+            _fut.result(timeout=1.0)
+
+    def test_send_future_canceled(self, worker):
+        """キャンセルされたコマンドのFuture"""
+        worker.send({"cmd": "sleep", "sec": 10.0})
+        _fut = worker.send({"cmd": "sleep", "sec": 1.0})
+        worker.clear_cmdq()
+
+        assert _fut.cancelled()
+        with pytest.raises(CancelledError):
+            _fut.result(timeout=1.0)
+
+    def test_send_async(self, worker, mservo):
+        """asyncioから、コマンドの完了を待てるか"""
+
+        async def _main():
+            return await worker.send_async(
+                {"cmd": "move_all_angles", "angles": [5, 6]}
+            )
+
+        _res = asyncio.run(_main())
+        assert _res["cmd"] == "move_all_angles"
+        mservo.move_all_angles.assert_called_once_with(
+            [5, 6], stop_event=worker._cancel_ev
+        )
+
+    def test_end_latency_idle(self, worker):
+        """アイドル状態のワーカーが、すぐに終了するかのテスト"""
+        time.sleep(0.05)  # recv()でブロックしている状態にする
+
+        _t0 = time.monotonic()
+        worker.end()
+        _latency = time.monotonic() - _t0
+
+        assert not worker.is_alive()
+        assert _latency < LATENCY_LIMIT
+
+    def test_end_latency_sleeping(self, worker):
+        """`sleep`実行中のワーカーが、すぐに終了するかのテスト"""
+        worker.send({"cmd": "sleep", "sec": 10.0})
+        time.sleep(0.05)
+
+        _t0 = time.monotonic()
+        worker.end()
+        _latency = time.monotonic() - _t0
+
+        assert not worker.is_alive()
+        assert _latency < LATENCY_LIMIT
+
+    def test_cancel_latency(self, worker, mservo):
+        """`cancel`で、`sleep`が中断され、後続のコマンドが破棄されるか"""
+        worker.send({"cmd": "sleep", "sec": 10.0})
+        worker.send({"cmd": "move_all_angles", "angles": [10, 20]})
+        time.sleep(0.05)
+
+        _t0 = time.monotonic()
+        _fut = worker.send({"cmd": "cancel"})
+        assert _fut.done()
+        assert _fut.cmd_data["count"] == 1
+
+        # キャンセル後のコマンドは、すぐに実行される
+        worker.send({"cmd": "move_all_angles", "angles": [30, 40]})
+        assert wait_until(lambda: mservo.move_all_angles.called)
+        _latency = time.monotonic() - _t0
+
+        mservo.move_all_angles.assert_called_once_with(
+            [30, 40], stop_event=worker._cancel_ev
+        )
+        assert _latency < LATENCY_LIMIT
+
+    def test_interval_canceled(self, worker, mservo):
+        """インターバル待ちも、キャンセルで中断されるか"""
+        worker.send({"cmd": "interval", "sec": 10.0})
+        worker.send({"cmd": "move_all_angles", "angles": [10, 20]})
+        assert wait_until(lambda: mservo.move_all_angles.called)
+
+        _t0 = time.monotonic()
+        worker.clear_cmdq()
+        worker.send({"cmd": "move_all_angles", "angles": [30, 40]})
+        assert wait_until(lambda: mservo.move_all_angles.call_count == 2)
+
+        assert time.monotonic() - _t0 < LATENCY_LIMIT
+
+    def test_end_not_started(self, mservo):
+        """開始前のワーカーに対する`end()`"""
+        _worker = ThreadWorker(mservo)
+        _worker.end()
+        assert not _worker.is_alive()
@@ -0,0 +1,190 @@
+# (c) 2025 Yoichi Tanibayashi
+#
+"""
+tests/test_07_async_worker.py
+"""
+import asyncio
+import threading
+from unittest.mock import MagicMock
+
+import pytest
+
+from piservo0.core.multi_servo import MultiServo
+from piservo0.helper.async_multi_servo import AsyncMultiServo
+from piservo0.helper.async_worker import AsyncWorker
+
+PINS = [17, 18]
+
+
+@pytest.fixture
+def mservo(tmp_path):
+    """モックのpiを使った、本物のMultiServoを返すフィクスチャ"""
+    pi = MagicMock()
+    pi.get_servo_pulsewidth.return_value = 1500
+    return MultiServo(
+        pi, PINS, first_move=False, conf_file=str(tmp_path / "servo.json")
+    )
+
+
+@pytest.fixture
+def amservo(mservo):
+    """AsyncMultiServoのインスタンスを返すフィクスチャ"""
+    _amservo = AsyncMultiServo(mservo, debug=True)
+    yield _amservo
+    _amservo.end()
+
+
+class TestAsyncMultiServo:
+    """AsyncMultiServoクラスのテスト"""
+
+    def test_get_all_pulses(self, amservo):
+        """状態取得が、イベントループ上で待てるか"""
+        _pulses = asyncio.run(amservo.get_all_pulses())
+        assert _pulses == [1500, 1500]
+
+    def test_move_all_angles_sync(self, amservo, mservo):
+        """ステップ数分、パルスが設定され、最後は目標角度になるか"""
+        step_n = 5
+        asyncio.run(
+            amservo.move_all_angles_sync(
+                ["max", None], move_sec=0.05, step_n=step_n
+            )
+        )
+
+        _calls = mservo._pi.set_servo_pulsewidth.call_args_list
+        assert len(_calls) == step_n * len(PINS)
+        assert _calls[-2].args == (PINS[0], 2500)
+        assert _calls[-1].args == (PINS[1], 1500)
+
+    def test_move_all_angles_sync_timing(self, amservo):
+        """ステップの待ちが、イベントループをブロックしないか"""
+        ticks = []
+
+        async def _ticker():
+            while True:
+                ticks.append(1)
+                await asyncio.sleep(0.005)
+
+        async def _main():
+            _task = asyncio.create_task(_ticker())
+            _loop = asyncio.get_running_loop()
+            _t0 = _loop.time()
+            await amservo.move_all_angles_sync([10, 10], 0.1, 10)
+            _elapsed = _loop.time() - _t0
+            _task.cancel()
+            return _elapsed
+
+        _elapsed = asyncio.run(_main())
+        assert _elapsed == pytest.approx(0.1, abs=0.05)
+        assert len(ticks) >= 5
+
+
+class TestAsyncWorker:
+    """AsyncWorkerクラスのテスト"""
+
+    def test_send(self, amservo, mservo):
+        """コマンドが実行され、Futureが完了するか"""
+
+        async def _main():
+            _worker = AsyncWorker(amservo, debug=True)
+            _worker.start()
+            _fut1 = _worker.send({"cmd": "step_n", "n": 1})
+            _res = await _worker.send_async(
+                {"cmd": "move", "angles": [90, -90]}
+            )
+            await _worker.end()
+            return _worker, _fut1, _res
+
+        _worker, _fut1, _res = asyncio.run(_main())
+
+        assert _fut1.done()
+        assert _worker.step_n == 1
+        assert _res["cmd"] == "move"
+        mservo._pi.set_servo_pulsewidth.assert_any_call(PINS[0], 2500)
+        mservo._pi.set_servo_pulsewidth.assert_any_call(PINS[1], 500)
+
+    def test_cancel(self, amservo):
+        """`cancel`で、`sleep`が中断され、キューが破棄されるか"""
+
+        async def _main():
+            _worker = AsyncWorker(amservo, debug=True)
+            _worker.start()
+            _fut1 = _worker.send({"cmd": "sleep", "sec": 10.0})
+            _fut2 = _worker.send({"cmd": "sleep", "sec": 10.0})
+            await asyncio.sleep(0.02)
+
+            _loop = asyncio.get_running_loop()
+            _t0 = _loop.time()
+            _fut_ca = _worker.send({"cmd": "cancel"})
+            await asyncio.wrap_future(_fut1)
+            _latency = _loop.time() - _t0
+
+            await _worker.end()
+            return _fut_ca, _fut2, _latency
+
+        _fut_ca, _fut2, _latency = asyncio.run(_main())
+
+        assert _fut_ca.cmd_data["count"] == 1
+        assert _fut2.cancelled()
+        assert _latency < 0.05
+
+    def test_unknown_cmd(self, amservo):
+        """不明なコマンドは、Futureに例外が設定される"""
+
+        async def _main():
+            _worker = AsyncWorker(amservo)
+            _worker.start()
+            _fut = _worker.send({"cmd": "no_such_cmd"})
+            with pytest.raises(ValueError):
+                await asyncio.wrap_future(_fut)
+            await _worker.end()
+
+        asyncio.run(_main())
+
+    def test_status_on_loop(self, amservo, monkeypatch):
+        """状態の通知は、イベントループのスレッドで反映されるか"""
+        _threads = []
+        _publish = AsyncWorker._publish_status
+
+        def _spy(self, state=None):
+            _threads.append(threading.get_ident())
+            _publish(self, state)
+
+        monkeypatch.setattr(AsyncWorker, "_publish_status", _spy)
+
+        async def _main():
+            _worker = AsyncWorker(amservo)
+            _worker.start()
+            await _worker.send_async(
+                {"cmd": "move", "angles": [30, -30], "step_n": 4}
+            )
+            _status = _worker.status
+            await _worker.end()
+            return threading.get_ident(), _status
+
+        _loop_thread, _status = asyncio.run(_main())
+
+        assert _threads
+        assert set(_threads) == {_loop_thread}
+        assert _status.angles == pytest.approx((30, -30), abs=1)
+
+    def test_shared_cmds(self, amservo):
+        """設定コマンドと引数の解釈は、ThreadWorkerと同じか"""
+
+        async def _main():
+            _worker = AsyncWorker(amservo)
+            _worker.start()
+            for _cmd in (
+                {"cmd": "move_sec", "sec": "auto"},
+                {"cmd": "interval", "sec": "0.01"},
+                {"cmd": "set", "servo": 0, "target": "no_such_target"},
+            ):
+                await _worker.send_async(_cmd)
+            await _worker.end()
+            return _worker
+
+        _worker = asyncio.run(_main())
+
+        assert _worker.move_sec == MultiServo.MOVE_SEC_AUTO
+        assert _worker.interval_sec == 0.01
+        assert _worker._get_move_params({"step_n": 3}) == ("auto", 3)
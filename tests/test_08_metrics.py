@@ -0,0 +1,101 @@
+# (c) 2025 Yoichi Tanibayashi
+#
+"""
+tests/test_08_metrics.py
+"""
+import time
+from unittest.mock import MagicMock
+
+import pytest
+
+from piservo0.helper.thread_worker import ThreadWorker
+from piservo0.utils.metrics import Histogram
+
+
+class TestHistogram:
+    """Histogramクラスのテスト"""
+
+    @pytest.mark.parametrize(
+        "value", [0, 1, 15, 16, 17, 31, 32, 33, 1000, 123456, 2**32 - 1]
+    )
+    def test_bucket_range(self, value):
+        """値が、対応するバケットの範囲に入るか"""
+        _idx = Histogram.bucket_index(value)
+        _low, _high = Histogram.bucket_range(_idx)
+
+        assert 0 <= _idx < Histogram.BUCKET_N
+        assert _low <= value <= _high
+        # 相対誤差
+        assert _high - _low <= max(1, _low / Histogram.SUB_BUCKET_N)
+
+    def test_empty(self):
+        """空のヒストグラム"""
+        _h = Histogram()
+        assert _h.percentile(99) == 0
+        assert _h.to_dict()["count"] == 0
+
+    def test_percentile(self):
+        """パーセンタイル値の精度"""
+        _h = Histogram()
+        for _v in range(1, 10001):
+            _h.record(_v)
+
+        assert _h.count == 10000
+        assert _h.min == 1
+        assert _h.max == 10000
+        assert _h.mean == pytest.approx(5000.5)
+        assert _h.percentile(50) == pytest.approx(5000, rel=0.07)
+        assert _h.percentile(99) == pytest.approx(9900, rel=0.07)
+        assert _h.percentile(100) == 10000
+
+    def test_record_clip(self):
+        """範囲外の値"""
+        _h = Histogram()
+        _h.record(-5)
+        _h.record(2**40)
+        assert _h.min == 0
+        assert _h.max == Histogram.MAX_VALUE
+
+    def test_record_sec(self):
+        """秒単位の記録と、リセット"""
+        _h = Histogram()
+        _h.record_sec(0.25)
+        assert _h.max == 250000
+        assert _h.buckets()[0][2] == 1
+
+        _h.reset()
+        assert _h.count == 0
+        assert _h.buckets() == []
+
+
+class TestWorkerMetrics:
+    """ThreadWorkerのメトリクスのテスト"""
+
+    def test_worker_metrics(self):
+        """キュー待ち時間、実行時間、超過時間が記録されるか"""
+        _mservo = MagicMock()
+        _mservo.DEF_MOVE_SEC = 0.2
+        _mservo.DEF_STEP_N = 40
+        _mservo.hist_step_jitter = Histogram("step_jitter")
+        _mservo.move_all_angles_sync.side_effect = (
+            lambda *args: time.sleep(0.03)
+        )
+
+        _worker = ThreadWorker(_mservo)
+        _worker.start()
+        _worker.send({"cmd": "sleep", "sec": 0.02})
+        _fut = _worker.send({"cmd": "move", "angles": [0], "move_sec": 0.01})
+        _fut.result(timeout=1.0)
+        _worker.end()
+
+        _metrics = _worker.get_metrics()
+        assert _metrics["cmd_n"] == 2
+        assert _metrics["queue_wait"]["count"] == 2
+        assert _metrics["queue_wait"]["max"] >= 15000
+        assert _metrics["exec"]["max"] >= 25000
+        assert _metrics["overrun"]["count"] == 1
+        assert _metrics["overrun"]["max"] >= 15000
+        assert "step_jitter" in _metrics
+
+        _worker.reset_metrics()
+        assert _worker.get_metrics()["cmd_n"] == 0
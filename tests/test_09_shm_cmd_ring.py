@@ -0,0 +1,333 @@
+# (c) 2025 Yoichi Tanibayashi
+#
+"""
+tests/test_09_shm_cmd_ring.py
+"""
+import json
+import multiprocessing
+import os
+import subprocess
+import sys
+import time
+
+import pytest
+
+from piservo0.helper.process_worker import ProcessWorker
+from piservo0.helper.shm_cmd_ring import ShmCmdRing
+from piservo0.utils.servo_config_manager import ServoConfigManager
+
+PINS = [17, 27]
+
+
+def wait_until(cond, timeout: float) -> bool:
+    """`cond()`が`True`になるまで待つ"""
+    _t_end = time.monotonic() + timeout
+    while not cond():
+        if time.monotonic() > _t_end:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+def producer_main(ring_name, n):
+    """別プロセスから、コマンドを書き込む"""
+    _ring = ShmCmdRing(ring_name, untrack=False)
+    for _i in range(n):
+        _ring.put(json.dumps({"cmd": "sleep", "sec": _i}).encode())
+    _ring.shutdown()
+    _ring.close()
+
+
+@pytest.fixture
+def ring():
+    """ShmCmdRingのインスタンスを返すフィクスチャ"""
+    _ring = ShmCmdRing(create=True, slot_n=8, slot_size=64, debug=True)
+    yield _ring
+    _ring.close()
+
+
+class TestShmCmdRing:
+    """ShmCmdRingクラスのテスト"""
+
+    def test_put_get(self, ring):
+        """書き込んだ順に、読み出せるか"""
+        ring.open_reader()
+        assert ring.put(b"abc")
+        assert ring.put(b"")
+        assert ring.put(b"x" * ring.payload_max)
+        assert ring.qsize() == 3
+
+        assert ring.get_all() == [b"abc", b"", b"x" * ring.payload_max]
+        assert ring.qsize() == 0
+        assert ring.get_all(block=False) == []
+
+    def test_full(self, ring):
+        """満杯の場合は、書き込めない"""
+        for _i in range(ring.slot_n):
+            assert ring.put(b"%d" % _i)
+        assert not ring.put(b"overflow")
+        assert ring.dropped == 1
+
+        # 読み出せば、再び書き込める (ラップアラウンド)
+        assert len(ring.get_all(block=False)) == ring.slot_n
+        assert ring.put(b"next")
+        assert ring.get_all(block=False) == [b"next"]
+
+    def test_get_max_n(self, ring):
+        """`max_n`個までしか取り出さないか"""
+        for _i in range(5):
+            ring.put(b"%d" % _i)
+        assert ring.get(2) == [b"0", b"1"]
+        assert ring.qsize() == 3
+        assert ring.get(0, timeout=0.0) == []
+        assert ring.get() == [b"2", b"3", b"4"]
+        assert ring.get(timeout=0.01) == []
+
+    def test_cancel(self, ring):
+        """`cancel()`より前のレコードだけを、読まずに捨てるか"""
+        ring.put(b"a")
+        ring.put(b"b")
+        _producer = ShmCmdRing(ring.name, untrack=False)
+        try:
+            assert _producer.cancel() == 2
+            _producer.put(b"c")
+        finally:
+            _producer.close()
+
+        assert ring.get(timeout=0.0) == []  # キャンセル要求が先
+        assert ring.take_cancel() == 2
+        assert ring.take_cancel() is None
+        assert ring.get(timeout=0.0) == [b"c"]
+
+    def test_stats(self, ring):
+        """stats領域の書き込み・読み出し"""
+        assert ring.stats_seq == 0
+        assert ring.get_stats() is None
+
+        assert ring.put_stats(b'{"a":1}')
+        assert ring.put_stats(b'{"a":2}')
+        assert ring.stats_seq == 4
+        assert ring.get_stats() == (4, b'{"a":2}')
+
+        # 収まらないものは、書き込まない
+        assert not ring.put_stats(b"x" * (ring.stats_max + 1))
+        assert ring.get_stats() == (4, b'{"a":2}')
+
+        # 別のインスタンスから読める
+        _other = ShmCmdRing(ring.name, untrack=False)
+        try:
+            assert _other.get_stats() == (4, b'{"a":2}')
+        finally:
+            _other.close()
+
+    def test_reset(self, ring):
+        """メトリクスのリセット要求"""
+        assert not ring.take_reset()
+        ring.request_reset()
+        ring.request_reset()
+        assert ring.take_reset()
+        assert not ring.take_reset()
+
+    def test_too_large(self, ring):
+        """スロットに収まらないデータ"""
+        with pytest.raises(ValueError):
+            ring.put(b"x" * (ring.payload_max + 1))
+
+    def test_attach(self, ring):
+        """名前で接続できるか"""
+        _ring2 = ShmCmdRing(ring.name, untrack=False)
+        assert _ring2.slot_n == ring.slot_n
+        _ring2.put(b"hello")
+        _ring2.close()
+
+        assert ring.get_all(block=False) == [b"hello"]
+        assert os.path.exists(ring.fifo_path)
+
+    def test_untrack(self, ring):
+        """無関係のプロセスが接続して終了しても、削除されないか"""
+        _code = (
+            "import sys\n"
+            "from piservo0.helper.shm_cmd_ring import ShmCmdRing\n"
+            "_ring = ShmCmdRing(sys.argv[1])\n"
+            "_ring.put(b'from child')\n"
+            "_ring.close()\n"
+        )
+        _res = subprocess.run(
+            [sys.executable, "-c", _code, ring.name],
+            capture_output=True, text=True, timeout=30,
+        )
+        assert _res.returncode == 0, _res.stderr
+        assert "leaked" not in _res.stderr
+
+        # 作成したプロセスからは、まだ使える
+        _ring2 = ShmCmdRing(ring.name, untrack=False)
+        assert _ring2.slot_n == ring.slot_n
+        _ring2.close()
+        assert ring.get_all(block=False) == [b"from child"]
+
+    def test_shutdown(self, ring):
+        """`shutdown()`で、待っている読み出し側が戻るか"""
+        ring.shutdown()
+        assert ring.closed
+        assert ring.get_all() == []
+
+    def test_multiprocess(self, ring):
+        """別プロセスからの書き込みを、ブロックして待てるか"""
+        n = 20
+        _ctx = multiprocessing.get_context("spawn")
+        _proc = _ctx.Process(target=producer_main, args=(ring.name, n))
+        ring.open_reader()
+        _proc.start()
+
+        _records: list[bytes] = []
+        while True:
+            _recs = ring.get_all()
+            _records += _recs
+            if not _recs and ring.closed:
+                break
+            # リングバッファより多いので、読み出し中も書き込まれる
+        _proc.join()
+
+        # 満杯で書き込めなかった分を除き、順番通りに届く
+        _secs = [json.loads(_r)["sec"] for _r in _records]
+        assert _secs == sorted(_secs)
+        assert len(_secs) >= ring.slot_n
+
+
+class TestProcessWorker:
+    """ProcessWorkerクラスのテスト (プロセスは起動しない)"""
+
+    def test_send(self):
+        """コマンドが、リングバッファに書き込まれるか"""
+        _worker = ProcessWorker([17, 27], slot_n=2, slot_size=128)
+        try:
+            _fut = _worker.send('{"cmd": "sleep", "sec": 1.0}')
+            assert _fut.result()["cmd"] == "sleep"
+
+            _worker.send({"cmd": "sleep", "sec": 2.0})
+            _fut = _worker.send({"cmd": "sleep", "sec": 3.0})
+            with pytest.raises(BufferError):
+                _fut.result()
+
+            # ハードウェアプロセスの状態は、まだない
+            assert _worker.get_metrics() == {"qsize": 2, "dropped": 1}
+            _status = _worker.status
+            assert _status.qsize == 2
+            assert _status.pulses is None
+            assert (_status.sent_n, _status.cmd_n, _status.err_n) == (
+                None, None, None
+            )
+
+            # `cancel`は、リングバッファに入れない
+            _fut = _worker.send({"cmd": "cancel"})
+            assert _fut.cmd_data["count"] == 2
+            assert _worker.ring.qsize() == 2
+            assert _worker.ring.take_cancel() == 2
+            assert _worker.ring.get_all(block=False) == []
+        finally:
+            _worker.ring.close()
+
+    def test_attach(self):
+        """`ring_name`で、既存のリングバッファに接続して書き込めるか"""
+        _owner = ProcessWorker([17, 27], slot_n=4, slot_size=128)
+        try:
+            _worker = ProcessWorker(
+                [17, 27], ring_name=_owner.ring_name, ring_untrack=False
+            )
+            assert _worker.attached
+            assert not _owner.attached
+
+            _worker.start()  # プロセスは起動しない
+            _worker.send({"cmd": "sleep", "sec": 0.0}).result()
+            _worker.end()
+
+            # 接続しただけのワーカーは、リングバッファを削除しない
+            _records = _owner.ring.get_all(block=False)
+            assert [json.loads(_r) for _r in _records] == [
+                {"cmd": "sleep", "sec": 0.0}
+            ]
+        finally:
+            _owner.ring.close()
+
+
+class TestHwProcess:
+    """ハードウェアプロセスを起動するテスト (memバックエンド)"""
+
+    @pytest.fixture
+    def conf_file(self, tmp_path):
+        """設定ファイル"""
+        _conf_file = str(tmp_path / "servo.json")
+        ServoConfigManager(_conf_file).save_all_configs([
+            {"pin": _pin, "min": 500, "center": 1500, "max": 2500}
+            for _pin in PINS
+        ])
+        return _conf_file
+
+    def test_backpressure(self, conf_file):
+        """ロボットが遅れると、リングバッファが満杯になり、送れなくなるか"""
+        _worker = ProcessWorker(
+            PINS, conf_file=conf_file, slot_n=4, slot_size=128,
+            backend="mem", hw_qsize_max=2
+        )
+        _worker.start()
+        try:
+            # ハードウェアプロセスが、読み出し始めるまで待つ
+            _worker.send({"cmd": "sleep", "sec": 0.0})
+            assert wait_until(lambda: _worker.ring.qsize() == 0, 10.0)
+
+            _futs = [
+                _worker.send({"cmd": "sleep", "sec": 0.5})
+                for _ in range(12)
+            ]
+            _err_n = sum(1 for _f in _futs if _f.exception() is not None)
+
+            # 実行中 1 + ワーカーのキュー 2 + リングバッファ 4 まで
+            assert _err_n >= 12 - (1 + 2 + 4)
+            assert _worker.get_metrics()["dropped"] == _err_n
+
+            # キャンセルは、リングバッファの順番を待たない
+            _worker.clear_cmdq()
+            assert wait_until(lambda: _worker.ring.qsize() == 0, 2.0)
+            assert _worker.send({"cmd": "sleep", "sec": 0.0}).exception() \
+                is None
+        finally:
+            _t0 = time.monotonic()
+            _worker.end()
+        assert time.monotonic() - _t0 < 2.0
+
+    def test_status(self, conf_file):
+        """ハードウェアプロセスの状態とメトリクスが、共有メモリで届くか"""
+        _worker = ProcessWorker(
+            PINS, conf_file=conf_file, backend="mem"
+        )
+        _worker.start()
+        try:
+            for _a in (10, 20, 30):
+                _worker.send({
+                    "cmd": "move_all_angles_sync", "angles": [_a, -_a],
+                    "move_sec": 0.05, "step_n": 5,
+                })
+            _worker.send({"cmd": "sleep", "sec": 0.3})
+
+            # 実行中のコマンドとキューの長さ
+            assert wait_until(lambda: _worker.status.cmd == "sleep", 10.0)
+            assert _worker.qsize() == 0
+
+            _status = _worker.status
+            assert _status.angles == pytest.approx((30.0, -30.0), abs=0.1)
+            assert (_status.sent_n, _status.cmd_n, _status.err_n) == (
+                4, 3, 0
+            )
+
+            _metrics = _worker.get_metrics()
+            assert _metrics["cmd_n"] == 3
+            assert _metrics["exec"]["count"] == 3
+            assert _metrics["step_jitter"]["count"] > 0
+            assert _metrics["dropped"] == 0
+
+            _worker.reset_metrics()
+            assert wait_until(
+                lambda: _worker.get_metrics()["exec"]["count"] == 0, 2.0
+            )
+        finally:
+            _worker.end()
@@ -0,0 +1,155 @@
+# (c) 2025 Yoichi Tanibayashi
+#
+"""
+tests/test_10_shm_target_pose.py
+"""
+import math
+import struct
+import threading
+import time
+from unittest.mock import MagicMock
+
+import pytest
+
+from piservo0.core.multi_servo import MultiServo
+from piservo0.helper.shm_target_pose import ShmTargetPose
+from piservo0.helper.thread_worker import ThreadWorker
+
+PINS = [17, 18]
+
+
+@pytest.fixture
+def target_pose():
+    """ShmTargetPoseのインスタンスを返すフィクスチャ"""
+    _tp = ShmTargetPose(len(PINS), create=True, debug=True)
+    yield _tp
+    _tp.close()
+
+
+@pytest.fixture
+def mservo(tmp_path):
+    """モックのpiを使った、本物のMultiServoを返すフィクスチャ"""
+    pi = MagicMock()
+    pi.get_servo_pulsewidth.return_value = 1500
+    return MultiServo(
+        pi, PINS, first_move=False, conf_file=str(tmp_path / "servo.json")
+    )
+
+
+class TestShmTargetPose:
+    """ShmTargetPoseクラスのテスト"""
+
+    def test_not_written(self, target_pose):
+        """一度も書き込まれていない場合"""
+        assert target_pose.read() is None
+
+    def test_write_read(self, target_pose):
+        """書き込んだ角度とタイムスタンプを読み出せるか"""
+        target_pose.write([10.0, None], timestamp=123.0)
+
+        _pose = target_pose.read()
+        assert _pose.seq == 2
+        assert _pose.timestamp == 123.0
+        assert _pose.angles[0] == 10.0
+        assert math.isnan(_pose.angles[1])
+
+        target_pose.write([20.0, 30.0])
+        assert target_pose.read().seq == 4
+
+    def test_attach(self, target_pose):
+        """名前で接続した別インスタンスから、書き込めるか"""
+        _tp2 = ShmTargetPose(name=target_pose.name, untrack=False)
+        assert _tp2.servo_n == len(PINS)
+        _tp2.write([1.0, 2.0])
+        _tp2.close()
+
+        assert target_pose.read().angles == (1.0, 2.0)
+
+    def test_write_invalid_len(self, target_pose):
+        """サーボ数と異なる長さの角度"""
+        with pytest.raises(ValueError):
+            target_pose.write([1.0])
+
+    def test_read_while_writing(self, target_pose):
+        """書き込み途中(seqが奇数)のデータは読まない"""
+        target_pose.write([1.0, 2.0])
+        struct.pack_into(
+            "<Q", target_pose._shm.buf, ShmTargetPose.OFS_SEQ, 3
+        )
+        assert target_pose.read(retry_n=3) is None
+
+
+class TestFollowTargetPose:
+    """MultiServo.follow_target_pose()のテスト"""
+
+    def test_no_target_pose(self, mservo):
+        """目標角度の共有メモリがない場合"""
+        assert mservo.follow_target_pose(duration_sec=0.01) == 0
+
+    def test_follow(self, mservo, target_pose):
+        """更新された目標角度にだけ追従するか"""
+        mservo.attach_target_pose(target_pose)
+        target_pose.write([90.0, None])
+
+        _n = mservo.follow_target_pose(tick_sec=0.002, duration_sec=0.02)
+
+        assert _n == 1
+        mservo._pi.set_servo_pulsewidth.assert_any_call(PINS[0], 2500)
+        mservo._pi.set_servo_pulsewidth.assert_any_call(PINS[1], 1500)
+
+    def test_follow_stale(self, mservo, target_pose):
+        """古い目標角度は無視する"""
+        mservo.attach_target_pose(target_pose)
+        target_pose.write([90.0, 90.0], timestamp=time.monotonic() - 1.0)
+
+        _n = mservo.follow_target_pose(
+            tick_sec=0.002, duration_sec=0.02, max_age_sec=0.1
+        )
+        assert _n == 0
+
+    def test_follow_cmd_cancel(self, mservo, target_pose):
+        """`follow`コマンドが、キャンセルで終了するか"""
+        mservo.attach_target_pose(target_pose)
+        _worker = ThreadWorker(mservo)
+        _worker.start()
+
+        _fut = _worker.send({"cmd": "follow", "tick": 0.002})
+        for _i in range(10):
+            target_pose.write([_i, -_i])
+            time.sleep(0.005)
+
+        # 最後の目標角度が反映されるまで待つ (GCなどで遅れることがある)
+        _t_end = time.monotonic() + 1.0
+        while mservo.state.angles[0] != pytest.approx(9, abs=0.5):
+            assert time.monotonic() < _t_end
+            time.sleep(0.002)
+
+        _worker.send({"cmd": "cancel"})
+        _res = _fut.result(timeout=1.0)
+        _worker.end()
+
+        assert _res["cmd"] == "follow"
+        mservo._pi.set_servo_pulsewidth.assert_any_call(
+            PINS[0], mservo.servo[0].deg2pulse(9)
+        )
+
+    def test_follow_threaded_writer(self, mservo, target_pose):
+        """別スレッドから高頻度で書き込んでも、一貫した値が読めるか"""
+        _stop = threading.Event()
+
+        def _writer():
+            _i = 0
+            while not _stop.is_set():
+                _i += 1
+                target_pose.write([_i % 90, _i % 90])
+
+        _thr = threading.Thread(target=_writer)
+        _thr.start()
+        try:
+            for _ in range(1000):
+                _pose = target_pose.read()
+                if _pose is not None:
+                    assert _pose.angles[0] == _pose.angles[1]
+        finally:
+            _stop.set()
+            _thr.join()
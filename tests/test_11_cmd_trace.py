@@ -0,0 +1,274 @@
+#
+# (c) 2025 Yoichi Tanibayashi
+#
+"""
+tests/test_11_cmd_trace.py
+"""
+import os
+import time
+
+import pytest
+from click.testing import CliRunner
+
+from piservo0.__main__ import cli
+from piservo0.backend import pca9685_pi
+from piservo0.backend.factory import BACKEND_PIGPIO, BACKENDS
+from piservo0.backend.fake_smbus import FakeSMBus
+from piservo0.backend.mem_pi import MemPi
+from piservo0.core.multi_servo import MultiServo
+from piservo0.helper.cmd_trace import (
+    FILE_HDR,
+    TraceCmd,
+    TracePi,
+    TracePulse,
+    TraceRecorder,
+    TraceReplayer,
+    read_trace,
+)
+from piservo0.helper.thread_worker import ThreadWorker
+from piservo0.utils.clock import SimClock
+
+PINS = [17, 18]
+
+
+@pytest.fixture
+def trace_file(tmp_path):
+    """トレースファイルのパス"""
+    return str(tmp_path / "trace.bin")
+
+
+class TestTraceRecorder:
+    """TraceRecorderとread_trace()のテスト"""
+
+    def test_record_read(self, trace_file):
+        """記録したレコードを、そのまま読み出せるか"""
+        _rec = TraceRecorder(trace_file)
+        _rec.record_cmd(1, {"cmd": "move", "angles": [10, None]}, t=1.0)
+        _rec.record_pulse(17, 1500, t=1.5)
+        _rec.record_cmd(2, "not json", t=2.0)
+        _rec.close()
+
+        assert list(read_trace(trace_file)) == [
+            TraceCmd(1.0, 1, {"cmd": "move", "angles": [10, None]}),
+            TracePulse(1.5, 17, 1500),
+            TraceCmd(2.0, 2, "not json"),
+        ]
+
+    def test_append(self, trace_file):
+        """既存のファイルに追記するか"""
+        for _i in range(2):
+            _rec = TraceRecorder(trace_file)
+            _rec.record_pulse(17, 1000 + _i, t=_i)
+            _rec.close()
+
+        assert [r.pulse for r in read_trace(trace_file)] == [1000, 1001]
+
+    def test_truncated(self, trace_file):
+        """途切れた最後のレコードは無視する"""
+        _rec = TraceRecorder(trace_file)
+        _rec.record_pulse(17, 1000)
+        _rec.record_pulse(17, 2000)
+        _rec.close()
+
+        with open(trace_file, "r+b") as _f:
+            _f.truncate(os.path.getsize(trace_file) - 1)
+
+        assert [r.pulse for r in read_trace(trace_file)] == [1000]
+
+    def test_not_trace(self, trace_file):
+        """トレースファイルでない場合"""
+        with open(trace_file, "wb") as _f:
+            _f.write(b"x" * FILE_HDR.size)
+
+        with pytest.raises(ValueError):
+            list(read_trace(trace_file))
+
+    def test_flush_n(self, trace_file):
+        """`flush_n`レコードごとに、ファイルに書き出すか"""
+        _rec = TraceRecorder(trace_file, flush_n=2, flush_sec=0)
+        try:
+            _rec.record_pulse(17, 1000)
+            assert list(read_trace(trace_file)) == []
+            _rec.record_pulse(17, 2000)
+            assert [r.pulse for r in read_trace(trace_file)] == [1000, 2000]
+        finally:
+            _rec.close()
+
+    def test_flush_sec(self, trace_file):
+        """`flush_sec`ごとに、ファイルに書き出すか (記録が止まっても)"""
+        _rec = TraceRecorder(trace_file, flush_n=0, flush_sec=0.02)
+        try:
+            _rec.record_pulse(17, 1000)
+            _t_end = time.monotonic() + 2.0
+            while not list(read_trace(trace_file)):
+                assert time.monotonic() < _t_end
+                time.sleep(0.01)
+            assert [r.pulse for r in read_trace(trace_file)] == [1000]
+        finally:
+            _rec.close()
+
+    def test_rotate(self, trace_file):
+        """max_bytesを超えたらローテートするか"""
+        _rec = TraceRecorder(trace_file, max_bytes=100, backup_n=2)
+        for _i in range(50):
+            _rec.record_pulse(17, _i)
+        _rec.close()
+
+        assert os.path.exists(trace_file + ".1")
+        assert os.path.exists(trace_file + ".2")
+        assert not os.path.exists(trace_file + ".3")
+        for _f in (trace_file, trace_file + ".1", trace_file + ".2"):
+            assert os.path.getsize(_f) <= 100
+
+        # ローテートされたファイルを順に読むと、連続している
+        _pulses = [
+            r.pulse
+            for _f in (trace_file + ".2", trace_file + ".1", trace_file)
+            for r in read_trace(_f)
+        ]
+        assert _pulses == list(range(50 - len(_pulses), 50))
+
+
+class TestTraceWorker:
+    """ThreadWorkerとTracePiによる記録のテスト"""
+
+    def test_worker_trace(self, trace_file, tmp_path):
+        """コマンドとパルスが、時刻順に記録されるか"""
+        _rec = TraceRecorder(trace_file)
+        _pi = TracePi(MemPi(), _rec)
+        _mservo = MultiServo(
+            _pi, PINS, first_move=False,
+            conf_file=str(tmp_path / "servo.json")
+        )
+        _worker = ThreadWorker(_mservo, trace=_rec)
+        _worker.start()
+        _worker.send(
+            {"cmd": "move", "angles": [90, -90], "move_sec": 0.05,
+             "step_n": 5}
+        ).result(timeout=2.0)
+        _worker.end()
+        _rec.close()
+
+        _records = list(read_trace(trace_file))
+        assert isinstance(_records[0], TraceCmd)
+        assert _records[0].cmd_data["cmd"] == "move"
+
+        _pulses = [r for r in _records if isinstance(r, TracePulse)]
+        assert len(_pulses) == 5 * len(PINS)
+        assert _pulses[-1].pin == PINS[1]
+        assert _pulses[-1].pulse == _mservo.servo[1].deg2pulse(-90)
+
+        _ts = [r.t for r in _records]
+        assert _ts == sorted(_ts)
+
+
+    def test_worker_trace_sim_clock(self, trace_file, tmp_path):
+        """コマンドとパルスが、同じ時計(`SimClock`)で記録されるか"""
+        _clock = SimClock(t0=1.0e9)
+        _rec = TraceRecorder(trace_file, clock=_clock)
+        _mservo = MultiServo(
+            TracePi(MemPi(), _rec), PINS, first_move=False,
+            conf_file=str(tmp_path / "servo.json"), clock=_clock
+        )
+        _worker = ThreadWorker(_mservo, trace=_rec)
+        _worker.start()
+        _worker.send({"cmd": "sleep", "sec": 10.0})
+        _worker.send(
+            {"cmd": "move", "angles": [90, -90], "move_sec": 1.0,
+             "step_n": 5}
+        ).result(timeout=2.0)
+        _worker.end()
+        _rec.close()
+
+        _records = list(read_trace(trace_file))
+        _ts = [r.t for r in _records]
+        assert _ts == sorted(_ts)
+
+        # `move`は、`sleep`の10秒後に始まり、1秒で終わる
+        _cmds = [r for r in _records if isinstance(r, TraceCmd)]
+        assert _cmds[1].t == pytest.approx(1.0e9 + 10.0)
+        assert _ts[-1] == pytest.approx(1.0e9 + 11.0)
+
+
+class TestTraceReplayer:
+    """TraceReplayerのテスト"""
+
+    @staticmethod
+    def make_records(n=10, step_sec=0.01):
+        """パルスのレコード"""
+        return [TracePulse(100.0 + _i * step_sec, 17, 1000 + _i)
+                for _i in range(n)]
+
+    def test_replay_fast(self):
+        """最速で、同じパルス列を出力するか"""
+        _pi = MemPi()
+        _t0 = time.monotonic()
+        _n = TraceReplayer(_pi, speed=0).replay(self.make_records(10, 1.0))
+        assert time.monotonic() - _t0 < 0.5
+
+        assert _n == 10
+        assert _pi.write_n == 10
+        assert _pi.get_servo_pulsewidth(17) == 1009
+
+    @pytest.mark.parametrize("speed", [1.0, 2.0])
+    def test_replay_speed(self, speed):
+        """再生速度に応じた時間がかかるか"""
+        _t0 = time.monotonic()
+        TraceReplayer(MemPi(), speed=speed).replay(self.make_records())
+        _elapsed = time.monotonic() - _t0
+
+        _expected = 0.09 / speed
+        assert _expected <= _elapsed < _expected + 0.05
+
+
+class TestReplayCli:
+    """`piservo0 replay`のテスト"""
+
+    def test_replay_cli(self, trace_file):
+        """memバックエンドで再生できるか"""
+        _rec = TraceRecorder(trace_file)
+        _rec.record_cmd(1, {"cmd": "move"}, t=0.0)
+        _rec.record_pulse(17, 1500, t=0.1)
+        _rec.close()
+
+        _runner = CliRunner()
+        _res = _runner.invoke(
+            cli, ["replay", "--fast", "-b", "mem", trace_file]
+        )
+        assert _res.exit_code == 0
+        assert "1 pulses replayed" in _res.output
+
+        _res = _runner.invoke(cli, ["replay", "--dump", trace_file])
+        assert _res.exit_code == 0
+        assert "pin=17 1500" in _res.output
+
+    def test_replay_backends(self, trace_file, monkeypatch):
+        """`api-server`と同じバックエンドで再生できるか"""
+        _rec = TraceRecorder(trace_file)
+        _rec.record_pulse(17, 1500, t=0.0)
+        _rec.close()
+
+        _buses = []
+
+        def _smbus(bus_n):
+            _buses.append(bus_n)
+            return FakeSMBus()
+
+        monkeypatch.setattr(pca9685_pi, "SMBus", _smbus)
+
+        _runner = CliRunner()
+        for _backend in BACKENDS:
+            if _backend == BACKEND_PIGPIO:
+                continue
+            _res = _runner.invoke(cli, [
+                "replay", "--fast", "-b", _backend, "--i2c_bus", "2",
+                "--pca9685_addrs", "0x40,0x41", trace_file
+            ])
+            assert _res.exit_code == 0, _backend
+            assert "1 pulses replayed" in _res.output, _backend
+        assert _buses == [2]
+
+        _res = _runner.invoke(cli, [
+            "replay", "-b", "pca9685", "--pca9685_addrs", "0x80", trace_file
+        ])
+        assert _res.exit_code != 0
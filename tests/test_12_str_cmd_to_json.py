@@ -0,0 +1,204 @@
+#
+# (c) 2025 Yoichi Tanibayashi
+#
+"""
+tests/test_12_str_cmd_to_json.py
+"""
+from unittest.mock import patch
+
+import pytest
+
+from piservo0.helper.str_cmd_to_json import (
+    CmdRecord,
+    CompileError,
+    StrCmdToJson,
+)
+
+SCRIPT = """
+# comment
+ms:0.3 st:10
+mv:10,20,30,40
+
+mv:c,c,c,c sl:0.5
+"""
+
+
+@pytest.fixture
+def parser():
+    """StrCmdToJsonのインスタンスを返すフィクスチャ"""
+    return StrCmdToJson([1, -1, 1, -1], cache_size=4)
+
+
+class TestStrCmdToJson:
+    """StrCmdToJsonクラスのテスト"""
+
+    @pytest.mark.parametrize(
+        "cmd_str, expected",
+        [
+            ("mv:10,20,x,n",
+             {"cmd": "move_all_angles_sync",
+              "angles": [10, -20, "max", "max"]}),
+            ("mv:.,c,.,.",
+             {"cmd": "move_all_angles_sync",
+              "angles": [None, "center", None, None]}),
+            ("sl:0.5", {"cmd": "sleep", "sec": 0.5}),
+            ("st:20", {"cmd": "step_n", "n": 20}),
+            ("ca", {"cmd": "cancel"}),
+            ("mv:100,0,0,0", {"err": "mv:100,0,0,0"}),
+            ("xx:1", {"err": "xx:1"}),
+        ],
+    )
+    def test_cmd_data(self, parser, cmd_str, expected):
+        """コマンド文字列の変換"""
+        assert parser.cmd_data(cmd_str) == expected
+
+    def test_cache_hit(self, parser):
+        """同じコマンド文字列は、キャッシュから返されるか"""
+        for _ in range(3):
+            parser.cmd_data("mv:10,20,30,40")
+
+        _info = parser.cache_info()
+        assert (_info.hits, _info.misses, _info.currsize) == (2, 1, 1)
+
+    def test_cache_immutable(self, parser):
+        """キャッシュされたオブジェクトは変更できず、コピーは変更できる"""
+        _cmd = parser.parse("mv:10,20,30,40")
+        assert _cmd["angles"] == (10, -20, 30, -40)
+        with pytest.raises(TypeError):
+            _cmd["angles"] = None  # type: ignore
+
+        _data = parser.cmd_data("mv:10,20,30,40")
+        _data["angles"][0] = 0
+        _data["count"] = 1
+        assert parser.cmd_data("mv:10,20,30,40") == {
+            "cmd": "move_all_angles_sync", "angles": [10, -20, 30, -40]
+        }
+
+    def test_cache_lru(self, parser):
+        """cache_sizeを超えたら、古いものから捨てるか"""
+        for _i in range(5):
+            parser.cmd_data(f"sl:{_i}")
+        parser.cmd_data("sl:4")
+        parser.cmd_data("sl:0")
+
+        _info = parser.cache_info()
+        assert (_info.hits, _info.misses, _info.currsize) == (1, 6, 4)
+
+    def test_cache_angle_factor(self, parser):
+        """angle_factorを変更すると、キャッシュがクリアされるか"""
+        parser.cmd_data("mv:10,20,30,40")
+        parser.angle_factor = [-1, 1, 1, 1]
+
+        assert parser.cache_info().currsize == 0
+        _angles = parser.cmd_data("mv:10,20,30,40")["angles"]
+        assert _angles == [-10, 20, 30, 40]
+
+    def test_cache_angle_factor_inplace(self, parser):
+        """angle_factorのリストを直接変更した場合も、正しく変換されるか"""
+        parser.cmd_data("mv:10,20,30,40")
+        parser.angle_factor[0] = -1
+
+        assert parser.cmd_data("mv:10,20,30,40")["angles"] == [
+            -10, -20, 30, -40
+        ]
+
+    def test_no_cache(self):
+        """cache_size=0の場合は、キャッシュしない"""
+        _parser = StrCmdToJson([1], cache_size=0)
+        _parser.cmd_data("sl:1")
+        _parser.cmd_data("sl:1")
+        assert _parser.cache_info().currsize == 0
+
+    def test_cmd_data_list(self, parser):
+        """エラーのコマンドで、変換を打ち切るか"""
+        _list = parser.cmd_data_list("sl:1 xx mv:0,0,0,0")
+        assert _list == [{"cmd": "sleep", "sec": 1.0}, {"err": "xx"}]
+
+
+class TestCompile:
+    """StrCmdToJson.compile()のテスト"""
+
+    def test_compile(self, parser):
+        """スクリプト全体を、行番号付きのレコードに変換するか"""
+        _prog = parser.compile(SCRIPT)
+
+        assert len(_prog) == 5
+        assert [(_r.lineno, _r.token) for _r in _prog] == [
+            (3, "ms:0.3"), (3, "st:10"), (4, "mv:10,20,30,40"),
+            (6, "mv:c,c,c,c"), (6, "sl:0.5"),
+        ]
+        assert isinstance(_prog.records[0], CmdRecord)
+        assert _prog.cmd_data_list()[2] == {
+            "cmd": "move_all_angles_sync", "angles": [10, -20, 30, -40]
+        }
+
+    def test_compile_errors(self, parser):
+        """すべてのエラーを、行番号付きで報告するか"""
+        with pytest.raises(CompileError) as _e:
+            parser.compile(["mv:0,0,0,0", "xx sl:1", "sl:-1"], source="a")
+
+        assert _e.value.errors == [(2, "xx"), (3, "sl:-1")]
+        assert "line 2" in str(_e.value)
+
+    def test_compile_file_cache(self, parser, tmp_path):
+        """2回目以降は、ディスクキャッシュから読み込むか"""
+        _script = tmp_path / "script.txt"
+        _script.write_text(SCRIPT)
+        _cache_dir = tmp_path / "cache"
+
+        _prog1 = parser.compile_file(str(_script), str(_cache_dir))
+        assert len(list(_cache_dir.iterdir())) == 1
+
+        with patch.object(
+            parser, "compile", wraps=parser.compile
+        ) as _spy:
+            _prog2 = parser.compile_file(str(_script), str(_cache_dir))
+            _spy.assert_not_called()
+            assert _prog2.records == _prog1.records
+
+            # 内容が変われば、コンパイルし直す
+            _script.write_text(SCRIPT + "sl:1\n")
+            _prog3 = parser.compile_file(str(_script), str(_cache_dir))
+            _spy.assert_called_once()
+            assert len(_prog3) == 6
+
+    def test_compile_file_angle_factor(self, parser, tmp_path):
+        """angle_factorが違えば、別のキャッシュになるか"""
+        _script = tmp_path / "script.txt"
+        _script.write_text("mv:10,10,10,10")
+        _cache_dir = str(tmp_path / "cache")
+
+        _prog1 = parser.compile_file(str(_script), _cache_dir)
+        parser.angle_factor = [1, 1, 1, 1]
+        _prog2 = parser.compile_file(str(_script), _cache_dir)
+
+        assert _prog1.records[0].cmd["angles"] == (10, -10, 10, -10)
+        assert _prog2.records[0].cmd["angles"] == (10, 10, 10, 10)
+
+
+class TestStreaming:
+    """StrCmdToJson.iter_records(), iter_cmd_data()のテスト"""
+
+    def test_iter_lazy(self, parser):
+        """無限のストリームからでも、少しずつ読み出せるか"""
+
+        def _lines():
+            _i = 0
+            while True:
+                _i += 1
+                yield f"mv:{_i % 90},0,0,0 sl:0.1\n".encode()
+
+        _iter = parser.iter_records(_lines())
+        _recs = [next(_iter) for _ in range(5)]
+
+        assert [_r.lineno for _r in _recs] == [1, 1, 2, 2, 3]
+        assert _recs[2].cmd["angles"] == (2, 0, 0, 0)
+
+    def test_iter_cmd_data(self, parser):
+        """エラーのコマンドで終了するか"""
+        _lines = iter(["# comment", "sl:1 ms:0.5", "", "xx sl:2", "sl:3"])
+        assert list(parser.iter_cmd_data(_lines)) == [
+            {"cmd": "sleep", "sec": 1.0},
+            {"cmd": "move_sec", "sec": 0.5},
+            {"err": "xx"},
+        ]
@@ -0,0 +1,229 @@
+#
+# (c) 2025 Yoichi Tanibayashi
+#
+"""
+tests/test_13_api_client.py
+"""
+import json
+import time
+from unittest.mock import MagicMock, patch
+
+import pytest
+from click.testing import CliRunner
+from fastapi.testclient import TestClient
+
+from piservo0.__main__ import cli
+from piservo0.web.api_client import ApiClient
+
+URL = "http://localhost:8000/cmd"
+
+
+@pytest.fixture
+def mock_requests():
+    """requestsをモックするフィクスチャ
+
+    `ApiClient`は`requests.Session`を使うので、セッションのモックを返す。
+    """
+    with patch("piservo0.web.api_client.requests") as _req:
+        _req.RequestException = Exception
+        yield _req.Session.return_value
+
+
+class TestApiClient:
+    """ApiClientクラスのテスト"""
+
+    def test_metrics_url(self):
+        """metricsのURL"""
+        assert ApiClient(URL).metrics_url == "http://localhost:8000/metrics"
+
+    def test_status_url(self):
+        """statusのURL"""
+        assert ApiClient(URL).status_url == "http://localhost:8000/status"
+
+    def test_positional_debug(self):
+        """2番目の位置引数は、従来どおり`debug`"""
+        _client = ApiClient(URL, True)
+        assert _client._debug is True
+        assert _client.binary is False
+        with pytest.raises(TypeError):
+            ApiClient(URL, False, True)  # type: ignore
+
+    def test_post_stream(self, mock_requests):
+        """chunk_n個ずつ、JSON配列としてPOSTするか"""
+        mock_requests.get.return_value.json.return_value = {"qsize": 0}
+
+        _cmds = ({"cmd": "sleep", "sec": _i} for _i in range(7))
+        _res = list(ApiClient(URL).post_stream(_cmds, chunk_n=3))
+
+        assert len(_res) == 3
+        _posted = [
+            json.loads(_c.kwargs["data"])
+            for _c in mock_requests.post.call_args_list
+        ]
+        assert [len(_p) for _p in _posted] == [3, 3, 1]
+        assert _posted[2] == [{"cmd": "sleep", "sec": 6}]
+
+    def test_post_stream_flow_control(self, mock_requests):
+        """サーバーのキューが長い間は、次のPOSTを待つか"""
+        _qsizes = iter([5, 4, 2, 0])
+        mock_requests.get.return_value.json.side_effect = (
+            lambda: {"qsize": next(_qsizes)}
+        )
+
+        _client = ApiClient(URL)
+        with patch("piservo0.web.api_client.time.sleep") as _sleep:
+            _res = list(_client.post_stream(
+                [{"cmd": "sleep", "sec": 0}] * 4, chunk_n=2, max_qsize=2
+            ))
+
+        assert len(_res) == 2
+        assert _sleep.call_count == 2  # qsize=5, 4 で待つ
+        assert mock_requests.get.call_count == 4
+
+    def test_get_qsize_error(self, mock_requests):
+        """キューの長さが取得できない場合は、待たない"""
+        mock_requests.get.side_effect = Exception("refused")
+
+        assert ApiClient(URL).get_qsize() is None
+        _res = list(ApiClient(URL).post_stream([{"cmd": "cancel"}]))
+        assert len(_res) == 1
+        assert isinstance(_res[0], MagicMock)
+
+    def test_str_client_file(self, mock_requests, tmp_path):
+        """`str-client --file`で、スクリプトを少しずつ送信するか"""
+        mock_requests.get.return_value.json.return_value = {"qsize": 0}
+        mock_requests.post.return_value.json.return_value = []
+
+        _script = tmp_path / "script.txt"
+        _script.write_text("mv:0,0,0,0 sl:0.1\n" * 5)
+
+        _res = CliRunner().invoke(
+            cli, ["str-client", "--file", str(_script), "-n", "4"]
+        )
+        assert _res.exit_code == 0
+        assert mock_requests.post.call_count == 3
+
+
+class TestApiClientBatch:
+    """ApiClient.submit()のテスト"""
+
+    @staticmethod
+    def echo_post(mock_session):
+        """POSTされたコマンドを、IDを付けてエコーバックするモック"""
+
+        def _post(url, data=None, headers=None):
+            _res = MagicMock()
+            _res.json.return_value = [
+                dict(_c, id=_i) for _i, _c in enumerate(json.loads(data))
+            ]
+            return _res
+
+        mock_session.post.side_effect = _post
+
+    def test_submit_batch(self, mock_requests):
+        """時間窓の間のコマンドを、一つのPOSTにまとめるか"""
+        self.echo_post(mock_requests)
+        _client = ApiClient(URL, batch_ms=100)
+
+        _fut1 = _client.submit({"cmd": "sleep", "sec": 1})
+        _fut2 = _client.submit([{"cmd": "sleep", "sec": 2},
+                                {"cmd": "sleep", "sec": 3}])
+        assert not _fut1.done()  # 送信を待たずに返る
+
+        assert _fut1.result(timeout=1.0) == [
+            {"cmd": "sleep", "sec": 1, "id": 0}
+        ]
+        assert [_r["id"] for _r in _fut2.result(timeout=1.0)] == [1, 2]
+        assert mock_requests.post.call_count == 1
+        _client.close()
+
+    def test_submit_batch_max(self, mock_requests):
+        """batch_maxに達したら、時間窓を待たずに送るか"""
+        self.echo_post(mock_requests)
+        _client = ApiClient(URL, batch_ms=10_000, batch_max=2)
+
+        _fut = _client.submit([{"cmd": "cancel"}] * 2)
+        assert len(_fut.result(timeout=1.0)) == 2
+        _client.close()
+
+    def test_submit_error(self, mock_requests):
+        """送信に失敗したら、Futureに例外が設定されるか"""
+        mock_requests.post.side_effect = ConnectionError("refused")
+        _client = ApiClient(URL, batch_ms=0)
+
+        _fut = _client.submit({"cmd": "cancel"})
+        with pytest.raises(ConnectionError):
+            _fut.result(timeout=1.0)
+        _client.close()
+
+    def test_close_flush(self, mock_requests):
+        """close()で、送信待ちのコマンドも送るか"""
+        self.echo_post(mock_requests)
+        _client = ApiClient(URL, batch_ms=10_000)
+
+        _fut = _client.submit({"cmd": "cancel"})
+        _client.close()
+
+        assert _fut.done()
+        with pytest.raises(RuntimeError):
+            _client.submit({"cmd": "cancel"})
+
+    def test_session(self, mock_requests):
+        """同じセッションを使い回すか"""
+        self.echo_post(mock_requests)
+        mock_requests.get.return_value.json.return_value = {"qsize": 0}
+        _client = ApiClient(URL)
+
+        _client.post_cmds([{"cmd": "cancel"}])
+        _client.post_cmds([{"cmd": "cancel"}])
+        _client.get_qsize()
+        _client.close()
+
+        assert mock_requests.post.call_count == 2
+        mock_requests.close.assert_called_once()
+
+
+@pytest.fixture
+def process_client(tmp_path, monkeypatch):
+    """`engine="process"`のAPIサーバーに接続したApiClient
+
+    `requests`の代わりに、`TestClient`でリクエストを送る。
+    """
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv("PISERVO0_PINS", "17,27")
+    monkeypatch.setenv("PISERVO0_BACKEND", "mem")
+    monkeypatch.setenv("PISERVO0_ENGINE", "process")
+
+    from piservo0.web.json_api import app
+
+    with TestClient(app) as _test_client:
+        _client = ApiClient("http://testserver/cmd")
+        _client.session = _test_client  # type: ignore
+        yield _client
+
+
+def wait_qsize_eq(client: ApiClient, qsize: int, timeout: float) -> bool:
+    """`get_qsize()`が`qsize`になるまで待つ"""
+    _t_end = time.monotonic() + timeout
+    while client.get_qsize() != qsize:
+        if time.monotonic() > _t_end:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+class TestQsizeProcess:
+    """`engine="process"`のサーバーのキューの長さ"""
+
+    def test_get_qsize(self, process_client):
+        """リングバッファとハードウェアプロセスのキューの合計を返すか"""
+        assert wait_qsize_eq(process_client, 0, 10.0)
+
+        _session = process_client.session
+        _session.post("/cmd", json=[{"cmd": "sleep", "sec": 0.5}] * 4)
+
+        # 実行中 1, ハードウェアプロセスのキュー 2, リングバッファ 1
+        assert wait_qsize_eq(process_client, 3, 2.0)
+
+        _session.post("/cmd", json=[{"cmd": "cancel"}])
+        assert wait_qsize_eq(process_client, 0, 2.0)
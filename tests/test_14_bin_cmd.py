@@ -0,0 +1,120 @@
+#
+# (c) 2025 Yoichi Tanibayashi
+#
+"""
+tests/test_14_bin_cmd.py
+"""
+import json
+
+import pytest
+
+from piservo0.helper.bin_cmd import BinCmd
+from piservo0.web.api_client import ApiClient
+
+CMDS = [
+    {"cmd": "move_all_angles_sync",
+     "angles": [30.5, None, "max", "min"], "move_sec": 0.2, "step_n": 40},
+    {"cmd": "move_all_angles_sync", "angles": [0.0, -90.0]},
+    {"cmd": "move_all_angles_sync_relative", "angle_diffs": [10.0, -10.0]},
+    {"cmd": "move_all_angles", "angles": [None, 45.0]},
+    {"cmd": "move_all_pulses_relative", "pulse_diffs": [-20, 20, 0]},
+    {"cmd": "move_sec", "sec": 1.5},
+    {"cmd": "step_n", "n": 40},
+    {"cmd": "interval", "sec": 0.5},
+    {"cmd": "sleep", "sec": 0.1},
+    {"cmd": "set", "servo": 1, "target": "max"},
+    {"cmd": "cancel"},
+    {"cmd": "follow", "tick": 0.005},
+]
+
+
+class TestBinCmd:
+    """BinCmdクラスのテスト"""
+
+    @pytest.mark.parametrize("cmd", CMDS)
+    def test_round_trip(self, cmd):
+        """エンコードしてデコードすると、元に戻るか"""
+        _cmd, _offset = BinCmd.decode(BinCmd.encode(cmd))
+        assert _cmd == cmd
+
+    def test_alias(self):
+        """`move`は、`move_all_angles_sync`になる"""
+        _buf = BinCmd.encode({"cmd": "move", "angles": ["center"]})
+        assert BinCmd.decode_all(_buf) == [
+            {"cmd": "move_all_angles_sync", "angles": [0.0]}
+        ]
+
+    def test_decode_all(self):
+        """連結したフレームを、すべてデコードできるか"""
+        assert BinCmd.decode_all(BinCmd.encode_list(CMDS)) == CMDS
+
+    def test_size(self):
+        """JSONより小さいか"""
+        _cmd = {"cmd": "move", "angles": [30, -30, 45, None]}
+        assert len(BinCmd.encode(_cmd)) < len(json.dumps(_cmd))
+
+    @pytest.mark.parametrize(
+        "cmd",
+        [{"cmd": "unknown"}, {"angles": [0]}, {"cmd": "sleep"},
+         {"cmd": "set", "servo": 0, "target": "xx"}],
+    )
+    def test_encode_error(self, cmd):
+        """変換できないコマンド"""
+        with pytest.raises(ValueError):
+            BinCmd.encode(cmd)
+
+    @pytest.mark.parametrize(
+        "buf",
+        [b"\x01\x08", b"\x02\x08\x08\x00" + b"\0" * 8,
+         b"\x01\x63\x00\x00", b"\x01\x08\x08\x00\0\0"],
+    )
+    def test_decode_error(self, buf):
+        """不正なフレーム (途切れ, バージョン, opcode)"""
+        with pytest.raises(ValueError):
+            BinCmd.decode_all(buf)
+
+    @pytest.mark.parametrize(
+        "buf",
+        [
+            # 長さ0のsleepの後に、正しいsleep
+            b"\x01\x08\x00\x00"
+            + BinCmd.encode({"cmd": "sleep", "sec": 1.0}),
+            b"\x01\x03\x03\x00\0\0\0",  # 3 bytesのmove_all_angles
+            b"\x01\x08\x0a\x00" + b"\0" * 10,  # 余分なバイト
+            b"\x01\x0a\x01\x00\0",  # cancelに、ペイロード
+            b"\x01\x01\x0b\x00" + b"\0" * 11,  # moveの固定部分が不足
+            b"\x01\x04\x03\x00\0\0\0",  # int16の途中
+        ],
+    )
+    def test_decode_payload_size(self, buf):
+        """opcodeに合わないペイロード長 (短い, 余分)"""
+        with pytest.raises(ValueError):
+            BinCmd.decode_all(buf)
+
+
+class TestCmdBinApi:
+    """`/cmd/bin`のテスト"""
+
+    def test_cmd_bin(self, client):
+        """バイナリのコマンドを実行できるか"""
+        _buf = BinCmd.encode_list([
+            {"cmd": "move", "angles": [90, -90], "step_n": 1},
+            {"cmd": "sleep", "sec": 0.0},
+        ])
+        _res = client.post(
+            "/cmd/bin?wait=true", content=_buf,
+            headers=ApiClient.HEADERS_BIN
+        )
+        assert _res.status_code == 200
+        assert [_r["cmd"] for _r in _res.json()] == [
+            "move_all_angles_sync", "sleep"
+        ]
+
+        _pi = client.app.state.json_app.pi  # type: ignore
+        assert _pi.get_servo_pulsewidth(17) == 2500
+        assert _pi.get_servo_pulsewidth(27) == 500
+
+    def test_cmd_bin_invalid(self, client):
+        """不正なフレームは、400エラー"""
+        _res = client.post("/cmd/bin", content=b"\x01\x63\x00\x00")
+        assert _res.status_code == 400
@@ -0,0 +1,293 @@
+#
+# (c) 2025 Yoichi Tanibayashi
+#
+"""
+tests/test_15_ws.py
+"""
+import threading
+import time
+
+import pytest
+
+from piservo0.helper.bin_cmd import BinCmd
+from piservo0.web.api_client import ApiClient
+from piservo0.web.api_ws_client import ApiWsClient
+from piservo0.web.local_server import LocalServer
+
+
+def recv_until(ws, event_name, n=1):
+    """`event_name`のイベントを`n`個受け取るまで、イベントを集める"""
+    _events = []
+    _count = 0
+    while _count < n:
+        _ev = ws.receive_json()
+        _events.append(_ev)
+        if _ev["event"] == event_name:
+            _count += 1
+    return _events
+
+
+class TestWsApi:
+    """`/ws`のテスト"""
+
+    def test_json(self, client):
+        """JSONのコマンドを受け取り、完了イベントを返すか"""
+        with client.websocket_connect("/ws") as _ws:
+            _ws.send_json([
+                {"cmd": "move_all_angles", "angles": [90, -90]},
+                {"cmd": "sleep", "sec": 0.0},
+            ])
+            _events = recv_until(_ws, "done", 2)
+
+        assert _events[0]["event"] == "queued"
+        _ids = _events[0]["ids"]
+        assert len(_ids) == 2
+        assert [(_e["id"], _e["cmd"]) for _e in _events[1:]] == [
+            (_ids[0], "move_all_angles"), (_ids[1], "sleep")
+        ]
+        assert "exec_sec" in _events[1]
+
+        _pi = client.app.state.json_app.pi  # type: ignore
+        assert _pi.get_servo_pulsewidth(17) == 2500
+
+    def test_single(self, client):
+        """配列でないコマンドも受け取るか"""
+        with client.websocket_connect("/ws") as _ws:
+            _ws.send_json({"cmd": "sleep", "sec": 0.0})
+            _events = recv_until(_ws, "done")
+
+        assert _events[-1]["cmd"] == "sleep"
+
+    def test_binary(self, client):
+        """バイナリのコマンドを受け取るか"""
+        with client.websocket_connect("/ws") as _ws:
+            _ws.send_bytes(BinCmd.encode_list([
+                {"cmd": "move", "angles": [-90, 90], "step_n": 1},
+            ]))
+            _events = recv_until(_ws, "done")
+
+        assert _events[-1]["cmd"] == "move_all_angles_sync"
+
+        _pi = client.app.state.json_app.pi  # type: ignore
+        assert _pi.get_servo_pulsewidth(27) == 2500
+
+    @pytest.mark.parametrize("msg", ["{invalid", "[1, 2]"])
+    def test_invalid_message(self, client, msg):
+        """不正なメッセージは、IDなしのエラーイベント"""
+        with client.websocket_connect("/ws") as _ws:
+            _ws.send_text(msg)
+            _ev = _ws.receive_json()
+
+            assert _ev["event"] == "error"
+            assert "id" not in _ev
+
+            # 接続は、そのまま使える
+            _ws.send_json({"cmd": "sleep", "sec": 0.0})
+            assert recv_until(_ws, "done")[-1]["cmd"] == "sleep"
+
+    def test_cmd_error(self, client):
+        """実行に失敗したコマンドは、IDつきのエラーイベント"""
+        with client.websocket_connect("/ws") as _ws:
+            _ws.send_json({"cmd": "no_such_cmd"})
+            _events = recv_until(_ws, "error")
+
+        assert _events[-1]["id"] == _events[0]["ids"][0]
+        assert "unknown command" in _events[-1]["err"]
+
+    def test_cancel(self, client):
+        """キャンセルされたコマンドは、canceledイベント"""
+        with client.websocket_connect("/ws") as _ws:
+            _ws.send_json([
+                {"cmd": "sleep", "sec": 5.0},
+                {"cmd": "sleep", "sec": 5.0},
+            ])
+            _ws.send_json({"cmd": "cancel"})
+            _events = recv_until(_ws, "done", 2)
+
+        _names = [_e["event"] for _e in _events]
+        assert "canceled" in _names
+
+    def test_telemetry(self, client):
+        """`?telemetry_ms=`で、テレメトリーイベントを送るか"""
+        with client.websocket_connect("/ws?telemetry_ms=10") as _ws:
+            _events = recv_until(_ws, "telemetry", 2)
+
+        assert _events[-1]["qsize"] == 0
+        assert _events[-1]["pulses"] == [1500, 1500]
+
+
+@pytest.fixture
+def live_server(tmp_path, monkeypatch):
+    """メモリ上のバックエンドで動かす、実際のAPIサーバー
+
+    Yields:
+        str: コマンドのURL (http://127.0.0.1:PORT/cmd)
+    """
+    monkeypatch.chdir(tmp_path)
+    for _name in ("PINS", "DEBUG", "ENGINE", "BACKEND"):
+        monkeypatch.delenv(f"PISERVO0_{_name}", raising=False)
+
+    _server = LocalServer([17, 27])
+    _server.start()
+    yield _server.url
+    _server.end()
+
+
+class TestApiWsClient:
+    """ApiWsClientクラスのテスト"""
+
+    @pytest.mark.parametrize(
+        "http_url, ws_url",
+        [
+            ("http://localhost:8000/cmd", "ws://localhost:8000/ws"),
+            ("https://robot:8443/cmd", "wss://robot:8443/ws"),
+        ],
+    )
+    def test_ws_url(self, http_url, ws_url):
+        """HTTPのURLから、WebSocketのURLを作れるか"""
+        assert ApiWsClient.ws_url(http_url) == ws_url
+
+    @pytest.mark.parametrize("binary", [False, True])
+    def test_stream(self, live_server, binary):
+        """ウィンドウ内で、すべてのコマンドを送り、完了を受け取れるか"""
+        _cmd_n = 200
+        _window = 10
+        _max_inflight = [0]
+
+        def _on_event(event):
+            _max_inflight[0] = max(_max_inflight[0], _ws.inflight)
+
+        _ws = ApiClient(live_server, binary=binary).open_ws(
+            window=_window, on_event=_on_event
+        )
+        try:
+            _t0 = time.monotonic()
+            _n = _ws.send_stream(
+                {"cmd": "move_all_angles", "angles": [_i % 90, None]}
+                for _i in range(_cmd_n)
+            )
+            assert _ws.wait_done(10)
+            _sec = time.monotonic() - _t0
+        finally:
+            _ws.close()
+
+        assert _n == _cmd_n
+        assert _ws.done_n == _cmd_n
+        assert _ws.inflight == 0
+        assert _max_inflight[0] <= _window
+        assert _cmd_n / _sec > 100  # commands/sec
+
+    def test_send_unlocked(self):
+        """送信中も、受信スレッドがイベントを処理できるか"""
+        _sending = threading.Event()
+        _release = threading.Event()
+
+        class _SlowConn:
+            """送信がブロックする接続"""
+
+            def send(self, msg):
+                _sending.set()
+                _release.wait(5)
+
+        _ws = ApiWsClient(window=2)
+        _ws.conn = _SlowConn()  # type: ignore
+        _release.set()
+        _ws.send({"cmd": "sleep", "sec": 0})
+        _ws._handle_event({"event": "queued", "ids": [1]})
+
+        _sender = threading.Thread(
+            target=_ws.send, args=({"cmd": "sleep", "sec": 0},)
+        )
+        _sending.clear()
+        _release.clear()
+        _sender.start()
+        try:
+            assert _sending.wait(5)
+            assert _ws.inflight == 2  # 送信前に、枠を予約済み
+
+            _handler = threading.Thread(
+                target=_ws._handle_event, args=({"event": "done", "id": 1},)
+            )
+            _handler.start()
+            _handler.join(1.0)
+            assert not _handler.is_alive()
+            assert _ws.inflight == 1
+        finally:
+            _release.set()
+            _sender.join()
+        assert _ws.sent_n == 2
+
+    def test_rejected(self, live_server):
+        """拒否されたメッセージのコマンドも、未完了から外れるか"""
+        _ws = ApiWsClient(ApiWsClient.ws_url(live_server))
+        _ws.connect()
+        try:
+            _ws.send([1, 2])  # type: ignore
+            assert _ws.wait_done(5)
+            assert _ws.done_n == 0
+        finally:
+            _ws.close()
+
+    def test_str_client_ws(self, live_server, tmp_path, capsys):
+        """`str-client --ws --file`で、スクリプトを送れるか"""
+        from piservo0.command.cmd_strclient import CmdStrClient
+
+        _script = tmp_path / "walk.txt"
+        _script.write_text("mv:90,-90 sl:0\nmv:0,0\n")
+
+        _app = CmdStrClient(
+            "str-client", live_server, (), str(tmp_path / "hist"), [1, 1],
+            script_file=str(_script), ws=True
+        )
+        try:
+            _app.main()
+        finally:
+            _app.end()
+
+        assert "3 commands" in capsys.readouterr().out
+
+    def test_str_client_count(
+        self, live_server, tmp_path, capsys, monkeypatch
+    ):
+        """`str-client --count`で、コンパイルしたスクリプトを繰り返すか"""
+        from piservo0.command.cmd_strclient import CmdStrClient
+
+        monkeypatch.setenv("HOME", str(tmp_path))  # コンパイルのキャッシュ
+        _script = tmp_path / "walk.txt"
+        _script.write_text("mv:90,-90 sl:0\nmv:0,0\n")
+
+        _app = CmdStrClient(
+            "str-client", live_server, (), str(tmp_path / "hist"), [1, 1],
+            script_file=str(_script), ws=True, count=3
+        )
+        try:
+            _app.main()
+        finally:
+            _app.end()
+
+        assert "9 commands" in capsys.readouterr().out
+        assert list((tmp_path / ".cache/piservo0/compiled").iterdir())
+
+    def test_str_client_count_error(
+        self, live_server, tmp_path, capsys, monkeypatch
+    ):
+        """`--count`で、不正なコマンドがあれば、何も送らないか"""
+        from piservo0.command.cmd_strclient import CmdStrClient
+
+        monkeypatch.setenv("HOME", str(tmp_path))
+        _script = tmp_path / "walk.txt"
+        _script.write_text("mv:90,-90\nxx:1\n")
+
+        _app = CmdStrClient(
+            "str-client", live_server, (), str(tmp_path / "hist"), [1, 1],
+            script_file=str(_script), ws=True, count=2
+        )
+        try:
+            _app.main()
+        finally:
+            _app.end()
+
+        _out = capsys.readouterr().out
+        assert "* invalid command" in _out
+        assert "line 2" in _out
+        assert "commands" not in _out
@@ -0,0 +1,276 @@
+#
+# (c) 2025 Yoichi Tanibayashi
+#
+"""
+tests/test_16_telemetry.py
+"""
+import asyncio
+import json
+import time
+from unittest.mock import patch
+
+import pytest
+
+from piservo0.backend.mem_pi import MemPi
+from piservo0.core.multi_servo import MultiServo
+from piservo0.helper.thread_worker import ThreadWorker
+from piservo0.web.telemetry import EventQueue, TelemetryHub
+
+
+@pytest.fixture
+def mservo(tmp_path):
+    """メモリ上のバックエンドで動かすMultiServo"""
+    return MultiServo(
+        MemPi(), [17, 27], conf_file=str(tmp_path / "servo.json")
+    )
+
+
+class TestServoState:
+    """MultiServo.stateのテスト"""
+
+    def test_init(self, mservo):
+        """初期化時の移動(0度)が、公開されているか"""
+        assert mservo.state.seq == 1
+        assert mservo.state.pulses == (1500, 1500)
+        assert mservo.state.angles == (0.0, 0.0)
+
+    def test_move(self, mservo):
+        """動かした結果が、pigpioを読まずに公開されるか"""
+        _seq = mservo.state.seq
+        with patch.object(
+            mservo._pi, "get_servo_pulsewidth",
+            wraps=mservo._pi.get_servo_pulsewidth
+        ) as _get:
+            mservo.move_all_angles([90, -90])
+            _state = mservo.state
+
+            assert _get.call_count == 0
+
+        assert _state.seq == _seq + 1
+        assert _state.pulses == (2500, 500)
+        assert _state.angles == (90.0, -90.0)
+
+    def test_sync_steps(self, mservo):
+        """ステップごとに公開されるか"""
+        _seq = mservo.state.seq
+        mservo.move_all_angles_sync([45, None], move_sec=0.0, step_n=4)
+        assert mservo.state.seq == _seq + 4
+        assert mservo.state.angles[0] == pytest.approx(45.0, abs=0.1)
+
+    def test_pulses_and_off(self, mservo):
+        """パルス指定とオフも、公開されるか"""
+        mservo.move_all_pulses([1000, None])
+        assert mservo.state.pulses == (1000, 1500)
+
+        mservo.off()
+        assert mservo.state.pulses == (0, 0)
+        assert mservo.state.angles == (None, None)
+
+
+class TestWorkerStatus:
+    """ThreadWorker.statusのテスト"""
+
+    def test_status(self, mservo):
+        """コマンドの実行中と完了後の状態が、公開されるか"""
+        _worker = ThreadWorker(mservo)
+        _worker.start()
+        try:
+            _fut = _worker.send({"cmd": "sleep", "sec": 0.2})
+            _t_end = time.monotonic() + 1
+            while _worker.status.cmd_id is None:
+                assert time.monotonic() < _t_end
+                time.sleep(0.005)
+            _running = _worker.status
+
+            _worker.send({
+                "cmd": "move_all_angles_sync", "angles": [90, -90],
+                "move_sec": 0.0, "step_n": 2,
+            }).result(1)
+            _done = _worker.status
+        finally:
+            _worker.end()
+
+        assert _running.cmd_id == _fut.cmd_id
+        assert _running.cmd == "sleep"
+
+        assert _done.cmd_id is None
+        assert _done.pulses == (2500, 500)
+        assert _done.angles == (90.0, -90.0)
+        assert (_done.sent_n, _done.cmd_n, _done.err_n) == (2, 2, 0)
+        assert _done.seq > _running.seq
+
+    def test_step(self, mservo):
+        """ステップごとに公開されるか"""
+        _worker = ThreadWorker(mservo)
+        _seqs = []
+        mservo.add_state_listener(lambda _s: _seqs.append(_worker.status.seq))
+
+        mservo.move_all_angles_sync([10, 10], move_sec=0.0, step_n=3)
+        assert len(_seqs) == 3
+        assert _seqs == sorted(set(_seqs))
+
+
+class TestTelemetryHub:
+    """TelemetryHubクラスのテスト"""
+
+    def test_broadcast(self):
+        """一回のスナップショットを、すべての購読者に配るか"""
+        _calls = []
+
+        def _snapshot():
+            _calls.append(1)
+            return {"n": len(_calls)}
+
+        async def _main():
+            _hub = TelemetryHub(_snapshot, tick_sec=0.01)
+            _q1 = _hub.subscribe()
+            _q2 = _hub.subscribe()
+            _d1 = [json.loads(await _q1.get()) for _ in range(3)]
+            _d2 = [json.loads(await _q2.get()) for _ in range(3)]
+            await _hub.end()
+            return _hub, _d1, _d2
+
+        _hub, _d1, _d2 = asyncio.run(_main())
+        assert _d1 == _d2
+        assert len(_calls) == _hub.tick_n
+
+    def test_slow_subscriber(self):
+        """遅い購読者のキューは、古いものから捨てるか"""
+
+        async def _main():
+            _hub = TelemetryHub(lambda: {}, tick_sec=0.001, queue_n=2)
+            _q = _hub.subscribe()
+            while _hub.tick_n < 10:
+                await asyncio.sleep(0.001)
+            _qsize = _q.qsize()
+            await _hub.end()
+            return _qsize
+
+        assert asyncio.run(_main()) == 2
+
+    def test_stop_without_subscriber(self):
+        """購読者がいなくなったら、ティックを止めるか"""
+
+        async def _main():
+            _hub = TelemetryHub(lambda: {}, tick_sec=0.001)
+            _agen = _hub.sse(max_n=2)
+            _events = [_e async for _e in _agen]
+            await asyncio.sleep(0.01)
+            return _hub, _events
+
+        _hub, _events = asyncio.run(_main())
+        assert _events == ["data: {}\n\n"] * 2
+        assert _hub.subscriber_n == 0
+        assert _hub._task is not None and _hub._task.done()
+
+
+class TestEventQueue:
+    """EventQueueクラスのテスト"""
+
+    def test_coalesce(self):
+        """テレメトリは最新の一つだけ、他のイベントは全部、順番に送るか"""
+
+        async def _main():
+            _q = EventQueue()
+            for _i in range(5):
+                _q.put_telemetry({"event": "telemetry", "i": _i})
+                _q.put({"event": "done", "id": _i})
+            _n = _q.qsize()
+            return _q, _n, [await _q.get() for _ in range(_n)]
+
+        _q, _n, _events = asyncio.run(_main())
+        assert _n == 6
+        assert _events == [
+            {"event": "done", "id": _i} for _i in range(5)
+        ] + [{"event": "telemetry", "i": 4}]
+        assert _q.coalesced_n == 4
+
+    def test_wait_room(self):
+        """`max_n`個たまったら、`wait_room()`で待たせるか"""
+
+        async def _main():
+            _q = EventQueue(max_n=2)
+            _q.put({"id": 1})
+            await asyncio.wait_for(_q.wait_room(), 1.0)
+
+            _q.put({"id": 2})
+            _q.put({"id": 3})  # 上限を超えても捨てない
+            _waiter = asyncio.ensure_future(_q.wait_room())
+            await asyncio.sleep(0.01)
+            _blocked = not _waiter.done()
+
+            _ids = [(await _q.get())["id"] for _ in range(2)]
+            await asyncio.wait_for(_waiter, 1.0)
+            return _blocked, _ids, await _q.get()
+
+        _blocked, _ids, _last = asyncio.run(_main())
+        assert _blocked
+        assert _ids == [1, 2]
+        assert _last == {"id": 3}
+
+    def test_get_wait(self):
+        """イベントがなければ、来るまで待つか"""
+
+        async def _main():
+            _q = EventQueue()
+            _getter = asyncio.ensure_future(_q.get())
+            await asyncio.sleep(0.01)
+            _blocked = not _getter.done()
+            _q.put_telemetry({"event": "telemetry"})
+            return _blocked, await asyncio.wait_for(_getter, 1.0)
+
+        assert asyncio.run(_main()) == (True, {"event": "telemetry"})
+
+
+class TestTelemetryApi:
+    """`/telemetry`のテスト"""
+
+    def test_sse(self, client):
+        """SSEで、スナップショットを受け取れるか"""
+        client.post("/cmd?wait=true", json={
+            "cmd": "move_all_angles", "angles": [90, -90]
+        })
+
+        _res = client.get("/telemetry?n=3")
+        assert _res.headers["content-type"].startswith("text/event-stream")
+
+        _events = [
+            json.loads(_l[len("data: "):])
+            for _l in _res.text.splitlines() if _l.startswith("data: ")
+        ]
+        assert len(_events) == 3
+        assert _events[-1]["pulses"] == [2500, 500]
+        assert _events[-1]["angles"] == [90.0, -90.0]
+        assert _events[-1]["qsize"] == 0
+        assert _events[-1]["cmd_id"] is None
+
+    def test_ws_telemetry(self, client):
+        """WebSocketのテレメトリーも、同じ内容か"""
+        with client.websocket_connect("/ws?telemetry_ms=10") as _ws:
+            _ev = _ws.receive_json()
+
+        assert _ev["event"] == "telemetry"
+        assert _ev["pulses"] == [1500, 1500]
+
+
+class TestStatusApi:
+    """`/status`のテスト"""
+
+    def test_status(self, client):
+        """pigpioを読まずに、状態を返すか"""
+        client.post("/cmd?wait=true", json={
+            "cmd": "move_all_angles", "angles": [-90, 90]
+        })
+
+        _pi = client.app.state.json_app.pi  # type: ignore
+        with patch.object(
+            _pi, "get_servo_pulsewidth", wraps=_pi.get_servo_pulsewidth
+        ) as _get:
+            _res = client.get("/status")
+            assert _get.call_count == 0
+
+        _status = _res.json()
+        assert _status["pulses"] == [500, 2500]
+        assert _status["qsize"] == 0
+        assert _status["cmd_id"] is None
+        assert _status["cmd_n"] == 1
@@ -0,0 +1,120 @@
+#
+# (c) 2025 Yoichi Tanibayashi
+#
+"""
+tests/test_17_codec.py
+"""
+from unittest.mock import patch
+
+import pytest
+
+from piservo0.web import codec
+
+CMDS = [
+    {"cmd": "move_all_angles", "angles": [90, None]},
+    {"cmd": "sleep", "sec": 0.0},
+]
+
+
+class TestCodec:
+    """codecモジュールのテスト"""
+
+    @pytest.mark.parametrize("use_orjson", [True, False])
+    def test_json(self, use_orjson):
+        """orjsonがあってもなくても、同じ内容になるか"""
+        _obj = {"ids": (1, 2), "cmd": "move", "angles": [30.5, None]}
+        _orjson = codec.orjson if use_orjson else None
+        with patch.object(codec, "orjson", _orjson):
+            _data = codec.dumps_json(_obj)
+            assert isinstance(_data, bytes)
+            assert codec.loads_json(_data) == dict(_obj, ids=[1, 2])
+
+    def test_invalid_json(self):
+        """不正なJSONは、ValueError"""
+        with pytest.raises(ValueError):
+            codec.decode_body(b"{invalid", "application/json")
+
+    @pytest.mark.parametrize(
+        "accept, expected",
+        [
+            ("application/msgpack", True),
+            ("application/json, application/x-msgpack;q=0.9", True),
+            ("application/json", False),
+            (None, False),
+        ],
+    )
+    def test_accepts_msgpack(self, accept, expected):
+        """Acceptヘッダーを判定できるか"""
+        with patch.object(codec, "msgpack", object()):
+            assert codec.accepts_msgpack(accept) is expected
+
+    def test_no_msgpack(self):
+        """msgpackがなければ、JSONで返し、リクエストは受け付けない"""
+        with patch.object(codec, "msgpack", None):
+            assert not codec.accepts_msgpack("application/msgpack")
+            with pytest.raises(codec.CodecUnavailableError):
+                codec.decode_body(b"\x90", "application/msgpack")
+
+
+class TestCmdAck:
+    """`/cmd`のレスポンスのテスト"""
+
+    def test_echo(self, client):
+        """従来どおり、IDつきのエコーバックを返すか"""
+        _res = client.post("/cmd", json=CMDS)
+        assert _res.status_code == 200
+        assert [_r["cmd"] for _r in _res.json()] == [
+            "move_all_angles", "sleep"
+        ]
+        assert all("id" in _r for _r in _res.json())
+
+    def test_ack_minimal(self, client):
+        """`?ack=minimal`は、IDと数だけを返すか"""
+        _res = client.post("/cmd?ack=minimal", json=CMDS * 50)
+        _ack = _res.json()
+        assert _ack["n"] == 100
+        assert len(_ack["ids"]) == 100
+        assert "err" not in _ack
+
+    def test_ack_minimal_wait(self, client):
+        """`?wait=true&ack=minimal`は、失敗したコマンドだけを返すか"""
+        _res = client.post(
+            "/cmd?wait=true&ack=minimal", json=[CMDS[1], {"cmd": "bad"}]
+        )
+        _ack = _res.json()
+        assert _ack["n"] == 2
+        assert [_e["id"] for _e in _ack["err"]] == [_ack["ids"][1]]
+
+    def test_ack_invalid(self, client):
+        """不正な`ack`は、400エラー"""
+        assert client.post("/cmd?ack=none", json=CMDS).status_code == 400
+
+    @pytest.mark.parametrize("body", [b"{invalid", b"[1, 2]"])
+    def test_invalid_body(self, client, body):
+        """不正なボディは、400エラー"""
+        _res = client.post(
+            "/cmd", content=body, headers={"content-type": "application/json"}
+        )
+        assert _res.status_code == 400
+
+    def test_msgpack_unsupported(self, client):
+        """msgpackがない場合、msgpackのリクエストは415エラー"""
+        with patch.object(codec, "msgpack", None):
+            _res = client.post(
+                "/cmd", content=b"\x90",
+                headers={"content-type": "application/msgpack"}
+            )
+        assert _res.status_code == 415
+
+    def test_msgpack(self, client):
+        """msgpackで送って、msgpackで受け取れるか"""
+        msgpack = pytest.importorskip("msgpack")
+        _res = client.post(
+            "/cmd?ack=minimal", content=msgpack.packb(CMDS),
+            headers={
+                "content-type": "application/msgpack",
+                "accept": "application/msgpack",
+            },
+        )
+        assert _res.headers["content-type"] == "application/msgpack"
+        assert msgpack.unpackb(_res.content)["n"] == 2
@@ -0,0 +1,89 @@
+#
+# (c) 2025 Yoichi Tanibayashi
+#
+"""
+tests/test_18_production.py
+"""
+import asyncio
+import os
+from unittest.mock import patch
+
+import pytest
+
+from piservo0 import ProcessWorker
+from piservo0.web.json_api import JsonApi
+from piservo0.web.production import ProductionServer
+
+
+class TestProductionServer:
+    """ProductionServerクラスのテスト (サーバーもプロセスも起動しない)"""
+
+    def test_select_fallback(self):
+        """uvloop, httptoolsがなければ、asyncio, h11を使うか"""
+        with patch("importlib.util.find_spec", return_value=None):
+            assert ProductionServer.select_loop() == "asyncio"
+            assert ProductionServer.select_http() == "h11"
+
+    def test_select(self):
+        """uvloop, httptoolsがあれば、使うか"""
+        with patch("importlib.util.find_spec", return_value=object()):
+            assert ProductionServer.select_loop() == "uvloop"
+            assert ProductionServer.select_http() == "httptools"
+
+    def test_invalid_workers(self):
+        """workersが1未満は、ValueError"""
+        with pytest.raises(ValueError):
+            ProductionServer([17, 27], workers=0)
+
+    def test_main(self):
+        """ハードウェアプロセスを一つ起動し、リロードせずにワーカーを起動するか"""
+        _server = ProductionServer([17, 27], port=8080, workers=3)
+        _env = {}
+
+        def _run(app, **kwargs):
+            _env.update(os.environ)
+            _env["ring_name"] = _server.worker.ring_name  # type: ignore
+
+        with patch.dict(os.environ), \
+                patch.object(ProcessWorker, "start") as _start, \
+                patch("uvicorn.run", side_effect=_run) as _uv_run:
+            _server.main()
+
+        assert _start.call_count == 1
+        assert _server.worker is None  # 終了済み
+
+        _args, _kwargs = _uv_run.call_args
+        assert _args == (ProductionServer.APP,)
+        assert _kwargs["workers"] == 3
+        assert _kwargs["port"] == 8080
+        assert _kwargs["reload"] is False
+
+        assert _env["PISERVO0_ENGINE"] == "process"
+        assert _env["PISERVO0_RING"] == _env["ring_name"]
+        assert _env["PISERVO0_PINS"] == "17,27"
+        assert _env["PISERVO0_TARGET_POSE"] == ""
+
+
+class TestAttachedApi:
+    """`PISERVO0_RING`で接続するHTTPワーカーのテスト"""
+
+    def test_send(self):
+        """JsonApiが、既存のリングバッファにコマンドを送るか"""
+        _owner = ProcessWorker([17, 27], slot_n=8, slot_size=128)
+        try:
+            _api = JsonApi(
+                [17, 27], engine=JsonApi.ENGINE_PROCESS,
+                ring_name=_owner.ring_name
+            )
+            _fut = _api.send_cmdjson({"cmd": "sleep", "sec": 0.0})
+            assert _fut.result()["cmd"] == "sleep"
+            asyncio.run(_api.end())
+
+            assert _owner.ring.qsize() == 1
+        finally:
+            _owner.ring.close()
+
+    def test_ring_requires_process(self):
+        """`ring_name`は、`engine="process"`のみ"""
+        with pytest.raises(ValueError):
+            JsonApi([17, 27], engine=JsonApi.ENGINE_THREAD, ring_name="x")
@@ -0,0 +1,318 @@
+#
+# (c) 2025 Yoichi Tanibayashi
+#
+"""
+tests/test_19_udp.py
+"""
+import asyncio
+import socket
+import time
+
+import pytest
+
+from piservo0 import UdpClient, UdpCmd
+from piservo0.backend.mem_pi import MemPi
+from piservo0.core.multi_servo import MultiServo
+from piservo0.helper.shm_target_pose import ShmTargetPose
+from piservo0.helper.thread_worker import ThreadWorker
+from piservo0.web.udp_server import UdpServer
+
+ADDR = ("127.0.0.1", 50000)
+
+
+@pytest.fixture
+def worker(tmp_path):
+    """メモリ上のバックエンドで動かすThreadWorker"""
+    _mservo = MultiServo(
+        MemPi(), [17, 27], conf_file=str(tmp_path / "servo.json")
+    )
+    _worker = ThreadWorker(_mservo)
+    _worker.start()
+    yield _worker
+    _worker.end()
+
+
+def free_port() -> int:
+    """空いているUDPのポート番号"""
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as _s:
+        _s.bind(("127.0.0.1", 0))
+        return _s.getsockname()[1]
+
+
+class TestUdpCmd:
+    """UdpCmdクラスのテスト"""
+
+    def test_pose(self):
+        """ポーズを変換して、元に戻せるか"""
+        _data = UdpCmd.encode_pose(7, 3, [30.0, None], timestamp=1.5)
+        assert len(_data) == UdpCmd.HDR.size + 8
+
+        _pkt = UdpCmd.decode(_data)
+        assert _pkt.kind == UdpCmd.KIND_POSE
+        assert (_pkt.session, _pkt.seq, _pkt.timestamp) == (7, 3, 1.5)
+        assert _pkt.angles == [30.0, None]
+        assert _pkt.cmds is None
+
+    def test_cmds(self):
+        """コマンドを変換して、元に戻せるか"""
+        _cmds = [
+            {"cmd": "move_all_angles", "angles": [90.0, -90.0]},
+            {"cmd": "sleep", "sec": 0.5},
+        ]
+        _pkt = UdpCmd.decode(UdpCmd.encode_cmds(1, 1, _cmds))
+        assert _pkt.kind == UdpCmd.KIND_CMD
+        assert _pkt.cmds == _cmds
+
+    @pytest.mark.parametrize(
+        "data",
+        [
+            b"\x01\x01",  # truncated header
+            UdpCmd.HDR.pack(9, 1, 0, 0, 1, 0.0),  # version
+            UdpCmd.HDR.pack(1, 9, 0, 0, 1, 0.0),  # kind
+            UdpCmd.HDR.pack(1, 1, 2, 0, 1, 0.0) + b"\x00" * 4,  # length
+        ],
+    )
+    def test_invalid(self, data):
+        """不正なデータグラムは、ValueError"""
+        with pytest.raises(ValueError):
+            UdpCmd.decode(data)
+
+    def test_too_large(self):
+        """大きすぎるデータグラムは、ValueError"""
+        with pytest.raises(ValueError):
+            UdpCmd.encode_pose(1, 1, [0.0] * 400)
+
+
+class TestUdpServer:
+    """UdpServerクラスのテスト (ソケットを使わない)"""
+
+    def test_order(self, worker):
+        """古いもの、重複したものを捨てるか"""
+        _server = UdpServer(worker)
+        for _seq in (1, 3, 2, 3, 4):
+            _server.datagram_received(
+                UdpCmd.encode_cmds(1, _seq, [{"cmd": "sleep", "sec": 0}]),
+                ADDR
+            )
+
+        _metrics = _server.get_metrics()
+        assert _metrics["cmd_n"] == 3
+        assert _metrics["drop_old_n"] == 2
+
+    def test_session(self, worker):
+        """セッションが変わったら、seqをリセットするか"""
+        _server = UdpServer(worker)
+        _server.datagram_received(UdpCmd.encode_pose(1, 10, [0, 0]), ADDR)
+        _server.datagram_received(UdpCmd.encode_pose(2, 1, [0, 0]), ADDR)
+        assert _server.get_metrics()["drop_old_n"] == 0
+
+    def test_stale(self, worker):
+        """`max_age`以上遅れたものを捨てるか (送信側の時計に依存しない)"""
+        _server = UdpServer(worker, max_age=0.1)
+        _t0 = time.monotonic() - 1000.0  # 別のホストの時計
+
+        for _seq, _ts in ((1, _t0), (2, _t0 - 0.5), (3, _t0 + 0.01)):
+            _server.datagram_received(
+                UdpCmd.encode_pose(1, _seq, [0, 0], timestamp=_ts), ADDR
+            )
+
+        _metrics = _server.get_metrics()
+        assert _metrics["pose_n"] == 2
+        assert _metrics["drop_stale_n"] == 1
+
+    def test_bad(self, worker):
+        """不正なデータグラムを数えるか"""
+        _server = UdpServer(worker)
+        _server.datagram_received(b"\x00", ADDR)
+        assert _server.get_metrics()["bad_n"] == 1
+
+    def test_bad_pose(self, worker):
+        """角度の数が違うポーズを、捨てて数えるか"""
+        _pose = ShmTargetPose(2, create=True)
+        try:
+            _server = UdpServer(worker, target_pose=_pose)
+            _server.datagram_received(
+                UdpCmd.encode_pose(1, 1, [45.0, 0.0, 0.0]), ADDR
+            )
+            assert _pose.read() is None  # 書き込まない
+            assert _server.get_metrics()["bad_n"] == 1
+        finally:
+            _pose.close()
+
+        _server = UdpServer(worker, servo_n=2)
+        _server.datagram_received(UdpCmd.encode_pose(1, 1, [45.0]), ADDR)
+
+        _metrics = _server.get_metrics()
+        assert _metrics["bad_n"] == 1
+        assert _metrics["pose_n"] == 0
+
+    def test_senders(self, worker):
+        """送信元の状態は、最近のものだけを覚えておくか"""
+        _server = UdpServer(worker)
+        for _port in range(UdpServer.SENDER_N_MAX + 10):
+            _server.datagram_received(
+                UdpCmd.encode_pose(1, 1, [0, 0]), ("127.0.0.1", _port)
+            )
+        assert len(_server._senders) == UdpServer.SENDER_N_MAX
+        assert ("127.0.0.1", 0) not in _server._senders
+
+    def test_target_pose(self, worker):
+        """`target_pose`があれば、ポーズを書き込むだけか"""
+        _pose = ShmTargetPose(2, create=True)
+        try:
+            _server = UdpServer(worker, target_pose=_pose)
+            _server.datagram_received(
+                UdpCmd.encode_pose(1, 1, [45.0, None]), ADDR
+            )
+            _angles = _pose.read().angles  # type: ignore
+        finally:
+            _pose.close()
+
+        assert _angles[0] == 45.0
+        assert worker.get_metrics()["cmd_n"] == 0
+
+    def test_coalesce(self, worker):
+        """前のポーズの実行中は、最新のポーズだけを残すか"""
+        _server = UdpServer(worker)
+        worker.send({"cmd": "sleep", "sec": 0.2})
+        for _seq in range(1, 6):
+            _server.datagram_received(
+                UdpCmd.encode_pose(1, _seq, [_seq * 10, -_seq * 10]), ADDR
+            )
+
+        _t_end = time.monotonic() + 2
+        while _server.latency.count < 2:
+            assert time.monotonic() < _t_end
+            time.sleep(0.01)
+
+        assert _server.get_metrics()["coalesced_n"] == 3
+        assert worker.mservo.state.angles == pytest.approx(
+            (50.0, -50.0), abs=0.1
+        )
+
+
+async def coalesce_on_loop(worker, n=30):
+    """イベントループの上で、ポーズを次々に受け取る
+
+    Returns:
+        UdpServer: 最後のポーズまで実行した後
+    """
+    _server = UdpServer(worker, max_age=0)
+    await _server.start("127.0.0.1", 0)
+    try:
+        for _seq in range(1, n + 1):
+            _server.datagram_received(
+                UdpCmd.encode_pose(1, _seq, [_seq, -_seq]), ADDR
+            )
+            await asyncio.sleep(0.001)
+
+        _t_end = time.monotonic() + 5
+        while _server._pose_busy:
+            assert time.monotonic() < _t_end
+            await asyncio.sleep(0.01)
+    finally:
+        _server.end()
+    return _server
+
+
+class TestCoalesceOnLoop:
+    """イベントループの上での、ポーズのまとめ"""
+
+    def test_last_pose(self, worker):
+        """古いポーズが、新しいポーズを追い越さないか"""
+        worker.send({"cmd": "sleep", "sec": 0.02})
+        _server = asyncio.run(coalesce_on_loop(worker))
+
+        assert worker.mservo.state.angles == pytest.approx(
+            (30.0, -30.0), abs=0.1
+        )
+        _metrics = _server.get_metrics()
+        assert _metrics["latency"]["count"] + _metrics["coalesced_n"] == 30
+
+
+async def measure_latency(worker, target_pose=None, n=200, interval=0.002):
+    """ループバックで、送信から反映までの遅延を計測する
+
+    Returns:
+        dict: `UdpServer.get_metrics()`
+    """
+    _server = UdpServer(worker, target_pose=target_pose, max_age=0)
+    _host, _port = await _server.start("127.0.0.1", 0)
+
+    def _send():
+        _client = UdpClient(_host, _port)
+        try:
+            for _i in range(n):
+                _client.send_pose([_i % 90, -(_i % 90)])
+                time.sleep(interval)
+        finally:
+            _client.close()
+
+    try:
+        await asyncio.get_running_loop().run_in_executor(None, _send)
+        _t_end = time.monotonic() + 5
+        while _server.pose_n < n and time.monotonic() < _t_end:
+            await asyncio.sleep(0.01)
+        await asyncio.sleep(0.05)  # 最後のポーズの完了
+    finally:
+        _server.end()
+
+    return _server.get_metrics()
+
+
+class TestLatency:
+    """ループバックでの遅延の計測"""
+
+    @pytest.mark.parametrize("use_target_pose", [False, True])
+    def test_latency(self, worker, use_target_pose):
+        """すべてのポーズが届き、遅延が十分に小さいか"""
+        _pose = ShmTargetPose(2, create=True) if use_target_pose else None
+        try:
+            _metrics = asyncio.run(measure_latency(worker, _pose))
+        finally:
+            if _pose:
+                _pose.close()
+
+        _lat = _metrics["latency"]
+        print(
+            f"target_pose={use_target_pose}: latency(usec) "
+            f"p50={_lat['p50']}, p90={_lat['p90']}, p99={_lat['p99']}, "
+            f"max={_lat['max']} (n={_lat['count']})"
+        )
+
+        assert _metrics["pose_n"] == 200
+        assert _metrics["drop_old_n"] == 0
+        assert _lat["count"] + _metrics["coalesced_n"] >= 199
+        assert _lat["p50"] < 20_000
+        assert _lat["p99"] < 100_000
+
+
+class TestUdpApi:
+    """api-serverのUDPのテスト"""
+
+    @pytest.fixture
+    def udp_port(self, monkeypatch):
+        """`PISERVO0_UDP_PORT`"""
+        _port = free_port()
+        monkeypatch.setenv("PISERVO0_UDP_PORT", str(_port))
+        return _port
+
+    def test_udp(self, udp_port, client):
+        """UDPのポーズとコマンドが、ワーカーに届くか"""
+        _client = UdpClient("127.0.0.1", udp_port)
+        try:
+            _client.send_pose([90, -90])
+            _client.send_cmds({"cmd": "sleep", "sec": 0.0})
+            _t_end = time.monotonic() + 5
+            while client.get("/metrics").json()["udp"]["cmd_n"] < 1:
+                assert time.monotonic() < _t_end
+                time.sleep(0.01)
+        finally:
+            _client.close()
+
+        _res = client.get("/metrics?reset=true").json()
+        assert _res["udp"]["pose_n"] == 1
+        assert client.get("/metrics").json()["udp"]["recv_n"] == 0
+
+        _status = client.get("/status").json()
+        assert _status["pulses"] == [2500, 500]
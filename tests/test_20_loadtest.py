@@ -0,0 +1,70 @@
+#
+# (c) 2025 Yoichi Tanibayashi
+#
+"""
+tests/test_20_loadtest.py
+"""
+import json
+import random
+
+import pytest
+from click.testing import CliRunner
+
+from piservo0.__main__ import cli
+from piservo0.command.cmd_loadtest import CmdLoadTest
+
+
+@pytest.fixture
+def env(tmp_path, monkeypatch):
+    """ローカルサーバーが設定する環境変数を、テスト後に戻す"""
+    monkeypatch.chdir(tmp_path)
+    for _name in ("PINS", "DEBUG", "ENGINE", "BACKEND"):
+        monkeypatch.delenv(f"PISERVO0_{_name}", raising=False)
+
+
+class TestCmdLoadTest:
+    """CmdLoadTestクラスのテスト"""
+
+    @pytest.mark.parametrize("kind", ["mv", "sl", "batch", "cancel"])
+    def test_make_cmdline(self, kind):
+        """どの種類のコマンドも、正しい文字列コマンドか"""
+        _app = CmdLoadTest([17, 27, 22])
+        _cmds = _app.parser.cmd_data_list(
+            _app.make_cmdline(kind, random.Random(0))
+        )
+        assert _cmds
+        assert not any(_c.get("err") for _c in _cmds)
+        for _c in _cmds:
+            if "angles" in _c:
+                assert len(_c["angles"]) == 3
+
+    @pytest.mark.parametrize("wait", [False, True])
+    def test_run(self, env, wait):
+        """ローカルサーバーに負荷をかけ、結果をまとめるか"""
+        _app = CmdLoadTest(
+            client_n=2, duration=0.5, wait=wait, sample_sec=0.05, seed=1
+        )
+        try:
+            _res = _app.run()
+        finally:
+            _app.end()
+
+        assert _res["req_n"] > 0
+        assert _res["err_n"] == 0
+        assert _res["latency"]["count"] == _res["req_n"]
+        assert _res["latency"]["p50"] <= _res["latency"]["p99"]
+        assert sum(_res["kind_n"].values()) == _res["req_n"]
+        assert _res["samples"]
+        assert _res["samples"][-1]["req_n"] <= _res["req_n"]
+        assert "p95=" in CmdLoadTest.report(_res)
+
+    def test_cli_json(self, env):
+        """`piservo0 loadtest --json`"""
+        _res = CliRunner().invoke(
+            cli, ["loadtest", "-c", "1", "-D", "0.3", "--json"]
+        )
+        assert _res.exit_code == 0, _res.output
+        _out = _res.output
+        _result = json.loads(_out[_out.index("{"):])
+        assert _result["client_n"] == 1
+        assert set(_result["latency"]) >= {"p50", "p95", "p99"}
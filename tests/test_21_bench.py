@@ -0,0 +1,137 @@
+#
+# (c) 2025 Yoichi Tanibayashi
+#
+"""
+tests/test_21_bench.py
+"""
+import json
+
+import pytest
+from click.testing import CliRunner
+
+from piservo0 import BinCmd
+from piservo0.__main__ import cli
+from piservo0.benchmarks import BENCHMARKS, bench_core, bench_wire_format
+from piservo0.benchmarks.runner import Benchmark, BenchRunner
+
+STATE = {"n": 0, "end": False}
+
+
+def bench_count(servo_n, workdir):
+    """呼び出し回数を数えるだけのベンチマーク"""
+    STATE.update(n=0, end=False)
+    yield lambda: STATE.update(n=STATE["n"] + 1)
+    STATE["end"] = True
+
+
+def result(name, usec, servo_n=1):
+    """結果の一件"""
+    return {"name": name, "servo_n": servo_n, "number": 1, "usec": usec}
+
+
+class TestBenchRunner:
+    """BenchRunnerクラスのテスト"""
+
+    def test_measure(self):
+        """`min_sec`以上になるまで呼び出し回数を増やし、後始末するか"""
+        _runner = BenchRunner(
+            [Benchmark("count", bench_count)], servo_ns=[1], repeat=2,
+            min_sec=0.001
+        )
+        _res = _runner.run()["results"]
+
+        assert len(_res) == 1
+        assert _res[0]["usec"] > 0
+        assert STATE["end"]
+        assert STATE["n"] >= _res[0]["number"] * 2
+
+    def test_scaled(self):
+        """`scaled=False`のものは、`servo_n=1`だけか"""
+        _runner = BenchRunner(
+            [
+                Benchmark("a", bench_count),
+                Benchmark("b", bench_count, False),
+            ],
+            servo_ns=[1, 4], repeat=1, min_sec=0.001
+        )
+        _res = _runner.run()["results"]
+        assert [(_r["name"], _r["servo_n"]) for _r in _res] == [
+            ("a", 1), ("a", 4), ("b", 1)
+        ]
+
+    def test_core(self):
+        """すべてのベンチマークが動くか"""
+        _runner = BenchRunner(
+            BENCHMARKS, servo_ns=[1, 4], repeat=1, min_sec=0.001
+        )
+        _res = _runner.run()
+        assert len(_res["results"]) == sum(
+            2 if _b.scaled else 1 for _b in BENCHMARKS
+        )
+
+    def test_registered(self):
+        """`piservo0 bench`で、すべてのモジュールのベンチマークを実行するか"""
+        assert BENCHMARKS == (
+            bench_core.BENCHMARKS + bench_wire_format.BENCHMARKS
+        )
+        assert len({_b.name for _b in BENCHMARKS}) == len(BENCHMARKS)
+
+    def test_wire_format(self):
+        """JSONとバイナリで、同じコマンドになるか"""
+        _cmds = bench_wire_format.make_cmds(8, 4)
+        _json = bench_wire_format.decode_json(
+            bench_wire_format.encode_json(_cmds)
+        )
+        _bin = BinCmd.decode_all(BinCmd.encode_list(_cmds))
+        assert _json == _cmds
+        assert len(_bin) == len(_cmds)
+        assert [_c["cmd"] for _c in _bin] == [_c["cmd"] for _c in _cmds]
+
+    @pytest.mark.parametrize(
+        "usec, status",
+        [(1.0, "ok"), (1.1, "ok"), (1.5, "regression"), (0.5, "improved")],
+    )
+    def test_compare(self, usec, status):
+        """ベースラインとの比較"""
+        _cmp = BenchRunner.compare(
+            {"results": [result("a", usec), result("b", 1.0)]},
+            {"results": [result("a", 1.0)]},
+            threshold=0.2,
+        )
+        assert _cmp[0]["status"] == status
+        assert _cmp[0]["ratio"] == pytest.approx(usec)
+        assert _cmp[1]["status"] == "new"
+
+
+class TestCli:
+    """`piservo0 bench`のテスト"""
+
+    def test_bench(self, tmp_path):
+        """結果を保存し、ベースラインと比べられるか"""
+        _out = str(tmp_path / "bench.json")
+        _args = ["bench", "-n", "1,2", "-k", "str_cmd", "-r", "1",
+                 "--min_sec", "0.001"]
+
+        _res = CliRunner().invoke(cli, _args + ["-o", _out])
+        assert _res.exit_code == 0, _res.output
+        assert "str_cmd.cmd_data_cached" in _res.output
+
+        with open(_out, encoding="utf-8") as _f:
+            _base = json.load(_f)
+        assert {_r["servo_n"] for _r in _base["results"]} == {1, 2}
+
+        # ベースラインを極端に速くして、regressionにする
+        for _r in _base["results"]:
+            _r["usec"] /= 1000
+        with open(_out, "w", encoding="utf-8") as _f:
+            json.dump(_base, _f)
+
+        _res = CliRunner().invoke(cli, _args + ["-B", _out, "-j"])
+        assert _res.exit_code == 1
+        _cmp = json.loads(_res.output)["compare"]
+        assert all(_c["status"] == "regression" for _c in _cmp)
+
+    def test_invalid_servo_n(self):
+        """`--servo_n`が不正"""
+        _res = CliRunner().invoke(cli, ["bench", "-n", "a,b"])
+        assert _res.exit_code == 2
@@ -0,0 +1,117 @@
+#
+# (c) 2025 Yoichi Tanibayashi
+#
+"""
+tests/test_22_clock.py
+"""
+import threading
+import time
+
+import pytest
+
+from piservo0 import Clock, MemPi, MultiServo, SimClock, ThreadWorker
+
+
+@pytest.fixture
+def sim_mservo(tmp_path):
+    """SimClockで動かすMultiServo"""
+    return MultiServo(
+        MemPi(), [17, 27], conf_file=str(tmp_path / "servo.json"),
+        clock=SimClock()
+    )
+
+
+class TestClock:
+    """Clock, SimClockクラスのテスト"""
+
+    def test_clock_event(self):
+        """セットされたイベントで、すぐに中断されるか"""
+        _ev = threading.Event()
+        _ev.set()
+        _t0 = time.monotonic()
+        assert Clock().sleep(1.0, _ev)
+        assert Clock().sleep_until(Clock().now() - 1.0, _ev)
+        assert time.monotonic() - _t0 < 0.5
+
+    def test_clock_sleep(self):
+        """実時間で待つか"""
+        _clock = Clock()
+        _t0 = _clock.now()
+        assert not _clock.sleep_until(_t0 + 0.02)
+        assert _clock.now() - _t0 >= 0.02
+
+    def test_sim_clock(self):
+        """待たずに時刻が進むか"""
+        _clock = SimClock(10.0)
+        assert not _clock.sleep(600.0)
+        assert _clock.now() == 610.0
+
+        _clock.sleep_until(600.0)  # 過去: 戻らない
+        assert _clock.now() == 610.0
+
+        _clock.advance(0.5)
+        assert _clock.now() == 610.5
+
+        _ev = threading.Event()
+        _ev.set()
+        assert _clock.sleep(1.0, _ev)
+        assert _clock.now() == 610.5
+
+
+class TestSimMotion:
+    """SimClockでのモーションのテスト"""
+
+    def test_timeline(self, sim_mservo):
+        """長い動作も、実時間と同じタイムラインで、すぐに終わるか"""
+        _states = []
+        sim_mservo.add_state_listener(_states.append)
+
+        _t0 = time.monotonic()
+        sim_mservo.move_all_angles_sync([90, -90], move_sec=600.0, step_n=6)
+        assert time.monotonic() - _t0 < 1.0
+
+        assert sim_mservo.clock.now() == pytest.approx(600.0)
+        assert [_s.t for _s in _states] == pytest.approx(
+            [0, 100, 200, 300, 400, 500]
+        )
+        assert _states[-1].pulses == (2500, 500)
+        assert sim_mservo.hist_step_jitter.max == 0
+
+    def test_no_drift(self, tmp_path):
+        """書き込みに時間がかかっても、遅れが積み重ならないか"""
+        _clock = SimClock()
+
+        class _SlowPi(MemPi):
+            def set_servo_pulsewidth(self, pin, pulse):
+                _clock.advance(0.002)  # 書き込みに 2 msec
+                return super().set_servo_pulsewidth(pin, pulse)
+
+        _mservo = MultiServo(
+            _SlowPi(), [17, 27], conf_file=str(tmp_path / "servo.json"),
+            clock=_clock
+        )
+        _t0 = _clock.now()
+        _mservo.move_all_angles_sync([90, -90], move_sec=1.0, step_n=50)
+
+        assert _clock.now() - _t0 == pytest.approx(1.0)
+        assert _mservo.hist_step_jitter.max == 0
+
+    def test_worker(self, sim_mservo):
+        """ワーカーの`sleep`とインターバルも、待たずに時刻を進めるか"""
+        _worker = ThreadWorker(sim_mservo, interval_sec=1.0)
+        assert _worker.clock is sim_mservo.clock
+
+        _worker.start()
+        try:
+            _worker.send({"cmd": "sleep", "sec": 300.0})
+            _fut = _worker.send(
+                {"cmd": "move", "angles": [30, -30], "move_sec": 10.0}
+            )
+            _res = _fut.result(timeout=5.0)
+        finally:
+            _worker.end()
+
+        assert _fut.t_start == pytest.approx(300.0)
+        assert _res["exec_sec"] == pytest.approx(11.0)
+        assert sim_mservo.clock.now() == pytest.approx(311.0)
+        assert _worker.get_metrics()["overrun"]["max"] == 0
@@ -0,0 +1,169 @@
+#
+# (c) 2025 Yoichi Tanibayashi
+#
+"""
+tests/test_23_sim_pi.py
+"""
+import json
+
+import pytest
+from click.testing import CliRunner
+
+from piservo0 import SimClock
+from piservo0.__main__ import cli
+from piservo0.backend.factory import BACKEND_SIM, open_pi
+from piservo0.backend.sim_pi import ServoModel, SimPi
+from piservo0.helper.dynamics_report import DynamicsReport
+
+PIN = 17
+
+# 1 sec で 1000 usec, 遅れ 0.1 sec, 不感帯 10 usec
+MODEL = ServoModel(
+    sec_per_60deg=60 * ServoModel.USEC_PER_DEG / 1000,
+    deadband_usec=10.0,
+    lag_sec=0.1,
+)
+
+
+@pytest.fixture
+def clock():
+    """SimClock"""
+    return SimClock()
+
+
+@pytest.fixture
+def pi(clock):
+    """SimPi"""
+    return SimPi(clock, MODEL)
+
+
+class TestSimPi:
+    """SimPiクラスのテスト"""
+
+    def test_model(self):
+        """SG90: 0.1 sec/60 deg"""
+        assert ServoModel().max_speed == pytest.approx(6666.7, abs=0.1)
+        assert MODEL.max_speed == pytest.approx(1000.0)
+
+    def test_slew(self, clock, pi):
+        """遅れてから、速度の上限で動くか"""
+        pi.set_servo_pulsewidth(PIN, 1000)
+        assert pi.actual_pulse(PIN) is None  # 遅れ
+
+        clock.sleep(0.1)
+        assert pi.actual_pulse(PIN) == 1000.0  # 最初の位置
+
+        pi.set_servo_pulsewidth(PIN, 2000)
+        assert pi.get_servo_pulsewidth(PIN) == 2000
+        assert pi.settle_sec(PIN) == pytest.approx(1.1)
+
+        clock.sleep(0.6)  # 遅れ 0.1 sec + 0.5 sec
+        assert pi.actual_pulse(PIN) == pytest.approx(1500.0)
+        assert pi.settle_sec(PIN) == pytest.approx(0.5)
+
+        clock.sleep(1.0)
+        assert pi.actual_pulse(PIN) == 2000.0
+        assert pi.settle_sec(PIN) == 0.0
+
+        assert [(_r.cmd_pulse, _r.act_pulse) for _r in pi.records] == [
+            (1000, None), (2000, 1000.0)
+        ]
+
+    def test_deadband(self, clock, pi):
+        """止まっているとき、不感帯以下の変化には反応しないか"""
+        pi.set_servo_pulsewidth(PIN, 1500)
+        clock.sleep(0.2)
+
+        pi.set_servo_pulsewidth(PIN, 1508)
+        clock.sleep(0.2)
+        assert pi.actual_pulse(PIN) == 1500.0
+
+        pi.set_servo_pulsewidth(PIN, 1520)
+        clock.sleep(0.2)
+        assert pi.actual_pulse(PIN) == 1520.0
+
+    def test_off(self, clock, pi):
+        """オフにすると、その位置で止まるか"""
+        pi.set_servo_pulsewidth(PIN, 1000)
+        clock.sleep(0.2)
+        pi.set_servo_pulsewidth(PIN, 2000)
+        clock.sleep(0.3)  # 0.2 sec 動く
+        pi.set_servo_pulsewidth(PIN, 0)
+        clock.sleep(1.0)
+        assert pi.actual_pulse(PIN) == pytest.approx(1300.0)
+
+    def test_models(self, clock):
+        """ピンごとのモデル"""
+        _pi = SimPi(clock, models={PIN: MODEL})
+        assert _pi.get_model(PIN) is MODEL
+        assert _pi.get_model(27) == ServoModel()
+
+    def test_factory(self):
+        """`open_pi("sim")`"""
+        assert isinstance(open_pi(BACKEND_SIM), SimPi)
+
+
+class TestDynamicsReport:
+    """DynamicsReportクラスのテスト"""
+
+    def test_flags(self):
+        """速すぎる移動と、多すぎるステップを指摘するか"""
+        _app = DynamicsReport([17, 27])
+        _res = _app.run(
+            "ms:0.05 st:10 mv:90,-90 "  # 180 deg: 0.3 sec 必要
+            "ms:1 st:400 mv:0,0 "  # 不感帯より小さいステップ
+            "sl:600 "
+            "ms:0.5 st:20 mv:-90,90"
+        )
+        _moves = _res["moves"]
+        assert [_m["index"] for _m in _moves] == [2, 5, 9]
+
+        assert _moves[0]["too_fast"]
+        assert _moves[0]["min_sec"] == pytest.approx(0.15)
+        assert _moves[0]["error_usec"] > 500
+        assert _moves[0]["settle_sec"] > 0.1
+        assert not _moves[0]["extra_steps"]
+
+        assert not _moves[1]["too_fast"]
+        assert _moves[1]["extra_steps"]
+        assert _moves[1]["useful_step_n"] == 100
+
+        assert not _moves[2]["too_fast"]
+        assert not _moves[2]["extra_steps"]
+
+        _sum = _res["summary"]
+        assert _sum["sec"] == pytest.approx(601.55)
+        assert _sum["too_fast_n"] == 1
+        assert _sum["extra_step_n"] == 300
+        assert "too_fast" in DynamicsReport.report(_res)
+
+    def test_cli(self):
+        """`piservo0 sim`"""
+        _res = CliRunner().invoke(
+            cli, ["sim", "17", "-c", "ms:0.01 mv:90", "--json"]
+        )
+        assert _res.exit_code == 0, _res.output
+        assert json.loads(_res.output)["summary"]["too_fast_n"] == 1
+
+        _res = CliRunner().invoke(cli, ["sim", "17"])
+        assert _res.exit_code == 2
+
+    def test_errors(self):
+        """不正なコマンドで止まらず、エラーとして報告するか"""
+        _res = DynamicsReport([17, 27]).run([
+            {"cmd": "move", "angles": [90, -90]},
+            {"cmd": "unknown"},
+            {"cmd": "move", "angles": [0, 0]},
+        ])
+        assert _res["summary"]["move_n"] == 2
+        assert _res["summary"]["error_n"] == 1
+        assert _res["errors"][0]["index"] == 1
+        assert "error" in DynamicsReport.report(_res)
+
+    def test_cli_parse_error(self):
+        """`piservo0 sim`で、解釈できない文字列コマンド"""
+        _res = CliRunner().invoke(
+            cli, ["sim", "17", "27", "--cmd", "mv:90,-90 xx:1"]
+        )
+        assert _res.exit_code == 1  # トレースバックではない
+        assert "error: xx:1" in _res.output
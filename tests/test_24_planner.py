@@ -0,0 +1,154 @@
+#
+# (c) 2025 Yoichi Tanibayashi
+#
+"""
+tests/test_24_planner.py
+"""
+import math
+
+import pytest
+
+from piservo0 import (
+    BinCmd,
+    MemPi,
+    MultiServo,
+    SimClock,
+    StrCmdToJson,
+    ThreadWorker,
+)
+from piservo0.helper.dynamics_report import DynamicsReport
+from piservo0.utils.servo_config_manager import ServoConfigManager
+
+PINS = [17, 27]
+
+
+@pytest.fixture
+def conf_file(tmp_path):
+    """pin 27だけ、速度の上限を設定した設定ファイル"""
+    _conf_file = str(tmp_path / "servo.json")
+    ServoConfigManager(_conf_file).save_all_configs([
+        {"pin": 17, "min": 500, "center": 1500, "max": 2500},
+        {"pin": 27, "min": 500, "center": 1500, "max": 2500,
+         "max_speed": 100.0, "max_accel": 200.0},
+    ])
+    return _conf_file
+
+
+@pytest.fixture
+def mservo(conf_file):
+    """SimClockで動かすMultiServo"""
+    return MultiServo(MemPi(), PINS, conf_file=conf_file, clock=SimClock())
+
+
+class TestProfile:
+    """MultiServo.profile()のテスト"""
+
+    @pytest.mark.parametrize("frac", [0.0, 0.1, 0.25, 0.5])
+    def test_profile(self, frac):
+        """0から1まで、単調に増え、連続しているか"""
+        _xs = [_i / 100 for _i in range(101)]
+        _ys = [MultiServo.profile(_x, frac) for _x in _xs]
+
+        assert _ys[0] == pytest.approx(0.0)
+        assert _ys[-1] == pytest.approx(1.0)
+        assert _ys[50] == pytest.approx(0.5)
+        assert all(_b >= _a for _a, _b in zip(_ys, _ys[1:]))
+        assert max(_b - _a for _a, _b in zip(_ys, _ys[1:])) < 0.03
+
+
+class TestPlanMove:
+    """MultiServo.plan_move()のテスト"""
+
+    def test_config(self, mservo):
+        """速度の上限を設定ファイルから読むか"""
+        assert mservo.servo[0].max_speed is None
+        assert mservo.servo[1].max_speed == 100.0
+        assert mservo.servo[1].max_accel == 200.0
+
+    def test_trapezoid(self, mservo):
+        """遅いサーボが律速し、台形になるか"""
+        # pin 27: 90 deg, V = 0.9, A = 0.45 --> T = 0.9 + 0.5
+        _plan = mservo.plan_move([90, 90], [0, 0])
+        assert _plan.move_sec == pytest.approx(1.4)
+        assert _plan.accel_frac == pytest.approx(0.45 / (0.81 + 0.45))
+
+    def test_triangle(self, mservo):
+        """短い移動は、三角形になるか"""
+        # pin 27: 10 deg, V = 0.1, A = 0.05 --> T = 2 * sqrt(0.05)
+        _plan = mservo.plan_move([0, 10], [0, 0])
+        assert _plan.move_sec == pytest.approx(2 * math.sqrt(0.05))
+        assert _plan.accel_frac == 0.5
+
+    def test_default_limits(self, mservo):
+        """未設定のサーボは、デフォルトの上限"""
+        # pin 17: 60 deg, V = 0.1, A = 0.01 --> T = 0.1 + 0.1
+        _plan = mservo.plan_move([60, None], [0, 0])
+        assert _plan.move_sec == pytest.approx(0.2)
+
+    def test_no_move(self, mservo):
+        """動かない場合は、0"""
+        assert mservo.plan_move([None, None]) == (0.0, 0.0)
+
+    def test_limits(self, mservo):
+        """計画した動きが、速度と加速度の上限を超えないか"""
+        for _target in ([90, 90], [0, 10], [-90, 30], [45, -90]):
+            _plan = mservo.plan_move(_target, [0, 0])
+            for _servo, _d in zip(mservo.servo, _target):
+                _v = abs(_d) / (_plan.move_sec * (1 - _plan.accel_frac))
+                _a = _v / (_plan.move_sec * _plan.accel_frac)
+                assert _v <= (_servo.max_speed or 600.0) * 1.000001
+                assert _a <= (_servo.max_accel or 6000.0) * 1.000001
+
+
+class TestAutoMove:
+    """`move_sec: "auto"`のテスト"""
+
+    def test_move_all_angles_sync(self, mservo):
+        """計画した時間で、同時に着くか"""
+        _plan = mservo.plan_move([90, 90])
+        _sec = mservo.move_all_angles_sync([90, 90], move_sec="auto")
+        assert _sec == pytest.approx(_plan.move_sec)
+        assert mservo.clock.now() == pytest.approx(_plan.move_sec)
+        assert mservo.get_all_angles() == pytest.approx([90, 90], abs=0.1)
+
+    def test_worker(self, mservo):
+        """ワーカーの`move`と`move_sec`で、"auto"を使えるか"""
+        _worker = ThreadWorker(mservo)
+        _worker.start()
+        try:
+            _res = _worker.send(
+                {"cmd": "move", "angles": [0, 10], "move_sec": "auto"}
+            ).result(timeout=5)
+            _worker.send({"cmd": "move_sec", "sec": "auto"}).result()
+            _res2 = _worker.send(
+                {"cmd": "move", "angles": [0, 0]}
+            ).result(timeout=5)
+        finally:
+            _worker.end()
+
+        assert _res["exec_sec"] == pytest.approx(2 * math.sqrt(0.05))
+        assert _res2["exec_sec"] == pytest.approx(  # パルス幅は整数
+            2 * math.sqrt(0.05), abs=0.001
+        )
+        assert _worker.move_sec == "auto"
+        assert _worker.get_metrics()["overrun"]["max"] == 0
+
+    def test_str_cmd(self):
+        """文字列コマンド`ms:auto`と、バイナリ形式"""
+        _cmds = StrCmdToJson([1, 1], cache_size=0).cmd_data_list(
+            "ms:auto mv:10,10"
+        )
+        assert _cmds[0] == {"cmd": "move_sec", "sec": "auto"}
+
+        _cmds.append({"cmd": "move", "angles": [0, 0], "move_sec": "auto"})
+        _buf = BinCmd.encode_list(_cmds)
+        assert BinCmd.decode(_buf)[0] == _cmds[0]
+        assert BinCmd.decode_all(_buf)[-1]["move_sec"] == "auto"
+
+    def test_physical_speed(self):
+        """"auto"の移動は、SG90の速度を超えないか"""
+        _res = DynamicsReport(PINS).run(
+            "ms:auto mv:90,-90 mv:-90,90 mv:0,0 mv:5,0"
+        )
+        assert _res["summary"]["move_n"] == 4
+        assert _res["summary"]["too_fast_n"] == 0
@@ -0,0 +1,266 @@
+#
+# (c) 2025 Yoichi Tanibayashi
+#
+"""
+tests/test_25_current_budget.py
+"""
+import asyncio
+import logging
+import threading
+import time
+
+import pytest
+
+from piservo0 import (
+    AsyncMultiServo,
+    Clock,
+    CurrentBudget,
+    CurrentModel,
+    MemPi,
+    MultiServo,
+    SimClock,
+)
+from piservo0.backend.sim_pi import SimPi
+from piservo0.helper.thread_worker import ThreadWorker
+from piservo0.utils.servo_config_manager import ServoConfigManager
+
+PINS = [17, 27, 22, 23]
+
+# 動き始め 1 A (0.1 sec), 動いている間 0.2 A
+MODEL = CurrentModel(surge_a=1.0, move_a=0.2, idle_a=0.0, surge_sec=0.1)
+
+
+@pytest.fixture
+def conf_file(tmp_path):
+    """pin 23だけ、ストール電流を設定した設定ファイル"""
+    _conf_file = str(tmp_path / "servo.json")
+    _confs = [
+        {"pin": _pin, "min": 500, "center": 1500, "max": 2500}
+        for _pin in PINS
+    ]
+    _confs[3]["stall_current"] = 1.5
+    ServoConfigManager(_conf_file).save_all_configs(_confs)
+    return _conf_file
+
+
+@pytest.fixture
+def clock():
+    """SimClock"""
+    return SimClock()
+
+
+@pytest.fixture
+def pi(clock):
+    """SimPi"""
+    return SimPi(clock)
+
+
+@pytest.fixture
+def mservo(conf_file, clock, pi):
+    """SimClockで動かすMultiServo"""
+    _mservo = MultiServo(pi, PINS, conf_file=conf_file, clock=clock)
+    _mservo.move_all_angles([0, 0, 0, 0])
+    return _mservo
+
+
+class TestCurrentBudget:
+    """CurrentBudgetクラスのテスト"""
+
+    def test_model(self):
+        """動き始め、動いている間、止まっている間"""
+        assert MODEL.current(0.05, 1.0) == 1.0
+        assert MODEL.current(0.5, 1.0) == 0.2
+        assert MODEL.current(1.0, 1.0) == 0.0
+        assert MODEL.current(-0.1, 1.0) == 0.0
+
+    def test_invalid(self):
+        """予算が0以下"""
+        with pytest.raises(ValueError):
+            CurrentBudget(0.0)
+
+    def test_within_budget(self):
+        """予算内なら、ずらさない"""
+        _budget = CurrentBudget(5.0, MODEL)
+        assert _budget.schedule([1.0, 1.0, 1.0, 0.0]) == [0.0] * 4
+
+    @pytest.mark.parametrize("budget_a", [1.5, 2.5, 3.0])
+    def test_schedule(self, budget_a):
+        """ずらした結果、予算内に収まり、フレーム単位か"""
+        _budget = CurrentBudget(budget_a, MODEL, frame_sec=0.02)
+        _durs = [1.0, 0.5, 0.8, 0.0, 0.3]
+        _offsets = _budget.schedule(_durs)
+
+        _models = [MODEL] * len(_durs)
+        assert CurrentBudget.peak(_models, _durs, [0.0] * 5) > budget_a
+        assert CurrentBudget.peak(_models, _durs, _offsets) <= budget_a
+        assert _offsets[3] == 0.0
+        for _o in _offsets:
+            assert _o / 0.02 == pytest.approx(round(_o / 0.02))
+
+        # 動き始め(0.1 sec)をずらすだけで、全体はほとんど延びない
+        _end = max(_o + _d for _o, _d in zip(_offsets, _durs))
+        assert _end <= 1.0 + 0.1 * len(_durs)
+
+    def test_serial(self):
+        """動いているサーボがあると予算を超える場合は、順番に動かす"""
+        _durs = [1.0, 0.5, 0.3]
+        _offsets = CurrentBudget(1.0, MODEL).schedule(_durs)
+        assert _offsets == [0.0, pytest.approx(1.0), pytest.approx(1.5)]
+
+    def test_over_budget(self):
+        """一台だけで予算を超える場合も、すべてのサーボを動かす"""
+        _offsets = CurrentBudget(0.5, MODEL).schedule([0.2, 0.2])
+        assert sorted(_offsets) == [0.0, pytest.approx(0.2)]
+
+    def test_warn_once(self):
+        """予算を超えるサーボが複数あっても、警告は一回"""
+        _records: list[logging.LogRecord] = []
+        _handler = logging.Handler()
+        _handler.emit = _records.append  # type: ignore
+        _budget = CurrentBudget(0.5, MODEL)
+        _logger = logging.getLogger("current_budget.py.CurrentBudget")
+        _logger.addHandler(_handler)
+        try:
+            _budget.schedule([0.2, 0.2, 0.2])
+        finally:
+            _logger.removeHandler(_handler)
+
+        _warns = [_r for _r in _records if _r.levelno == logging.WARNING]
+        assert len(_warns) == 1
+        assert "[0, 1, 2]" in _warns[0].getMessage()
+
+
+class TestMultiServo:
+    """`MultiServo.current_budget`のテスト"""
+
+    def test_stall_current(self, mservo):
+        """ストール電流を設定ファイルから読むか"""
+        assert mservo.servo[0].stall_current is None
+        assert mservo.servo[3].stall_current == 1.5
+
+    def test_no_budget(self, mservo, clock):
+        """予算がなければ、同時に動かす"""
+        _t0 = clock.now()
+        mservo.move_all_angles([90, 90, 90, 90])
+        assert clock.now() == _t0
+        assert mservo.plan_stagger([1.0] * 4) == [0.0] * 4
+
+    def test_move_all_angles(self, mservo, clock, pi):
+        """予算があれば、動き始めをずらすか"""
+        mservo.current_budget = CurrentBudget(2.0, MODEL)
+        _t0 = clock.now()
+        _n0 = len(pi.records)
+        mservo.move_all_angles([90, 90, None, 90])
+
+        _records = pi.records[_n0:]
+        assert len({_r.t for _r in _records}) > 1
+        assert clock.now() > _t0
+        assert mservo.get_all_angles() == pytest.approx(
+            [90, 90, 0, 90], abs=0.1
+        )
+
+        # 同時に動き始めた組の、ストール電流の合計 (pin 22は動かない)
+        _starts: dict[float, float] = {}
+        for _r in _records:
+            _i = PINS.index(_r.pin)
+            if _i == 2:
+                continue
+            _starts[_r.t] = _starts.get(_r.t, 0.0) + (
+                mservo.servo[_i].stall_current or MODEL.surge_a
+            )
+        assert max(_starts.values()) <= 2.0
+
+    def test_stop_event(self, mservo, clock):
+        """ずらしている間に`stop_event`がセットされたら、残りは動かさない"""
+        mservo.current_budget = CurrentBudget(1.0, MODEL)
+        _offsets = mservo.stagger_offsets([90, 90, 90, 90])
+        assert len(set(_offsets)) > 1
+
+        _stop_ev = threading.Event()
+        mservo.add_state_listener(lambda _state: _stop_ev.set())
+        mservo.move_all_angles([90, 90, 90, 90], stop_event=_stop_ev)
+
+        _first = min(_offsets)
+        assert clock.now() == pytest.approx(_first)
+        for _a, _o in zip(mservo.get_all_angles(), _offsets):
+            assert _a == pytest.approx(90 if _o == _first else 0, abs=0.1)
+
+    def test_worker_cancel(self, mservo):
+        """ワーカーのキャンセルで、ずらしている途中の移動を中断する"""
+        mservo.clock = Clock()
+        mservo.current_budget = CurrentBudget(1.0, MODEL)
+        _worker = ThreadWorker(mservo)
+        _worker.start()
+        try:
+            _fut = _worker.send({
+                "cmd": "move_all_angles", "angles": [90, 90, 90, 90]
+            })
+            _t0 = time.monotonic()
+            time.sleep(0.05)
+            _worker.cancel_cmds()
+            _fut.result(timeout=5.0)
+            assert time.monotonic() - _t0 < 0.5
+        finally:
+            _worker.end()
+
+        assert 0 in [round(_a) for _a in mservo.get_all_angles()]
+
+    def test_move_all_angles_sync(self, mservo, clock):
+        """予算があっても、すべて目標に着くか"""
+        mservo.current_budget = CurrentBudget(2.5, MODEL)
+        _sec = mservo.move_all_angles_sync(
+            [60, -60, 30, 90], move_sec=0.5, step_n=25
+        )
+
+        assert _sec > 0.5
+        assert _sec < 0.5 + 0.1 * len(PINS)
+        assert clock.now() == pytest.approx(_sec)
+        assert mservo.get_all_angles() == pytest.approx(
+            [60, -60, 30, 90], abs=0.1
+        )
+
+    def test_async(self, mservo, clock):
+        """AsyncMultiServoでも、ずらすか"""
+        mservo.current_budget = CurrentBudget(2.0, MODEL)
+        _amservo = AsyncMultiServo(mservo)
+        try:
+            _sec = asyncio.run(_amservo.move_all_angles_sync(
+                [45, 45, 45, 45], move_sec=0.2, step_n=10
+            ))
+        finally:
+            _amservo.end()
+
+        assert _sec > 0.2
+        assert mservo.get_all_angles() == pytest.approx(
+            [45, 45, 45, 45], abs=0.1
+        )
+
+    def test_async_stop_event(self, mservo):
+        """AsyncMultiServoでも、ずらしている途中で中断できるか"""
+        mservo.current_budget = CurrentBudget(1.0, MODEL)
+        _amservo = AsyncMultiServo(mservo)
+
+        async def _run():
+            _stop_ev = asyncio.Event()
+            _task = asyncio.create_task(
+                _amservo.move_all_angles([90, 90, 90, 90], _stop_ev)
+            )
+            await asyncio.sleep(0.05)
+            _stop_ev.set()
+            await asyncio.wait_for(_task, 0.5)
+
+        try:
+            asyncio.run(_run())
+        finally:
+            _amservo.end()
+
+        assert 0 in [round(_a) for _a in mservo.get_all_angles()]
+
+    def test_mem_pi(self, conf_file):
+        """予算内なら、`move_all_angles_sync()`は変わらない"""
+        _mservo = MultiServo(
+            MemPi(), PINS, conf_file=conf_file, clock=SimClock()
+        )
+        _mservo.current_budget = CurrentBudget(100.0, MODEL)
+        _sec = _mservo.move_all_angles_sync([10, 20, 30, 40], 0.4, 8)
+        assert _sec == pytest.approx(0.4)
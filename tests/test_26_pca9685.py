@@ -0,0 +1,222 @@
+#
+# (c) 2025 Yoichi Tanibayashi
+#
+"""
+tests/test_26_pca9685.py
+"""
+import pytest
+
+from piservo0 import MultiServo, SimClock
+from piservo0.backend import pca9685_pi
+from piservo0.backend.factory import (
+    BACKEND_PCA9685,
+    ENV_I2C_BUS,
+    ENV_PCA9685_ADDRS,
+    attach_pi,
+    open_pi,
+    parse_addrs,
+)
+from piservo0.backend.fake_smbus import FakeSMBus
+from piservo0.backend.pca9685_pi import Pca9685Pi
+from piservo0.utils.servo_config_manager import ServoConfigManager
+
+ADDRS = [0x40, 0x41]
+PINS = list(range(20))  # 0x40: 16 ch, 0x41: 4 ch
+
+
+def led_off(bus, addr, ch) -> int:
+    """LEDn_OFFの値"""
+    _regs = bus.regs[addr]
+    _reg = Pca9685Pi.REG_LED0 + 4 * ch
+    return _regs[_reg + 2] | (_regs[_reg + 3] << 8)
+
+
+@pytest.fixture
+def bus():
+    """FakeSMBus"""
+    return FakeSMBus()
+
+
+@pytest.fixture
+def pi(bus):
+    """2枚のボード"""
+    return Pca9685Pi(bus, ADDRS)
+
+
+@pytest.fixture
+def mservo(tmp_path, pi):
+    """20個のサーボ"""
+    _conf_file = str(tmp_path / "servo.json")
+    ServoConfigManager(_conf_file).save_all_configs([
+        {"pin": _pin, "min": 500, "center": 1500, "max": 2500}
+        for _pin in PINS
+    ])
+    _mservo = MultiServo(pi, PINS, conf_file=_conf_file, clock=SimClock())
+    attach_pi(pi, _mservo)
+    return _mservo
+
+
+class TestPca9685Pi:
+    """Pca9685Piクラスのテスト"""
+
+    def test_init(self, bus, pi):
+        """50 Hz、オートインクリメント"""
+        assert pi.prescale == 121
+        for _addr in ADDRS:
+            _regs = bus.regs[_addr]
+            assert _regs[Pca9685Pi.REG_PRESCALE] == 121
+            assert _regs[Pca9685Pi.REG_MODE1] == Pca9685Pi.MODE1_AI
+
+    def test_auto_flush(self, bus, pi):
+        """書き込みごとに、1チャンネルだけ書くか"""
+        _mark = bus.mark()
+        pi.set_servo_pulsewidth(17, 1500)
+
+        _trs = bus.since(_mark)
+        assert len(_trs) == 1
+        assert _trs[0].addr == 0x41
+        assert _trs[0].reg == Pca9685Pi.REG_LED0 + 4
+        assert len(_trs[0].data) == 4
+        assert led_off(bus, 0x41, 1) == round(1500 / pi.tick_usec)
+        assert pi.get_servo_pulsewidth(17) == 1500
+
+    def test_unchanged(self, bus, pi):
+        """パルス幅が変わらなければ、書き込まない"""
+        pi.set_servo_pulsewidth(1, 1500)
+        _mark = bus.mark()
+        pi.set_servo_pulsewidth(1, 1500)
+        assert bus.since(_mark) == []
+
+    def test_off(self, bus, pi):
+        """0は、full off"""
+        pi.set_servo_pulsewidth(3, 0)
+        _reg = Pca9685Pi.REG_LED0 + 4 * 3
+        assert bus.regs[0x40][_reg + 3] == Pca9685Pi.FULL_OFF
+        assert pi.get_servo_pulsewidth(3) == 0
+
+    def test_frame(self, bus, pi):
+        """`frame()`の中の書き込みを、ボードごとに一回で書くか"""
+        _mark = bus.mark()
+        with pi.frame():
+            for _pin in (2, 5, 3, 16):
+                pi.set_servo_pulsewidth(_pin, 1000 + _pin)
+            assert bus.since(_mark) == []
+
+        _trs = bus.since(_mark)
+        assert [(_t.addr, _t.reg, len(_t.data)) for _t in _trs] == [
+            (0x40, Pca9685Pi.REG_LED0 + 8, 16),  # ch 2..5
+            (0x41, Pca9685Pi.REG_LED0, 4),
+        ]
+        assert pi.frame_n == 1
+        assert pi.last_frame_bytes == 1 + 16 + 1 + 4
+        for _pin in (2, 3, 5, 16):
+            _i, _ch = divmod(_pin, 16)
+            assert led_off(bus, ADDRS[_i], _ch) == round(
+                (1000 + _pin) / pi.tick_usec
+            )
+
+    def test_invalid_pin(self, pi):
+        """ボードのないピン"""
+        with pytest.raises(ValueError):
+            pi.set_servo_pulsewidth(32, 1500)
+
+    def test_stop(self, bus, pi):
+        """`stop()`"""
+        pi.stop()
+        assert bus.closed
+        assert not pi.connected
+
+    def test_factory(self, monkeypatch):
+        """smbus2がない場合"""
+        monkeypatch.setattr(pca9685_pi, "SMBus", None)
+        with pytest.raises(RuntimeError):
+            open_pi(BACKEND_PCA9685)
+
+    def test_parse_addrs(self):
+        """ボードのアドレスの文字列"""
+        assert parse_addrs("0x40, 0x41,65") == [0x40, 0x41, 0x41]
+        for _str in ("", "0x40,xx", "0x80"):
+            with pytest.raises(ValueError):
+                parse_addrs(_str)
+
+
+class TestFactory:
+    """`open_pi("pca9685")`で、バスとボードを指定できるか"""
+
+    @pytest.fixture
+    def buses(self, monkeypatch):
+        """`SMBus(bus_n)`の代わりに、FakeSMBusを作る"""
+        _buses: dict[int, FakeSMBus] = {}
+
+        def _smbus(bus_n):
+            _buses[bus_n] = FakeSMBus()
+            return _buses[bus_n]
+
+        monkeypatch.setattr(pca9685_pi, "SMBus", _smbus)
+        return _buses
+
+    def test_args(self, buses, tmp_path):
+        """引数で、バスと複数のボードを指定し、20個のサーボを動かす"""
+        _pi = open_pi(BACKEND_PCA9685, i2c_bus=3, pca9685_addrs=ADDRS)
+        assert _pi.addrs == ADDRS
+
+        _conf_file = str(tmp_path / "servo.json")
+        _mservo = MultiServo(_pi, PINS, conf_file=_conf_file)
+        attach_pi(_pi, _mservo)
+        _mservo.move_all_angles([90] * len(PINS))
+
+        assert led_off(buses[3], 0x41, 3) == round(2500 / _pi.tick_usec)
+        assert [_t.addr for _t in buses[3].transactions[-2:]] == ADDRS
+
+    def test_env(self, buses, monkeypatch):
+        """環境変数で、バスとボードを指定する (子プロセス用)"""
+        monkeypatch.setenv(ENV_I2C_BUS, "0")
+        monkeypatch.setenv(ENV_PCA9685_ADDRS, "0x40,0x41,0x42")
+        _pi = open_pi(BACKEND_PCA9685)
+        assert list(buses) == [0]
+        assert _pi.addrs == [0x40, 0x41, 0x42]
+        _pi.set_servo_pulsewidth(47, 1500)
+
+    def test_default(self, buses, monkeypatch):
+        """指定しなければ、bus 1, 0x40"""
+        monkeypatch.delenv(ENV_I2C_BUS, raising=False)
+        monkeypatch.delenv(ENV_PCA9685_ADDRS, raising=False)
+        _pi = open_pi(BACKEND_PCA9685)
+        assert list(buses) == [1]
+        assert _pi.addrs == [0x40]
+
+
+class TestMultiServo:
+    """MultiServoから、フレーム単位で書くか"""
+
+    def test_move_all_angles(self, bus, mservo):
+        """一回の移動で、ボードごとに一回のブロック書き込み"""
+        _mark = bus.mark()
+        mservo.move_all_angles([30] * len(PINS))
+
+        _trs = bus.since(_mark)
+        assert [(_t.addr, len(_t.data)) for _t in _trs] == [
+            (0x40, 16 * 4), (0x41, 4 * 4)
+        ]
+        assert bus.bytes_since(_mark) == (2 + 64) + (2 + 16)
+        for _p, _pulse in zip(PINS, mservo.get_all_pulses()):
+            assert led_off(bus, ADDRS[_p // 16], _p % 16) == round(
+                _pulse / mservo.servo[0].pi.tick_usec
+            )
+
+    def test_move_all_angles_sync(self, bus, pi, mservo):
+        """ステップごとに、変わったチャンネルだけを一フレームで書く"""
+        mservo.move_all_angles([0] * len(PINS))
+        _frame_n = pi.frame_n
+        _mark = bus.mark()
+
+        _angles = [0] * len(PINS)
+        _angles[3] = 90
+        mservo.move_all_angles_sync(_angles, move_sec=0.2, step_n=10)
+
+        assert pi.frame_n - _frame_n == 10
+        assert [(_t.addr, _t.reg, len(_t.data)) for _t in bus.since(_mark)] \
+            == [(0x40, Pca9685Pi.REG_LED0 + 4 * 3, 4)] * 10
+        assert led_off(bus, 0x40, 3) == round(
+            mservo.get_pulse(3) / pi.tick_usec
+        )